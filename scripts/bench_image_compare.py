@@ -0,0 +1,158 @@
+"""Compare comparing images with ImageMagick's ``compare`` with comparing them in process.
+
+`compare_images.py` runs ``compare`` for every pair of pages, and for a tiled comparison
+``convert`` as well, to cut the mask into tiles. `barks_comic_building.build.image_compare`
+is meant to measure the same figures in process, over a process pool. This runs both over
+the name-matched images of two directories, at one fuzz and tile size, and reports the
+time each took and whether they agree on every pair: the AE count exactly, the RMSE and
+each tile's fraction to within rounding. It is what has to agree, and be faster, before
+the scripts can measure in process instead of running ``compare``.
+
+Usage:
+    uv run scripts/bench_image_compare.py /path/to/build1/images /path/to/build2/images \
+        --fuzz 20% --tile-size 512 --limit 20
+"""
+
+# ruff: noqa: T201
+
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from barks_comic_building.build.image_compare import (
+    PairRequest,
+    compare_image_pairs,
+    parse_fuzz,
+)
+
+
+def _run_magick(file1: Path, file2: Path, fuzz: str, mask_file: Path, tile_grid: str) -> tuple:
+    """Measure a pair the way `compare_images.py` did, returning its AE, RMSE and tiles."""
+    ae = subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "compare",
+            "-metric",
+            "AE",
+            "-fuzz",
+            fuzz,
+            "-highlight-color",
+            "white",
+            "-lowlight-color",
+            "black",
+            "-compose",
+            "src",
+            str(file1),
+            str(file2),
+            str(mask_file),
+        ],
+        capture_output=True,
+        text=True,
+        check=False,
+    ).stderr
+    rmse = subprocess.run(  # noqa: S603
+        ["compare", "-metric", "RMSE", str(file1), str(file2), "null:"],  # noqa: S607
+        capture_output=True,
+        text=True,
+        check=False,
+    ).stderr
+    tiles = subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "convert",
+            str(mask_file),
+            "-crop",
+            f"{tile_grid}@",
+            "+repage",
+            "-format",
+            "%[fx:mean]\n",
+            "info:",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    rmse_match = re.search(r"\(([^)]+)\)", rmse)
+    return (
+        int(float(ae.split()[0])),
+        float(rmse_match.group(1)) if rmse_match else 0.0,
+        [float(line) for line in tiles.split()],
+    )
+
+
+app = typer.Typer()
+
+
+@app.command(help="Time ImageMagick's compare against the in-process comparison")
+def main(  # noqa: PLR0913
+    dir1: Annotated[Path, typer.Argument(help="The first directory of images.")],
+    dir2: Annotated[Path, typer.Argument(help="The second, matched to the first by name.")],
+    fuzz: Annotated[str, typer.Option(help="The fuzz to count differing pixels at.")] = "20%",
+    tile_size: Annotated[int, typer.Option(help="The tile size to measure.")] = 512,
+    limit: Annotated[int, typer.Option(help="How many pairs to compare.")] = 20,
+    workers: Annotated[int | None, typer.Option(help="Processes to compare in.")] = None,
+) -> None:
+    if shutil.which("compare") is None:
+        msg = "ImageMagick's compare is not on the path."
+        raise typer.BadParameter(msg)
+
+    pairs = [
+        (file1, dir2 / file1.name)
+        for file1 in sorted(f for f in dir1.iterdir() if f.is_file())
+        if (dir2 / file1.name).is_file()
+    ][:limit]
+    if not pairs:
+        msg = f'No images in "{dir1}" with a match in "{dir2}".'
+        raise typer.BadParameter(msg)
+
+    requests = [PairRequest(f1, f2, parse_fuzz(fuzz), tile_size) for f1, f2 in pairs]
+    start = time.perf_counter()
+    results = list(compare_image_pairs(requests, workers))
+    in_process_s = time.perf_counter() - start
+
+    magick_s = 0.0
+    num_disagreeing = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mask_file = Path(temp_dir) / "mask.png"
+        for result in results:
+            difference = result.difference
+            if difference is None:
+                print(f"{result.request.file1.name}: not compared: {result.error}")
+                continue
+            tile_grid = f"{difference.tiles.cols}x{difference.tiles.rows}"
+            start = time.perf_counter()
+            ae, rmse, tiles = _run_magick(*result.request[:2], fuzz, mask_file, tile_grid)
+            magick_s += time.perf_counter() - start
+
+            worst_tile_gap = max(
+                (abs(a - b) for a, b in zip(tiles, difference.tiles.fractions, strict=False)),
+                default=0.0,
+            )
+            agrees = (
+                ae == difference.num_differing
+                and abs(rmse - difference.rmse) <= max(1e-4, rmse * 1e-3)
+                and len(tiles) == len(difference.tiles.fractions)
+                and worst_tile_gap < 1e-6
+            )
+            num_disagreeing += not agrees
+            print(
+                f"{result.request.file1.name[:24]:<24}"
+                f"   AE {ae:>9} {difference.num_differing:>9}"
+                f"   RMSE {rmse:.5f} {difference.rmse:.5f}"
+                f"   {'agree' if agrees else 'DISAGREE'}",
+                flush=True,
+            )
+
+    print(
+        f"\n{len(results)} pairs: ImageMagick {magick_s:.1f}s, in process {in_process_s:.1f}s;"
+        f" {num_disagreeing} disagreeing."
+    )
+
+
+if __name__ == "__main__":
+    app()
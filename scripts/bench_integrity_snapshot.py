@@ -0,0 +1,96 @@
+"""Time what the integrity snapshot's hash costs against the check it lets a run skip.
+
+A title is skipped when its inputs hash the same as when it last passed, so the hash is
+what every skipped title still costs. It used to be built from each page's dependency
+chain, `get_restored_srce_dependencies` stating every stage on disk, which is most of
+what the check itself costs. It is now built from the artifacts the scan found, named
+for each page. This scans the library's trees as a check does, then for each title
+times the chain walk the hash used to make, the hash as it is made now, and the check,
+with its findings thrown away.
+
+Usage:
+    uv run scripts/bench_integrity_snapshot.py --volume 9
+    uv run scripts/bench_integrity_snapshot.py --limit 50
+"""
+
+# ruff: noqa: T201
+
+import contextlib
+import io
+import time
+from collections.abc import Callable
+from typing import Annotated
+
+import typer
+from barks_fantagraphics.comics_database import ComicsDatabase
+from barks_fantagraphics.pages import get_restored_srce_dependencies, get_sorted_srce_and_dest_pages
+
+from barks_comic_building.build.comics_integrity import ComicsIntegrityChecker
+from barks_comic_building.build.fs_index import use_fs_index
+from barks_comic_building.build.utils import dating_dependencies, quiet_panel_bbox_height_warnings
+
+
+def _walk_the_chains(comics_database: ComicsDatabase, title: str) -> None:
+    """Date every page's dependencies, as the hash used to before it was built."""
+    comic = comics_database.get_comic_book(title)
+    pages = get_sorted_srce_and_dest_pages(comic, get_full_paths=True)
+    for srce_page in pages.srce_pages:
+        dating_dependencies(get_restored_srce_dependencies(comic, srce_page), comic.ini_file)
+
+
+def _time(function: Callable[..., object], *args: object) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(*args)
+
+    return time.perf_counter() - start
+
+
+app = typer.Typer()
+
+
+@app.command(help="Time the snapshot hash, the chain walk it replaced, and the check")
+def main(
+    volume: Annotated[int, typer.Option(help="Only this volume's titles. 0 is every one.")] = 0,
+    limit: Annotated[int, typer.Option(help="At most this many titles.")] = 0,
+) -> None:
+    comics_database = ComicsDatabase()
+    if volume:
+        titles_and_info = comics_database.get_configured_titles_in_fantagraphics_volumes([volume])
+        titles = [title for title, _ in titles_and_info]
+    else:
+        titles = list(comics_database.get_all_story_titles())
+    if limit:
+        titles = titles[:limit]
+
+    checker = ComicsIntegrityChecker(
+        comics_database, no_check_for_unexpected_files=True, no_check_symlinks=False
+    )
+    index = checker._get_fs_index()  # noqa: SLF001
+    index.scan()
+    checker._fs_index = index  # noqa: SLF001
+    print(f"Scanned {index.num_entries} entries in {index.scan_seconds:.2f}s.")
+
+    chain_seconds = hash_seconds = check_seconds = 0.0
+    with quiet_panel_bbox_height_warnings(), use_fs_index(index):
+        for title in titles:
+            comic = comics_database.get_comic_book(title)
+            chain_seconds += _time(_walk_the_chains, comics_database, title)
+            hash_seconds += _time(checker.get_check_inputs_hash, comic)
+            check_seconds += _time(checker.check_single_title, title)
+
+    num_titles = max(len(titles), 1)
+    for name, seconds in [
+        ("The chain walk the hash made", chain_seconds),
+        ("The hash, from the scan", hash_seconds),
+        ("The check", check_seconds),
+    ]:
+        print(
+            f"{name:<30} {seconds:>8.2f}s  {1000 * seconds / num_titles:>8.1f}ms a title"
+            f"  {100 * seconds / max(check_seconds, 1e-9):>5.0f}% of the check"
+        )
+    print(f"{len(titles)} title(s).")
+
+
+if __name__ == "__main__":
+    app()
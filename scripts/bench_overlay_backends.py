@@ -0,0 +1,109 @@
+"""Time the two overlay backends on a real page, and check they make the same page.
+
+The gmic overlay needs the traced ink rendered out to a 4x png in part 3 and both 100
+megapixel inputs read back from disk in part 4, plus a gmic process to do a blend that is
+one line of arithmetic. The in-process backend renders the svg straight into memory and
+takes the colour layer from the snap that made it. This puts a number on the difference,
+and on how far apart the two pages are, before the default is trusted with the library.
+
+Each backend is timed from the svg and the colour layer to the written 4x page, so the
+gmic side includes the 4x render it depends on - that is work the in-process side no
+longer does at all. The numpy side reads its colour layer from the file too, which
+understates its advantage slightly: in the pipeline that array is already in memory.
+
+Usage:
+    uv run scripts/bench_overlay_backends.py --colour-file <a -palette-snapped.png> \
+        --svg-file <the matching restored svg>
+
+Run it on an idle machine, as with the other benchmarks here.
+"""
+
+# ruff: noqa: T201
+
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+
+import cv2 as cv
+import numpy as np
+import typer
+
+from barks_comic_building.restore.image_io import svg_file_to_png, svg_file_to_rgba_array
+from barks_comic_building.restore.overlay import (
+    OVERLAY_TOLERANCE,
+    overlay_inpainted_file_with_black_ink,
+    overlay_with_black_ink,
+    write_overlaid_file,
+)
+
+
+def _time_gmic(colour_file: Path, svg_file: Path, out_dir: Path) -> tuple[float, Path]:
+    start = time.time()
+    ink_file = out_dir / "svg-4x.png"
+    svg_file_to_png(svg_file, ink_file)
+    out_file = out_dir / "gmic.png"
+    overlay_inpainted_file_with_black_ink(colour_file, ink_file, out_file)
+
+    return time.time() - start, out_file
+
+
+def _time_numpy(colour_file: Path, svg_file: Path, out_dir: Path) -> tuple[float, Path]:
+    start = time.time()
+    colour_image = cv.imread(str(colour_file))
+    assert colour_image is not None
+    overlaid = overlay_with_black_ink(colour_image, svg_file_to_rgba_array(svg_file))
+    out_file = out_dir / "numpy.png"
+    write_overlaid_file(out_file, overlaid)
+
+    return time.time() - start, out_file
+
+
+app = typer.Typer()
+
+
+@app.command(help="Compare the gmic and in-process overlay backends on one page")
+def main(
+    colour_file: Annotated[
+        Path, typer.Option(help="The colour layer: a '-palette-snapped.png' or '-inpainted.png'.")
+    ],
+    svg_file: Annotated[Path, typer.Option(help="The restored svg of the same page.")],
+    repeats: Annotated[int, typer.Option(help="How many times to time each backend.")] = 3,
+) -> None:
+    for file in (colour_file, svg_file):
+        if not file.is_file():
+            msg = f'Could not find file: "{file}".'
+            raise typer.BadParameter(msg)
+
+    print(f"Colour layer: {colour_file}  ({colour_file.stat().st_size / 1e6:.0f}MB)")
+    print(f"Svg:          {svg_file}  ({svg_file.stat().st_size / 1e6:.0f}MB)\n")
+
+    gmic_times: list[float] = []
+    numpy_times: list[float] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_dir = Path(temp_dir)
+        for _ in range(repeats):
+            seconds, gmic_file = _time_gmic(colour_file, svg_file, out_dir)
+            gmic_times.append(seconds)
+            seconds, numpy_file = _time_numpy(colour_file, svg_file, out_dir)
+            numpy_times.append(seconds)
+            print(f"gmic {gmic_times[-1]:6.1f}s   numpy {numpy_times[-1]:6.1f}s", flush=True)
+
+        gmic_pixels = cv.imread(str(gmic_file)).astype(np.int16)
+        numpy_pixels = cv.imread(str(numpy_file)).astype(np.int16)
+
+    difference = np.abs(gmic_pixels - numpy_pixels)
+    best_gmic, best_numpy = min(gmic_times), min(numpy_times)
+
+    print(f"\nBest of {repeats}: gmic {best_gmic:.1f}s, numpy {best_numpy:.1f}s", end="")
+    print(f" - {best_gmic / best_numpy:.1f}x.")
+    num_pixels = difference.shape[0] * difference.shape[1]
+    num_different = np.count_nonzero(difference.max(axis=2))
+    print(
+        f"Largest difference {int(difference.max())} (tolerance {OVERLAY_TOLERANCE}),"
+        f" on {num_different:,} of {num_pixels:,} pixels."
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,138 @@
+"""Compare finding panels on a smaller copy of each page with the panel segments already made.
+
+`batch_panel_bounds --detect-mode half` (or `quarter`) runs Kumiko on a reduced copy of
+each page and refines the edges at full size, which is much quicker, but is only worth
+switching to if it puts the panels where the full size run did. This runs the chosen
+mode over every restorable page of the given titles that already has a panel segments
+file, and reports how far each box edge moved from the one in that file, and how long a
+page took.
+
+Boxes are compared by their place in the list, as the page layout code uses them. A page
+where the two find a different number of panels is counted apart, as its boxes cannot be
+paired up; those are the pages to look at first.
+
+Nothing is written: the existing segment files are only read.
+
+Usage:
+    uv run scripts/bench_panel_detect.py --work-dir /tmp/panel-detect --volume 5 --mode half
+    uv run scripts/bench_panel_detect.py --work-dir /tmp/panel-detect --title "..." --time-full
+"""
+
+# ruff: noqa: T201
+
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from comic_utils.common_typer_options import TitleArg, VolumesArg
+
+from barks_comic_building.cli_setup import get_comic_titles
+from barks_comic_building.restore.batch_panel_bounds import (
+    get_override_files,
+    get_title_jobs,
+    get_title_work_dir,
+)
+from barks_comic_building.restore.panel_detect import PanelDetectMode, get_panels_segment_info
+
+_NUM_WORST_PAGES = 10
+
+
+def _get_edges(box: list[int]) -> tuple[int, int, int, int]:
+    x, y, w, h = box
+    return x, y, x + w, y + h
+
+
+def _get_box_deltas(made: list[list[int]], found: list[list[int]]) -> list[int]:
+    """Return, for each pair of boxes, the furthest any of its four edges moved."""
+    return [
+        max(abs(a - b) for a, b in zip(_get_edges(m), _get_edges(f), strict=True))
+        for m, f in zip(made, found, strict=True)
+    ]
+
+
+app = typer.Typer()
+
+
+@app.command(help="Compare reduced copy panel detection with the existing panel segments")
+def main(  # noqa: PLR0913
+    work_dir: Annotated[Path, typer.Option(help="Where Kumiko may write its work files.")],
+    volumes_str: VolumesArg = "",
+    title_str: TitleArg = "",
+    mode: Annotated[
+        PanelDetectMode, typer.Option(help="The size of copy to find panels in.")
+    ] = PanelDetectMode.HALF,
+    time_full: Annotated[
+        bool, typer.Option(help="Also time each page at full size, to set against.")
+    ] = False,
+    tolerance: Annotated[
+        int, typer.Option(help="How many pixels an edge may move and still agree.")
+    ] = 2,
+) -> None:
+    comics_database, titles = get_comic_titles(volumes_str, title_str)
+
+    deltas: list[int] = []
+    worst: list[tuple[int, Path]] = []
+    mismatched: list[Path] = []
+    mode_seconds = full_seconds = 0.0
+    num_pages = 0
+
+    for title in titles:
+        get_title_work_dir(work_dir, title).mkdir(parents=True, exist_ok=True)
+        for processor, override_dir, srce_file, dest_file in get_title_jobs(
+            comics_database, title, work_dir
+        ):
+            if not dest_file.is_file():
+                continue
+            made = json.loads(dest_file.read_text())["panels"]
+            has_override = bool(get_override_files(srce_file, override_dir))
+
+            start = time.perf_counter()
+            found = get_panels_segment_info(
+                processor, override_dir, srce_file, mode, has_override=has_override
+            )["panels"]
+            mode_seconds += time.perf_counter() - start
+
+            if time_full:
+                start = time.perf_counter()
+                get_panels_segment_info(processor, override_dir, srce_file)
+                full_seconds += time.perf_counter() - start
+
+            num_pages += 1
+            if len(found) != len(made):
+                mismatched.append(srce_file)
+                print(f"{srce_file}: {len(made)} panel(s) made, {len(found)} found.", flush=True)
+                continue
+            page_deltas = _get_box_deltas(made, found)
+            deltas.extend(page_deltas)
+            worst.append((max(page_deltas, default=0), srce_file))
+
+    if num_pages == 0:
+        msg = "None of those titles' pages has a panel segments file to compare with."
+        raise typer.BadParameter(msg)
+
+    print(f"\n{num_pages} page(s) in {len(titles)} title(s), mode '{mode}'.\n")
+    print(f"{len(mismatched)} page(s) found a different number of panels.")
+    if deltas:
+        outside = sum(d > tolerance for d in deltas)
+        print(
+            f"{len(deltas)} box(es): edge delta mean {statistics.fmean(deltas):.2f}px,"
+            f" max {max(deltas)}px, {outside} more than {tolerance}px out."
+        )
+    print("\nWorst pages:")
+    for delta, srce_file in sorted(worst, reverse=True)[:_NUM_WORST_PAGES]:
+        print(f"  {delta:5d}px  {srce_file}")
+
+    print(f"\n{mode:>7} {mode_seconds / num_pages:8.2f}s a page")
+    if time_full:
+        print(f"{'full':>7} {full_seconds / num_pages:8.2f}s a page")
+        print(f"\n'{mode}' took {mode_seconds / full_seconds:.0%} of the full size time.")
+
+    if mismatched or any(d > tolerance for d in deltas):
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
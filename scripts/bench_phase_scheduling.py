@@ -0,0 +1,178 @@
+"""Compare the makespan of streamed and batched restore phases on a synthetic batch.
+
+Batched, every phase waits for the slowest page of its batch before the next one starts,
+and every batch for the slowest of its phases, so the cores go idle through each tail.
+Streamed, a page moves on the moment it is done. How much that wins depends on how much
+the pages vary, which is why this draws each page's phase times at random around a mean
+rather than giving them all the same.
+
+Streaming is timed twice: once with each phase waiting for the one before it, as a chain,
+and once as the step graph has it, where a page's inpaint starts beside its own smooth and
+trace. The difference between those two is what the graph is worth to a batch.
+
+The pages only sleep. What is being measured is the scheduling, and real pages would make
+each run hours long and the result depend on whatever else the machine was doing. The
+per-phase limits are the real ones from `_PHASES`, so the comparison is for this machine.
+
+The default phase times are the rough shape of a 4x page - part 1 short, the smooth and
+the inpaint long, the trace and the overlay in between - scaled right down. Pass --phase-seconds taken
+from a real ledger (`barks-restore-status` shows the step means) to match a real run.
+
+Usage:
+    uv run scripts/bench_phase_scheduling.py --pages 64 --batch-size 32
+"""
+
+# ruff: noqa: T201
+
+import contextlib
+import random
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Annotated, cast
+
+import typer
+from loguru import logger
+
+from barks_comic_building.restore import batch_restore_pipeline
+from barks_comic_building.restore.batch_restore_pipeline import (
+    _PHASES,
+    _get_pool_width,
+    run_restore,
+    stream_restore,
+)
+from barks_comic_building.restore.restore_pipeline import RestorePipeline
+from barks_comic_building.restore.worker_pool import WorkerPool
+
+DEFAULT_PHASE_SECONDS = "0.4,2.4,0.8,2.2,0.8"
+
+
+class _SleepingPage:
+    """Stands in for a `RestorePipeline`, sleeping through each phase instead of working.
+
+    Has exactly what the schedulers look at, and no more.
+    """
+
+    def __init__(self, index: int, phase_seconds: list[float]) -> None:
+        self.srce_upscale_file = Path(f"page-{index:03d}.png")
+        self.stop_file: Path | None = None
+        self.errors_occurred = False
+        self.failed_step: str | None = None
+        self.stopped_early = False
+        self.step_seconds: dict[str, float] = {}
+        self.step_peak_rss_mb: dict[str, float] = {}
+        self.phase_seconds = phase_seconds
+
+    def _sleep(self, phase_index: int) -> None:
+        time.sleep(self.phase_seconds[phase_index])
+        self.step_seconds[_PHASES[phase_index].name] = self.phase_seconds[phase_index]
+
+    def do_part1(self) -> None:
+        self._sleep(0)
+
+    def do_part2_memory_hungry(self) -> None:
+        self._sleep(1)
+
+    def do_part3(self) -> None:
+        self._sleep(2)
+
+    def do_part4_memory_hungry(self) -> None:
+        self._sleep(3)
+
+    def do_part5_memory_hungry(self) -> None:
+        self._sleep(4)
+
+
+def _make_pages(
+    num_pages: int, mean_seconds: list[float], spread: float, seed: int
+) -> list[RestorePipeline]:
+    rng = random.Random(seed)
+    pages = [
+        _SleepingPage(i, [s * rng.uniform(1 - spread, 1 + spread) for s in mean_seconds])
+        for i in range(num_pages)
+    ]
+
+    return cast("list[RestorePipeline]", pages)
+
+
+def _time_barrier(pages: list[RestorePipeline], batch_size: int, pool: WorkerPool) -> float:
+    start = time.time()
+    for batch_start in range(0, len(pages), batch_size):
+        run_restore(pages[batch_start : batch_start + batch_size], pool=pool)
+
+    return time.time() - start
+
+
+def _time_streaming(pages: list[RestorePipeline], batch_size: int, pool: WorkerPool) -> float:
+    start = time.time()
+    stream_restore(pages, max_in_flight=batch_size, pool=pool)
+
+    return time.time() - start
+
+
+@contextlib.contextmanager
+def _chained_phases() -> Iterator[None]:
+    """Make each phase wait for the one before it, as they did before the step graph."""
+    needs = batch_restore_pipeline._PHASE_NEEDS
+    batch_restore_pipeline._PHASE_NEEDS = [
+        frozenset({index - 1}) if index else frozenset() for index in range(len(_PHASES))
+    ]
+    try:
+        yield
+    finally:
+        batch_restore_pipeline._PHASE_NEEDS = needs
+
+
+app = typer.Typer()
+
+
+@app.command(help="Time streamed against batched phases on a batch of sleeping pages")
+def main(
+    pages: Annotated[int, typer.Option(help="How many synthetic pages.")] = 64,
+    batch_size: Annotated[
+        int, typer.Option(help="Pages per batch, and the streamed in-flight cap.")
+    ] = 32,
+    phase_seconds_str: Annotated[
+        str, typer.Option("--phase-seconds", help="Comma separated mean seconds per phase.")
+    ] = DEFAULT_PHASE_SECONDS,
+    spread: Annotated[
+        float, typer.Option(help="How far a page's phase time may be from the mean, 0 to 1.")
+    ] = 0.5,
+    seed: Annotated[int, typer.Option(help="Seed for the page times.")] = 1,
+) -> None:
+    mean_seconds = [float(s) for s in phase_seconds_str.split(",")]
+    if len(mean_seconds) != len(_PHASES):
+        msg = f"Need {len(_PHASES)} phase times, one per phase."
+        raise typer.BadParameter(msg)
+
+    limits = ", ".join(f"{phase.name} {phase.workers or 'per core'}" for phase in _PHASES)
+    print(f"{pages} page(s), batch size {batch_size}. Phase limits: {limits}.\n")
+
+    # Logging every page of the runs would bury the numbers this is for.
+    logger.remove()
+
+    # One pool for both, warmed before either is timed, so that neither pays for starting
+    # the workers and the difference is the scheduling alone.
+    with WorkerPool(_get_pool_width()) as pool:
+        stream_restore(_make_pages(pool.num_workers, [0.0] * len(_PHASES), 0.0, seed), pool=pool)
+
+        barrier = _time_barrier(_make_pages(pages, mean_seconds, spread, seed), batch_size, pool)
+        print(f"barrier           {barrier:7.1f}s", flush=True)
+        with _chained_phases():
+            chained = _time_streaming(
+                _make_pages(pages, mean_seconds, spread, seed), batch_size, pool
+            )
+        print(f"streaming, chain  {chained:7.1f}s", flush=True)
+        streaming = _time_streaming(
+            _make_pages(pages, mean_seconds, spread, seed), batch_size, pool
+        )
+        print(f"streaming, graph  {streaming:7.1f}s", flush=True)
+
+    print(
+        f"\nStreamed as a chain took {chained / barrier:.0%} of the barrier makespan,"
+        f" and as the graph {streaming / barrier:.0%}."
+    )
+
+
+if __name__ == "__main__":
+    app()
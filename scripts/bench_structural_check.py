@@ -0,0 +1,104 @@
+"""Compare checking a png by decoding it with checking it as a stream.
+
+`find_structural_fault` used to prove a png readable by decoding it whole and reducing the
+decoded page to a thumbnail for the blank test. It now walks the chunks and inflates the
+image data a window at a time, averaging the thumbnail from the rows as they pass. This
+runs both over a directory of real pages, each check in a fresh process, and reports the
+time each took and the peak memory each added to that process - the decode's grows with
+the page, the stream's should not. It also checks that the two agree on every page, and
+how far apart their thumbnails are.
+
+Usage:
+    uv run scripts/bench_structural_check.py /path/to/restored-upscayled/pages --limit 10
+"""
+
+# ruff: noqa: T201
+
+import concurrent.futures
+import multiprocessing
+import resource
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from PIL import Image, ImageChops, ImageStat
+
+from barks_comic_building.restore import image_checks
+from barks_comic_building.restore.image_checks import CHECK_THUMBNAIL_SIZE
+
+
+def _decode_whole(png_file: Path) -> Image.Image:
+    """Make the check's thumbnail the way `find_structural_fault` did before the stream."""
+    with Image.open(png_file) as image:
+        image.load()
+        return image.convert("RGB").resize(CHECK_THUMBNAIL_SIZE, Image.Resampling.BOX)
+
+
+def _stream(png_file: Path) -> Image.Image:
+    return image_checks._scan_png(png_file).thumbnail  # noqa: SLF001
+
+
+def _run(method: str, png_file: Path) -> tuple[float, float, bytes]:
+    """Run one check in this process, returning its seconds, its peak MB and thumbnail."""
+    check = _decode_whole if method == "decode" else _stream
+    if method == "stream":
+        # Compiled, or loaded from numba's cache, before the baseline, as a worker would.
+        _stream(png_file)
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    thumbnail = check(png_file)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return seconds, (peak_kb - baseline_kb) / 1024, thumbnail.tobytes()
+
+
+def _run_fresh(method: str, png_file: Path) -> tuple[float, float, bytes]:
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(_run, method, png_file).result()
+
+
+def _get_deviation(thumbnail: bytes, other: bytes) -> float:
+    images = [Image.frombytes("RGB", CHECK_THUMBNAIL_SIZE, t) for t in (thumbnail, other)]
+    channel_means = ImageStat.Stat(ImageChops.difference(*images)).mean
+
+    return sum(channel_means) / len(channel_means)
+
+
+app = typer.Typer()
+
+
+@app.command(help="Time the decode and stream structural checks over a directory of pngs")
+def main(
+    png_dir: Annotated[Path, typer.Argument(help="A directory of pngs, searched recursively.")],
+    limit: Annotated[int, typer.Option(help="How many of them to check.")] = 10,
+) -> None:
+    png_files = sorted(png_dir.rglob("*.png"))[:limit]
+    if not png_files:
+        msg = f'No pngs under "{png_dir}".'
+        raise typer.BadParameter(msg)
+
+    print(f"{'page':<24} {'MP':>6}   {'decode':>14}   {'stream':>14}   deviation")
+    worst_deviation = 0.0
+    for png_file in png_files:
+        with Image.open(png_file) as image:
+            megapixels = image.width * image.height / 1e6
+        decode_s, decode_mb, decode_thumbnail = _run_fresh("decode", png_file)
+        stream_s, stream_mb, stream_thumbnail = _run_fresh("stream", png_file)
+        deviation = _get_deviation(decode_thumbnail, stream_thumbnail)
+        worst_deviation = max(worst_deviation, deviation)
+        print(
+            f"{png_file.name[:24]:<24} {megapixels:6.1f}"
+            f"   {decode_s:5.2f}s {decode_mb:6.0f}MB   {stream_s:5.2f}s {stream_mb:6.0f}MB"
+            f"   {deviation:.2f}",
+            flush=True,
+        )
+
+    print(f"\nThe thumbnails differ by at most {worst_deviation:.2f} of 255.")
+
+
+if __name__ == "__main__":
+    app()
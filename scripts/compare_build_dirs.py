@@ -1,16 +1,39 @@
+"""Compare two builds of a comic, manifest to manifest.
+
+Both build dirs are hashed into a `TreeManifest`, and only what the two manifests
+disagree on is looked at: a file that differs is diffed, ignoring the lines that
+legitimately change from build to build, and a page that differs is compared pixel by
+pixel. Everything that came out byte for byte the same - nearly all of a rebuild - is
+never opened again. The digests are cached by stat, so a baseline compared against run
+after run is read once. A page that is a png in the first build and a jpg in the second
+is compared with its jpg, and a file that cannot be read fails only its own comic.
+"""
+
 import subprocess
 import sys
 import zipfile
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from typing import Annotated
 
 import typer
 from barks_build_comic_images.consts import SUMMARY_FILENAME
-from compare_images import CompareError, compare_images_in_dir
+from barks_comic_building.build.tree_manifest import (
+    FileDigestCache,
+    ManifestDiff,
+    TreeManifest,
+    diff_manifests,
+    get_default_file_digest_cache_file,
+    get_tree_manifests,
+    read_archive_crcs,
+)
+from compare_images import CompareError, compare_image_lists
 from loguru import logger
 from rich.console import Console
 from rich.table import Table
 
+# The build's pages, compared as images rather than diffed.
+IMAGES_DIRNAME = "images"
+
 # The build writes the summary file into the build dir but deliberately leaves
 # it out of the cbz archive, so it must not count as a missing archive member.
 ARCHIVE_EXCLUDED_FILES = frozenset({SUMMARY_FILENAME})
@@ -66,7 +89,12 @@ def print_error_summary(errors: list[tuple[str, CompareError]]) -> None:
     Console().print(table)
 
 
-def compare_build_dirs(dir1: Path, dir2: Path) -> list[CompareError]:
+def compare_build_dirs(
+    dir1: Path,
+    dir2: Path,
+    manifest1: TreeManifest | None = None,
+    manifest2: TreeManifest | None = None,
+) -> list[CompareError]:
     """Compare one built comic directory to another.
 
     A missing directory is returned as an error rather than raised, so that a
@@ -76,6 +104,9 @@ def compare_build_dirs(dir1: Path, dir2: Path) -> list[CompareError]:
     Args:
         dir1: The reference (baseline) build directory.
         dir2: The build directory under test.
+        manifest1: The manifest of `dir1`, if it has already been taken - a caller
+            comparing many comics takes them all in one pass. None to take it here.
+        manifest2: Likewise, of `dir2`.
 
     Returns:
         A list of comparison errors, empty if the two builds are equivalent.
@@ -93,84 +124,77 @@ def compare_build_dirs(dir1: Path, dir2: Path) -> list[CompareError]:
             logger.error(f"Error: Could not find build directory: {err.file}.")
         return missing
 
-    errs = compare_dirs_excluding_images(dir1, dir2)
-    errs += compare_dir_images(dir1, dir2)
-    errs += check_comic_archive(dir2)
+    if manifest1 is None or manifest2 is None:
+        manifest1, manifest2 = get_tree_manifests([dir1, dir2])
+    unreadable = get_unreadable_errors(manifest1) + get_unreadable_errors(manifest2)
+    if unreadable:
+        # A file missing from a manifest would be reported as missing from the build.
+        return unreadable
+    manifest_diff = diff_manifests(manifest1, manifest2)
 
-    return errs
+    errs = compare_dirs_excluding_images(dir1, dir2, manifest_diff)
+    errs += compare_dir_images(dir1, dir2, manifest_diff)
+    errs += check_comic_archive(dir2, manifest2)
 
+    return errs
 
-def compare_dirs_excluding_images(dir1: Path, dir2: Path) -> list[CompareError]:
-    logger.info(f'\nComparing non-image files in "{dir1}" to "{dir2}"...')
 
-    # Use brief mode (`-q`) so that every differing file -- text or binary -- is
-    # reported uniformly as "Files <a> and <b> differ", which we can parse per file.
-    diff_command = [
-        "diff",
-        "-r",
-        "-q",
-        "--exclude=images",
-        *DIFF_IGNORE_OPTIONS,
-        str(dir1),
-        str(dir2),
+def get_unreadable_errors(manifest: TreeManifest) -> list[CompareError]:
+    """Return an error for each file a manifest could not read, and log it."""
+    errs = [
+        CompareError(error_type="file-unreadable", file=f'"{manifest.root / name}"', detail=why)
+        for name, why in manifest.unreadable.items()
     ]
+    for err in errs:
+        logger.error(f"Error: Could not read {err.file}: {err.detail}")
 
-    proc = subprocess.run(diff_command, capture_output=True, text=True, check=False)  # noqa: S603
-    if proc.returncode == 0:
-        return []
-
-    logger.error(f'Error: Some files differ between "{dir1}" and "{dir2}".')
-    if proc.stderr:
-        logger.error(f"--- diff stderr ---\n{proc.stderr}")
+    return errs
 
-    errs = parse_diff_output(proc.stdout)
-    if not errs:
-        # The files differ but the output did not name any (e.g. a stderr-only
-        # failure). Record a single generic error so it is still reported.
-        errs = [CompareError(error_type="file", file=str(dir1), detail="files differ")]
 
-    return errs
+def is_image(name: str) -> bool:
+    """Return whether a path in a build dir's manifest is one of its pages."""
+    return name.startswith(f"{IMAGES_DIRNAME}/")
 
 
-def parse_diff_output(diff_output: str) -> list[CompareError]:
-    """Extract per-file errors from the output of `diff -rq`.
+def compare_dirs_excluding_images(
+    dir1: Path, dir2: Path, manifest_diff: ManifestDiff
+) -> list[CompareError]:
+    """Report the non-image files that one build dir lacks, or that differ between them.
 
-    For each differing file the full diff is logged inline (so it appears in the
-    scrollback near where it was found); the table only flags the file with a
-    short "diff" marker, keeping rows short and the paths easy to copy.
+    A file whose bytes differ is diffed to see whether it differs in anything but the
+    lines `DIFF_IGNORE_OPTIONS` ignores. The full diff is logged inline (so it appears in
+    the scrollback near where it was found); the table only flags the file with a short
+    "diff" marker, keeping rows short and the paths easy to copy.
 
     Args:
-        diff_output: The stdout captured from a recursive brief `diff` run.
+        dir1: The reference (baseline) build directory.
+        dir2: The build directory under test.
+        manifest_diff: How the two dirs' manifests differ.
 
     Returns:
-        A list of errors, one per differing or missing file named in the output.
+        A list of errors, one per differing or missing file.
 
     """
-    errs: list[CompareError] = []
-    for line in diff_output.splitlines():
-        if line.startswith("Files ") and line.endswith(" differ"):
-            # Lines of the form: Files <path1> and <path2> differ
-            inner = line[len("Files ") : -len(" differ")]
-            file1_str, _, file2_str = inner.partition(" and ")
-            file1_str = file1_str.strip("'")
-            file2_str = file2_str.strip("'")
-            full_diff = get_file_diff(Path(file1_str), Path(file2_str))
-            if full_diff:
-                logger.error(f'Diff for "{file1_str}" vs "{file2_str}":\n{full_diff}')
-            errs.append(
-                CompareError(
-                    error_type="file",
-                    file=f'"{file1_str}"\n"{file2_str}"',
-                    detail="diff",
-                )
-            )
-        elif line.startswith("Only in "):
-            # Lines of the form: Only in <dir>: <name>
-            location, _, name = line[len("Only in ") :].partition(": ")
-            file = Path(location) / name
-            errs.append(
-                CompareError(error_type="file-missing", file=f'"{file}"', detail="only in one dir")
-            )
+    logger.info(f'\nComparing non-image files in "{dir1}" to "{dir2}"...')
+
+    errs = [
+        CompareError(error_type="file-missing", file=f'"{d / name}"', detail="only in one dir")
+        for d, names in ((dir1, manifest_diff.only_in_1), (dir2, manifest_diff.only_in_2))
+        for name in names
+        if not is_image(name)
+    ]
+    for name in manifest_diff.differing:
+        if is_image(name):
+            continue
+        file1, file2 = dir1 / name, dir2 / name
+        full_diff = get_file_diff(file1, file2)
+        if not full_diff:
+            continue
+        logger.error(f'Diff for "{file1}" vs "{file2}":\n{full_diff}')
+        errs.append(CompareError(error_type="file", file=f'"{file1}"\n"{file2}"', detail="diff"))
+
+    if errs:
+        logger.error(f'Error: Some files differ between "{dir1}" and "{dir2}".')
 
     return errs
 
@@ -192,9 +216,20 @@ def get_file_diff(file1: Path, file2: Path) -> str:
     return proc.stdout.strip()
 
 
-def compare_dir_images(dir1: Path, dir2: Path) -> list[CompareError]:
-    dir1_images = dir1 / "images"
-    dir2_images = dir2 / "images"
+def compare_dir_images(dir1: Path, dir2: Path, manifest_diff: ManifestDiff) -> list[CompareError]:
+    """Compare the pages whose bytes differ, and report those one build dir lacks.
+
+    Args:
+        dir1: The reference (baseline) build directory.
+        dir2: The build directory under test.
+        manifest_diff: How the two dirs' manifests differ.
+
+    Returns:
+        A list of errors, one per missing, extra or differing page.
+
+    """
+    dir1_images = dir1 / IMAGES_DIRNAME
+    dir2_images = dir2 / IMAGES_DIRNAME
 
     missing = [
         CompareError(error_type="dir-missing", file=f'"{d}"', detail="images dir does not exist")
@@ -206,33 +241,87 @@ def compare_dir_images(dir1: Path, dir2: Path) -> list[CompareError]:
             logger.error(f"Error: Could not find images dir: {err.file}.")
         return missing
 
-    logger.info(f'Comparing images in "{dir1_images}" to "{dir2_images}"...')
+    as_jpgs = get_images_as_jpgs(manifest_diff)
+    paired = as_jpgs.keys() | set(as_jpgs.values())
+    errs = [
+        CompareError(error_type=error_type, file=f'"{d / name}"', detail="no corresponding file")
+        for error_type, d, names in (
+            ("image-missing", dir1, manifest_diff.only_in_1),
+            ("image-extra", dir2, manifest_diff.only_in_2),
+        )
+        for name in names
+        if is_image(name) and name not in paired
+    ]
+    for err in errs:
+        logger.warning(f"Image with no counterpart: {err.file}.")
+
+    pairs = [(name, name) for name in manifest_diff.differing if is_image(name)]
+    pairs += as_jpgs.items()
+    logger.info(
+        f'Comparing images in "{dir1_images}" to "{dir2_images}":'
+        f" {len(pairs) - len(as_jpgs)} differ by content,"
+        f" {len(as_jpgs)} compared with a jpg in the second..."
+    )
     compare_fuzz = "0%"
     try:
         # For 0% fuzz, ae_cutoff and diff_dir are not used.
-        image_errors = compare_images_in_dir(
-            dir1_images, dir2_images, fuzz=compare_fuzz, ae_cutoff=0.0, diff_dir=None
+        image_errors = compare_image_lists(
+            [dir1 / name1 for name1, _ in pairs],
+            [dir2 / name2 for _, name2 in pairs],
+            fuzz=compare_fuzz,
+            ae_cutoff=0.0,
+            diff_dir=None,
         )
         if image_errors:
             logger.error(f"Error: Found {len(image_errors)} different images.")
-    except (FileNotFoundError, ValueError) as e:
+    except ValueError as e:
         logger.error(f"Error during image comparison: {e}")
-        return [CompareError(error_type="image-error", file=str(dir1_images), detail=str(e))]
+        return [
+            *errs,
+            CompareError(error_type="image-error", file=str(dir1_images), detail=str(e)),
+        ]
+
+    return errs + image_errors
 
-    return image_errors
 
+def get_images_as_jpgs(manifest_diff: ManifestDiff) -> dict[str, str]:
+    """Return each page only the first build has whose jpg only the second has.
+
+    A page written as a png in one build may be a jpg in the other, which is the same
+    page, so it is compared with its jpg - as `compare_images.get_image_file2` matches
+    them - rather than reported missing from one build and extra in the other.
+
+    Args:
+        manifest_diff: How the two build dirs' manifests differ.
 
-def check_comic_archive(build_dir: Path) -> list[CompareError]:
+    Returns:
+        The jpg in the second build dir, by the page in the first it stands for.
+
+    """
+    only_in_2 = set(manifest_diff.only_in_2)
+    as_jpgs = {
+        name: PurePosixPath(name).with_suffix(".jpg").as_posix()
+        for name in manifest_diff.only_in_1
+        if is_image(name)
+    }
+
+    return {name: jpg for name, jpg in as_jpgs.items() if jpg in only_in_2}
+
+
+def check_comic_archive(
+    build_dir: Path, manifest: TreeManifest | None = None
+) -> list[CompareError]:
     """Check the cbz archive and symlinks a build wrote outside its build dir.
 
     The build dirs are only half of what a build produces; the archive and its
     two symlinks are the half the reader actually consumes. There is no baseline
     to diff them against, so they are checked for self-consistency instead: the
-    archive must hold exactly the build dir's files, must not predate them, and
-    both symlinks must resolve to it.
+    archive must hold exactly the build dir's files, as they are now, must not
+    predate them, and both symlinks must resolve to it.
 
     Args:
         build_dir: The build directory whose archive should be checked.
+        manifest: The manifest of `build_dir`, or None to take it here.
 
     Returns:
         A list of errors, empty if the archive and symlinks are consistent.
@@ -272,7 +361,7 @@ def check_comic_archive(build_dir: Path) -> list[CompareError]:
         )
         return errs
 
-    errs += compare_archive_contents(build_dir, zip_path)
+    errs += compare_archive_contents(build_dir, zip_path, manifest)
     errs += [
         err
         for key in (SERIES_SYMLINK_KEY, YEAR_SYMLINK_KEY)
@@ -310,44 +399,60 @@ def get_summary_paths(summary_file: Path) -> dict[str, Path]:
     return paths
 
 
-def compare_archive_contents(build_dir: Path, zip_path: Path) -> list[CompareError]:
+def compare_archive_contents(
+    build_dir: Path, zip_path: Path, manifest: TreeManifest | None = None
+) -> list[CompareError]:
     """Check a cbz archive holds exactly its build dir's files, and is no older.
 
+    Each member is checked by the CRC its central directory records against the CRC
+    of the file in the build dir, so the archive is read without inflating any of it.
+
     Args:
         build_dir: The build directory the archive was made from.
         zip_path: The cbz archive to check.
+        manifest: The manifest of `build_dir`, or None to take it here.
 
     Returns:
         A list of errors, empty if the archive matches the build dir.
 
     """
+    if manifest is None:
+        manifest = get_tree_manifests([build_dir])[0]
+    if manifest.unreadable:
+        return get_unreadable_errors(manifest)
     build_files = {
-        p.relative_to(build_dir).as_posix(): p
-        for p in build_dir.rglob("*")
-        if p.is_file() and p.name not in ARCHIVE_EXCLUDED_FILES
+        name: digest
+        for name, digest in manifest.files.items()
+        if Path(name).name not in ARCHIVE_EXCLUDED_FILES
     }
 
     try:
-        with zipfile.ZipFile(zip_path) as archive:
-            archived = {info.filename for info in archive.infolist() if not info.is_dir()}
+        archived = read_archive_crcs(zip_path)
     except (OSError, zipfile.BadZipFile) as e:
         logger.error(f'Error reading archive "{zip_path}": {e}')
         return [CompareError(error_type="archive-error", file=f'"{zip_path}"', detail=str(e))]
 
     errs = [
         CompareError(error_type="archive-missing", file=f'"{zip_path}"', detail=f'missing "{name}"')
-        for name in sorted(set(build_files) - archived)
+        for name in sorted(build_files.keys() - archived.keys())
     ]
     errs += [
         CompareError(
             error_type="archive-extra", file=f'"{zip_path}"', detail=f'unexpected "{name}"'
         )
-        for name in sorted(archived - set(build_files))
+        for name in sorted(archived.keys() - build_files.keys())
+    ]
+    errs += [
+        CompareError(
+            error_type="archive-differs", file=f'"{zip_path}"', detail=f'"{name}" differs'
+        )
+        for name in sorted(build_files.keys() & archived.keys())
+        if archived[name] != build_files[name].crc
     ]
 
     # The archive is written after the files it holds, so anything newer than it
     # means the build dir was updated without the archive being rebuilt.
-    newest = max((p.stat().st_mtime for p in build_files.values()), default=0.0)
+    newest = max(((build_dir / name).stat().st_mtime for name in build_files), default=0.0)
     if zip_path.stat().st_mtime < newest:
         errs.append(
             CompareError(
@@ -391,13 +496,21 @@ def check_zip_symlink(link: Path, zip_path: Path) -> list[CompareError]:
 def main(
     dir1: Annotated[Path, typer.Argument(help="First build directory.")],
     dir2: Annotated[Path, typer.Argument(help="Second build directory.")],
+    digest_cache: Annotated[
+        Path | None,
+        typer.Option(help="Where to keep file digests between runs. Default: beside the ledgers."),
+    ] = None,
 ) -> None:
     """Compare two build directories.
 
     First diff files (excluding images), then compare images in the 'images'
-    subdirectories.
+    subdirectories - in both, only those whose contents differ.
     """
-    errors = compare_build_dirs(dir1, dir2)
+    manifests: list[TreeManifest | None] = [None, None]
+    if dir1.is_dir() and dir2.is_dir():
+        with FileDigestCache(digest_cache or get_default_file_digest_cache_file()) as cache:
+            manifests[:] = get_tree_manifests([dir1, dir2], cache)
+    errors = compare_build_dirs(dir1, dir2, *manifests)
 
     if errors:
         logger.error(f"Comparison failed with {len(errors)} errors.")
@@ -3,6 +3,11 @@ from pathlib import Path
 from typing import Annotated
 
 import typer
+from barks_comic_building.build.tree_manifest import (
+    FileDigestCache,
+    get_default_file_digest_cache_file,
+    get_tree_manifests,
+)
 from barks_fantagraphics.comics_utils import get_abbrev_path
 from compare_build_dirs import compare_build_dirs, print_error_summary
 from compare_images import CompareError
@@ -21,11 +26,20 @@ def main(
             "(e.g. a title or volume number).",
         ),
     ] = None,
+    digest_cache: Annotated[
+        Path | None,
+        typer.Option(help="Where to keep file digests between runs. Default: beside the ledgers."),
+    ] = None,
+    workers: Annotated[
+        int | None,
+        typer.Option("--workers", help="Threads to hash files in. Default: one a CPU."),
+    ] = None,
 ) -> None:
     """Compare two build root directories.
 
-    First diff files (excluding images), then compare images in the 'images'
-    subdirectories.
+    Every comic dir to be compared, in both roots, is hashed in one pass; then, for each
+    comic, the files whose contents differ are diffed (excluding images) and the images
+    in its 'images' subdirectory whose contents differ are compared.
     """
     if not dir1.is_dir():
         msg = f'Error: Could not find build directory1: "{dir1}".'
@@ -34,11 +48,14 @@ def main(
         msg = f'Error: Could not find build directory2: "{dir2}".'
         raise FileNotFoundError(msg)
 
-    all_errors: list[tuple[str, CompareError]] = []
-    for subdir1 in sorted(dir1.iterdir()):
-        if name_filter and name_filter not in subdir1.name:
-            continue
+    subdirs1 = [d for d in sorted(dir1.iterdir()) if not name_filter or name_filter in d.name]
+    pairs = [(d, dir2 / d.name) for d in subdirs1 if d.is_dir() and (dir2 / d.name).is_dir()]
+    with FileDigestCache(digest_cache or get_default_file_digest_cache_file()) as cache:
+        manifests = get_tree_manifests([d for pair in pairs for d in pair], cache, workers)
+    manifests_by_dir = {manifest.root: manifest for manifest in manifests}
 
+    all_errors: list[tuple[str, CompareError]] = []
+    for subdir1 in subdirs1:
         if not subdir1.is_dir():
             # A stray file among the comic dirs is worth reporting, but it must
             # not abort the comparison of every comic after it.
@@ -55,7 +72,10 @@ def main(
 
         subdir2 = dir2 / subdir1.name
         logger.info(f'Comparing "{get_abbrev_path(subdir1)}" to "{get_abbrev_path(subdir2)}".')
-        all_errors.extend((subdir1.name, err) for err in compare_build_dirs(subdir1, subdir2))
+        errors = compare_build_dirs(
+            subdir1, subdir2, manifests_by_dir.get(subdir1), manifests_by_dir.get(subdir2)
+        )
+        all_errors.extend((subdir1.name, err) for err in errors)
 
     if all_errors:
         logger.error(f"Comparison failed with {len(all_errors)} errors.")
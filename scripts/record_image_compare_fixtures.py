@@ -0,0 +1,153 @@
+"""Record what ImageMagick's ``compare`` measures on the image compare fixtures.
+
+`barks_comic_building.build.image_compare` is meant to give ``compare``'s own AE counts,
+RMSEs and ``-crop`` tile fractions, and ``tests/test_image_compare.py`` holds it to them.
+ImageMagick is not run by the tests, so that they run where it is not installed: what it
+made of a few noisy pairs - grey and colour, png and jpg - is checked in under
+``tests/fixtures/image_compare``, and this is what writes them. Run it where ImageMagick
+is installed, and check in the pairs and ``expected.json`` together, as they are only
+right for each other.
+
+Usage:
+    uv run scripts/record_image_compare_fixtures.py
+"""
+
+# ruff: noqa: T201
+
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Annotated
+
+import cv2 as cv
+import numpy as np
+import typer
+
+from barks_comic_building.build.image_compare import get_tile_grid
+
+FIXTURES_DIR = Path(__file__).parent.parent / "tests" / "fixtures" / "image_compare"
+EXPECTED_FILENAME = "expected.json"
+
+# Each pair's name, and its channels and format.
+PAIRS = {"grey-png": (1, ".png"), "colour-png": (3, ".png"), "colour-jpg": (3, ".jpg")}
+AE_FUZZES = ("0%", "5%", "20%")
+TILE_FUZZ = "20%"
+TILE_SIZE = 64
+
+
+def _write_pair(fixtures_dir: Path, name: str, channels: int, suffix: str) -> tuple[Path, Path]:
+    """Write a noisy page and a copy with noise of its own added, about 70 either way."""
+    rng = np.random.default_rng(sorted(PAIRS).index(name))
+    shape = (301, 257) if channels == 1 else (301, 257, channels)
+    image = rng.integers(0, 256, shape, dtype=np.uint8)
+    noise = rng.integers(-70, 71, shape)
+    other = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    files = (fixtures_dir / f"{name}-1{suffix}", fixtures_dir / f"{name}-2{suffix}")
+    for file, pixels in zip(files, (image, other), strict=True):
+        if not cv.imwrite(str(file), pixels):
+            msg = f'Could not write "{file}".'
+            raise OSError(msg)
+
+    return files
+
+
+def _run(*args: str) -> subprocess.CompletedProcess[str]:
+    # compare exits 1 when the images differ, which is not a failure here.
+    completed = subprocess.run(args, capture_output=True, text=True, check=False)  # noqa: S603
+    if completed.returncode not in (0, 1):
+        msg = f"{args[0]} failed: {completed.stderr.strip()}"
+        raise RuntimeError(msg)
+
+    return completed
+
+
+def _get_ae(file1: Path, file2: Path, fuzz: str) -> int:
+    output = _run("compare", "-metric", "AE", "-fuzz", fuzz, str(file1), str(file2), "null:")
+    return int(float(output.stderr.split()[0]))
+
+
+def _get_rmse(file1: Path, file2: Path) -> float:
+    output = _run("compare", "-metric", "RMSE", str(file1), str(file2), "null:").stderr
+    match = re.search(r"\(([^)]+)\)", output)
+    if match is None:
+        msg = f"Could not parse an RMSE from: '{output}'"
+        raise RuntimeError(msg)
+
+    return float(match.group(1))
+
+
+def _get_tile_fractions(file1: Path, file2: Path, grid: tuple[int, int]) -> list[float]:
+    """Measure the tiles as `compare_images.get_tile_diff_fractions` does: mask, then crop."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mask_file = Path(temp_dir) / "mask.png"
+        _run(
+            "compare",
+            "-fuzz",
+            TILE_FUZZ,
+            "-highlight-color",
+            "white",
+            "-lowlight-color",
+            "black",
+            "-compose",
+            "src",
+            str(file1),
+            str(file2),
+            str(mask_file),
+        )
+        output = _run(
+            "convert",
+            str(mask_file),
+            "-crop",
+            f"{grid[0]}x{grid[1]}@",
+            "+repage",
+            "-format",
+            "%[fx:mean]\n",
+            "info:",
+        ).stdout
+
+    return [float(line) for line in output.split()]
+
+
+app = typer.Typer()
+
+
+@app.command(help="Write the image compare fixtures and what ImageMagick measures on them")
+def main(
+    fixtures_dir: Annotated[Path, typer.Option(help="Where to write them.")] = FIXTURES_DIR,
+) -> None:
+    if shutil.which("compare") is None or shutil.which("convert") is None:
+        msg = "ImageMagick's compare and convert are not on the path."
+        raise typer.BadParameter(msg)
+
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    version = _run("compare", "-version").stdout.splitlines()[0]
+
+    pairs = {}
+    for name, (channels, suffix) in PAIRS.items():
+        file1, file2 = _write_pair(fixtures_dir, name, channels, suffix)
+        height, width = cv.imread(str(file1), cv.IMREAD_UNCHANGED).shape[:2]
+        grid = get_tile_grid((width, height), TILE_SIZE)
+        pairs[name] = {
+            "files": [file1.name, file2.name],
+            "ae": {fuzz: _get_ae(file1, file2, fuzz) for fuzz in AE_FUZZES},
+            "rmse": _get_rmse(file1, file2),
+            "tiles": {
+                "fuzz": TILE_FUZZ,
+                "tile_size": TILE_SIZE,
+                "grid": list(grid),
+                "fractions": _get_tile_fractions(file1, file2, grid),
+            },
+        }
+        print(f"{name}: AE {pairs[name]['ae']}, RMSE {pairs[name]['rmse']}.")
+
+    expected = {"imagemagick": version, "pairs": pairs}
+    (fixtures_dir / EXPECTED_FILENAME).write_text(json.dumps(expected, indent=2) + "\n")
+    print(f'Recorded with "{version}" in "{fixtures_dir}".')
+
+
+if __name__ == "__main__":
+    app()
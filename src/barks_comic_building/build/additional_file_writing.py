@@ -47,7 +47,6 @@ from barks_fantagraphics.pages import (
     get_srce_dest_map,
 )
 from comic_utils.sys_utils import get_hash_str
-from comic_utils.timing import Timing
 
 
 def write_summary_file(  # noqa: PLR0913, PLR0915
@@ -56,7 +55,8 @@ def write_summary_file(  # noqa: PLR0913, PLR0915
     required_dim: RequiredDimensions,
     pages: SrceAndDestPages,
     max_dest_timestamp: float,
-    timing: Timing,
+    time_of_run: str,
+    seconds_taken: float,
 ) -> None:
     summary_file = comic.get_dest_dir() / SUMMARY_FILENAME
 
@@ -95,8 +95,8 @@ def write_summary_file(  # noqa: PLR0913, PLR0915
 
     with summary_file.open("w") as f:
         f.write("Run Summary:\n")
-        f.write(f"time of run              = {timing.get_start_time()}\n")
-        f.write(f"time taken               = {timing.get_elapsed_time_in_seconds()} seconds\n")
+        f.write(f"time of run              = {time_of_run}\n")
+        f.write(f"time taken               = {seconds_taken} seconds\n")
         f.write(f'title                    = "{comic.title}"\n')
         f.write(f'ini title                = "{comic.get_ini_title()}"\n')
         f.write(f'issue title              = "{comic.issue_title}"\n')
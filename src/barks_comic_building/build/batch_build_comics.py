@@ -1,6 +1,10 @@
 # ruff: noqa: ERA001, F401
 
 import sys
+import time
+from functools import partial
+from pathlib import Path
+from typing import Annotated
 
 import typer
 from barks_build_comic_images.build_comic_images import RGB_PROFILE, SVG_ADAPTIVE_PROFILE
@@ -12,57 +16,136 @@ from loguru import logger
 
 from barks_comic_building.build.additional_file_writing import write_summary_file
 from barks_comic_building.build.build_comics import BuildError, ComicBookBuilder
+from barks_comic_building.build.build_manifest import (
+    DEFAULT_BUILD_MODE,
+    BuildMode,
+    get_build_manifest_file,
+    get_default_build_manifests_dir,
+)
+from barks_comic_building.build.title_scheduler import (
+    DEFAULT_MAX_CONCURRENT_TITLES,
+    TitleBuildResult,
+    build_titles,
+    describe_throughput,
+)
+from barks_comic_building.build.zipping import create_symlinks_to_comic_zip
 from barks_comic_building.cli_setup import get_comic_titles, init_logging
 
 APP_LOGGING_NAME = "bbld"
 
 
-def process_comic_book_titles(comics_database: ComicsDatabase, titles: list[str]) -> int:
+def process_comic_book_titles(
+    comics_database: ComicsDatabase,
+    titles: list[str],
+    *,
+    max_titles: int = DEFAULT_MAX_CONCURRENT_TITLES,
+    page_budget: int | None = None,
+    mode: BuildMode = DEFAULT_BUILD_MODE,
+    manifests_dir: Path | None = None,
+) -> int:
     assert len(titles) > 0
 
-    ret_code = 0
+    start = time.time()
 
-    for title in titles:
-        comic = comics_database.get_comic_book(title)
-        ret = process_comic_book(comic)
-        if ret != 0:
-            ret_code = ret_code or ret
+    results = build_titles(
+        [(title, comics_database.get_comic_book(title)) for title in titles],
+        partial(build_comic_book, mode=mode, manifests_dir=manifests_dir),
+        finish_comic_book,
+        max_titles=max_titles,
+        page_budget=page_budget,
+    )
 
-    return ret_code
+    logger.complete()
+    for line in describe_throughput(results, time.time() - start):
+        logger.info(line)
 
+    return next((r.ret_code for r in results if r.ret_code != 0), 0)
 
-def process_comic_book(comic: ComicBook) -> int:
+
+def build_comic_book(
+    comic: ComicBook,
+    *,
+    mode: BuildMode = DEFAULT_BUILD_MODE,
+    manifests_dir: Path | None = None,
+) -> TitleBuildResult:
+    """Build one comic up to its zip, in a worker. Its symlinks and summary are left.
+
+    Args:
+        comic: The comic.
+        mode: Whether to draw every page, or only those whose inputs changed.
+        manifests_dir: Where the titles' build manifests are kept. Without one every
+            build is a full one.
+
+    Returns:
+        How it went, with what `finish_comic_book` will need to finish it.
+
+    """
     process_timing = Timing()
 
+    manifest_file = None
+    if manifests_dir is not None:
+        manifest_file = get_build_manifest_file(manifests_dir, comic.get_dest_dir())
+
     # noinspection PyBroadException
     try:
         comic_book_builder = ComicBookBuilder(
             comic,
             build_source=RGB_PROFILE,
+            profile_name="rgb",
             # build_source=SVG_ADAPTIVE_PROFILE,
+            # profile_name="svg-adaptive",
+            mode=mode,
+            manifest_file=manifest_file,
         )
 
-        comic_book_builder.build()
+        comic_book_builder.build(create_symlinks=False)
 
         logger.info(
             f"Time taken to complete comic: {process_timing.get_elapsed_time_in_seconds()} seconds",
         )
 
-        write_summary_file(
-            comic,
-            comic_book_builder.get_srce_dim(),
-            comic_book_builder.get_required_dim(),
-            comic_book_builder.get_srce_and_dest_pages(),
-            comic_book_builder.get_max_dest_page_timestamp(),
-            process_timing,
+        # The time taken is fixed here, at the end of the build, rather than when the
+        # summary is written, which may be after waiting on the titles before this one.
+        seconds_taken = process_timing.get_elapsed_time_in_seconds()
+        srce_and_dest_pages = comic_book_builder.get_srce_and_dest_pages()
+        return TitleBuildResult(
+            comic.title,
+            ret_code=0,
+            num_pages=comic_book_builder.get_num_pages_drawn(),
+            bytes_written=comic_book_builder.get_bytes_written(),
+            seconds=seconds_taken,
+            finish_args=(
+                comic_book_builder.get_srce_dim(),
+                comic_book_builder.get_required_dim(),
+                srce_and_dest_pages,
+                comic_book_builder.get_max_dest_page_timestamp(),
+                str(process_timing.get_start_time()),
+                seconds_taken,
+            ),
         )
     except BuildError as exc:
         # Already reported page by page, in terms of the files that are wrong. A
         # traceback here would repeat it back in terms of this module's call stack.
         logger.error(f'Could not build "{comic.title}": {exc}')
-        return 1
     except Exception:  # noqa: BLE001
         logger.exception(f'Unexpected error building "{comic.title}":')
+
+    return TitleBuildResult(comic.title, ret_code=1)
+
+
+def finish_comic_book(comic: ComicBook, result: TitleBuildResult) -> int:
+    """Link a built comic's zip into the browse trees and write its summary, in the parent.
+
+    Returns:
+        The title's exit code.
+
+    """
+    # noinspection PyBroadException
+    try:
+        create_symlinks_to_comic_zip(comic)
+        write_summary_file(comic, *result.finish_args)
+    except Exception:  # noqa: BLE001
+        logger.exception(f'Unexpected error finishing "{comic.title}":')
         return 1
 
     return 0
@@ -75,13 +158,36 @@ app = typer.Typer()
 def main(
     volumes_str: VolumesArg = "",
     title_str: TitleArg = "",
+    max_titles: Annotated[
+        int, typer.Option(min=1, help="How many titles to build at once.")
+    ] = DEFAULT_MAX_CONCURRENT_TITLES,
+    page_workers: Annotated[
+        int | None,
+        typer.Option(
+            min=1, help="How many pages to draw at once across every title. One a core if unset."
+        ),
+    ] = None,
+    mode: Annotated[
+        BuildMode,
+        typer.Option(
+            help="Draw every page again, or only the pages whose inputs changed since they"
+            " were built."
+        ),
+    ] = DEFAULT_BUILD_MODE,
     log_level_str: LogLevelArg = "DEBUG",
 ) -> None:
     init_logging(APP_LOGGING_NAME, "build-comics.log", log_level_str)
 
     comics_database, titles = get_comic_titles(volumes_str, title_str)
 
-    exit_code = process_comic_book_titles(comics_database, titles)
+    exit_code = process_comic_book_titles(
+        comics_database,
+        titles,
+        max_titles=max_titles,
+        page_budget=page_workers,
+        mode=mode,
+        manifests_dir=get_default_build_manifests_dir(),
+    )
 
     if exit_code != 0:
         # The log sinks are enqueued, so without draining them first this summary races
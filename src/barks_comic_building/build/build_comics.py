@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import concurrent.futures
+import io
 import shutil
 from datetime import datetime
 from pathlib import Path
@@ -12,7 +13,9 @@ from barks_build_comic_images.build_comic_images import RGB_PROFILE, ComicBookIm
 from barks_build_comic_images.consts import (
     DEST_JPG_COMPRESS_LEVEL,
     DEST_JPG_QUALITY,
+    DEST_NON_IMAGE_FILES,
     MIN_HD_SRCE_HEIGHT,
+    SUMMARY_FILENAME,
 )
 from barks_build_comic_images.image_io import open_image_for_reading
 from barks_fantagraphics.comics_consts import (
@@ -33,9 +36,11 @@ from barks_fantagraphics.pages import (
     EMPTY_IMAGE_FILEPATH,
     get_max_timestamp,
     get_page_num_str,
+    get_restored_srce_dependencies,
     get_sorted_srce_and_dest_pages_with_dimensions,
 )
 from comic_utils.pil_image_utils import METADATA_PROPERTY_GROUP
+from comic_utils.sys_utils import get_hash_str
 from loguru import logger
 
 from barks_comic_building.build.additional_file_writing import (
@@ -45,7 +50,25 @@ from barks_comic_building.build.additional_file_writing import (
     write_readme_file,
     write_srce_dest_map,
 )
-from barks_comic_building.build.zipping import create_symlinks_to_comic_zip, zip_comic_book
+from barks_comic_building.build.build_manifest import (
+    DEFAULT_BUILD_MODE,
+    BuildManifest,
+    BuildMode,
+    ManifestPage,
+    get_file_identity,
+    hash_inputs,
+    load_build_manifest,
+    save_build_manifest,
+)
+from barks_comic_building.build.title_scheduler import page_slot
+from barks_comic_building.build.utils import dating_dependencies
+from barks_comic_building.build.zipping import (
+    CbzWriter,
+    create_symlinks_to_comic_zip,
+    get_cbz_members,
+    start_cbz,
+    zip_comic_book,
+)
 
 if TYPE_CHECKING:
     from barks_build_comic_images.build_comic_images import BuildSourceProfile
@@ -85,9 +108,29 @@ class ComicBookBuilder:
         self,
         comic: ComicBook,
         build_source: BuildSourceProfile | None = None,
+        *,
+        profile_name: str = "rgb",
+        mode: BuildMode = DEFAULT_BUILD_MODE,
+        manifest_file: Path | None = None,
     ) -> None:
+        """Get ready to build a comic.
+
+        Args:
+            comic: The comic.
+            build_source: Where the page images come from. RGB if not given.
+            profile_name: A name for `build_source`, recorded with each page so that
+                switching profiles draws every page again.
+            mode: Whether to draw every page, or only those whose inputs changed.
+            manifest_file: Where to record what each page was drawn from. Without one a
+                build is always a full one.
+
+        """
         self._comic = comic
         source = build_source or RGB_PROFILE
+        self._profile_name = profile_name
+        self._mode = mode if manifest_file is not None else BuildMode.FULL
+        self._manifest_file = manifest_file
+        self._manifest = BuildManifest()
         self._image_builder = ComicBookImageBuilder(
             comic,
             EMPTY_IMAGE_FILEPATH,
@@ -102,8 +145,18 @@ class ComicBookBuilder:
 
         # What went wrong, per page. Pages are built on a thread pool, so this is
         # appended to from several threads at once - list.append is atomic, and nothing
-        # reads it until the pool has drained.
+        # reads it until the pool has drained. The sizes of the pages drawn, and the
+        # manifest's pages, are written to the same way.
         self._page_errors: list[str] = []
+        self._drawn_page_sizes: list[int] = []
+
+        self._title_hash: str | None = None
+        self._num_files_removed = 0
+        self._rewrite = True
+        self._bytes_written = 0
+
+        # The cbz, written as the pages are drawn when a build is sure to need a new one.
+        self._cbz_writer: CbzWriter | None = None
 
     def get_srce_dim(self) -> ComicDimensions:
         assert self._srce_dim
@@ -121,14 +174,78 @@ class ComicBookBuilder:
         assert self._srce_and_dest_pages
         return get_max_timestamp(self._srce_and_dest_pages.dest_pages)
 
-    def build(self) -> None:
+    def get_num_pages_drawn(self) -> int:
+        return len(self._drawn_page_sizes)
+
+    def get_bytes_written(self) -> int:
+        return self._bytes_written
+
+    def build(self, *, create_symlinks: bool = True) -> None:
+        """Build the comic and zip it.
+
+        Args:
+            create_symlinks: Whether to link the zip into the series and year trees as
+                well. A title built in a worker leaves that to the parent, which does it
+                for every title in turn.
+
+        """
         self._init_pages()
 
-        self._create_comic_book()
+        if self._mode is BuildMode.INCREMENTAL:
+            assert self._manifest_file
+            self._manifest = load_build_manifest(self._manifest_file)
 
-        self._log_comic_book_params()
+        try:
+            self._create_comic_book()
+            self._log_comic_book_params()
+            if self._rewrite:
+                self._write_zip()
+        finally:
+            # Anything that stopped the build before the cbz was finished leaves the old
+            # one in place, and no half-written one beside it.
+            if self._cbz_writer is not None:
+                self._cbz_writer.abort()
+                self._cbz_writer = None
+
+        if self._rewrite:
+            self._bytes_written += self._comic.get_dest_comic_zip().stat().st_size
+        else:
+            logger.info(f'Nothing has changed in "{self._comic.title}": the zip is left as it is.')
+        self._save_manifest(self._title_hash)
+
+        if create_symlinks:
+            create_symlinks_to_comic_zip(self._comic)
+
+    def _write_zip(self) -> None:
+        # A full build empties the directory before zipping it, and the summary is
+        # written after, so it is never in the zip. It must not get in from the last
+        # build either.
+        (self._comic.get_dest_dir() / SUMMARY_FILENAME).unlink(missing_ok=True)
+
+        if self._cbz_writer is None:
+            # Nothing was drawn, but something beside the pages changed.
+            zip_comic_book(self._comic)
+            return
+
+        logger.info(
+            f'Finishing the comic zip "{get_abbrev_path(self._comic.get_dest_comic_zip())}"'
+            f" with the files beside the pages."
+        )
+        pages, other_files = get_cbz_members(self._comic.get_dest_dir())
+        if [arcname for arcname, _ in pages] != self._cbz_writer.page_arcnames:
+            # Something below the dest directory came or went while the pages were
+            # drawn. What is on disk is what the zip must hold, so it is read back.
+            logger.warning(
+                f'The pages under "{get_abbrev_path(self._comic.get_dest_dir())}" changed'
+                f" while they were drawn: zipping them from disk."
+            )
+            self._cbz_writer.abort()
+            self._cbz_writer = None
+            zip_comic_book(self._comic)
+            return
 
-        self._zip_and_symlink_comic_book()
+        self._cbz_writer.finish(other_files)
+        self._cbz_writer = None
 
     def _init_pages(self) -> None:
         logger.debug("Initializing pages...")
@@ -185,47 +302,187 @@ class ComicBookBuilder:
         logger.debug("Creating comic book...")
         self._create_dest_dirs()
         self._process_pages()
-        self._process_additional_files()
+        # Decided once, before anything beside the pages is written: the same question
+        # asked after would find the files it had just written, and skip the zip.
+        self._rewrite = self._needs_rewrite()
+        if self._rewrite:
+            self._process_additional_files()
+            self._bytes_written += sum(
+                f.stat().st_size for f in self._comic.get_dest_dir().iterdir() if f.is_file()
+            )
 
     def _process_pages(self) -> None:
         logger.debug("Processing pages...")
-        delete_all_files_in_directory(self._comic.get_dest_dir())
-        delete_all_files_in_directory(self._comic.get_dest_image_dir())
+        assert self._srce_and_dest_pages
 
-        self._page_errors = []
+        pages = self._get_pages_with_inputs_hashes()
+        self._title_hash = hash_inputs([inputs_hash for _, _, inputs_hash in pages])
 
-        assert self._srce_and_dest_pages
+        if self._mode is BuildMode.FULL:
+            delete_all_files_in_directory(self._comic.get_dest_dir())
+            delete_all_files_in_directory(self._comic.get_dest_image_dir())
+            self._manifest = BuildManifest()
+            pages_to_draw = pages
+        else:
+            self._num_files_removed = self._remove_stale_dest_files()
+            pages_to_draw = [
+                page
+                for page in pages
+                if not self._manifest.is_page_current(Path(page[1].page_filename), page[2])
+            ]
+            logger.info(
+                f"{len(pages_to_draw)} of {len(pages)} page(s) to draw:"
+                f" the rest are unchanged since they were built."
+            )
+
+        self._page_errors = []
+        self._drawn_page_sizes = []
+
+        if pages_to_draw:
+            # A page drawn means a new zip, so it is written as the pages come, rather
+            # than read back from disk once they all have. The pages left as they were,
+            # and anything else in the dest subdirectories, are added from disk, each as
+            # its turn in the zip comes.
+            self._cbz_writer = start_cbz(
+                self._comic.get_dest_dir(),
+                self._comic.get_dest_comic_zip(),
+                [self._get_arcname(dest_page) for _, dest_page, _ in pages_to_draw],
+            )
 
         if USE_CONCURRENT_PROCESSES:
             # max_workers = min(32, (os.cpu_count() or 1) + 4)
             max_workers = None
             # with concurrent.futures.ProcessPoolExecutor() as executor:
             with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
-                for srce_page, dest_page in zip(
-                    self._srce_and_dest_pages.srce_pages,
-                    self._srce_and_dest_pages.dest_pages,
-                    strict=True,
-                ):
-                    executor.submit(self._process_page, srce_page, dest_page)
+                for srce_page, dest_page, inputs_hash in pages_to_draw:
+                    executor.submit(self._process_page, srce_page, dest_page, inputs_hash)
         else:
-            for srce_page, dest_page in zip(
-                self._srce_and_dest_pages.srce_pages,
-                self._srce_and_dest_pages.dest_pages,
-                strict=True,
-            ):
-                self._process_page(srce_page, dest_page)
+            for srce_page, dest_page, inputs_hash in pages_to_draw:
+                self._process_page(srce_page, dest_page, inputs_hash)
+
+        self._bytes_written += sum(self._drawn_page_sizes)
 
         if self._page_errors:
-            assert self._srce_and_dest_pages
+            # The pages that were drawn are recorded, so the next build starts from the
+            # ones that failed. With no title hash, it writes the zip again whatever.
+            self._save_manifest(title_hash=None)
             num_pages = len(self._srce_and_dest_pages.dest_pages)
             failures = "\n  ".join(sorted(self._page_errors))
             msg = f"{len(self._page_errors)} of {num_pages} pages failed:\n  {failures}"
             raise BuildError(msg)
 
+    def _get_arcname(self, dest_page: CleanPage) -> str:
+        dest_file = Path(dest_page.page_filename)
+        return dest_file.relative_to(self._comic.get_dest_dir()).as_posix()
+
+    def _get_pages_with_inputs_hashes(self) -> list[tuple[CleanPage, CleanPage, str]]:
+        """Return each page, with the hash of everything it would be drawn from now.
+
+        What dates the page's source is left to `dating_dependencies`, the same oracle
+        the integrity check uses: the restore chain behind the source, and a hand-drawn
+        panel bounds fix or intro inset, but not the ini's timestamp. The ini goes in
+        by its hash instead, which changes only when its content does.
+        """
+        assert self._srce_and_dest_pages
+        assert self._required_dim
+
+        ini_hash = get_hash_str(self._comic.ini_file)
+        required_dim = [
+            self._required_dim.panels_bbox_width,
+            self._required_dim.panels_bbox_height,
+            self._required_dim.page_num_y_bottom,
+        ]
+
+        pages = []
+        for srce_page, dest_page in zip(
+            self._srce_and_dest_pages.srce_pages,
+            self._srce_and_dest_pages.dest_pages,
+            strict=True,
+        ):
+            dependencies = dating_dependencies(
+                get_restored_srce_dependencies(self._comic, srce_page), self._comic.ini_file
+            )
+            inputs = {
+                "profile": self._profile_name,
+                "ini_hash": ini_hash,
+                "required_dim": required_dim,
+                "srce_file": get_file_identity(Path(srce_page.page_filename)),
+                "dependencies": [[str(d.file), d.timestamp] for d in dependencies],
+                "srce_page": self._describe_page(srce_page),
+                "dest_page": self._describe_page(dest_page),
+            }
+            pages.append((srce_page, dest_page, hash_inputs(inputs)))
+
+        return pages
+
+    @staticmethod
+    def _describe_page(page: CleanPage) -> list[str | int]:
+        bbox = page.panels_bbox
+        return [
+            page.page_filename,
+            page.page_num,
+            page.page_type.name,
+            bbox.x_min,
+            bbox.y_min,
+            bbox.x_max,
+            bbox.y_max,
+        ]
+
+    def _remove_stale_dest_files(self) -> int:
+        """Remove what a full build would not have left, returning how many files went.
+
+        That is any image that is not one of the comic's dest pages now - a page taken
+        out of the ini, or renumbered - and any file beside the images that the build
+        does not write.
+        """
+        assert self._srce_and_dest_pages
+
+        dest_dir = self._comic.get_dest_dir()
+        image_dir = self._comic.get_dest_image_dir()
+        wanted = {Path(page.page_filename).name for page in self._srce_and_dest_pages.dest_pages}
+        wanted_beside = {image_dir.name, self._comic.ini_file.name, *DEST_NON_IMAGE_FILES}
+
+        stale = [f for f in image_dir.iterdir() if f.is_file() and f.name not in wanted]
+        stale += [f for f in dest_dir.iterdir() if f.is_file() and f.name not in wanted_beside]
+        for file in stale:
+            logger.info(f'Removing the stale dest file "{get_abbrev_path(file)}".')
+            file.unlink()
+
+        return len(stale)
+
+    def _needs_rewrite(self) -> bool:
+        """Return whether the files beside the pages, and the zip, must be written again."""
+        if self._mode is BuildMode.FULL:
+            return True
+
+        dest_dir = self._comic.get_dest_dir()
+        beside = [self._comic.ini_file.name, *DEST_NON_IMAGE_FILES]
+
+        return (
+            self._title_hash != self._manifest.title_hash
+            or bool(self._drawn_page_sizes)
+            or self._num_files_removed > 0
+            or not self._comic.get_dest_comic_zip().is_file()
+            or not all((dest_dir / name).is_file() for name in beside if name != SUMMARY_FILENAME)
+        )
+
+    def _save_manifest(self, title_hash: str | None) -> None:
+        if self._manifest_file is None:
+            return
+
+        assert self._srce_and_dest_pages
+        wanted = {Path(page.page_filename).name for page in self._srce_and_dest_pages.dest_pages}
+        self._manifest.pages = {
+            name: page for name, page in self._manifest.pages.items() if name in wanted
+        }
+        self._manifest.title_hash = title_hash
+        save_build_manifest(self._manifest_file, self._manifest)
+
     def _process_page(
         self,
         srce_page: CleanPage,
         dest_page: CleanPage,
+        inputs_hash: str,
     ) -> None:
         def check_srce_page_image_min_height() -> None:
             if srce_page_image.height < MIN_HD_SRCE_HEIGHT:
@@ -236,56 +493,79 @@ class ComicBookBuilder:
                 )
                 raise ValueError(msg)
 
-        # noinspection PyBroadException
-        try:
-            srce_page_image = open_image_for_reading(Path(srce_page.page_filename))
-            if srce_page.page_type == PageType.BODY:
-                check_srce_page_image_min_height()
+        # A slot is held for the whole page, from opening the source to saving the
+        # result, as that is how long its images are in memory. When several titles are
+        # built at once it is these slots, shared between them, that bound the pages.
+        with page_slot():
+            # noinspection PyBroadException
+            try:
+                srce_page_image = open_image_for_reading(Path(srce_page.page_filename))
+                if srce_page.page_type == PageType.BODY:
+                    check_srce_page_image_min_height()
+
+                logger.info(
+                    f'Convert "{get_abbrev_path(srce_page.page_filename)}"'
+                    f" (page-type {srce_page.page_type.name})"
+                    f' to "{get_abbrev_path(dest_page.page_filename)}"'
+                    f" (page {get_page_num_str(dest_page):>2}.",
+                )
 
-            logger.info(
-                f'Convert "{get_abbrev_path(srce_page.page_filename)}"'
-                f" (page-type {srce_page.page_type.name})"
-                f' to "{get_abbrev_path(dest_page.page_filename)}"'
-                f" (page {get_page_num_str(dest_page):>2}.",
-            )
+                logger.info(
+                    f'Creating dest image "{get_abbrev_path(dest_page.page_filename)}"'
+                    f' from srce file "{get_abbrev_path(srce_page.page_filename)}".',
+                )
+                dest_page_image = self._image_builder.get_dest_page_image(
+                    srce_page_image,
+                    srce_page,
+                    dest_page,
+                )
 
-            logger.info(
-                f'Creating dest image "{get_abbrev_path(dest_page.page_filename)}"'
-                f' from srce file "{get_abbrev_path(srce_page.page_filename)}".',
-            )
-            dest_page_image = self._image_builder.get_dest_page_image(
-                srce_page_image,
-                srce_page,
-                dest_page,
-            )
+                dest_data = self._save_dest_image(dest_page, dest_page_image, srce_page)
+                logger.info(f'Saved changes to image "{get_abbrev_path(dest_page.page_filename)}".')
+
+                dest_identity = get_file_identity(Path(dest_page.page_filename))
+                assert dest_identity is not None
+                self._manifest.pages[Path(dest_page.page_filename).name] = ManifestPage(
+                    inputs_hash, dest_identity
+                )
+                self._drawn_page_sizes.append(dest_identity[0])
 
-            self._save_dest_image(dest_page, dest_page_image, srce_page)
-            logger.info(f'Saved changes to image "{get_abbrev_path(dest_page.page_filename)}".')
+                if self._cbz_writer is not None:
+                    self._cbz_writer.add_page(
+                        self._get_arcname(dest_page), dest_data, mtime=dest_identity[1] / 1e9
+                    )
 
-            logger.info("")
-        except Exception as exc:  # noqa: BLE001
-            page = get_abbrev_path(dest_page.page_filename)
-            reason = str(exc) or exc.__class__.__name__
-            self._page_errors.append(f'"{page}": {reason}')
+                logger.info("")
+            except Exception as exc:  # noqa: BLE001
+                page = get_abbrev_path(dest_page.page_filename)
+                reason = str(exc) or exc.__class__.__name__
+                self._page_errors.append(f'"{page}": {reason}')
 
-            if isinstance(exc, _EXPECTED_PAGE_ERRORS):
-                logger.error(f'Could not build page "{page}": {reason}')
-            else:
-                logger.exception(f'Unexpected error building page "{page}":')
+                if isinstance(exc, _EXPECTED_PAGE_ERRORS):
+                    logger.error(f'Could not build page "{page}": {reason}')
+                else:
+                    logger.exception(f'Unexpected error building page "{page}":')
 
     def _save_dest_image(
         self,
         dest_page: CleanPage,
         dest_page_image: PilImage,
         srce_page: CleanPage,
-    ) -> None:
+    ) -> bytes:
+        # Encoded once, to go both to disk and into the zip.
+        buffer = io.BytesIO()
         dest_page_image.save(
-            dest_page.page_filename,
+            buffer,
+            format="JPEG",
             optimize=True,
             compress_level=DEST_JPG_COMPRESS_LEVEL,
             quality=DEST_JPG_QUALITY,
             comment="\n".join(self._get_dest_jpg_comments(srce_page, dest_page)),
         )
+        data = buffer.getvalue()
+        Path(dest_page.page_filename).write_bytes(data)
+
+        return data
 
     @staticmethod
     def _get_dest_jpg_comments(srce_page: CleanPage, dest_page: CleanPage) -> list[str]:
@@ -339,10 +619,6 @@ class ComicBookBuilder:
             msg = f'Could not make directory "{self._comic.get_dest_image_dir()}".'
             raise RuntimeError(msg)
 
-    def _zip_and_symlink_comic_book(self) -> None:
-        zip_comic_book(self._comic)
-        create_symlinks_to_comic_zip(self._comic)
-
     def _log_comic_book_params(self) -> None:
         logger.info("")
 
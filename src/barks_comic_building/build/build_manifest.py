@@ -0,0 +1,199 @@
+"""What each built page was made from, so that a rebuild redraws only what changed.
+
+A build used to empty the comic's directory and draw every page again, even when the one
+thing that had changed was a single fixes page. Each title now keeps a manifest: for
+every dest page, a hash of everything the page was drawn from, and the size and mtime
+of the jpg that came out. A page whose inputs hash the same, and whose jpg is still the
+one recorded, is left alone.
+
+The inputs are what `ComicBookBuilder` draws a page from - the source file, the chain of
+files that source was restored from, the page's panel box and the title's required
+dimensions, the build profile and the ini - and it is the builder that gathers them. This
+module only records and compares them. A manifest that is missing, unreadable or from an
+older version of this module is an empty one, and an empty manifest rebuilds everything,
+so no failure here can leave a page stale.
+
+The manifests live at the library root, one a title, rather than in the comic's own
+directory: everything in that directory goes into the cbz.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from enum import StrEnum
+from pathlib import Path
+from typing import Any
+
+from barks_comic_building.build import inputs_common
+
+__all__ = [
+    "BUILD_MANIFESTS_DIRNAME",
+    "DEFAULT_BUILD_MODE",
+    "BuildManifest",
+    "BuildMode",
+    "ManifestPage",
+    "get_build_manifest_file",
+    "get_default_build_manifests_dir",
+    "get_file_identity",
+    "hash_inputs",
+    "load_build_manifest",
+    "save_build_manifest",
+]
+
+BUILD_MANIFESTS_DIRNAME = "build-manifests"
+
+# Part of every hash, so that a change to what is recorded, or to how a page is drawn
+# that the inputs would not show, rebuilds every page once.
+BUILD_MANIFEST_VERSION = 1
+
+
+class BuildMode(StrEnum):
+    """How much of a comic a build draws again."""
+
+    FULL = "full"
+    """Every page, from an emptied directory, as the build always has."""
+
+    INCREMENTAL = "incremental"
+    """Only the pages whose inputs changed, and the zip only if anything did."""
+
+
+DEFAULT_BUILD_MODE = BuildMode.INCREMENTAL
+
+
+@dataclass(frozen=True, slots=True)
+class ManifestPage:
+    """One built page: the hash of its inputs, and the jpg that was made from them."""
+
+    inputs_hash: str
+    dest_identity: list[int]
+
+
+@dataclass(slots=True)
+class BuildManifest:
+    """A title's manifest.
+
+    `title_hash` is the hash of every page's inputs together, recorded only once the
+    zip has been written from them. None means the zip and the files alongside the pages
+    are to be written again, whatever the pages say.
+    """
+
+    title_hash: str | None = None
+    pages: dict[str, ManifestPage] = field(default_factory=dict)
+
+    def is_page_current(self, dest_file: Path, inputs_hash: str) -> bool:
+        """Return whether a page was built from these inputs and is still as built.
+
+        Args:
+            dest_file: The dest page.
+            inputs_hash: The hash of what the page would be drawn from now.
+
+        Returns:
+            True if the page can be left as it is.
+
+        """
+        page = self.pages.get(dest_file.name)
+        if page is None or page.inputs_hash != inputs_hash:
+            return False
+
+        return get_file_identity(dest_file) == page.dest_identity
+
+
+def get_default_build_manifests_dir() -> Path:
+    """Return where the titles' build manifests are kept unless told otherwise.
+
+    Beside the ledgers and the other caches, out of the trees the integrity checks walk.
+
+    Returns:
+        The default manifests directory.
+
+    """
+    from barks_fantagraphics.comics_consts import BARKS_ROOT_DIR  # noqa: PLC0415
+
+    return Path(BARKS_ROOT_DIR) / BUILD_MANIFESTS_DIRNAME
+
+
+def get_build_manifest_file(manifests_dir: Path, dest_dir: Path) -> Path:
+    """Return a title's manifest file, named for the comic's dest directory.
+
+    Args:
+        manifests_dir: Where the manifests are kept.
+        dest_dir: The comic's dest directory.
+
+    Returns:
+        The manifest file.
+
+    """
+    return manifests_dir / f"{dest_dir.name}.json"
+
+
+def get_file_identity(file: Path) -> list[int] | None:
+    """Return what tells one version of a file from another without reading it.
+
+    As `inputs_common.get_file_identity` takes it, from the file as it is on disk now.
+
+    Args:
+        file: The file.
+
+    Returns:
+        The identity, or None if the file is not there.
+
+    """
+    return inputs_common.get_file_identity(file)
+
+
+def hash_inputs(inputs: Any) -> str:  # noqa: ANN401
+    """Return a hash of a page's or a title's inputs, as gathered by the builder.
+
+    Args:
+        inputs: Anything json can write. Dict key order does not matter.
+
+    Returns:
+        The hash, as hex.
+
+    """
+    return inputs_common.hash_versioned_inputs(BUILD_MANIFEST_VERSION, inputs)
+
+
+def load_build_manifest(manifest_file: Path) -> BuildManifest:
+    """Return a title's manifest, or an empty one if there is none to trust.
+
+    Args:
+        manifest_file: The manifest file.
+
+    Returns:
+        The manifest.
+
+    """
+    return inputs_common.load_versioned_json(
+        manifest_file, BUILD_MANIFEST_VERSION, _parse_manifest, BuildManifest(), "build manifest"
+    )
+
+
+def _parse_manifest(data: dict[str, Any]) -> BuildManifest:
+    pages = {
+        name: ManifestPage(page["inputs_hash"], page["dest_identity"])
+        for name, page in data["pages"].items()
+    }
+
+    return BuildManifest(data["title_hash"], pages)
+
+
+def save_build_manifest(manifest_file: Path, manifest: BuildManifest) -> None:
+    """Write a title's manifest, all at once.
+
+    Args:
+        manifest_file: The manifest file.
+        manifest: The manifest.
+
+    """
+    inputs_common.save_versioned_json(
+        manifest_file,
+        BUILD_MANIFEST_VERSION,
+        {
+            "title_hash": manifest.title_hash,
+            "pages": {
+                name: {"inputs_hash": page.inputs_hash, "dest_identity": page.dest_identity}
+                for name, page in sorted(manifest.pages.items())
+            },
+        },
+    )
@@ -4,7 +4,10 @@ import typer
 from barks_fantagraphics.comics_database import ComicsDatabase
 from comic_utils.common_typer_options import LogLevelArg, TitleArg, VolumesArg
 
-from barks_comic_building.build.comics_integrity import ComicsIntegrityChecker
+from barks_comic_building.build.comics_integrity import (
+    INTEGRITY_SNAPSHOT_FILE,
+    ComicsIntegrityChecker,
+)
 from barks_comic_building.cli_setup import get_comic_titles, init_logging
 
 APP_LOGGING_NAME = "cbld"
@@ -23,6 +26,8 @@ def main(  # noqa: PLR0913
     censorship_only: bool = False,
     fix_names: bool = False,
     apply: bool = False,
+    profile: bool = False,
+    full: bool = False,
 ) -> None:
     init_logging(APP_LOGGING_NAME, "check-build-comics-integrity.log", log_level_str)
 
@@ -78,6 +83,8 @@ def main(  # noqa: PLR0913
         no_check_for_unexpected_files,
         no_check_symlinks,
         no_check_censorship_csv,
+        profile=profile,
+        snapshot_file=None if full else INTEGRITY_SNAPSHOT_FILE,
     )
     exit_code = integrity_checker.check_comics_integrity(
         titles, fix_names=fix_names, apply_fixes=apply
@@ -5,10 +5,11 @@
 import json
 import stat
 from collections import Counter
-from collections.abc import Iterable, Iterator, Mapping, Sequence
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
 from dataclasses import dataclass
 from enum import StrEnum
 from pathlib import Path
+from typing import Any
 
 from barks_build_comic_images.consts import DEST_NON_IMAGE_FILES
 from barks_fantagraphics.barks_titles import ENUM_TO_STR_TITLE, Titles
@@ -45,7 +46,6 @@ from barks_fantagraphics.comics_database import ComicsDatabase, TitleNotFoundErr
 from barks_fantagraphics.comics_utils import (
     get_relpath,
     get_safe_title,
-    get_timestamp,
     get_timestamp_as_str,
 )
 from barks_fantagraphics.fanta_comics_info import (
@@ -66,13 +66,27 @@ from comic_utils.comic_consts import JPG_FILE_EXT, JSON_FILE_EXT, SVG_FILE_EXT
 from comic_utils.sys_utils import get_hash_str
 from loguru import logger
 
+from barks_comic_building.build import fs_index
 from barks_comic_building.build.artifact_renaming import run_artifact_rename_fix
+from barks_comic_building.build.build_manifest import BUILD_MANIFESTS_DIRNAME
+from barks_comic_building.build.fs_index import FsIndex, describe_profile, use_fs_index
+from barks_comic_building.build.integrity_snapshot import (
+    INTEGRITY_SNAPSHOT_FILENAME,
+    IntegritySnapshot,
+    get_code_version,
+    get_file_identity,
+    get_page_file_identities,
+    hash_check_inputs,
+    load_integrity_snapshot,
+    save_integrity_snapshot,
+)
 from barks_comic_building.build.stage_covers import (
     get_staged_links_by_title as get_cover_staged_links,
 )
 from barks_comic_building.build.stage_one_pagers import (
     get_staged_links_by_title as get_one_pager_staged_links,
 )
+from barks_comic_building.build.tree_manifest import FILE_DIGEST_CACHE_FILENAME
 from barks_comic_building.build.utils import (
     TIMESTAMP_SEPS,
     MaxTimestamp,
@@ -88,14 +102,33 @@ from barks_comic_building.build.utils import (
     quiet_panel_bbox_height_warnings,
     walk_srce_dependency_chain,
 )
+from barks_comic_building.restore.ledger_common import INDEX_SUFFIX as LEDGER_INDEX_SUFFIX
+from barks_comic_building.restore.page_state import PAGE_STATE_CACHE_FILENAME
+from barks_comic_building.restore.panel_bounds_inputs import PANEL_BOUNDS_INPUTS_FILENAME
 from barks_comic_building.restore.restore_ledger import LEDGER_FILENAME as RESTORE_LEDGER_FILENAME
 from barks_comic_building.restore.upscale_ledger import LEDGER_FILENAME as UPSCALE_LEDGER_FILENAME
+from barks_comic_building.restore.verified_image_cache import VERIFIED_IMAGE_CACHE_FILENAME
 
 ERROR_MSG_PREFIX = "ERROR: "
 BLANK_ERR_MSG_PREFIX = f"{' ':<{len(ERROR_MSG_PREFIX)}}"
 
 RESTORE_LEDGER_FILE = BARKS_ROOT_DIR / RESTORE_LEDGER_FILENAME
 UPSCALE_LEDGER_FILE = BARKS_ROOT_DIR / UPSCALE_LEDGER_FILENAME
+INTEGRITY_SNAPSHOT_FILE = BARKS_ROOT_DIR / INTEGRITY_SNAPSHOT_FILENAME
+
+# The caches the restore, build and check commands keep beside the ledgers. Expected at
+# the root like the ledgers themselves, though any of them may be absent: each is rebuilt
+# when it is missing.
+ROOT_CACHE_FILES = (
+    BARKS_ROOT_DIR / (RESTORE_LEDGER_FILENAME + LEDGER_INDEX_SUFFIX),
+    BARKS_ROOT_DIR / (UPSCALE_LEDGER_FILENAME + LEDGER_INDEX_SUFFIX),
+    BARKS_ROOT_DIR / PAGE_STATE_CACHE_FILENAME,
+    BARKS_ROOT_DIR / VERIFIED_IMAGE_CACHE_FILENAME,
+    BARKS_ROOT_DIR / FILE_DIGEST_CACHE_FILENAME,
+    BARKS_ROOT_DIR / PANEL_BOUNDS_INPUTS_FILENAME,
+    BARKS_ROOT_DIR / BUILD_MANIFESTS_DIRNAME,
+    INTEGRITY_SNAPSHOT_FILE,
+)
 
 # Ceiling for *ordinary* added fixes pages - real pages appended past the end of a
 # volume (e.g. volume 1's 251-268). The synthetic collections' staged pages are not
@@ -114,6 +147,17 @@ STORIES_WITH_NON_BARKS_SCRIPTS_THAT_ARE_OK = {
 TITLES_WITHOUT_INSETS = frozenset(NON_COMIC_TITLES) | frozenset(SYNTHETIC_TITLES)
 
 
+# The modules whose code decides a title's verdict. Their source is the code version in
+# every title's snapshot hash, so a change to any of them checks every title again.
+_VERDICT_MODULES = (
+    __name__,
+    "barks_comic_building.build.utils",
+    "barks_fantagraphics.comic_book",
+    "barks_fantagraphics.comic_book_info",
+    "barks_fantagraphics.pages",
+)
+
+
 def _as_str(timestamp: float) -> str:
     """Render a timestamp for a finding, in the one format every finding uses."""
     return get_timestamp_as_str(timestamp, *TIMESTAMP_SEPS)
@@ -500,8 +544,8 @@ def iter_fix_images(images_dir: Path, spec: FixesTreeSpec) -> Iterator[tuple[str
         Each image's page num and path, in name order.
 
     """
-    for file in sorted(images_dir.iterdir()):
-        if file.is_dir() or _is_fixes_note(file) or file.suffix not in spec.allowed_exts:
+    for file in sorted(fs_index.iterdir(images_dir)):
+        if fs_index.is_dir(file) or _is_fixes_note(file) or file.suffix not in spec.allowed_exts:
             continue
         yield file.stem, file
 
@@ -786,12 +830,12 @@ def unexpected_entries(dir_path: Path, allowed: Iterable[Path]) -> list[Path] |
         callers report differently, one as a finding of its own.
 
     """
-    if not dir_path.is_dir():
+    if not fs_index.is_dir(dir_path):
         return None
 
     allowed_paths = set(allowed)
 
-    return sorted(entry for entry in dir_path.iterdir() if entry not in allowed_paths)
+    return sorted(entry for entry in fs_index.iterdir(dir_path) if entry not in allowed_paths)
 
 
 def has_restored_file_in_chain(
@@ -841,15 +885,15 @@ def panel_segments_are_stale(segments_file: Path, bounds_file: Path | None) -> b
         True if the segments predate the override.
 
     """
-    if bounds_file is None or not bounds_file.is_file():
+    if bounds_file is None or not fs_index.is_file(bounds_file):
         return False
 
     # A segments file that is not there at all is already the chain's missing-stage
     # finding; saying it a second way would only pad the report.
-    if not segments_file.is_file():
+    if not fs_index.is_file(segments_file):
         return False
 
-    return get_timestamp(segments_file) < get_timestamp(bounds_file)
+    return fs_index.get_timestamp(segments_file) < fs_index.get_timestamp(bounds_file)
 
 
 def _has_staged_original_scan(links: list[tuple[Path, Path]]) -> bool:
@@ -858,7 +902,7 @@ def _has_staged_original_scan(links: list[tuple[Path, Path]]) -> bool:
     Without the original scan the collection has no image for the member at all. Which
     of the *other* artifacts are required is decided by `unstaged_artifacts`.
     """
-    return any(link.exists() for link, _ in links if link.suffix == JPG_FILE_EXT)
+    return any(fs_index.exists(link) for link, _ in links if link.suffix == JPG_FILE_EXT)
 
 
 def unstaged_artifacts(links: list[tuple[Path, Path]]) -> list[tuple[Path, Path]]:
@@ -886,7 +930,11 @@ def unstaged_artifacts(links: list[tuple[Path, Path]]) -> list[tuple[Path, Path]
     return [
         (link, source)
         for link, source in links
-        if source.is_file() and not link.exists() and not link.is_symlink()
+        if (
+            fs_index.is_file(source)
+            and not fs_index.exists(link)
+            and not fs_index.is_symlink(link)
+        )
     ]
 
 
@@ -915,7 +963,7 @@ def check_collection_staged_links(
         title_str = ENUM_TO_STR_TITLE[title]
 
         for link, source in links:
-            if link.is_symlink() and not link.exists():
+            if fs_index.is_symlink(link) and not fs_index.exists(link):
                 print(
                     f"{ERROR_MSG_PREFIX}Staged link for"
                     f' "{title_str}" is dangling: "{get_relpath(link)}"'
@@ -923,7 +971,7 @@ def check_collection_staged_links(
                     f"{BLANK_ERR_MSG_PREFIX}{restage_msg}.",
                 )
                 ret_code = 1
-            elif link.is_symlink() and link.resolve() != source.resolve():
+            elif fs_index.is_symlink(link) and not fs_index.same_file(link, source):
                 # The page's own files are fine; it is the mapping that is wrong.
                 print(
                     f"{ERROR_MSG_PREFIX}Staged link for"
@@ -937,7 +985,11 @@ def check_collection_staged_links(
                     f" {restage_msg}.",
                 )
                 ret_code = 1
-            elif link.exists() and not link.is_symlink() and source.is_file():
+            elif (
+                fs_index.exists(link)
+                and not fs_index.is_symlink(link)
+                and fs_index.is_file(source)
+            ):
                 # A real file with no upstream source is normal - the pipeline fills a
                 # missing stage in place. One that *does* have an upstream source has
                 # diverged from it and will not pick up a re-restore.
@@ -1085,21 +1137,77 @@ class ComicsIntegrityChecker:
         no_check_for_unexpected_files: bool,
         no_check_symlinks: bool,
         no_check_censorship_csv: bool = False,
+        *,
+        profile: bool = False,
+        snapshot_file: Path | None = None,
     ) -> None:
         self.comics_database = comics_db
 
         self._check_for_unexpected_files = not no_check_for_unexpected_files
         self._check_symlinks = not no_check_symlinks
         self.check_censorship_fixes = not no_check_censorship_csv
+        self._profile = profile
+
+        # The titles that last passed. Without a snapshot file every title is checked.
+        self._snapshot_file = snapshot_file
+        self._snapshot: IntegritySnapshot | None = None
+        self._num_titles_seen = 0
+
+        # Empty until a full check scans the trees, so that a check called on its own
+        # goes to the disk.
+        self._fs_index = FsIndex()
+        # What the snapshot hashes, gathered once: each volume's artifacts, by page,
+        # as the scan found them, and the code version.
+        self._page_files: dict[int, dict[str, list[list[Any]]]] = {}
+        self._code_version: str | None = None
 
     def check_comics_integrity(
         self, titles: list[str], *, fix_names: bool = False, apply_fixes: bool = False
     ) -> int:
-        with quiet_panel_bbox_height_warnings():
-            return self._check_comics_integrity(
+        self._fs_index = self._get_fs_index()
+        logger.info("Scanning the library's trees.")
+        self._fs_index.scan()
+
+        if self._snapshot_file is not None:
+            self._snapshot = load_integrity_snapshot(self._snapshot_file)
+
+        with quiet_panel_bbox_height_warnings(), use_fs_index(self._fs_index):
+            ret_code = self._check_comics_integrity(
                 titles, fix_names=fix_names, apply_fixes=apply_fixes
             )
 
+        if self._snapshot_file is not None and self._snapshot is not None:
+            save_integrity_snapshot(self._snapshot_file, self._snapshot)
+
+        if self._profile:
+            for line in describe_profile(self._fs_index):
+                logger.info(line)
+
+        return ret_code
+
+    def _get_fs_index(self) -> FsIndex:
+        """Return an index of every tree the checks sweep, not yet scanned.
+
+        The artifact trees and the comics tree, all the way down, and the library root
+        itself, whose other directories are only ever looked at from above.
+        """
+        database = self.comics_database
+        roots = [
+            database.get_fantagraphics_original_root_dir(),
+            database.get_fantagraphics_upscayled_root_dir(),
+            database.get_fantagraphics_restored_root_dir(),
+            database.get_fantagraphics_restored_upscayled_root_dir(),
+            database.get_fantagraphics_restored_svg_root_dir(),
+            database.get_fantagraphics_restored_ocr_root_dir(),
+            database.get_fantagraphics_fixes_root_dir(),
+            database.get_fantagraphics_upscayled_fixes_root_dir(),
+            database.get_fantagraphics_fixes_scraps_root_dir(),
+            database.get_fantagraphics_panel_segments_root_dir(),
+            THE_COMICS_DIR,
+        ]
+
+        return FsIndex(roots, shallow_roots=[BARKS_ROOT_DIR])
+
     def _check_comics_integrity(
         self, titles: list[str], *, fix_names: bool, apply_fixes: bool
     ) -> int:
@@ -1119,17 +1227,28 @@ class ComicsIntegrityChecker:
                 # A dry run deliberately changed nothing, so there is no point
                 # reporting on a tree we already know is stale.
                 return 1
+            # The renames moved what the scan found.
+            self._fs_index.scan()
+            self._page_files.clear()
 
-        unexpected_files = self.check_no_unexpected_files() != 0
+        with self._fs_index.section("check_no_unexpected_files"):
+            unexpected_files = self.check_no_unexpected_files() != 0
 
-        if not titles:
-            ret_code = self.check_all_titles()
-        else:
-            ret_code = 0
-            for title in titles:
-                ret = self.check_single_title(title)
-                if ret != 0:
-                    ret_code = ret
+        with self._fs_index.section("check_titles"):
+            if not titles:
+                ret_code = self.check_all_titles()
+            else:
+                ret_code = 0
+                for title in titles:
+                    ret = self._check_title_unless_unchanged(title)
+                    if ret != 0:
+                        ret_code = ret
+
+        if self._snapshot is not None:
+            logger.info(
+                f"Skipped {self._snapshot.num_skipped} of {self._num_titles_seen} title(s),"
+                f" unchanged since they last passed. Use --full to check them anyway."
+            )
 
         if ret_code == 0:
             if unexpected_files:
@@ -1158,20 +1277,16 @@ class ComicsIntegrityChecker:
             0 if every precondition holds, 1 otherwise.
 
         """
-        if self.check_comics_source_is_readonly() != 0:
-            return 1
-
-        if self.check_directory_structure() != 0:
-            return 1
-
-        if self.check_ini_files_match_series_info() != 0:
-            return 1
-
-        if self.check_staged_collection_links() != 0:
-            return 1
-
-        if self.check_fantagraphics_files() != 0:
-            return 1
+        for check in (
+            self.check_comics_source_is_readonly,
+            self.check_directory_structure,
+            self.check_ini_files_match_series_info,
+            self.check_staged_collection_links,
+            self.check_fantagraphics_files,
+        ):
+            with self._fs_index.section(check.__name__):
+                if check() != 0:
+                    return 1
 
         return 0
 
@@ -1241,7 +1356,7 @@ class ComicsIntegrityChecker:
 
         num_pages = self.comics_database.get_num_pages_in_fantagraphics_volume(volume)
         faults = check_contiguous_page_numbers(
-            [file.stem for file in sorted(fanta_original_image_dir.iterdir())]
+            [file.stem for file in sorted(fs_index.iterdir(fanta_original_image_dir))]
         )
 
         ret_code = 0
@@ -1437,7 +1552,7 @@ class ComicsIntegrityChecker:
         edited_pages: dict[str, Path] = {}
         for spec in (STANDARD_FIXES, UPSCAYLED_FIXES):
             _root_dir, images_dir, _other_tree_dir = self._fixes_tree_dirs(volume, spec)
-            if not images_dir.is_dir():
+            if not fs_index.is_dir(images_dir):
                 # Already reported by `check_basic_fixes`; nothing to add here.
                 continue
             # An edit replaces a scan; a page with no scan behind it was added to the
@@ -1446,7 +1561,7 @@ class ComicsIntegrityChecker:
                 {
                     page_num: file
                     for page_num, file in iter_fix_images(images_dir, spec)
-                    if (original_image_dir / (page_num + JPG_FILE_EXT)).is_file()
+                    if fs_index.is_file(original_image_dir / (page_num + JPG_FILE_EXT))
                 }
             )
 
@@ -1517,8 +1632,8 @@ class ComicsIntegrityChecker:
         )
 
         ret_code = 0
-        for file in sorted(images_dir.iterdir()):
-            if file.is_dir() and is_expected_subdir(file.name, spec):
+        for file in sorted(fs_index.iterdir(images_dir)):
+            if fs_index.is_dir(file) and is_expected_subdir(file.name, spec):
                 continue
 
             is_note = _is_fixes_note(file)
@@ -1536,11 +1651,11 @@ class ComicsIntegrityChecker:
             facts = FixesFileFacts(
                 is_note=is_note,
                 note_pair_present=any(
-                    (images_dir / (stem + ext)).is_file() for ext in spec.allowed_exts
+                    fs_index.is_file(images_dir / (stem + ext)) for ext in spec.allowed_exts
                 ),
-                original_exists=original_file.is_file(),
+                original_exists=fs_index.is_file(original_file),
                 present_in_other_tree=any(
-                    (other_tree_dir / (stem + ext)).is_file()
+                    fs_index.is_file(other_tree_dir / (stem + ext))
                     for ext in (JPG_FILE_EXT, PNG_FILE_EXT)
                 ),
                 added_page_allowed=added_page_allowed,
@@ -1578,7 +1693,7 @@ class ComicsIntegrityChecker:
             print(f'{ERROR_MSG_PREFIX}Directory "{root_dir}" has too many files.')
             return 1
 
-        if not images_dir.is_dir():
+        if not fs_index.is_dir(images_dir):
             print(
                 f'{ERROR_MSG_PREFIX}Could not find {spec.tree_label} directory: "{images_dir}".',
             )
@@ -1611,21 +1726,21 @@ class ComicsIntegrityChecker:
 
     @staticmethod
     def _get_num_files_in_dir(dir_path: Path) -> int:
-        return len(list(dir_path.iterdir()))
+        return len(fs_index.iterdir(dir_path))
 
     def check_folder_and_contents_are_readonly(self, dir_path: Path) -> int:
         ret_code = 0
 
-        for file_path in sorted(dir_path.iterdir()):
-            if file_path.is_dir():
-                if file_path.stat().st_mode & stat.S_IWRITE:
+        for file_path in sorted(fs_index.iterdir(dir_path)):
+            if fs_index.is_dir(file_path):
+                if fs_index.stat(file_path).st_mode & stat.S_IWRITE:
                     print(f'{ERROR_MSG_PREFIX}Directory "{file_path}" is not readonly.')
                     ret_code = 1
                 if self.check_folder_and_contents_are_readonly(file_path) != 0:
                     ret_code = 1
                     continue
 
-            if file_path.stat().st_mode & stat.S_IWRITE:
+            if fs_index.stat(file_path).st_mode & stat.S_IWRITE:
                 print(f'{ERROR_MSG_PREFIX}File "{file_path}" is not readonly.')
                 ret_code = 1
 
@@ -1681,7 +1796,7 @@ class ComicsIntegrityChecker:
 
     @staticmethod
     def _found_dir(dir_path: Path) -> bool:
-        if not dir_path.is_dir():
+        if not fs_index.is_dir(dir_path):
             print(f'{ERROR_MSG_PREFIX}Could not find directory "{dir_path}".')
             return False
         return True
@@ -1781,6 +1896,7 @@ class ComicsIntegrityChecker:
             THE_COMICS_DIR,
             RESTORE_LEDGER_FILE,
             UPSCALE_LEDGER_FILE,
+            *ROOT_CACHE_FILES,
         ]
 
         # These are the artifact tree roots, not per-volume directories: every one of
@@ -1847,8 +1963,16 @@ class ComicsIntegrityChecker:
 
     def _source_trees(self) -> list[tuple[SourceTreeSpec, Path, list[tuple[int, Path]]]]:
         """Return each source tree's spec, root, and numbered expected volume directories."""
+        volumes = range(FIRST_VOLUME_NUMBER, LAST_VOLUME_NUMBER + 1)
+        return [
+            (spec, root_dir, [(volume, get_volume_dir(volume)) for volume in volumes])
+            for spec, root_dir, get_volume_dir in self._source_tree_dirs()
+        ]
+
+    def _source_tree_dirs(self) -> list[tuple[SourceTreeSpec, Path, Callable[[int], Path]]]:
+        """Return each source tree's spec, root, and how to name one of its volume dirs."""
         database = self.comics_database
-        trees = [
+        return [
             (
                 ORIGINAL_TREE,
                 database.get_fantagraphics_original_root_dir(),
@@ -1881,12 +2005,6 @@ class ComicsIntegrityChecker:
             ),
         ]
 
-        volumes = range(FIRST_VOLUME_NUMBER, LAST_VOLUME_NUMBER + 1)
-        return [
-            (spec, root_dir, [(volume, get_volume_dir(volume)) for volume in volumes])
-            for spec, root_dir, get_volume_dir in trees
-        ]
-
     def _hand_restored_page_nums(self) -> dict[int, dict[str, str]]:
         """Map each volume to the page nums the hand-restored titles occupy in it.
 
@@ -1966,7 +2084,7 @@ class ComicsIntegrityChecker:
         # said so once, and ten more "missing" lines would not say it better.
         if (
             spec.hand_restored is HandRestoredPolicy.REQUIRED
-            and page_dir.is_dir()
+            and fs_index.is_dir(page_dir)
             and self.check_hand_restored_files_exist(
                 spec.label, page_dir, spec.page_file_exts, hand_restored_pages
             )
@@ -2004,7 +2122,7 @@ class ComicsIntegrityChecker:
         for page_num, title in sorted(hand_restored_pages.items()):
             for ext in required_exts:
                 file = page_dir / (page_num + ext)
-                if not file.is_file():
+                if not fs_index.is_file(file):
                     print(
                         f'{ERROR_MSG_PREFIX}The {file_type} page file "{file}" is missing.\n'
                         f'{BLANK_ERR_MSG_PREFIX}"{title}" is hand-restored and this tree'
@@ -2034,15 +2152,15 @@ class ComicsIntegrityChecker:
             0 if every entry is a page file that belongs here, 1 otherwise.
 
         """
-        if not dir_path.is_dir():
+        if not fs_index.is_dir(dir_path):
             print(f'{ERROR_MSG_PREFIX}The directory "{dir_path}" is missing.')
             return 1
 
         banned_pages = hand_restored_pages or {}
 
         ret_code = 0
-        for entry in sorted(dir_path.iterdir()):
-            if entry.is_dir():
+        for entry in sorted(fs_index.iterdir(dir_path)):
+            if fs_index.is_dir(entry):
                 print(f'{ERROR_MSG_PREFIX}The {file_type} directory "{entry}" was unexpected.')
                 ret_code = 1
                 continue
@@ -2095,40 +2213,146 @@ class ComicsIntegrityChecker:
         return ret_code
 
     def check_single_title(self, title: str) -> int:
-        ret_code = 0
-
         comic = self.comics_database.get_comic_book(title)
         title_str = get_safe_title(comic.get_comic_title())
 
-        if (
-            self.check_comic_structure(comic, title_str) != 0
-            or self.check_story_attributes(comic, title_str) != 0
-            or self.check_out_of_date_files(comic) != 0
-        ):
-            ret_code = 1
+        # Each in its own profile section, so `--profile` shows which of a title's
+        # checks the time goes to; `check_out_of_date_files` splits its own.
+        for check in (self.check_comic_structure, self.check_story_attributes):
+            with self._fs_index.section(check.__name__):
+                if check(comic, title_str) != 0:
+                    return 1
 
-        return ret_code
+        return 1 if self.check_out_of_date_files(comic) != 0 else 0
 
     def check_all_titles(self) -> int:
         ret_code = 0
 
         for title in self.comics_database.get_all_story_titles():
-            comic = self.comics_database.get_comic_book(title)
-            title_str = get_safe_title(comic.get_comic_title())
-
-            if self.check_comic_structure(comic, title_str) != 0:
+            if self._check_title_unless_unchanged(title) != 0:
                 ret_code = 1
-                continue
 
-            if self.check_story_attributes(comic, title_str) != 0:
-                ret_code = 1
-                continue
+        return ret_code
 
-            if self.check_out_of_date_files(comic) != 0:
-                ret_code = 1
+    def _check_title_unless_unchanged(self, title: str) -> int:
+        """Check a title, unless the snapshot has it passing against the same inputs."""
+        self._num_titles_seen += 1
+        if self._snapshot is None:
+            return self.check_single_title(title)
+
+        comic = self.comics_database.get_comic_book(title)
+        with self._fs_index.section("get_check_inputs_hash"):
+            inputs_hash = self.get_check_inputs_hash(comic)
+        if inputs_hash is not None and self._snapshot.is_unchanged(title, inputs_hash):
+            title_str = get_safe_title(comic.get_comic_title())
+            logger.info(f'"{title_str}" is unchanged since it last passed: not checking it.')
+            return 0
+
+        ret_code = self.check_single_title(title)
+        self._snapshot.record(title, inputs_hash if ret_code == 0 else None)
 
         return ret_code
 
+    def get_check_inputs_hash(self, comic: ComicBook) -> str | None:
+        """Return a hash of everything a title's check looks at.
+
+        The story attributes the structure and attribute checks grade, the identity of
+        every file named for each page in the volume's artifact trees - which is
+        everything `walk_srce_dependency_chain` could be given for it, without the
+        chain walk - and of everything else the check grades: the ini, whose hash it
+        checks, the metadata holding that hash, the dest pages and what else is in their
+        directory, the panel bounds and segments, the info files, the zip and its
+        symlinks. And the code version, so a change to the checks checks every title.
+
+        Args:
+            comic: The title.
+
+        Returns:
+            The hash, or None if the title's pages do not resolve - which the check
+            itself will report, every run.
+
+        """
+        try:
+            srce_and_dest_pages = get_sorted_srce_and_dest_pages(comic, get_full_paths=True)
+        except Exception:  # noqa: BLE001
+            return None
+
+        volume = comic.get_fanta_volume()
+        page_files = self._get_page_files(volume)
+
+        pages = []
+        for srce_page, dest_page in zip(
+            srce_and_dest_pages.srce_pages, srce_and_dest_pages.dest_pages, strict=True
+        ):
+            srce_file = Path(srce_page.page_filename)
+            dest_file = Path(dest_page.page_filename)
+            page_str = get_page_str(srce_page.page_num)
+            page: dict[str, object] = {
+                "srce_page": [str(srce_file), srce_page.page_type.name],
+                "srce_file": get_file_identity(srce_file),
+                "artifacts": page_files.get(page_str, []),
+                "dest_page": [str(dest_file), get_file_identity(dest_file)],
+            }
+            if srce_page.page_type in RESTORABLE_PAGE_TYPES:
+                bounds_file = comic.get_final_fixes_panel_bounds_file(srce_page.page_num)
+                segments_file = comic.get_srce_panel_segments_file(page_str)
+                if bounds_file is not None:
+                    page["panel_bounds"] = [str(bounds_file), get_file_identity(bounds_file)]
+                page["panel_segments"] = [str(segments_file), get_file_identity(segments_file)]
+            pages.append(page)
+
+        dest_dir = comic.get_dest_dir()
+        dest_image_dir = comic.get_dest_image_dir()
+        inputs = {
+            "code_version": self._get_code_version(),
+            "check_symlinks": self._check_symlinks,
+            "story": {
+                "title": comic.get_title_enum(),
+                "ini_title": comic.get_ini_title(),
+                "volume": volume,
+                "num_pages": get_total_num_pages(comic),
+                "extra_pub_info": comic.extra_pub_info,
+                "series_name": comic.fanta_info.series_name,
+            },
+            "ini": get_file_identity(comic.ini_file),
+            "metadata": get_file_identity(comic.get_metadata_filepath()),
+            "inset": [str(comic.intro_inset_file), fs_index.is_file(comic.intro_inset_file)],
+            "pages": pages,
+            "dest_images": (
+                sorted(str(file) for file in fs_index.iterdir(dest_image_dir))
+                if fs_index.is_dir(dest_image_dir)
+                else None
+            ),
+            "dest_files": {
+                name: get_file_identity(dest_dir / name) for name in DEST_NON_IMAGE_FILES
+            },
+            "zip": get_file_identity(comic.get_dest_comic_zip()),
+            "series_symlink": get_file_identity(comic.get_dest_series_comic_zip_symlink()),
+            "year_symlink": get_file_identity(comic.get_dest_year_comic_zip_symlink()),
+        }
+
+        return hash_check_inputs(inputs)
+
+    def _get_page_files(self, volume: int) -> dict[str, list[list[Any]]]:
+        """Return every file in a volume's artifact trees, by page, read once a scan."""
+        if volume not in self._page_files:
+            dirs = [
+                get_volume_dir(volume) for _, _, get_volume_dir in self._source_tree_dirs()
+            ]
+            dirs.extend(
+                self._fixes_tree_dirs(volume, spec)[0]
+                for spec in (STANDARD_FIXES, UPSCAYLED_FIXES)
+            )
+            self._page_files[volume] = get_page_file_identities(dirs)
+
+        return self._page_files[volume]
+
+    def _get_code_version(self) -> str:
+        if self._code_version is None:
+            self._code_version = get_code_version(_VERDICT_MODULES)
+
+        return self._code_version
+
     def check_comic_structure(self, comic: ComicBook, title_str: str) -> int:
         num_pages = get_total_num_pages(comic)
         if (num_pages <= 1) and (comic.get_title_enum() not in NON_COMIC_TITLES):
@@ -2160,7 +2384,7 @@ class ComicsIntegrityChecker:
     def check_hashes(comic: ComicBook, errors: HashErrors) -> int:
         ini_hash = get_hash_str(comic.ini_file)
         metadata_file = comic.get_metadata_filepath()
-        if not metadata_file.is_file():
+        if not fs_index.is_file(metadata_file):
             # A configured title with no metadata has not been built. That is a
             # finding to report, not a reason to abort the whole run.
             errors.metadata_file = metadata_file
@@ -2251,9 +2475,13 @@ class ComicsIntegrityChecker:
 
         out_of_date_errors = self.make_out_of_date_errors(title)
 
-        self.check_srce_and_dest_files(comic, out_of_date_errors)
-        self.check_zip_files(comic, out_of_date_errors)
-        self.check_additional_files(comic, out_of_date_errors)
+        for check in (
+            self.check_srce_and_dest_files,
+            self.check_zip_files,
+            self.check_additional_files,
+        ):
+            with self._fs_index.section(check.__name__):
+                check(comic, out_of_date_errors)
 
         self.print_check_errors(out_of_date_errors)
 
@@ -2275,7 +2503,8 @@ class ComicsIntegrityChecker:
         errors.checks_skipped = False
 
         inset_file = comic.intro_inset_file
-        if comic.get_title_enum() not in TITLES_WITHOUT_INSETS and not inset_file.is_file():
+        has_inset = comic.get_title_enum() not in TITLES_WITHOUT_INSETS
+        if has_inset and not fs_index.is_file(inset_file):
             errors.exception_errors.append(f'Inset file not found: "{inset_file}"')
             errors.checks_skipped = True
             return
@@ -2318,7 +2547,7 @@ class ComicsIntegrityChecker:
             srce_and_dest_pages.srce_pages, srce_and_dest_pages.dest_pages, strict=True
         ):
             dest_file = Path(dest_page.page_filename)
-            if not dest_file.is_file():
+            if not fs_index.is_file(dest_file):
                 errors.srce_and_dest_files_missing.append(
                     (Path(srce_page.page_filename), dest_file),
                 )
@@ -2341,7 +2570,7 @@ class ComicsIntegrityChecker:
                 if panel_segments_are_stale(segments_file, bounds_file) and bounds_file:
                     errors.stale_panel_segments.append((bounds_file, segments_file))
 
-            dest_timestamp = get_timestamp(dest_file)
+            dest_timestamp = fs_index.get_timestamp(dest_file)
             chain = walk_srce_dependency_chain(
                 dependencies,
                 dest_file,
@@ -2492,7 +2721,7 @@ class ComicsIntegrityChecker:
     @staticmethod
     def check_additional_files(comic: ComicBook, errors: OutOfDateErrors) -> None:
         dest_dir = comic.get_dest_dir()
-        if not dest_dir.is_dir():
+        if not fs_index.is_dir(dest_dir):
             errors.dest_dir_files_missing.append(dest_dir)
             return
 
@@ -2500,10 +2729,10 @@ class ComicsIntegrityChecker:
         # out in a different order on every run.
         for file in sorted(DEST_NON_IMAGE_FILES):
             file_path = dest_dir / file
-            if not file_path.is_file():
+            if not fs_index.is_file(file_path):
                 errors.dest_dir_files_missing.append(file_path)
                 continue
-            if is_stale(get_timestamp(file_path), errors.max_srce):
+            if is_stale(fs_index.get_timestamp(file_path), errors.max_srce):
                 errors.dest_dir_files_out_of_date.append(file_path)
 
     def print_check_errors(self, errors: OutOfDateErrors) -> None:
@@ -0,0 +1,396 @@
+"""One scan of the library's trees, for the integrity check to ask instead of the disk.
+
+The integrity check is dozens of separate sweeps - the unexpected-files sweep, the
+source tree sweep, the fixes trees, the read-only check, the per-title dest checks - and
+many of them cover the same directories, each with its own `iterdir`, `is_file` and
+`stat` calls. Over a full library that is several hundred thousand system calls, most
+of them asking again what an earlier sweep already asked.
+
+`FsIndex` walks each tree once, up front, with `os.scandir`, a thread per tree, and
+keeps every entry's stat and, for a symlink, the link's own. While an index is in use the
+query functions here - `is_file`, `is_dir`, `iterdir`, `stat`, `get_timestamp`,
+`same_file` and the rest - answer from it; with none in use, or for a path outside what
+was scanned, they go to the disk as `Path` would. A path counts as scanned only if its
+directory was listed, so an answer from the index is never a guess: a name missing from
+a listed directory is not there, and anything else is asked of the disk.
+
+The index is a snapshot. A caller that changes the trees - the `--fix-names` renames -
+scans again afterwards.
+
+Each query is counted against the check that made it, answered or passed on, which is
+what `describe_profile` reports: the calls each check was saved, against what the scan
+cost. A check can be broken down into sections of its own, which the report indents
+under it.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import os
+import stat as stat_module
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+__all__ = [
+    "FsIndex",
+    "SectionCounts",
+    "describe_profile",
+    "exists",
+    "get_timestamp",
+    "is_dir",
+    "is_file",
+    "is_symlink",
+    "iterdir",
+    "lstat",
+    "same_file",
+    "stat",
+    "use_fs_index",
+]
+
+# Where queries made outside any named section are counted.
+_NO_SECTION = "(other)"
+
+# The index queries are answered from, set by `use_fs_index`. None outside one, where
+# every query goes to the disk.
+_active_index: FsIndex | None = None
+
+
+class _Entry(NamedTuple):
+    # The stat through any symlink, as `Path.stat` gives it: None for a dangling link.
+    stat: os.stat_result | None
+    # The entry's own, as `Path.lstat` gives it: the same as `stat` but for a symlink.
+    link_stat: os.stat_result | None
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.link_stat is not None and stat_module.S_ISLNK(self.link_stat.st_mode)
+
+
+# What the index answers for a name its directory listing does not have.
+_MISSING = _Entry(None, None)
+
+
+@dataclass(slots=True)
+class SectionCounts:
+    """What one check asked of the index."""
+
+    answered: int = 0
+    """Queries answered from the index: the system calls the check was saved."""
+
+    passed_on: int = 0
+    """Queries about paths outside the scan, which went to the disk."""
+
+    seconds: float = 0.0
+    """The time spent inside the section, the sections inside it included."""
+
+    depth: int = 0
+    """How many sections the section was first entered inside."""
+
+
+class FsIndex:
+    """Every entry under a set of roots, as one scan found them."""
+
+    def __init__(self, roots: Iterable[Path] = (), *, shallow_roots: Iterable[Path] = ()) -> None:
+        """Get ready to scan some trees. Until `scan` is called, every query is passed on.
+
+        Args:
+            roots: The trees to scan, all the way down. Symlinked directories are not
+                followed, so the paths under one are left to the disk.
+            shallow_roots: Directories of which only the entries themselves are wanted,
+                such as the library root, most of which no check looks inside.
+
+        """
+        self._jobs = [(root, True) for root in roots] + [(root, False) for root in shallow_roots]
+        self._entries: dict[Path, _Entry] = {}
+        self._listings: dict[Path, list[Path]] = {}
+        self.scan_calls = 0
+        self.scan_seconds = 0.0
+
+        self._counts: dict[str, SectionCounts] = {}
+        self._sections: list[str] = []
+
+    def scan(self) -> None:
+        """Scan the roots, each on its own thread, replacing whatever an earlier scan found."""
+        start = time.perf_counter()
+
+        entries: dict[Path, _Entry] = {}
+        listings: dict[Path, list[Path]] = {}
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            for scanned in executor.map(lambda job: _scan_root(*job), self._jobs):
+                entries.update(scanned.entries)
+                listings.update(scanned.listings)
+                self.scan_calls += scanned.calls
+
+        self._entries, self._listings = entries, listings
+        self.scan_seconds += time.perf_counter() - start
+
+    @property
+    def num_entries(self) -> int:
+        return len(self._entries)
+
+    @property
+    def counts(self) -> dict[str, SectionCounts]:
+        """What each section asked, in the order the sections were first entered."""
+        return self._counts
+
+    @contextlib.contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """Count the queries made inside, and the time taken, against `name`.
+
+        Sections nest: a query is counted against the innermost, and the time against
+        every one it was made inside.
+        """
+        counts = self._counts.setdefault(name, SectionCounts(depth=len(self._sections)))
+        self._sections.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            counts.seconds += time.perf_counter() - start
+            self._sections.pop()
+
+    def lookup(self, path: Path) -> _Entry | None:
+        """Return what the scan found at `path`, or None if the scan did not look there."""
+        entry = self._entries.get(path)
+        if entry is None and path.parent in self._listings:
+            entry = _MISSING
+
+        self._count(answered=entry is not None)
+        return entry
+
+    def listing(self, path: Path) -> list[Path] | None:
+        """Return the entries the scan found in a directory, or None if it did not list it."""
+        listing = self._listings.get(path)
+
+        self._count(answered=listing is not None)
+        return listing
+
+    def _count(self, *, answered: bool) -> None:
+        name = self._sections[-1] if self._sections else _NO_SECTION
+        counts = self._counts.setdefault(name, SectionCounts())
+        if answered:
+            counts.answered += 1
+        else:
+            counts.passed_on += 1
+
+
+class _ScannedRoot(NamedTuple):
+    entries: dict[Path, _Entry]
+    listings: dict[Path, list[Path]]
+    calls: int
+
+
+def _scan_root(root: Path, recursive: bool) -> _ScannedRoot:
+    """Scan one root: a stat for every entry, and a listing for every directory.
+
+    The type of an entry comes free with its directory's listing, so the calls counted
+    are the root's own stat and lstat, then one a directory and one an entry, for the
+    stat, and one more a symlink, for the link's own.
+    """
+    entries: dict[Path, _Entry] = {}
+    listings: dict[Path, list[Path]] = {}
+    calls = 2
+
+    try:
+        entries[root] = _Entry(root.stat(), root.lstat())
+    except OSError:
+        # Left out rather than recorded as missing: the root's parent was not listed,
+        # so only the disk can say.
+        return _ScannedRoot(entries, listings, calls)
+
+    pending = [root]
+    while pending:
+        dir_path = pending.pop()
+        children = []
+        calls += 1
+        try:
+            with os.scandir(dir_path) as it:
+                for dir_entry in it:
+                    path = dir_path / dir_entry.name
+                    children.append(path)
+                    is_link = dir_entry.is_symlink()
+                    try:
+                        entry_stat = dir_entry.stat()
+                    except OSError:
+                        entry_stat = None
+                    if is_link:
+                        link_stat = dir_entry.stat(follow_symlinks=False)
+                        calls += 2
+                    else:
+                        link_stat = entry_stat
+                        calls += 1
+                    entries[path] = _Entry(entry_stat, link_stat)
+
+                    if recursive and not is_link and dir_entry.is_dir(follow_symlinks=False):
+                        pending.append(path)
+        except (NotADirectoryError, PermissionError):
+            # Not listed, so whatever is asked about the paths under it goes to the disk.
+            continue
+
+        listings[dir_path] = children
+
+    return _ScannedRoot(entries, listings, calls)
+
+
+@contextlib.contextmanager
+def use_fs_index(index: FsIndex) -> Iterator[FsIndex]:
+    """Answer the queries in this module from `index` until the block is left."""
+    global _active_index  # noqa: PLW0603
+    previous, _active_index = _active_index, index
+    try:
+        yield index
+    finally:
+        _active_index = previous
+
+
+def _find(path: Path) -> _Entry | None:
+    # A `zipfile.Path`, as an intro inset can be, is never in the index.
+    if _active_index is None or not isinstance(path, Path):
+        return None
+
+    return _active_index.lookup(path)
+
+
+def stat(path: Path) -> os.stat_result:
+    """Return `path.stat()`.
+
+    Raises:
+        FileNotFoundError: If there is no such file, or it is a dangling link.
+
+    """
+    entry = _find(path)
+    if entry is None:
+        return path.stat()
+    if entry.stat is None:
+        msg = f'No such file: "{path}".'
+        raise FileNotFoundError(msg)
+
+    return entry.stat
+
+
+def lstat(path: Path) -> os.stat_result:
+    """Return `path.lstat()`.
+
+    Raises:
+        FileNotFoundError: If there is no such file.
+
+    """
+    entry = _find(path)
+    if entry is None:
+        return path.lstat()
+    if entry.link_stat is None:
+        msg = f'No such file: "{path}".'
+        raise FileNotFoundError(msg)
+
+    return entry.link_stat
+
+
+def _has_mode(path: Path, is_kind: Callable[[int], bool]) -> bool | None:
+    entry = _find(path)
+    if entry is None:
+        return None
+
+    return entry.stat is not None and is_kind(entry.stat.st_mode)
+
+
+def is_file(path: Path) -> bool:
+    """Return `path.is_file()`."""
+    answer = _has_mode(path, stat_module.S_ISREG)
+    return path.is_file() if answer is None else answer
+
+
+def is_dir(path: Path) -> bool:
+    """Return `path.is_dir()`."""
+    answer = _has_mode(path, stat_module.S_ISDIR)
+    return path.is_dir() if answer is None else answer
+
+
+def exists(path: Path) -> bool:
+    """Return `path.exists()`, which is False for a dangling link."""
+    entry = _find(path)
+    return path.exists() if entry is None else entry.stat is not None
+
+
+def is_symlink(path: Path) -> bool:
+    """Return `path.is_symlink()`."""
+    entry = _find(path)
+    return path.is_symlink() if entry is None else entry.is_symlink
+
+
+def get_timestamp(path: Path) -> float:
+    """Return `path`'s mtime as `comics_utils.get_timestamp` gives it: a symlink's own.
+
+    Raises:
+        FileNotFoundError: If there is no such file.
+
+    """
+    entry = _find(path)
+    if entry is None:
+        link_stat = path.lstat()
+        return (link_stat if stat_module.S_ISLNK(link_stat.st_mode) else path.stat()).st_mtime
+    if entry.link_stat is None:
+        msg = f'No such file: "{path}".'
+        raise FileNotFoundError(msg)
+
+    # The entry's own stat, which for anything but a symlink is the stat through it.
+    return entry.link_stat.st_mtime
+
+
+def same_file(path: Path, other: Path) -> bool:
+    """Return whether two paths are the one file once their symlinks are followed.
+
+    As comparing their `resolve()`s would, but by device and inode, so that for two
+    paths the scan covered no call is made. A path that is not there, or is a dangling
+    link, is left to `resolve()`, which still names where it leads.
+    """
+    try:
+        return os.path.samestat(stat(path), stat(other))
+    except FileNotFoundError:
+        return path.resolve() == other.resolve()
+
+
+def iterdir(path: Path) -> list[Path]:
+    """Return a directory's entries, in no particular order, as `path.iterdir()` would."""
+    listing = None if _active_index is None else _active_index.listing(path)
+    return list(path.iterdir()) if listing is None else list(listing)
+
+
+def describe_profile(index: FsIndex) -> list[str]:
+    """Return the lines of the `--profile` report: what each check asked of the index.
+
+    Each answered query stands for the system call the check would have made without
+    the index, so the saving is set against what the scan itself made.
+
+    Args:
+        index: The index the checks ran with.
+
+    Returns:
+        The report, a line at a time.
+
+    """
+    names = {name: "  " * counts.depth + name for name, counts in index.counts.items()}
+    width = max((len(name) for name in names.values()), default=0)
+
+    lines = [
+        f"Scanned {index.num_entries} entries in {index.scan_seconds:.2f}s,"
+        f" with {index.scan_calls} system calls.",
+    ]
+    lines.extend(
+        f"  {names[name]:<{width}}  {counts.answered:>8} answered"
+        f"  {counts.passed_on:>6} to the disk  {counts.seconds:>7.2f}s"
+        for name, counts in index.counts.items()
+    )
+
+    answered = sum(counts.answered for counts in index.counts.values())
+    lines.append(
+        f"The checks were saved {answered} system calls, for the {index.scan_calls}"
+        f" the scan made: {answered - index.scan_calls:+d} net."
+    )
+
+    return lines
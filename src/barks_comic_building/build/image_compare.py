@@ -0,0 +1,411 @@
+"""Comparing two images the way ImageMagick's ``compare`` does, without running it.
+
+The comparison scripts used to spawn ``compare`` for every pair of pages - and for a
+tiled comparison, ``convert`` as well, to cut its mask into tiles - so a full build dir
+was thousands of processes, each decoding its pages afresh. Here a pair is decoded once,
+with OpenCV, and every figure the scripts judge by comes from one pass over the two: the
+AE count of pixels differing beyond a fuzz, the normalised RMSE, and the fraction of
+differing pixels in each tile of a grid. `compare_image_pairs` spreads the pairs over a
+process pool.
+
+The figures are meant to be ImageMagick's own, so that the cutoffs measured with it in
+``docs/image-compare-cutoffs.md`` hold for them too:
+
+- A fuzz is read as a Q16 build reads ``-fuzz N%``: N% of 65536, against channel values
+  out of 65535. A pixel differs when the distance between its two colours is beyond
+  that: the root of its channels' squared differences summed, once an alpha channel has
+  weighted the colours, as ``GetAbsoluteDistortion`` in IM6's ``compare.c`` sums them,
+  rather than any one channel's difference alone. A grey image counts in all three
+  colour channels, as IM6 reads it. At 0% any difference at all counts.
+- The RMSE is the root of the mean squared difference over every channel of every pixel,
+  as a fraction of full scale: the figure ``compare`` prints in brackets.
+- The tiles are the ones ``-crop CxR@`` cuts, each edge the running sum of the side over
+  the tile count, rounded half up.
+
+That is ImageMagick's source as read, not yet as measured. ``tests/test_image_compare.py``
+holds all three to ``compare``'s figures on fixtures recorded by
+``scripts/record_image_compare_fixtures.py``, and ``scripts/bench_image_compare.py`` times
+both over two real directories, but neither has yet been run where ``compare`` is
+installed. Until they have, nothing uses this: the comparison scripts run ``compare``.
+
+Two images that decode to the same bytes are the same whatever the fuzz, which is most
+pages of a rebuild, so that is asked first, a band at a time, and nothing is measured for
+a pair that is. An exact comparison asks nothing else at all.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import math
+import os
+from typing import TYPE_CHECKING, NamedTuple
+
+import cv2 as cv
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from pathlib import Path
+
+__all__ = [
+    "ImageDifference",
+    "PairRequest",
+    "PairResult",
+    "TileFractions",
+    "compare_image_pair",
+    "compare_image_pairs",
+    "get_tile_grid",
+    "measure_difference",
+    "parse_fuzz",
+    "read_image",
+]
+
+# The quantum range of the Q16 ImageMagick that distributions ship, which is what the
+# fuzz is measured against, and the fuzz it falls back on at 0%, under which two channel
+# values are never told apart.
+_QUANTUM_RANGE = 65535.0
+_MIN_FUZZ = math.sqrt(0.5)
+
+# Rows compared at a time. Keeps the temporaries to a band of the page rather than the
+# page, which on a 4x page is the difference between megabytes and a gigabyte.
+_BAND_ROWS = 256
+
+_GREY, _COLOUR, _COLOUR_AND_ALPHA = 1, 3, 4
+
+
+def parse_fuzz(fuzz: str) -> float:
+    """Return a fuzz written as ImageMagick takes it, such as "20%", as a fraction.
+
+    Raises:
+        ValueError: If it is not a percentage.
+
+    """
+    if not fuzz.endswith("%"):
+        msg = f"The fuzz amount must end with a '%': \"{fuzz}\"."
+        raise ValueError(msg)
+
+    return float(fuzz[:-1]) / 100.0
+
+
+def read_image(image_file: Path) -> np.ndarray:
+    """Return an image as it is stored: no orientation applied, alpha and depth kept.
+
+    Raises:
+        OSError: If it cannot be read as an image.
+
+    """
+    image = cv.imread(str(image_file), cv.IMREAD_UNCHANGED)
+    if image is None:
+        msg = f'Could not read image "{image_file}".'
+        raise OSError(msg)
+
+    return image
+
+
+class TileFractions(NamedTuple):
+    """The fraction of each tile's pixels that differ, in row-major order."""
+
+    fractions: list[float]
+    cols: int
+    rows: int
+
+    def get_worst(self) -> tuple[float, int, int]:
+        """Return the largest fraction, and the (row, column) of the first tile with it."""
+        worst = max(self.fractions)
+        row, col = divmod(self.fractions.index(worst), self.cols)
+
+        return worst, row, col
+
+
+class ImageDifference(NamedTuple):
+    """What comparing two images of the same size found."""
+
+    size: tuple[int, int]
+    num_differing: int
+    """The pixels differing beyond the fuzz: ImageMagick's AE."""
+    rmse: float
+    """The normalised RMSE: 0 for identical images, up to 1."""
+    tiles: TileFractions | None
+    """Each tile's fraction of differing pixels, if a grid was asked for."""
+
+    @property
+    def num_pixels(self) -> int:
+        return self.size[0] * self.size[1]
+
+
+def get_tile_grid(size: tuple[int, int], tile_size: int) -> tuple[int, int]:
+    """Return the (columns, rows) of tiles about `tile_size` across that cover an image."""
+    width, height = size
+    return max(1, round(width / tile_size)), max(1, round(height / tile_size))
+
+
+def _get_tile_edges(length: int, num_tiles: int) -> np.ndarray:
+    """Return where ``-crop NxM@`` puts the edges of its tiles along a side, ends included.
+
+    A running sum of the side over the tile count, rather than a multiple of it, because
+    that is how ImageMagick finds them, and the two round differently often enough to
+    move a tile's edge by a pixel.
+    """
+    delta = max(length / num_tiles, 1.0)
+    edges = [0]
+    offset = 0.0
+    while offset < length:
+        offset += delta
+        edge = min(math.floor(offset + 0.5), length)
+        if edge > edges[-1]:
+            edges.append(edge)
+
+    return np.array(edges)
+
+
+def _are_equal(image1: np.ndarray, image2: np.ndarray) -> bool:
+    """Return whether two images decoded to the same bytes, stopping at the first band not."""
+    if image1.shape != image2.shape or image1.dtype != image2.dtype:
+        return False
+
+    return all(
+        np.array_equal(image1[top : top + _BAND_ROWS], image2[top : top + _BAND_ROWS])
+        for top in range(0, image1.shape[0], _BAND_ROWS)
+    )
+
+
+def _match_channels(image1: np.ndarray, image2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return two images with the same channels: colour, or colour and alpha.
+
+    A grey image is compared as colour, its one channel counted in all three as IM6 counts
+    it, and an image without alpha against one with it is opaque, which changes none of
+    the figures.
+
+    Raises:
+        ValueError: If either has a number of channels other than 1, 3 or 4.
+
+    """
+    images = [
+        image if image.ndim == 3 else image[:, :, np.newaxis]  # noqa: PLR2004
+        for image in (image1, image2)
+    ]
+    for image in images:
+        if image.shape[2] not in (_GREY, _COLOUR, _COLOUR_AND_ALPHA):
+            msg = f"Cannot compare an image with {image.shape[2]} channels."
+            raise ValueError(msg)
+
+    num_channels = max(_COLOUR, *(image.shape[2] for image in images))
+    matched = []
+    for image in images:
+        if image.shape[2] == _GREY:
+            image = np.repeat(image, _COLOUR, axis=2)  # noqa: PLW2901
+        if image.shape[2] == _COLOUR and num_channels == _COLOUR_AND_ALPHA:
+            opaque = np.full(image.shape[:2] + (1,), np.iinfo(image.dtype).max, image.dtype)
+            image = np.concatenate((image, opaque), axis=2)  # noqa: PLW2901
+        matched.append(image)
+
+    return matched[0], matched[1]
+
+
+def _get_fuzz_in_quanta(fuzz: float) -> float:
+    return max(fuzz * (_QUANTUM_RANGE + 1.0), _MIN_FUZZ)
+
+
+def _compare_8_bit_band(
+    band1: np.ndarray, band2: np.ndarray, fuzz_in_quanta: float
+) -> tuple[np.ndarray, float]:
+    """Return which pixels of a band differ, and its summed squared error, for 8 bit colour.
+
+    The common case, kept to integers. An 8 bit value is 257 quanta, so a pixel differs
+    when 257 times the distance between its colours is beyond the fuzz.
+    """
+    difference = band1.astype(np.int16) - band2
+    pixel_squared = np.square(difference, dtype=np.int32).sum(axis=2, dtype=np.int32)
+    differs = pixel_squared > np.square(fuzz_in_quanta / 257.0)
+
+    return differs, float(pixel_squared.sum(dtype=np.int64)) / (255.0 * 255.0)
+
+
+def _compare_band(
+    band1: np.ndarray, band2: np.ndarray, scales: tuple[float, float], fuzz_in_quanta: float
+) -> tuple[np.ndarray, float]:
+    """Return which pixels of a band differ, and its summed squared error, for any image.
+
+    Each channel is taken as a fraction of its full scale, so an 8 bit image compares with
+    a 16 bit one. With alpha, the colours are weighted by it, as ImageMagick weights them.
+    """
+    values1 = band1 / scales[0]
+    values2 = band2 / scales[1]
+    if values1.shape[2] == _COLOUR_AND_ALPHA:
+        alpha1, alpha2 = values1[:, :, 3:], values2[:, :, 3:]
+        error = np.concatenate(
+            (alpha1 * values1[:, :, :3] - alpha2 * values2[:, :, :3], alpha1 - alpha2), axis=2
+        )
+    else:
+        error = values1 - values2
+
+    pixel_squared = np.square(error).sum(axis=2)
+    differs = pixel_squared * (_QUANTUM_RANGE * _QUANTUM_RANGE) > np.square(fuzz_in_quanta)
+    return differs, float(pixel_squared.sum())
+
+
+def measure_difference(
+    image1: np.ndarray,
+    image2: np.ndarray,
+    fuzz: float,
+    *,
+    tile_grid: tuple[int, int] | None = None,
+    mask_file: Path | None = None,
+) -> ImageDifference:
+    """Return how two images of the same size differ, in ImageMagick's figures.
+
+    Args:
+        image1: One image, as `read_image` returns it.
+        image2: The other.
+        fuzz: How far apart, as a fraction of full scale, two colours may be and still
+            count as the same.
+        tile_grid: The (columns, rows) of tiles to measure, or None for none.
+        mask_file: Where to write a mask of the differing pixels, white on black, as
+            ``compare -highlight-color white -lowlight-color black`` writes it. Written
+            only if some pixels differ. None not to write one.
+
+    Returns:
+        The difference.
+
+    Raises:
+        ValueError: If the two are different sizes, or either has channels that cannot
+            be compared.
+
+    """
+    if image1.shape[:2] != image2.shape[:2]:
+        msg = (
+            f"The images are different sizes:"
+            f" {image1.shape[1]}x{image1.shape[0]} and {image2.shape[1]}x{image2.shape[0]}."
+        )
+        raise ValueError(msg)
+
+    height, width = image1.shape[:2]
+    image1, image2 = _match_channels(image1, image2)
+    fuzz_in_quanta = _get_fuzz_in_quanta(fuzz)
+    is_8_bit_colour = image1.shape[2] < _COLOUR_AND_ALPHA and (
+        image1.dtype == image2.dtype == np.uint8
+    )
+    scales = (float(np.iinfo(image1.dtype).max), float(np.iinfo(image2.dtype).max))
+
+    if tile_grid is not None:
+        col_edges = _get_tile_edges(width, tile_grid[0])
+        row_edges = _get_tile_edges(height, tile_grid[1])
+        tile_counts = np.zeros((len(row_edges) - 1, len(col_edges) - 1), dtype=np.int64)
+    mask = np.zeros((height, width), dtype=np.uint8) if mask_file is not None else None
+
+    num_differing = 0
+    squared = 0.0
+    for top in range(0, height, _BAND_ROWS):
+        band1, band2 = image1[top : top + _BAND_ROWS], image2[top : top + _BAND_ROWS]
+        if is_8_bit_colour:
+            differs, band_squared = _compare_8_bit_band(band1, band2, fuzz_in_quanta)
+        else:
+            differs, band_squared = _compare_band(band1, band2, scales, fuzz_in_quanta)
+
+        num_differing += int(np.count_nonzero(differs))
+        squared += band_squared
+        if mask is not None:
+            mask[top : top + differs.shape[0]][differs] = 255
+        if tile_grid is not None:
+            per_row = np.add.reduceat(differs, col_edges[:-1], axis=1, dtype=np.int64)
+            tile_rows = np.searchsorted(row_edges, np.arange(top, top + differs.shape[0]), "right")
+            np.add.at(tile_counts, tile_rows - 1, per_row)
+
+    if mask is not None and num_differing and not cv.imwrite(str(mask_file), mask):
+        msg = f'Could not write the difference mask "{mask_file}".'
+        raise OSError(msg)
+
+    tiles = None
+    if tile_grid is not None:
+        areas = np.outer(np.diff(row_edges), np.diff(col_edges))
+        tiles = TileFractions(
+            (tile_counts / areas).ravel().tolist(), len(col_edges) - 1, len(row_edges) - 1
+        )
+
+    rmse = math.sqrt(squared / (width * height * image1.shape[2]))
+    return ImageDifference((width, height), num_differing, rmse, tiles)
+
+
+def _get_no_difference(size: tuple[int, int], tile_grid: tuple[int, int] | None) -> ImageDifference:
+    tiles = None
+    if tile_grid is not None:
+        cols = len(_get_tile_edges(size[0], tile_grid[0])) - 1
+        rows = len(_get_tile_edges(size[1], tile_grid[1])) - 1
+        tiles = TileFractions([0.0] * (cols * rows), cols, rows)
+
+    return ImageDifference(size, 0, 0.0, tiles)
+
+
+class PairRequest(NamedTuple):
+    """One pair of images to compare, and how."""
+
+    file1: Path
+    file2: Path
+    fuzz: float = 0.0
+    tile_size: int | None = None
+    """Measure tiles about this many pixels across, or None not to."""
+    mask_file: Path | None = None
+    """Where to write the mask of differing pixels, if any differ."""
+    exact: bool = False
+    """Only ask whether the two decode to the same bytes, and measure nothing."""
+
+
+class PairResult(NamedTuple):
+    """What comparing a pair found."""
+
+    request: PairRequest
+    is_identical: bool
+    """Whether the two decoded to the same bytes."""
+    difference: ImageDifference | None
+    """The figures: all zero for an identical pair, and None for an exact comparison of a
+    pair that is not, or a pair that could not be compared."""
+    error: str | None = None
+    """Why the pair could not be compared, if it could not."""
+
+
+def compare_image_pair(request: PairRequest) -> PairResult:
+    """Compare one pair of images. Never raises for the images: a failure is in the result."""
+    try:
+        image1 = read_image(request.file1)
+        image2 = read_image(request.file2)
+        height, width = image1.shape[:2]
+        tile_grid = (
+            None if request.tile_size is None else get_tile_grid((width, height), request.tile_size)
+        )
+
+        if image1.shape[:2] == image2.shape[:2] and _are_equal(image1, image2):
+            return PairResult(request, True, _get_no_difference((width, height), tile_grid))
+        if request.exact:
+            return PairResult(request, False, None)
+
+        difference = measure_difference(
+            image1, image2, request.fuzz, tile_grid=tile_grid, mask_file=request.mask_file
+        )
+    except (OSError, ValueError) as exc:
+        return PairResult(request, False, None, str(exc))
+
+    return PairResult(request, False, difference)
+
+
+def compare_image_pairs(
+    requests: Sequence[PairRequest], num_workers: int | None = None
+) -> Iterator[PairResult]:
+    """Compare pairs of images over a process pool, yielding the results in order.
+
+    Args:
+        requests: The pairs.
+        num_workers: How many processes to compare in. None for one a CPU; 1 compares in
+            this process, with no pool.
+
+    Yields:
+        Each pair's result, in the order of `requests`, as soon as it and every pair
+        before it are done.
+
+    """
+    num_workers = min(num_workers or os.process_cpu_count() or 1, len(requests))
+    if num_workers <= 1:
+        yield from map(compare_image_pair, requests)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        yield from executor.map(compare_image_pair, requests)
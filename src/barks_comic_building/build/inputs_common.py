@@ -0,0 +1,124 @@
+"""The parts a record of what something was made from needs, whatever it records.
+
+The build manifests, the integrity snapshot and the panel bounds inputs all keep, between
+runs, a hash of what each page or title was last made or checked against, and skip what
+hashes the same. The awkward parts of that - telling one version of a file from another
+without reading it, hashing inputs so that a change of record version changes every hash,
+and a record file that is never half written and reads as empty rather than failing when
+it cannot be trusted - are not specific to any of them. They live here so that a fix to
+one is a fix to all.
+
+What each records stays with it, as does where it reads a file's identity from: a build
+stats the trees as they are, while an integrity check answers from its `fs_index` scan.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+__all__ = [
+    "get_file_identity",
+    "hash_versioned_inputs",
+    "load_versioned_json",
+    "save_versioned_json",
+]
+
+
+def get_file_identity(
+    file: Path,
+    stat: Callable[[Path], os.stat_result] = os.stat,
+    lstat: Callable[[Path], os.stat_result] = os.lstat,
+) -> list[int] | None:
+    """Return what tells one version of a file from another without reading it.
+
+    The size and nanosecond mtime of the file, and the mtime of the link itself for a
+    symlink, so that re-pointing a staged link counts as a change even where the file
+    it now points at is older.
+
+    Args:
+        file: The file.
+        stat: What to stat the file with, following a symlink.
+        lstat: What to stat the file with, not following one.
+
+    Returns:
+        The identity, or None if the file is not there.
+
+    """
+    try:
+        file_stat = stat(file)
+        link_stat = lstat(file)
+    except OSError:
+        return None
+
+    return [file_stat.st_size, file_stat.st_mtime_ns, link_stat.st_mtime_ns]
+
+
+def hash_versioned_inputs(version: int, inputs: Any) -> str:  # noqa: ANN401
+    """Return a hash of some inputs, and of the version of the record they are kept in.
+
+    Args:
+        version: The record's version, so that bumping it changes every hash.
+        inputs: Anything json can write. Dict key order does not matter.
+
+    Returns:
+        The hash, as hex.
+
+    """
+    text = json.dumps([version, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_versioned_json[T](
+    record_file: Path, version: int, parse: Callable[[dict[str, Any]], T], empty: T, what: str
+) -> T:
+    """Return a record read back, or an empty one if there is none to trust.
+
+    A record that is missing or of another version is an empty one. So is one that cannot
+    be read or parsed, with a warning, since it was written by this code and should have.
+
+    Args:
+        record_file: The record file.
+        version: The version this code writes.
+        parse: Makes the record from the json written by `save_versioned_json`. Raises
+            `KeyError`, `TypeError` or `ValueError` on what it cannot make sense of.
+        empty: The record to return when there is none to trust.
+        what: What the record is, for the warning.
+
+    Returns:
+        The record.
+
+    """
+    try:
+        data = json.loads(record_file.read_text())
+        if data.get("version") != version:
+            return empty
+        return parse(data)
+    except FileNotFoundError:
+        return empty
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f'Ignoring the unreadable {what} "{record_file}": {e}')
+        return empty
+
+
+def save_versioned_json(record_file: Path, version: int, data: dict[str, Any]) -> None:
+    """Write a record, all at once, so that it is never read half written.
+
+    Args:
+        record_file: The record file. Its parent directories are made.
+        version: The version this code writes.
+        data: The record, as json.
+
+    """
+    record_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = record_file.with_name(record_file.name + ".tmp")
+    temp_file.write_text(json.dumps({"version": version, **data}, indent=1))
+    temp_file.replace(record_file)
@@ -0,0 +1,215 @@
+"""What each title's last clean integrity check was made against, so it need not be redone.
+
+Checking every title means, for each, hashing its ini, reading its metadata and walking
+every page's dependency chain, and almost all of it comes back clean and unchanged from
+the run before. The snapshot records, for each title that passed, a hash of everything
+its check looked at: the ini's and metadata's identity, the story attributes the
+database gives it, every file named for each of its pages in the volume's artifact
+trees, the dest pages, the panel bounds and segments, the info files, the zip and its
+symlinks, and the source of the code that grades them. A title whose inputs hash the
+same as when it last passed is not checked again.
+
+The pages' artifacts are hashed rather than their dependency chains. Walking a chain is
+`get_restored_srce_dependencies` stating each stage on disk, which is most of what
+checking a page costs, so a hash built from the chains saved little over the check it
+stood in for. Every file a chain can hold is named for its page, in one of the
+volume's trees, so `get_page_file_identities` takes them all from the scan at once: a
+chain cannot change without one of them changing, though one of them can change - a
+scrap beside the page, say - without the chain changing, which only checks the title
+again.
+
+Only passes are recorded. A title with findings is checked again every run, so its
+findings are printed every run, and a title that passes is recorded afresh. A snapshot
+that is missing, unreadable or from another version of this module is an empty one, and
+an empty snapshot checks every title.
+
+A file's identity is its size and nanosecond mtime, and its link's own mtime for a
+symlink, as `get_timestamp` dates a symlink by the link. They are read through
+`fs_index`, so a run with the trees scanned answers them from the scan.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from barks_comic_building.build import fs_index, inputs_common
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = [
+    "INTEGRITY_SNAPSHOT_FILENAME",
+    "IntegritySnapshot",
+    "get_code_version",
+    "get_file_identity",
+    "get_page_file_identities",
+    "hash_check_inputs",
+    "load_integrity_snapshot",
+    "save_integrity_snapshot",
+]
+
+INTEGRITY_SNAPSHOT_FILENAME = "integrity-snapshot.json"
+
+# Part of every hash, so that a change to what a title's check looks at checks every
+# title once.
+INTEGRITY_SNAPSHOT_VERSION = 2
+
+# The page number an artifact is named for: "017" in "017.png" or "017.svg.png".
+_PAGE_NUM = re.compile(r"\d+")
+
+
+@dataclass(slots=True)
+class IntegritySnapshot:
+    """Each title that last passed, with the hash of the inputs it passed against."""
+
+    passed: dict[str, str] = field(default_factory=dict)
+    num_skipped: int = 0
+
+    def is_unchanged(self, title: str, inputs_hash: str) -> bool:
+        """Return whether a title passed against these same inputs.
+
+        Counted, for the summary, when it did.
+        """
+        unchanged = self.passed.get(title) == inputs_hash
+        if unchanged:
+            self.num_skipped += 1
+
+        return unchanged
+
+    def record(self, title: str, inputs_hash: str | None) -> None:
+        """Record a title's verdict: passed against `inputs_hash`, or not if None."""
+        if inputs_hash is None:
+            self.passed.pop(title, None)
+        else:
+            self.passed[title] = inputs_hash
+
+
+def get_file_identity(file: Path) -> list[int] | None:
+    """Return a file's size and mtime and its link's mtime, or None if it is not there.
+
+    Read through `fs_index`, as `inputs_common.get_file_identity` describes.
+
+    Args:
+        file: The file.
+
+    Returns:
+        The identity.
+
+    """
+    return inputs_common.get_file_identity(file, fs_index.stat, fs_index.lstat)
+
+
+def get_page_file_identities(dirs: Iterable[Path]) -> dict[str, list[list[Any]]]:
+    """Return every file under some directories, by the page number it is named for.
+
+    Walked through `fs_index`, so with the trees scanned nothing is asked of the disk.
+    Symlinked directories are not followed, and a file not named for a page is left
+    out.
+
+    Args:
+        dirs: The directories, each all the way down. One that is not there is skipped.
+
+    Returns:
+        Each page number's files, as their path and identity, in path order.
+
+    """
+    by_page: dict[str, list[list[Any]]] = {}
+
+    pending = [dir_path for dir_path in dirs if fs_index.is_dir(dir_path)]
+    while pending:
+        dir_path = pending.pop()
+        for path in fs_index.iterdir(dir_path):
+            if fs_index.is_symlink(path) or not fs_index.is_dir(path):
+                page_num = _PAGE_NUM.match(path.name)
+                if page_num is not None:
+                    files = by_page.setdefault(page_num[0], [])
+                    files.append([str(path), get_file_identity(path)])
+            else:
+                pending.append(path)
+
+    for files in by_page.values():
+        files.sort(key=lambda file: file[0])
+
+    return by_page
+
+
+def get_code_version(module_names: Iterable[str]) -> str:
+    """Return a digest of the source of the modules a title's verdict comes from.
+
+    Part of every title's hash, so that a change to how a title is graded checks every
+    title again, without anyone having to remember to bump a version.
+
+    Args:
+        module_names: The modules, as they are imported.
+
+    Returns:
+        The digest, as hex.
+
+    """
+    digest = hashlib.sha256()
+    for name in module_names:
+        digest.update(name.encode())
+        source = importlib.import_module(name).__file__
+        if source is not None:
+            digest.update(Path(source).read_bytes())
+
+    return digest.hexdigest()
+
+
+def hash_check_inputs(inputs: Any) -> str:  # noqa: ANN401
+    """Return a hash of a title's check inputs, as gathered by the checker.
+
+    Args:
+        inputs: Anything json can write. Dict key order does not matter.
+
+    Returns:
+        The hash, as hex.
+
+    """
+    return inputs_common.hash_versioned_inputs(INTEGRITY_SNAPSHOT_VERSION, inputs)
+
+
+def load_integrity_snapshot(snapshot_file: Path) -> IntegritySnapshot:
+    """Return the snapshot, or an empty one if there is none to trust.
+
+    Args:
+        snapshot_file: The snapshot file.
+
+    Returns:
+        The snapshot.
+
+    """
+    return inputs_common.load_versioned_json(
+        snapshot_file,
+        INTEGRITY_SNAPSHOT_VERSION,
+        _parse_snapshot,
+        IntegritySnapshot(),
+        "integrity snapshot",
+    )
+
+
+def _parse_snapshot(data: dict[str, Any]) -> IntegritySnapshot:
+    passed = data["passed"]
+    if not all(isinstance(h, str) for h in passed.values()):
+        msg = "a hash that is not a string"
+        raise TypeError(msg)
+
+    return IntegritySnapshot(dict(passed))
+
+
+def save_integrity_snapshot(snapshot_file: Path, snapshot: IntegritySnapshot) -> None:
+    """Write the snapshot, all at once.
+
+    Args:
+        snapshot_file: The snapshot file.
+        snapshot: The snapshot.
+
+    """
+    inputs_common.save_versioned_json(
+        snapshot_file, INTEGRITY_SNAPSHOT_VERSION, {"passed": dict(sorted(snapshot.passed.items()))}
+    )
@@ -0,0 +1,180 @@
+"""Building several titles at once, with one budget for the pages across all of them.
+
+A title used to be built only once the one before it had finished. Inside a title the
+pages go through a thread pool, but drawing a page is partly Pillow holding the GIL, and
+every title ends in a zip that one thread does alone, so a build spent much of its time
+with most of the cores idle. Running titles in their own processes gets past both: one
+title's pages render while another's zip is written.
+
+How many titles run at once is bounded, and so is how many pages are drawn at once
+across all of them: each page takes a slot from a semaphore the worker processes share.
+The page budget is what bounds the memory and the cores, whatever the titles' sizes; the
+title bound only keeps the zips and page setup from piling up. A title running alone
+can use the whole page budget.
+
+What each title leaves outside its own directory - the symlinks into the series and year
+trees, and the summary that records their timestamps - is done back in the parent, one
+title at a time in the order the titles were asked for, so a parallel build lays those
+down exactly as a serial one would. The log of the page work interleaves, as it must.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+    from multiprocessing.synchronize import BoundedSemaphore
+
+__all__ = [
+    "DEFAULT_MAX_CONCURRENT_TITLES",
+    "TitleBuildResult",
+    "build_titles",
+    "describe_throughput",
+    "get_default_page_budget",
+    "page_slot",
+]
+
+DEFAULT_MAX_CONCURRENT_TITLES = 3
+
+_BYTES_PER_MB = 1024 * 1024
+
+# The slots a worker's pages take, set by the pool's initializer. None outside a worker,
+# where a page takes no slot at all.
+_page_slots: BoundedSemaphore | None = None
+
+
+class TitleBuildResult(NamedTuple):
+    """What building one title came to, sent back from its worker.
+
+    `finish_args` is whatever the parent's finishing step needs from the build; the
+    scheduler passes it through untouched.
+    """
+
+    title: str
+    ret_code: int
+    num_pages: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+    finish_args: Any = None
+
+
+def get_default_page_budget() -> int:
+    """Return how many pages to draw at once across every title: one a core."""
+    return os.cpu_count() or 1
+
+
+def _init_title_worker(page_slots: BoundedSemaphore) -> None:
+    global _page_slots  # noqa: PLW0603
+    _page_slots = page_slots
+
+
+@contextlib.contextmanager
+def page_slot() -> Iterator[None]:
+    """Hold one of the page slots shared by every title being built, for one page."""
+    if _page_slots is None:
+        yield
+        return
+
+    with _page_slots:
+        yield
+
+
+def build_titles(
+    items: Sequence[tuple[str, Any]],
+    build_one: Callable[[Any], TitleBuildResult],
+    finish_one: Callable[[Any, TitleBuildResult], int],
+    *,
+    max_titles: int = DEFAULT_MAX_CONCURRENT_TITLES,
+    page_budget: int | None = None,
+) -> list[TitleBuildResult]:
+    """Build titles in worker processes, finishing each in the parent in the given order.
+
+    Every title is started as a worker comes free, but finished strictly in the order
+    of `items`: a title that is done waits for those before it. A worker that dies, or
+    raises past `build_one`, fails its own title and no other.
+
+    Args:
+        items: Each title, with what `build_one` is to be given for it.
+        build_one: Builds one title. Runs in a worker, so it and what it is given must
+            pickle.
+        finish_one: Finishes one built title in the parent, returning its exit code.
+            Only called for titles whose build succeeded.
+        max_titles: How many titles to build at once.
+        page_budget: How many pages to draw at once across every title. One a core if
+            not given.
+
+    Returns:
+        A result for every title, in the order of `items`.
+
+    """
+    page_budget = page_budget or get_default_page_budget()
+    page_slots = multiprocessing.BoundedSemaphore(page_budget)
+
+    logger.info(
+        f"Building {len(items)} title(s), {min(max_titles, len(items))} at a time,"
+        f" with {page_budget} page(s) drawn at once across them."
+    )
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_titles, initializer=_init_title_worker, initargs=(page_slots,)
+    ) as executor:
+        futures = [executor.submit(build_one, item) for _, item in items]
+
+        for (title, item), future in zip(items, futures, strict=True):
+            try:
+                result = future.result()
+            except Exception:  # noqa: BLE001
+                logger.exception(f'Building "{title}" failed in its worker:')
+                result = TitleBuildResult(title, ret_code=1)
+
+            if result.ret_code == 0:
+                result = result._replace(ret_code=finish_one(item, result))
+            results.append(result)
+
+    return results
+
+
+def describe_throughput(results: Sequence[TitleBuildResult], wall_seconds: float) -> list[str]:
+    """Return the lines of the closing throughput report.
+
+    Rates are over the wall clock of the whole run, which is what running titles at
+    once changes; the titles' own times, added up, are there to set against it.
+
+    Args:
+        results: Every title's result.
+        wall_seconds: How long the whole run took.
+
+    Returns:
+        The report, a line at a time.
+
+    """
+    built = [r for r in results if r.ret_code == 0]
+    num_pages = sum(r.num_pages for r in built)
+    mb_written = sum(r.bytes_written for r in built) / _BYTES_PER_MB
+    title_seconds = sum(r.seconds for r in built)
+    wall_seconds = max(wall_seconds, 1e-6)
+
+    lines = [
+        f"Built {len(built)} of {len(results)} title(s), {num_pages} page(s),"
+        f" {mb_written:.1f}MB written, in {wall_seconds:.1f}s.",
+        f"Throughput: {num_pages / wall_seconds:.2f} pages/s, {mb_written / wall_seconds:.2f}MB/s.",
+    ]
+    if built:
+        lines.append(
+            f"The titles took {title_seconds:.1f}s between them,"
+            f" {title_seconds / wall_seconds:.1f}x the wall clock."
+        )
+    failed = [r.title for r in results if r.ret_code != 0]
+    if failed:
+        lines.append(f"Failed: {', '.join(failed)}.")
+
+    return lines
+
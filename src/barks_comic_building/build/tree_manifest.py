@@ -0,0 +1,340 @@
+"""What every file under a build root holds, so two roots are compared without reopening.
+
+Comparing two builds used to be a ``diff -r`` over each comic's dir, then a ``compare``
+over every one of its pages, then a walk of its cbz - every byte of both roots read, and
+every page decoded twice, although nearly all of a rebuild comes out byte for byte the
+same. A `TreeManifest` is each file under a root and its digest: a blake2b of its bytes,
+and the CRC-32 a zip would record for it. Two roots are compared manifest to manifest,
+and only the files whose digests differ are diffed or decoded. The CRC is there for the
+archive: its members' CRCs are read straight from its central directory by
+`read_archive_crcs`, without inflating any of them, and checked against the files the
+build dir holds.
+
+The digests are taken over a thread pool - hashing gives up the GIL - and each is kept
+in a `FileDigestCache` against the file's inode, size and nanosecond mtime, so a
+comparison run again over a baseline that has not changed reads none of it. It is a
+`StatCache`, so it forgets the files deleted from under the roots it is asked about.
+
+A file that cannot be read does not stop the others being hashed: it is left out of its
+root's manifest and named in the manifest's `unreadable`, so that when many comics are
+compared in one pass, one bad file fails its own comic and no other.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import hashlib
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from barks_comic_building.restore.stat_cache import StatCache, get_file_signature
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = [
+    "FILE_DIGEST_CACHE_FILENAME",
+    "FileDigest",
+    "FileDigestCache",
+    "ManifestDiff",
+    "TreeManifest",
+    "diff_manifests",
+    "get_default_file_digest_cache_file",
+    "get_file_digest",
+    "get_file_digests",
+    "get_tree_manifest",
+    "get_tree_manifests",
+    "read_archive_crcs",
+]
+
+FILE_DIGEST_CACHE_FILENAME = "file-digest-cache.json"
+
+# Bumped when what a digest is changes, so that none taken the old way is trusted.
+_FILE_DIGEST_CACHE_VERSION = 1
+
+_DIGEST_SIZE = 16
+_READ_SIZE = 1 << 20
+
+
+def get_default_file_digest_cache_file() -> Path:
+    """Return where the file digest cache lives unless told otherwise.
+
+    Beside the other caches, out of the trees being compared.
+
+    Returns:
+        The default cache path.
+
+    """
+    from barks_fantagraphics.comics_consts import BARKS_ROOT_DIR  # noqa: PLC0415
+
+    return Path(BARKS_ROOT_DIR) / FILE_DIGEST_CACHE_FILENAME
+
+
+class FileDigest(NamedTuple):
+    """What a file holds, as far as telling it from another goes."""
+
+    digest: str
+    """A blake2b of its bytes, in hex."""
+    crc: int
+    """Its CRC-32, as a zip records it for a member."""
+    size: int
+
+
+def get_file_digest(file: Path) -> FileDigest:
+    """Return a file's digest, from one read of it.
+
+    Args:
+        file: The file.
+
+    Returns:
+        Its digest.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    """
+    blake = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    crc = 0
+    size = 0
+    with file.open("rb") as f:
+        while chunk := f.read(_READ_SIZE):
+            blake.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+
+    return FileDigest(blake.hexdigest(), crc, size)
+
+
+class FileDigestCache(StatCache):
+    """Each file's digest, kept against the signature it was taken under.
+
+    A `StatCache`: deleting it costs nothing but one full read of the trees.
+    """
+
+    VERSION = _FILE_DIGEST_CACHE_VERSION
+    NAME = "file digest cache"
+
+    @property
+    def num_hashed(self) -> int:
+        """How many files were read for their digests, rather than answered from the cache."""
+        return self.num_recorded
+
+    def get_digest(self, file: Path, signature: list[int]) -> FileDigest | None:
+        """Return a file's digest, if it was taken of the file as it is now.
+
+        Args:
+            file: The file.
+            signature: Its signature now, from `get_file_signature`.
+
+        Returns:
+            The digest, or None if the file has to be read.
+
+        """
+        try:
+            return FileDigest(*self.get_entry(file, signature))
+        except KeyError:
+            return None
+
+    def record(self, file: Path, signature: list[int], digest: FileDigest) -> None:
+        """Keep a file's digest against the signature it was taken under.
+
+        Args:
+            file: The file.
+            signature: Its signature as it was before it was read, so that a file
+                written while it was being read is read again next time.
+            digest: Its digest.
+
+        """
+        self.record_entry(file, signature, list(digest))
+
+
+def get_file_digests(
+    files: Iterable[Path],
+    cache: FileDigestCache | None = None,
+    num_workers: int | None = None,
+    unreadable: dict[Path, str] | None = None,
+) -> dict[Path, FileDigest]:
+    """Return the digests of files, reading only those the cache cannot answer for.
+
+    Args:
+        files: The files.
+        cache: Where digests are kept between runs. None to read every file.
+        num_workers: How many threads to read in. None for one a CPU.
+        unreadable: Where to put each file that cannot be read, and why, leaving it out
+            of the digests. None to raise on the first.
+
+    Returns:
+        Each file's digest, in the order of `files`.
+
+    Raises:
+        OSError: If a file cannot be read, and there is no `unreadable` to put it in.
+
+    """
+    cache = FileDigestCache() if cache is None else cache
+
+    def set_unreadable(file: Path, exc: OSError) -> None:
+        if unreadable is None:
+            raise exc
+        unreadable[file] = str(exc)
+
+    files = list(files)
+    digests: dict[Path, FileDigest] = {}
+    to_hash: list[tuple[Path, list[int]]] = []
+    for file in files:
+        try:
+            signature = get_file_signature(file.stat())
+        except OSError as exc:
+            set_unreadable(file, exc)
+            continue
+        digest = cache.get_digest(file, signature)
+        if digest is None:
+            to_hash.append((file, signature))
+        else:
+            digests[file] = digest
+
+    num_workers = num_workers or os.process_cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+        hashed = executor.map(_try_get_file_digest, [file for file, _signature in to_hash])
+        for (file, signature), digest in zip(to_hash, hashed, strict=True):
+            if isinstance(digest, OSError):
+                set_unreadable(file, digest)
+                continue
+            cache.record(file, signature, digest)
+            digests[file] = digest
+
+    return {file: digests[file] for file in files if file in digests}
+
+
+def _try_get_file_digest(file: Path) -> FileDigest | OSError:
+    try:
+        return get_file_digest(file)
+    except OSError as exc:
+        return exc
+
+
+class TreeManifest(NamedTuple):
+    """Each file under a root, by its posix path relative to the root, and its digest."""
+
+    root: Path
+    files: dict[str, FileDigest]
+    unreadable: dict[str, str]
+    """Each file or directory under the root that could not be read, and why."""
+
+
+def get_tree_manifest(
+    root: Path, cache: FileDigestCache | None = None, num_workers: int | None = None
+) -> TreeManifest:
+    """Return the manifest of every file under a root.
+
+    Symlinks to files are followed, as a diff of the tree follows them; symlinked dirs
+    are not descended into.
+
+    Args:
+        root: The root.
+        cache: Where digests are kept between runs. None to read every file.
+        num_workers: How many threads to read in. None for one a CPU.
+
+    Returns:
+        The manifest. A file that cannot be read is in its `unreadable`, not its `files`.
+
+    """
+    return get_tree_manifests([root], cache, num_workers)[0]
+
+
+def get_tree_manifests(
+    roots: Iterable[Path], cache: FileDigestCache | None = None, num_workers: int | None = None
+) -> list[TreeManifest]:
+    """Return the manifests of several roots, their files all read over the one pool.
+
+    Args:
+        roots: The roots.
+        cache: Where digests are kept between runs. None to read every file.
+        num_workers: How many threads to read in. None for one a CPU.
+
+    Returns:
+        Each root's manifest, as `get_tree_manifest` takes it, in the order of `roots`. A
+        file that cannot be read fails only its own root's, in its `unreadable`.
+
+    """
+    unreadable: dict[Path, str] = {}
+    files_by_root = {root: _get_files_under(root, unreadable) for root in roots}
+    if cache is not None:
+        cache.mark_swept(files_by_root)
+    digests = get_file_digests(
+        (file for files in files_by_root.values() for file in files),
+        cache,
+        num_workers,
+        unreadable,
+    )
+
+    return [
+        TreeManifest(
+            root,
+            {file.relative_to(root).as_posix(): digests[file] for file in files if file in digests},
+            {
+                path.relative_to(root).as_posix(): why
+                for path, why in sorted(unreadable.items())
+                if path.is_relative_to(root)
+            },
+        )
+        for root, files in files_by_root.items()
+    ]
+
+
+def _get_files_under(root: Path, unreadable: dict[Path, str]) -> list[Path]:
+    def set_unreadable(exc: OSError) -> None:
+        unreadable[Path(exc.filename)] = str(exc)
+
+    return sorted(
+        Path(dir_path, name)
+        for dir_path, _dir_names, file_names in os.walk(root, onerror=set_unreadable)
+        for name in file_names
+        if Path(dir_path, name).is_file()
+    )
+
+
+class ManifestDiff(NamedTuple):
+    """How two manifests differ, each by path relative to its root, and sorted."""
+
+    only_in_1: list[str]
+    only_in_2: list[str]
+    differing: list[str]
+    """The paths in both whose contents differ."""
+
+
+def diff_manifests(manifest1: TreeManifest, manifest2: TreeManifest) -> ManifestDiff:
+    """Return the files only one manifest has, and the files whose contents differ."""
+    files1, files2 = manifest1.files, manifest2.files
+    return ManifestDiff(
+        sorted(files1.keys() - files2.keys()),
+        sorted(files2.keys() - files1.keys()),
+        sorted(
+            name
+            for name in files1.keys() & files2.keys()
+            if files1[name].digest != files2[name].digest
+        ),
+    )
+
+
+def read_archive_crcs(zip_path: Path) -> dict[str, int]:
+    """Return the CRC-32 of each file in an archive, from its central directory.
+
+    Nothing is inflated: the central directory records each member's CRC as it was when
+    the member was written, which is all a comparison with the files it was made from
+    needs. A file that is not a zip at all raises `zipfile.BadZipFile`.
+
+    Args:
+        zip_path: The archive.
+
+    Returns:
+        Each member's CRC, by its name in the archive.
+
+    Raises:
+        OSError: If the archive cannot be read.
+
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        return {info.filename: info.CRC for info in archive.infolist() if not info.is_dir()}
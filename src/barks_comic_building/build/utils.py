@@ -24,11 +24,12 @@ from typing import TYPE_CHECKING
 from barks_fantagraphics import panel_bounding
 from barks_fantagraphics.comics_utils import (
     get_abbrev_path,
-    get_timestamp,
     get_timestamp_as_str,
     get_timestamp_str,
 )
 
+from barks_comic_building.build import fs_index
+
 if TYPE_CHECKING:
     from collections.abc import Iterator, Sequence
     from pathlib import Path
@@ -309,10 +310,10 @@ def check_zip_freshness(
         The verdict. A missing zip is reported missing and nothing else.
 
     """
-    if not zip_file.is_file():
+    if not fs_index.is_file(zip_file):
         return ZipOutOfDateErrors(file=zip_file, missing=True)
 
-    timestamp = get_timestamp(zip_file)
+    timestamp = fs_index.get_timestamp(zip_file)
 
     return ZipOutOfDateErrors(
         file=zip_file,
@@ -333,8 +334,9 @@ def check_zip_symlink_freshness(
     `return` at the first missing one, so a missing series symlink hid the year
     symlink's state entirely and two runs were needed to see both faults.
 
-    `get_timestamp` uses lstat for a symlink, so a *dangling* link still grades rather
-    than raising - it is the link's own age that matters here, not its target's.
+    `fs_index.get_timestamp` uses lstat for a symlink, as `get_timestamp` does, so a
+    *dangling* link still grades rather than raising - it is the link's own age that
+    matters here, not its target's.
 
     Args:
         symlink: The symlink to grade.
@@ -345,10 +347,10 @@ def check_zip_symlink_freshness(
         The verdict. A missing symlink is reported missing and nothing else.
 
     """
-    if not symlink.is_symlink():
+    if not fs_index.is_symlink(symlink):
         return ZipSymlinkOutOfDateErrors(symlink=symlink, missing=True)
 
-    timestamp = get_timestamp(symlink)
+    timestamp = fs_index.get_timestamp(symlink)
 
     # A missing zip is no reference to compare against - its absence is already reported.
     zip_reference = (
@@ -1,33 +1,248 @@
+"""Writing a built comic's cbz, and linking it into the series and year trees.
+
+The cbz used to be made by `shutil.make_archive`, which deflates every member. A cbz is
+almost all jpgs, which deflate by a percent or two at the cost of the CPU time to try,
+and the archive could only be started once every page was on disk, to be read back in
+a second pass over the directory. `CbzWriter` stores the images as they are, deflating
+only the small text and json files beside them, and takes each page's bytes as it is
+drawn rather than reading it back.
+
+The members go in a fixed order - the pages, by name, then the files beside them, by
+name - whatever order the pages are drawn in, so two builds of the same pages make the
+same archive. A "page" is any file in a directory below the dest directory, so a cbz
+streamed as the pages are drawn holds the same members as one zipped from disk. The
+archive is written to a temporary file beside the cbz and renamed over it once it is
+complete, so a build killed part way leaves the old cbz in place.
+"""
+
 from __future__ import annotations
 
 import os
-import shutil
+import threading
+import time
+import zipfile
 from typing import TYPE_CHECKING
 
 from barks_fantagraphics.comics_utils import get_relpath
 from loguru import logger
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
     from pathlib import Path
+    from types import TracebackType
+    from typing import Self
 
     from barks_fantagraphics.comic_book import ComicBook
 
+# Members already compressed, stored as they are. Deflating a jpg saves a percent or two.
+_STORED_SUFFIXES = frozenset({".jpg", ".jpeg", ".png"})
+
+# The mode a member given as bytes is recorded with, as a file written here would have.
+_MEMBER_MODE = 0o100644
+
+
+class CbzWriter:
+    """A cbz written a member at a time, pages in order whatever order they arrive in.
+
+    The pages are named up front. Each may then be added from any thread, as bytes or as
+    a file already on disk, and is written as soon as every page before it has been; a
+    page that arrives early waits in memory until then. Pages drawn on a thread pool
+    come back close to in order, so few wait for long.
+
+    Used as a context manager: leaving it by an exception before `finish` removes the
+    temporary archive, and the old cbz, if there was one, is left as it was.
+    """
+
+    def __init__(self, zip_file: Path, page_arcnames: Sequence[str]) -> None:
+        """Start a new archive, to replace `zip_file` when it is finished.
+
+        Args:
+            zip_file: The cbz to write.
+            page_arcnames: Every page's name in the archive, in the order to write them.
+
+        """
+        self._zip_file = zip_file
+        self._temp_file = zip_file.with_name(zip_file.name + ".tmp")
+        self._page_arcnames = list(page_arcnames)
+        self._next_page = 0
+        self._waiting: dict[str, bytes | Path] = {}
+        self._mtimes: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        zip_file.parent.mkdir(parents=True, exist_ok=True)
+        self._archive: zipfile.ZipFile | None = zipfile.ZipFile(self._temp_file, "w")
+
+    @property
+    def page_arcnames(self) -> list[str]:
+        """Every page's name in the archive, in the order they are written."""
+        return list(self._page_arcnames)
+
+    def add_page(self, arcname: str, data: bytes, mtime: float) -> None:
+        """Add a page's bytes, as it comes out of being drawn.
+
+        Args:
+            arcname: The page's name in the archive, one of those given up front.
+            data: The page file's bytes.
+            mtime: The page file's mtime, for the member's date.
+
+        """
+        with self._lock:
+            self._waiting[arcname] = data
+            self._mtimes[arcname] = mtime
+            self._write_waiting_pages()
+
+    def add_page_file(self, arcname: str, file: Path) -> None:
+        """Add a page that is already on disk, to be read when its turn comes.
+
+        Args:
+            arcname: The page's name in the archive, one of those given up front.
+            file: The page file.
+
+        """
+        with self._lock:
+            self._waiting[arcname] = file
+            self._write_waiting_pages()
+
+    def finish(self, other_files: Iterable[tuple[str, Path]]) -> None:
+        """Write the files beside the pages, and put the archive in place of the old.
+
+        Args:
+            other_files: The other members, as their names in the archive and their
+                files. They are written in name order.
+
+        Raises:
+            RuntimeError: If a page was never added.
+
+        """
+        assert self._archive is not None
+
+        with self._lock:
+            if self._next_page < len(self._page_arcnames):
+                not_yet = self._page_arcnames[self._next_page :]
+                missing = [name for name in not_yet if name not in self._waiting]
+                msg = f'Pages never added to "{self._zip_file}": {", ".join(missing)}.'
+                raise RuntimeError(msg)
+
+            for arcname, file in sorted(other_files):
+                self._archive.write(file, arcname, _get_compress_type(arcname))
+
+            self._archive.close()
+            self._archive = None
+
+        self._temp_file.replace(self._zip_file)
+
+    def abort(self) -> None:
+        """Give up on the archive, removing what has been written of it."""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        self._temp_file.unlink(missing_ok=True)
+
+    def _write_waiting_pages(self) -> None:
+        assert self._archive is not None
+
+        while self._next_page < len(self._page_arcnames):
+            arcname = self._page_arcnames[self._next_page]
+            page = self._waiting.pop(arcname, None)
+            if page is None:
+                return
+
+            if isinstance(page, bytes):
+                info = zipfile.ZipInfo(arcname, time.localtime(self._mtimes.pop(arcname))[:6])
+                info.compress_type = _get_compress_type(arcname)
+                info.external_attr = _MEMBER_MODE << 16
+                self._archive.writestr(info, page)
+            else:
+                self._archive.write(page, arcname, _get_compress_type(arcname))
+            self._next_page += 1
+
+    def __enter__(self) -> Self:
+        """Return the writer."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        _exc: BaseException | None,
+        _tb: TracebackType | None,
+    ) -> None:
+        """Remove the temporary archive if it was not finished."""
+        if exc_type is not None or self._archive is not None:
+            self.abort()
+
+
+def _get_compress_type(arcname: str) -> int:
+    suffix = os.path.splitext(arcname)[1].lower()  # noqa: PTH122
+    return zipfile.ZIP_STORED if suffix in _STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+
+def get_cbz_members(dest_dir: Path) -> tuple[list[tuple[str, Path]], list[tuple[str, Path]]]:
+    """Return what goes in a comic's cbz: the pages, and the files beside them.
+
+    The pages are every file in a directory below `dest_dir`, and the rest are the files
+    directly in it, each as its name in the archive and its file, in name order.
+
+    Args:
+        dest_dir: The comic's dest directory.
+
+    Returns:
+        The pages, and the other files.
+
+    """
+    files = sorted(
+        (file.relative_to(dest_dir).as_posix(), file)
+        for file in dest_dir.rglob("*")
+        if file.is_file()
+    )
+
+    pages = [(arcname, file) for arcname, file in files if "/" in arcname]
+    others = [(arcname, file) for arcname, file in files if "/" not in arcname]
+
+    return pages, others
+
+
+def start_cbz(dest_dir: Path, zip_file: Path, to_draw: Iterable[str]) -> CbzWriter:
+    """Start a comic's cbz, for the pages still to be drawn to be added as they come.
+
+    Every other page - every file in a directory below `dest_dir` - is added from disk,
+    so once the drawn pages are in, the cbz holds what `zip_comic_book` would have put in
+    it, in the same order.
+
+    Args:
+        dest_dir: The comic's dest directory.
+        zip_file: The cbz to write.
+        to_draw: The names in the archive of the pages still to be drawn.
+
+    Returns:
+        The writer, with the pages already on disk added.
+
+    """
+    drawing = set(to_draw)
+    pages, _ = get_cbz_members(dest_dir)
+    on_disk = [(arcname, file) for arcname, file in pages if arcname not in drawing]
+
+    writer = CbzWriter(zip_file, sorted(drawing.union(arcname for arcname, _ in on_disk)))
+    for arcname, file in on_disk:
+        writer.add_page_file(arcname, file)
+
+    return writer
+
 
 def zip_comic_book(comic: ComicBook) -> None:
+    """Write a comic's cbz from what is on disk in its dest directory."""
     logger.info(
         f'Zipping directory "{get_relpath(comic.get_dest_dir())}" to'
         f' "{get_relpath(comic.get_dest_comic_zip())}".',
     )
 
     comic.get_dest_zip_root_dir().mkdir(parents=True, exist_ok=True)
-    temp_zip_file = comic.get_dest_dir().with_name(f"{comic.get_dest_dir().name}.zip")
 
-    shutil.make_archive(str(comic.get_dest_dir()), "zip", str(comic.get_dest_dir()))
-    if not temp_zip_file.is_file():
-        msg = f'Could not create temporary zip file "{temp_zip_file}".'
-        raise RuntimeError(msg)
+    pages, others = get_cbz_members(comic.get_dest_dir())
+    with CbzWriter(comic.get_dest_comic_zip(), [arcname for arcname, _ in pages]) as writer:
+        for arcname, file in pages:
+            writer.add_page_file(arcname, file)
+        writer.finish(others)
 
-    temp_zip_file.replace(comic.get_dest_comic_zip())
     if not comic.get_dest_comic_zip().is_file():
         msg = f'Could not create final comic zip "{comic.get_dest_comic_zip()}".'
         raise RuntimeError(msg)
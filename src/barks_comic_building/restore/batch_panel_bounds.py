@@ -1,6 +1,27 @@
+"""Finding the panels on every restorable page, with Kumiko, for a whole run at once.
+
+Kumiko takes seconds a page, so the run keeps every core busy from its first page to its
+last: one process pool for the whole run rather than one per title, which used to leave
+the pool draining down to a single page at the end of every title before the next could
+start. Each page's result is collected as it comes back, so a page that fails is counted
+and named in the summary instead of vanishing inside a worker.
+
+A page is only worth running again if something Kumiko reads has changed. What it read
+is recorded as a hash - the page's content, its hand-drawn override if it has one, and
+`PANEL_BOUNDS_VERSION` - in a file beside the ledgers, and a page whose hash still
+matches is skipped. So a re-run after some pages were restored again redoes exactly
+those pages, and a re-run over an unchanged volume does nothing but read it. The hashes
+are kept out of the panel segments tree because the integrity check expects nothing
+there but the pages.
+"""
+
 import concurrent.futures
+import hashlib
 import time
+from collections import Counter
+from enum import StrEnum
 from pathlib import Path
+from typing import NamedTuple
 
 import typer
 from barks_fantagraphics.comics_consts import RESTORABLE_PAGE_TYPES
@@ -11,11 +32,62 @@ from comic_utils.panel_bounding_box_processor import BoundingBoxProcessor
 from loguru import logger
 
 from barks_comic_building.cli_setup import get_comic_titles, init_logging
+from barks_comic_building.restore.panel_bounds_inputs import (
+    get_default_panel_bounds_inputs_file,
+    load_panel_bounds_inputs,
+    save_panel_bounds_inputs,
+)
+from barks_comic_building.restore.panel_detect import (
+    DEFAULT_PANEL_DETECT_MODE,
+    PanelDetectMode,
+    get_panels_segment_info,
+)
+from barks_comic_building.restore.report_format import format_duration
 
 APP_LOGGING_NAME = "bpan"
 
 COMIC_BUILDING_DIR = Path(__file__).parent.parent.parent.parent
 
+# Bumped when Kumiko, or the settings it is run with, change in a way that moves the
+# panels it finds. Part of every page's inputs hash, so bumping it remakes every page.
+PANEL_BOUNDS_VERSION = 1
+
+# How often progress is logged while pages are coming back.
+_PROGRESS_INTERVAL_SECONDS = 60
+
+
+class PanelBoundsOutcome(StrEnum):
+    """What became of one page."""
+
+    MADE = "made"
+    """Kumiko was run and the panel segments written."""
+
+    UNCHANGED = "unchanged"
+    """Nothing Kumiko reads has changed since its panel segments were made. Skipped."""
+
+    LINKED = "linked"
+    """The page belongs to another volume. Skipped, for that volume's run to make."""
+
+    FAILED = "failed"
+    """Something went wrong. Logged where it happened, and named in the summary."""
+
+
+class PageResult(NamedTuple):
+    """What a worker sends back for one page."""
+
+    outcome: PanelBoundsOutcome
+    inputs_hash: str | None = None
+    """The hash of what the panel segments now on disk were made from, if known."""
+
+
+class PanelBoundsJob(NamedTuple):
+    """One page to find the panels of, with what `get_page_panel_bounds` needs for it."""
+
+    bounding_box_processor: BoundingBoxProcessor
+    srce_panels_bounds_override_dir: Path
+    srce_file: Path
+    dest_file: Path
+
 
 def panel_bounds(
     comics_database: ComicsDatabase,
@@ -23,60 +95,265 @@ def panel_bounds(
     work_dir: Path,
     *,
     force: bool,
-) -> None:
+    inputs_file: Path | None = None,
+    detect_mode: PanelDetectMode = DEFAULT_PANEL_DETECT_MODE,
+) -> Counter[PanelBoundsOutcome]:
     """Make the panel bounds file for every restorable page of each title.
 
     Args:
         comics_database: The comics database.
         title_list: The titles to process.
         work_dir: Where Kumiko's intermediate files go.
-        force: Remake panel bounds files that already exist.
+        force: Remake panel bounds files even when nothing they were made from changed.
+        inputs_file: Where each page's inputs hash is recorded. None records nothing,
+            so that every page with a panel bounds file is treated as made before the
+            hashes were kept.
+        detect_mode: What size of copy of each page to find its panels in.
+
+    Returns:
+        How many pages came to each outcome.
 
     """
     start = time.time()
 
-    num_page_files = 0
     for title in title_list:
-        logger.info(f'Getting panel bounds for all pages in "{title}"...')
+        _make_title_dirs(comics_database, title, work_dir)
+    jobs = [
+        job for title in title_list for job in get_title_jobs(comics_database, title, work_dir)
+    ]
 
-        title_work_dir = work_dir / title
-        title_work_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Getting panel bounds for {len(jobs)} page(s) in {len(title_list)} title(s).")
 
-        title_vol_dir = comics_database.get_fantagraphics_panel_segments_volume_dir(
-            comics_database.get_fanta_volume_int(title)
-        )
-        title_vol_dir.mkdir(parents=True, exist_ok=True)
+    outcomes, failed = run_panel_bounds_jobs(
+        jobs, force=force, inputs_file=inputs_file, detect_mode=detect_mode
+    )
 
-        bounding_box_processor = BoundingBoxProcessor(title_work_dir, COMIC_BUILDING_DIR)
+    _log_summary(outcomes, failed, time.time() - start)
 
-        comic = comics_database.get_comic_book(title)
+    return outcomes
 
-        srce_files = comic.get_final_srce_story_files(RESTORABLE_PAGE_TYPES)
-        dest_files = comic.get_srce_panel_segments_files(RESTORABLE_PAGE_TYPES)
 
-        if not comic.get_srce_original_fixes_image_dir().is_dir():
-            msg = (
-                f"Could not find panel bounds directory "
-                f'"{comic.get_srce_original_fixes_image_dir()}".'
-            )
-            raise FileNotFoundError(msg)
-        # TODO(glk): Put this in barks_fantagraphics
-        srce_panels_bounds_override_dir = comic.get_srce_original_fixes_image_dir() / "bounded"
+def run_panel_bounds_jobs(
+    jobs: list[PanelBoundsJob],
+    *,
+    force: bool,
+    inputs_file: Path | None = None,
+    detect_mode: PanelDetectMode = DEFAULT_PANEL_DETECT_MODE,
+) -> tuple[Counter[PanelBoundsOutcome], list[Path]]:
+    """Run every job on one process pool, counting each page's outcome as it comes back.
+
+    Args:
+        jobs: The pages.
+        force: Remake panel bounds files even when nothing they were made from changed.
+        inputs_file: Where each page's inputs hash is recorded, as for `panel_bounds`.
+        detect_mode: What size of copy of each page to find its panels in.
 
+    Returns:
+        How many pages came to each outcome, and the source file of each that failed.
+
+    """
+    start = time.time()
+    inputs = load_panel_bounds_inputs(inputs_file)
+    outcomes: Counter[PanelBoundsOutcome] = Counter()
+    failed: list[Path] = []
+
+    try:
         with concurrent.futures.ProcessPoolExecutor() as executor:
-            for (srce_file, _), dest_file in zip(srce_files, dest_files, strict=True):
+            futures = {
                 executor.submit(
                     get_page_panel_bounds,
-                    bounding_box_processor,
-                    srce_panels_bounds_override_dir,
-                    srce_file,
-                    dest_file,
+                    *job,
                     force=force,
-                )
+                    recorded_hash=inputs.get(str(job.dest_file)),
+                    detect_mode=detect_mode,
+                ): job
+                for job in jobs
+            }
+
+            last_logged = start
+            for num_done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                job = futures[future]
+                result = _get_page_result(future, job)
+                outcomes[result.outcome] += 1
+                if result.outcome is PanelBoundsOutcome.FAILED:
+                    failed.append(job.srce_file)
+                if result.inputs_hash is not None:
+                    inputs[str(job.dest_file)] = result.inputs_hash
+
+                if time.time() - last_logged >= _PROGRESS_INTERVAL_SECONDS:
+                    _log_progress(num_done, len(jobs), outcomes, start)
+                    last_logged = time.time()
+    finally:
+        # Whatever was made before a failure or an interrupt is recorded, so that the
+        # next run does not make it again.
+        save_panel_bounds_inputs(inputs_file, inputs)
+
+    return outcomes, failed
+
+
+def get_title_work_dir(work_dir: Path, title: str) -> Path:
+    """Return where Kumiko's intermediate files for a title's pages go.
+
+    Args:
+        work_dir: The run's work dir.
+        title: The title.
+
+    Returns:
+        The title's work dir, which is not made here.
+
+    """
+    return work_dir / title
+
+
+def _make_title_dirs(comics_database: ComicsDatabase, title: str, work_dir: Path) -> None:
+    get_title_work_dir(work_dir, title).mkdir(parents=True, exist_ok=True)
+    comics_database.get_fantagraphics_panel_segments_volume_dir(
+        comics_database.get_fanta_volume_int(title)
+    ).mkdir(parents=True, exist_ok=True)
+
+
+def get_title_jobs(
+    comics_database: ComicsDatabase, title: str, work_dir: Path
+) -> list[PanelBoundsJob]:
+    """Return a job for each restorable page of a title.
+
+    Nothing is made or written: a run makes the dirs its jobs write to before it starts
+    them, and anything else looking at the pages - a benchmark, say - only reads.
+
+    Args:
+        comics_database: The comics database.
+        title: The title.
+        work_dir: The run's work dir, under which the title's goes.
+
+    Returns:
+        The title's jobs, in page order.
+
+    Raises:
+        FileNotFoundError: If the title has no dir of original fixes.
+
+    """
+    bounding_box_processor = BoundingBoxProcessor(
+        get_title_work_dir(work_dir, title), COMIC_BUILDING_DIR
+    )
+
+    comic = comics_database.get_comic_book(title)
+
+    srce_files = comic.get_final_srce_story_files(RESTORABLE_PAGE_TYPES)
+    dest_files = comic.get_srce_panel_segments_files(RESTORABLE_PAGE_TYPES)
+
+    if not comic.get_srce_original_fixes_image_dir().is_dir():
+        msg = (
+            f"Could not find panel bounds directory "
+            f'"{comic.get_srce_original_fixes_image_dir()}".'
+        )
+        raise FileNotFoundError(msg)
+    # TODO(glk): Put this in barks_fantagraphics
+    srce_panels_bounds_override_dir = comic.get_srce_original_fixes_image_dir() / "bounded"
+
+    return [
+        PanelBoundsJob(
+            bounding_box_processor, srce_panels_bounds_override_dir, srce_file, dest_file
+        )
+        for (srce_file, _), dest_file in zip(srce_files, dest_files, strict=True)
+    ]
 
-        num_page_files += len(srce_files)
 
-    logger.info(f"\nTime taken to process all {num_page_files} files: {int(time.time() - start)}s.")
+def _get_page_result(
+    future: concurrent.futures.Future[PageResult], job: PanelBoundsJob
+) -> PageResult:
+    """Return a page's result, or a failure if its worker never sent one back."""
+    try:
+        return future.result()
+    except Exception:  # noqa: BLE001
+        # The page logs its own errors. This is the worker dying under it, or its
+        # arguments not making it across, neither of which it could report.
+        logger.exception(f'Panel bounds worker failed on "{get_abbrev_path(job.srce_file)}": ')
+        return PageResult(PanelBoundsOutcome.FAILED)
+
+
+def _log_progress(
+    num_done: int, num_jobs: int, outcomes: Counter[PanelBoundsOutcome], run_start: float
+) -> None:
+    """Log how far through the run is, and how fast pages are being made."""
+    elapsed = time.time() - run_start
+    remaining = num_jobs - num_done
+    estimate = (elapsed / num_done) * remaining if num_done else 0.0
+    pages_per_minute = outcomes[PanelBoundsOutcome.MADE] / elapsed * 60 if elapsed else 0.0
+
+    logger.info(
+        f"\nProgress: {num_done}/{num_jobs} page(s) ({num_done / num_jobs:.1%})"
+        f" - {outcomes[PanelBoundsOutcome.MADE]} made at {pages_per_minute:.1f} a minute,"
+        f" elapsed {format_duration(elapsed)}, around {format_duration(estimate)} to go.",
+    )
+
+
+def _log_summary(
+    outcomes: Counter[PanelBoundsOutcome], failed: list[Path], elapsed: float
+) -> None:
+    counts = ", ".join(f"{outcomes[outcome]} {outcome}" for outcome in PanelBoundsOutcome)
+    logger.info(f"\nTime taken to process {outcomes.total()} page(s): {int(elapsed)}s ({counts}).")
+
+    if failed:
+        logger.error(f"{len(failed)} page(s) failed:")
+        for srce_file in sorted(failed):
+            logger.error(f'    "{get_abbrev_path(srce_file)}"')
+
+
+def get_inputs_hash(
+    srce_file: Path,
+    srce_panels_bounds_override_dir: Path,
+    detect_mode: PanelDetectMode = DEFAULT_PANEL_DETECT_MODE,
+) -> str:
+    """Return a hash of everything a page's panel bounds are made from.
+
+    The page itself, byte for byte, and any hand-drawn override for it - found by its
+    page number, whatever its extension - along with `PANEL_BOUNDS_VERSION` and the
+    size of copy the panels were found in.
+
+    Args:
+        srce_file: The page.
+        srce_panels_bounds_override_dir: Where hand-drawn panel bounds fixes live.
+        detect_mode: What size of copy the panels are found in.
+
+    Returns:
+        The hash, as hex.
+
+    """
+    digest = hashlib.sha256(f"panel-bounds-{PANEL_BOUNDS_VERSION}-{detect_mode}".encode())
+    for file in [srce_file, *get_override_files(srce_file, srce_panels_bounds_override_dir)]:
+        digest.update(b"\0" + file.name.encode() + b"\0")
+        with file.open("rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+
+    return digest.hexdigest()
+
+
+def get_override_files(srce_file: Path, srce_panels_bounds_override_dir: Path) -> list[Path]:
+    """Return a page's hand-drawn panel bounds overrides, found by its page number.
+
+    Args:
+        srce_file: The page.
+        srce_panels_bounds_override_dir: Where hand-drawn panel bounds fixes live.
+
+    Returns:
+        The override files, whatever their extension, sorted. Empty if there are none.
+
+    """
+    if not srce_panels_bounds_override_dir.is_dir():
+        return []
+
+    return sorted(
+        f for f in srce_panels_bounds_override_dir.iterdir() if f.stem == srce_file.stem
+    )
+
+
+def _is_older_than_inputs(
+    dest_file: Path, srce_file: Path, srce_panels_bounds_override_dir: Path
+) -> bool:
+    dest_mtime = dest_file.stat().st_mtime_ns
+    inputs = [srce_file, *get_override_files(srce_file, srce_panels_bounds_override_dir)]
+
+    return any(dest_mtime < file.stat().st_mtime_ns for file in inputs)
 
 
 def get_page_panel_bounds(
@@ -86,15 +363,28 @@ def get_page_panel_bounds(
     dest_file: Path,
     *,
     force: bool,
-) -> None:
-    """Make one page's panel bounds file.
+    recorded_hash: str | None = None,
+    detect_mode: PanelDetectMode = DEFAULT_PANEL_DETECT_MODE,
+) -> PageResult:
+    """Make one page's panel bounds file, unless nothing it is made from has changed.
+
+    An existing file is kept if `recorded_hash` says it was made from the page and
+    override as they are now. One with no hash recorded was made before the hashes were
+    kept, and is trusted the way every existing file used to be - as long as it is no
+    older than what it was made from, which is the same test the integrity check makes.
 
     Args:
         bounding_box_processor: The Kumiko wrapper.
         srce_panels_bounds_override_dir: Where hand-drawn panel bounds fixes live.
         srce_file: The page to find panels in.
         dest_file: Where to write the panel segments.
-        force: Remake the panel bounds file if it already exists.
+        force: Remake the panel bounds file whatever it was made from.
+        recorded_hash: The inputs hash recorded when the existing file was made, if any.
+        detect_mode: What size of copy of the page to find its panels in.
+
+    Returns:
+        What became of the page, and the hash of what its panel bounds file is now made
+        from, for the caller to record.
 
     """
     # noinspection PyBroadException
@@ -123,15 +413,18 @@ def get_page_panel_bounds(
                 f' "{get_abbrev_path(linked_file)}".'
                 f" Run the panel bounds for the volume it lives in instead."
             )
-            return
+            return PageResult(PanelBoundsOutcome.LINKED)
 
         if not srce_file.is_file():
             msg = f'Could not find srce file: "{srce_file}".'
             raise FileNotFoundError(msg)  # noqa: TRY301
+
+        inputs_hash = get_inputs_hash(srce_file, srce_panels_bounds_override_dir, detect_mode)
         if dest_file.is_file():
-            if not force:
-                logger.warning(f'Dest file exists - skipping: "{get_abbrev_path(dest_file)}".')
-                return
+            if not force and _is_unchanged(
+                srce_panels_bounds_override_dir, srce_file, dest_file, recorded_hash, inputs_hash
+            ):
+                return PageResult(PanelBoundsOutcome.UNCHANGED, inputs_hash)
             logger.info(f'Dest file exists - remaking: "{get_abbrev_path(dest_file)}".')
 
         logger.info(
@@ -139,16 +432,49 @@ def get_page_panel_bounds(
             f' - saving to dest file "{get_abbrev_path(dest_file)}".'
         )
 
-        segment_info = bounding_box_processor.get_panels_segment_info_from_kumiko(
-            srce_file,
+        segment_info = get_panels_segment_info(
+            bounding_box_processor,
             srce_panels_bounds_override_dir,
+            srce_file,
+            detect_mode,
+            has_override=bool(get_override_files(srce_file, srce_panels_bounds_override_dir)),
         )
 
         bounding_box_processor.save_panels_segment_info(dest_file, segment_info)
 
     except Exception:  # noqa: BLE001
         logger.exception("Error: ")
-        return
+        return PageResult(PanelBoundsOutcome.FAILED)
+
+    return PageResult(PanelBoundsOutcome.MADE, inputs_hash)
+
+
+def _is_unchanged(
+    srce_panels_bounds_override_dir: Path,
+    srce_file: Path,
+    dest_file: Path,
+    recorded_hash: str | None,
+    inputs_hash: str,
+) -> bool:
+    """Return whether a page's existing panel bounds were made from what is there now."""
+    is_older = _is_older_than_inputs(dest_file, srce_file, srce_panels_bounds_override_dir)
+
+    if recorded_hash is None:
+        if is_older:
+            return False
+        logger.warning(f'Dest file exists - skipping: "{get_abbrev_path(dest_file)}".')
+        return True
+
+    if recorded_hash != inputs_hash:
+        return False
+
+    # The page was written again, but came out the same. Brought up to date so that
+    # the integrity check, which goes by timestamps, does not take it for stale.
+    if is_older:
+        dest_file.touch()
+    logger.debug(f'Dest file is up to date - skipping: "{get_abbrev_path(dest_file)}".')
+
+    return True
 
 
 app = typer.Typer()
@@ -161,7 +487,12 @@ def main(
     title_str: TitleArg = "",
     force: bool = typer.Option(
         default=False,
-        help="Make panel bounds files even when they already exist, overwriting them.",
+        help="Remake panel bounds files even when nothing they were made from has changed.",
+    ),
+    detect_mode: PanelDetectMode = typer.Option(
+        DEFAULT_PANEL_DETECT_MODE,
+        help="Find panels in the page itself, or in a smaller copy with the edges refined at"
+        " full size. Compare the two with scripts/bench_panel_detect.py before switching.",
     ),
     log_level_str: LogLevelArg = "DEBUG",
 ) -> None:
@@ -171,7 +502,14 @@ def main(
 
     work_dir.mkdir(parents=True, exist_ok=True)
 
-    panel_bounds(comics_database, titles, work_dir, force=force)
+    panel_bounds(
+        comics_database,
+        titles,
+        work_dir,
+        force=force,
+        inputs_file=get_default_panel_bounds_inputs_file(),
+        detect_mode=detect_mode,
+    )
 
 
 if __name__ == "__main__":
@@ -9,12 +9,22 @@ Work is done in phases across a batch of pages rather than page by page, because
 gmic steps are memory hungry and have to be throttled to fewer workers than the machine
 has cores. Batching across titles rather than within one keeps those throttled phases
 full: a title is only eight to fourteen pages, so a six worker phase would spend much of
-its time running a half empty round.
+its time running a half empty round. How far those phases are throttled is decided by a
+memory budget, from what their steps have been measured to take - see `memory_budget`.
+
+By default the phases are streamed rather than run as barriers: a page goes on to each
+phase the moment the phases it needs are done, instead of waiting for the slowest page of
+its batch, and the batch size becomes a cap on how many pages are part way through at once.
+Which phases a phase needs comes from the step graph, so a page's inpaint runs beside its
+own smooth and trace rather than behind them.
 """
 
 import concurrent.futures
+import contextlib
 import os
 import time
+from collections import deque
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import StrEnum
@@ -32,8 +42,17 @@ from comic_utils.pil_image_utils import copy_file_to_png
 from loguru import logger
 
 from barks_comic_building.cli_setup import get_comic_titles, init_logging
+from barks_comic_building.restore.image_io import DEFAULT_WORK_FILE_FORMAT, WorkFileFormat
+from barks_comic_building.restore.memory_budget import (
+    DEFAULT_BUDGET_SHARE,
+    MemoryBudget,
+    MemoryModel,
+    get_default_budget_mb,
+)
 from barks_comic_building.restore.page_state import (
     PageState,
+    PageStateCache,
+    get_default_page_state_cache_file,
     get_page_status,
     get_upscaler_used,
 )
@@ -46,9 +65,18 @@ from barks_comic_building.restore.restore_ledger import (
     OUTCOME_STOPPED,
     LedgerWriter,
     get_default_ledger_file,
-    read_ledger,
+    read_ledger_index,
+)
+from barks_comic_building.restore.restore_pipeline import (
+    PART1_STEPS,
+    PART2_STEPS,
+    PART3_STEPS,
+    PART4_STEPS,
+    PART5_STEPS,
+    RESTORE_STEPS,
+    RestorePipeline,
+    check_for_errors,
 )
-from barks_comic_building.restore.restore_pipeline import RestorePipeline, check_for_errors
 from barks_comic_building.restore.restore_recipe import RestoreRecipe, get_current_recipe
 from barks_comic_building.restore.run_stop import (
     StopMode,
@@ -58,6 +86,8 @@ from barks_comic_building.restore.run_stop import (
     read_stop_mode,
     request_stop,
 )
+from barks_comic_building.restore.step_graph import get_step_dependencies
+from barks_comic_building.restore.worker_pool import WorkerPool, take_worker_warmup_seconds
 
 APP_LOGGING_NAME = "bres"
 
@@ -70,6 +100,30 @@ SMALL_RAM = 16 * 1024 * 1024 * 1024
 # that an interrupted run loses at most this much unfinished work.
 DEFAULT_BATCH_SIZE = 64
 
+# Threads for each page's median filter. Part 1 already runs a page per core, so letting
+# every worker's filter take every core as well would only have them fighting over the
+# same cores. The last few pages of a part 1 round run alone, and they are the ones this
+# costs - a few seconds each, against the oversubscription it saves for the rest.
+MEDIAN_THREADS_PER_PAGE = 1
+
+
+class PhaseScheduling(StrEnum):
+    """How pages are moved from one phase to the next."""
+
+    BARRIER = "barrier"
+    """A batch at a time, each phase across every page of the batch before the next phase
+    starts. Every phase waits for its slowest page, and every batch for its slowest phase,
+    so the cores sit idle through the tail of each."""
+
+    STREAMING = "streaming"
+    """A page starts a phase as soon as it is done with the phases that one needs, and a
+    new page is started as soon as there is room for it. The per-phase limits are the
+    same; what goes is the waiting at the end of every phase and every batch, and the
+    waiting of one branch of a page's steps on the other."""
+
+
+DEFAULT_PHASE_SCHEDULING = PhaseScheduling.STREAMING
+
 
 class _NonComicPage(NamedTuple):
     """A non-comic page a run dealt with, and what it did about it.
@@ -96,6 +150,16 @@ class _PageJob(NamedTuple):
     page: str
 
 
+@dataclass(frozen=True)
+class MemoryLimit:
+    """What the memory-hungry phases may take, and what they are expected to need."""
+
+    model: MemoryModel
+    """Updated as pages come back, so a run's later rounds learn from its earlier ones."""
+
+    budget_mb: float
+
+
 def restore(  # noqa: PLR0913
     comics_database: ComicsDatabase,
     title_list: list[str],
@@ -108,6 +172,9 @@ def restore(  # noqa: PLR0913
     debug_color_counts: bool,
     keep_work_files: bool,
     force: bool,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+    memory_budget_mb: float | None = None,
+    scheduling: PhaseScheduling = DEFAULT_PHASE_SCHEDULING,
 ) -> None:
     """Restore every page of every given title that is not already up to date.
 
@@ -116,13 +183,18 @@ def restore(  # noqa: PLR0913
         title_list: The titles to restore.
         work_dir: Where intermediates go. A subdirectory per title.
         ledger_file: Where to append the record of what was done.
-        batch_size: How many pages go through the phases together.
+        batch_size: How many pages go through the phases together. Streamed, the most
+            that may be part way through at once.
         stop_after_seconds: Ask the run to stop cleanly once it has been going this
             long. None lets it run to the end.
         use_existing_work_files: Reuse surviving intermediates rather than regenerating.
         debug_color_counts: Write the slow colour-count debug files.
         keep_work_files: Leave intermediates behind instead of cleaning up after a page.
         force: Restore pages that are already current.
+        work_file_format: How to write the intermediates.
+        memory_budget_mb: What the pages in a memory-hungry phase may take between them.
+            None for `DEFAULT_BUDGET_SHARE` of the memory free when the run starts.
+        scheduling: Whether pages are streamed through the phases or batched.
 
     """
     start = time.time()
@@ -147,19 +219,23 @@ def restore(  # noqa: PLR0913
 
     jobs: list[_PageJob] = []
     non_comic: list[_NonComicPage] = []
-    for title in title_list:
-        if is_non_comic_title(title):
-            non_comic += copy_title(comics_database, title)
-        else:
-            jobs += get_title_jobs(
-                comics_database,
-                title,
-                work_dir,
-                recipe,
-                use_existing_work_files=use_existing_work_files,
-                debug_color_counts=debug_color_counts,
-                force=force,
-            )
+    with PageStateCache(get_default_page_state_cache_file()) as cache:
+        for title in title_list:
+            if is_non_comic_title(title):
+                non_comic += copy_title(comics_database, title)
+            else:
+                jobs += get_title_jobs(
+                    comics_database,
+                    title,
+                    work_dir,
+                    recipe,
+                    use_existing_work_files=use_existing_work_files,
+                    debug_color_counts=debug_color_counts,
+                    keep_work_files=keep_work_files,
+                    force=force,
+                    work_file_format=work_file_format,
+                    cache=cache,
+                )
 
     if not jobs and not non_comic:
         logger.info(
@@ -171,39 +247,42 @@ def restore(  # noqa: PLR0913
     if jobs:
         _log_run_estimate(jobs, ledger_file, recipe)
 
-    workers = {phase[0]: phase[2] or os.process_cpu_count() or 0 for phase in _PHASES}
-    with LedgerWriter(ledger_file, recipe, workers) as ledger:
+    memory = _get_memory_limit(ledger_file, memory_budget_mb)
+
+    # The default counts, which the memory budget may take a phase past. What a phase
+    # actually ran with is in the log, round by round.
+    workers = {phase.name: phase.workers or os.process_cpu_count() or 0 for phase in _PHASES}
+    with (
+        LedgerWriter(ledger_file, recipe, workers) as ledger,
+        WorkerPool(_get_pool_width()) as pool,
+    ):
         _write_non_comic_records(ledger, non_comic)
 
-        num_done = 0
-        for batch_start in range(0, len(jobs), batch_size):
-            batch = jobs[batch_start : batch_start + batch_size]
-            logger.info(
-                f"\nBatch {batch_start // batch_size + 1}"
-                f" of {(len(jobs) + batch_size - 1) // batch_size}:"
-                f" {len(batch)} page(s).",
+        if scheduling is PhaseScheduling.STREAMING:
+            num_done = _run_stream(
+                jobs,
+                ledger,
+                start,
+                deadline,
+                memory,
+                batch_size,
+                pool,
+                keep_work_files=keep_work_files,
             )
-
-            num_done += _run_batch(
-                batch,
+            _log_if_stopping(stop_file, num_done, len(jobs))
+        else:
+            num_done = _run_batches(
+                jobs,
                 ledger,
-                num_done,
-                len(jobs),
+                batch_size,
                 start,
                 deadline,
+                memory,
+                pool,
+                stop_file,
                 keep_work_files=keep_work_files,
             )
 
-            stop_mode = read_stop_mode(stop_file)
-            if stop_mode is not StopMode.NONE:
-                logger.warning(
-                    f"\nStopping after {num_done} of {len(jobs)} page(s): {stop_mode.describe}."
-                    f"\nRe-run the same command to carry on"
-                    f" - finished pages are skipped, and part-finished ones"
-                    f" resume with --use-existing-work-files.",
-                )
-                break
-
     num_copied = sum(1 for page in non_comic if page.outcome == OUTCOME_COPIED)
     elapsed = format_duration(time.time() - start)
 
@@ -219,6 +298,23 @@ def restore(  # noqa: PLR0913
         logger.info(
             f"\nTime taken to restore {len(jobs)} page(s) and copy {num_copied}: {elapsed}.",
         )
+    if jobs:
+        logger.info(pool.describe_warmup())
+
+
+def _log_if_stopping(stop_file: Path, num_done: int, num_jobs: int) -> bool:
+    """Say so if the run has been asked to stop, returning whether it has."""
+    stop_mode = read_stop_mode(stop_file)
+    if stop_mode is StopMode.NONE:
+        return False
+
+    logger.warning(
+        f"\nStopping after {num_done} of {num_jobs} page(s): {stop_mode.describe}."
+        f"\nRe-run the same command to carry on"
+        f" - finished pages are skipped, and part-finished ones"
+        f" resume with --use-existing-work-files.",
+    )
+    return True
 
 
 def _write_non_comic_records(ledger: LedgerWriter, non_comic: list[_NonComicPage]) -> None:
@@ -242,9 +338,30 @@ def _write_non_comic_records(ledger: LedgerWriter, non_comic: list[_NonComicPage
         )
 
 
+def _get_memory_limit(ledger_file: Path, budget_mb: float | None) -> MemoryLimit:
+    """Return the budget the memory-hungry phases run under, primed from the ledger."""
+    if budget_mb is None:
+        budget_mb = get_default_budget_mb()
+        logger.info(
+            f"Memory budget {budget_mb / 1024:.1f}GB"
+            f" ({DEFAULT_BUDGET_SHARE:.0%} of what is free now).",
+        )
+    else:
+        logger.info(f"Memory budget {budget_mb / 1024:.1f}GB.")
+
+    measurements = read_ledger_index(ledger_file).memory_measurements()
+    if not measurements:
+        logger.info(
+            "No memory measurements in the ledger yet"
+            " - the memory-hungry phases start from their default worker counts.",
+        )
+
+    return MemoryLimit(MemoryModel.from_measurements(measurements), budget_mb)
+
+
 def _log_run_estimate(jobs: list[_PageJob], ledger_file: Path, recipe: RestoreRecipe) -> None:
     """Log what the queued work is expected to cost, from previously measured pages."""
-    stats = read_ledger(ledger_file).timing_stats(recipe.recipe_id)
+    stats = read_ledger_index(ledger_file).timing_stats(recipe.recipe_id)
     if stats is None:
         logger.info(f"{len(jobs)} page(s) to restore. No timings yet for this recipe.")
         return
@@ -256,6 +373,51 @@ def _log_run_estimate(jobs: list[_PageJob], ledger_file: Path, recipe: RestoreRe
     )
 
 
+def _run_batches(  # noqa: PLR0913
+    jobs: list[_PageJob],
+    ledger: LedgerWriter,
+    batch_size: int,
+    run_start: float,
+    deadline: float | None,
+    memory: MemoryLimit | None,
+    pool: WorkerPool,
+    stop_file: Path,
+    *,
+    keep_work_files: bool,
+) -> int:
+    """Run the pages a batch at a time, stopping between batches if asked to.
+
+    Returns:
+        How many pages were attempted.
+
+    """
+    num_done = 0
+    for batch_start in range(0, len(jobs), batch_size):
+        batch = jobs[batch_start : batch_start + batch_size]
+        logger.info(
+            f"\nBatch {batch_start // batch_size + 1}"
+            f" of {(len(jobs) + batch_size - 1) // batch_size}:"
+            f" {len(batch)} page(s).",
+        )
+
+        num_done += _run_batch(
+            batch,
+            ledger,
+            num_done,
+            len(jobs),
+            run_start,
+            deadline,
+            memory,
+            pool,
+            keep_work_files=keep_work_files,
+        )
+
+        if _log_if_stopping(stop_file, num_done, len(jobs)):
+            break
+
+    return num_done
+
+
 def _run_batch(  # noqa: PLR0913
     batch: list[_PageJob],
     ledger: LedgerWriter,
@@ -263,6 +425,8 @@ def _run_batch(  # noqa: PLR0913
     num_jobs: int,
     run_start: float,
     deadline: float | None,
+    memory: MemoryLimit | None,
+    pool: WorkerPool,
     *,
     keep_work_files: bool,
 ) -> int:
@@ -277,7 +441,7 @@ def _run_batch(  # noqa: PLR0913
     batch_start_time = time.time()
 
     pipelines = [job.pipeline for job in batch]
-    result = run_restore(pipelines, deadline)
+    result = run_restore(pipelines, deadline, memory, pool)
     check_for_errors(
         [p for i, p in enumerate(pipelines) if i not in result.unfinished | result.untouched],
         result.failed,
@@ -298,41 +462,130 @@ def _run_batch(  # noqa: PLR0913
             # is simply still to do, which the page state will work out on its own.
             continue
 
-        if i in result.unfinished:
-            outcome = OUTCOME_STOPPED
-        elif i in result.failed or job.pipeline.errors_occurred:
-            outcome = OUTCOME_FAILED
-        else:
-            outcome = OUTCOME_OK
-
-        ledger.write_page(
-            title=job.title,
-            volume=job.volume,
-            page=job.page,
-            outcome=outcome,
-            started=started,
-            total_seconds=seconds_each,
-            step_seconds=job.pipeline.step_seconds,
-            failed_step=job.pipeline.failed_step,
-            dest_bytes=(
-                job.pipeline.dest_restored_file.stat().st_size
-                if job.pipeline.dest_restored_file.is_file()
-                else 0
-            ),
-            upscaler=get_upscaler_used(job.pipeline.srce_upscale_file),
+        _record_page(
+            job,
+            ledger,
+            _get_outcome(result, i, job.pipeline),
+            started,
+            seconds_each,
+            keep_work_files=keep_work_files,
         )
 
-        # Only a page that finished has intermediates worth nothing. A stopped one keeps
-        # its own so that the next run can carry on from where it left off.
-        if outcome == OUTCOME_OK and not keep_work_files:
-            _clean_up_work_files(job.pipeline)
-
     num_done = num_done_before + num_attempted
     _log_progress(num_done, num_jobs, run_start)
 
     return num_attempted
 
 
+def _run_stream(  # noqa: PLR0913
+    jobs: list[_PageJob],
+    ledger: LedgerWriter,
+    run_start: float,
+    deadline: float | None,
+    memory: MemoryLimit | None,
+    max_in_flight: int,
+    pool: WorkerPool,
+    *,
+    keep_work_files: bool,
+) -> int:
+    """Stream every page through the phases, recording each one as soon as it is done.
+
+    The streaming counterpart of `_run_batch`, over the whole run rather than one batch.
+    A page is checked, written to the ledger and cleaned up the moment its last phase
+    comes back, so the ledger and the work directory stay as current as they would at
+    the end of a batch - there is just no longer an end of a batch to wait for.
+
+    Returns:
+        How many pages were attempted. Pages the stop reached before they had begun do
+        not count, since nothing was done to them.
+
+    """
+    if not jobs:
+        return 0
+
+    logger.info(f"\nStreaming {len(jobs)} page(s), at most {max_in_flight} part way through.")
+
+    pipelines = [job.pipeline for job in jobs]
+    num_attempted = 0
+    last_done_time = time.time()
+
+    def record(i: int, run: RunResult, page_start: float) -> None:
+        nonlocal num_attempted, last_done_time
+
+        if i in run.untouched:
+            return
+
+        if i not in run.unfinished:
+            check_for_errors([pipelines[i]], [0] if i in run.failed else None)
+
+        # The time since the page before it was done rather than the time it spent in the
+        # phases, for the same reason a batch hands out its wall clock: the pages overlap,
+        # and it is these gaps that add up to what the run took.
+        now = time.time()
+        started = datetime.fromtimestamp(page_start).astimezone().isoformat(timespec="seconds")
+        _record_page(
+            jobs[i],
+            ledger,
+            _get_outcome(run, i, pipelines[i]),
+            started,
+            now - last_done_time,
+            keep_work_files=keep_work_files,
+        )
+        last_done_time = now
+
+        num_attempted += 1
+        _log_progress(num_attempted, len(jobs), run_start)
+
+    stream_restore(pipelines, deadline, memory, max_in_flight, record, pool)
+
+    return num_attempted
+
+
+def _get_outcome(result: "RunResult", index: int, pipeline: RestorePipeline) -> str:
+    """Return what the ledger should say became of a page that was at least begun."""
+    if index in result.unfinished:
+        return OUTCOME_STOPPED
+    if index in result.failed or pipeline.errors_occurred:
+        return OUTCOME_FAILED
+
+    return OUTCOME_OK
+
+
+def _record_page(  # noqa: PLR0913
+    job: _PageJob,
+    ledger: LedgerWriter,
+    outcome: str,
+    started: str,
+    total_seconds: float,
+    *,
+    keep_work_files: bool,
+) -> None:
+    """Write a page that was at least begun to the ledger, and tidy up after it."""
+    ledger.write_page(
+        title=job.title,
+        volume=job.volume,
+        page=job.page,
+        outcome=outcome,
+        started=started,
+        total_seconds=total_seconds,
+        step_seconds=job.pipeline.step_seconds,
+        failed_step=job.pipeline.failed_step,
+        dest_bytes=(
+            job.pipeline.dest_restored_file.stat().st_size
+            if job.pipeline.dest_restored_file.is_file()
+            else 0
+        ),
+        upscaler=get_upscaler_used(job.pipeline.srce_upscale_file),
+        megapixels=_get_megapixels(job.pipeline),
+        step_peak_rss_mb=job.pipeline.step_peak_rss_mb,
+    )
+
+    # Only a page that finished has intermediates worth nothing. A stopped one keeps
+    # its own so that the next run can carry on from where it left off.
+    if outcome == OUTCOME_OK and not keep_work_files:
+        _clean_up_work_files(job.pipeline)
+
+
 def _log_progress(num_done: int, num_jobs: int, run_start: float) -> None:
     """Log how far through the run is and what is left, from this run's own pace."""
     elapsed = time.time() - run_start
@@ -435,7 +688,10 @@ def get_title_jobs(  # noqa: PLR0913
     *,
     use_existing_work_files: bool,
     debug_color_counts: bool,
+    keep_work_files: bool,
     force: bool,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+    cache: PageStateCache | None = None,
 ) -> list[_PageJob]:
     """Return the pages of a title that still need restoring.
 
@@ -446,7 +702,11 @@ def get_title_jobs(  # noqa: PLR0913
         recipe: The settings this run restores with.
         use_existing_work_files: Reuse surviving intermediates rather than regenerating.
         debug_color_counts: Write the slow colour-count debug files.
+        keep_work_files: Keep intermediates, including the ones a page would otherwise
+            never write because nothing reads them.
         force: Include pages that are already current.
+        work_file_format: How to write the intermediates.
+        cache: What has already been read from the restored pngs, or None to open them.
 
     Returns:
         A job per page that needs work.
@@ -493,6 +753,7 @@ def get_title_jobs(  # noqa: PLR0913
             Path(dest_svg_restored_file),
             recipe.recipe_id,
             is_hand_restored=comic.is_hand_restored(page_num),
+            cache=cache,
         )
         num_by_state[status.state] = num_by_state.get(status.state, 0) + 1
 
@@ -546,9 +807,12 @@ def get_title_jobs(  # noqa: PLR0913
                     Path(dest_svg_restored_file),
                     use_existing_work_files=use_existing_work_files,
                     debug_color_counts=debug_color_counts,
+                    keep_work_files=keep_work_files,
+                    work_file_format=work_file_format,
                     # The run's work directory, not this title's, so every page of the
                     # run looks at the same request.
                     stop_file=get_stop_file(work_dir),
+                    median_threads=MEDIAN_THREADS_PER_PAGE,
                 ),
                 title,
                 volume,
@@ -564,13 +828,33 @@ def get_title_jobs(  # noqa: PLR0913
 
 _SMALL_RAM_DETECTED = psutil.virtual_memory().total < SMALL_RAM
 
-# Each phase runs across all pages of a batch before the next phase starts. The third
-# tuple element is the worker count for that phase: the memory-hungry phases (part 2
-# smoothing, part 4 inpaint/overlay/resize) are throttled to few workers (1 on small-RAM
-# machines) to avoid exhausting memory, while the lighter phases use the default pool
-# size. This is why run_restore() builds a fresh ProcessPoolExecutor per phase rather
-# than one shared pool. The fourth element caps the OpenMP threads each gmic subprocess
-# in that phase may take; None leaves it to gmic, which takes every core it can see.
+
+class _Phase(NamedTuple):
+    """One phase of the pipeline, and how many pages it may run at once."""
+
+    name: str
+    method_name: str
+    steps: tuple[str, ...]
+    """The steps it runs, which decide the phases it has to wait for."""
+    workers: int | None
+    """The default worker count. None is the default pool size, a page per core."""
+    omp_threads: int | None
+    """The OpenMP threads each gmic subprocess may take. None leaves it to gmic."""
+    memory_steps: tuple[str, ...] = ()
+    """The steps whose measured peak memory decides how many pages run at once. Empty
+    for the phases light enough that a page per core is always fine."""
+
+
+# The worker count is each phase's default: the memory-hungry phases (part 2 smoothing,
+# part 4 inpainting, part 5 snap/overlay/resize) are throttled to few workers (1 on small-RAM machines) to
+# avoid exhausting memory, while the lighter phases use the default pool size. The counts
+# are kept by the scheduler rather than by the size of a pool, so one `WorkerPool`, warmed
+# once, serves every phase of the run, batched or streamed.
+#
+# The throttled counts are only where a phase starts, though. Once the ledger - or the
+# run itself - has measured what its steps take, a memory-hungry phase starts pages while
+# their predicted peaks fit the run's memory budget instead, which on a big machine is
+# more of them and on a batch of double-page spreads is fewer. See `memory_budget`.
 #
 # The thread caps are deliberately left off. Six concurrent smooths ask for ninety six
 # threads on sixteen cores, which looks like it should be costing something, but it is
@@ -585,14 +869,62 @@ _SMALL_RAM_DETECTED = psutil.virtual_memory().total < SMALL_RAM
 # smooths return only about a quarter more throughput than one at a time. The way to
 # make a long run faster is to keep these phases full, which is what batching pages
 # across titles does, rather than to rearrange the threads inside them.
-_PHASES: list[tuple[str, str, int | None, int | None]] = [
-    ("part 1", "do_part1", None, None),
-    ("part 2", "do_part2_memory_hungry", 1 if _SMALL_RAM_DETECTED else 6, None),
-    ("part 3", "do_part3", None, None),
-    ("part 4", "do_part4_memory_hungry", 1 if _SMALL_RAM_DETECTED else 4, None),
+#
+# The inpaint is a phase of its own because the step graph lets it run beside the smooth
+# and the trace: it only needs part 1. Streamed, a page starts it as soon as part 1 is
+# done, in another worker, and only the overlay waits for both branches. A phase still
+# runs its own steps one after another, so the memory budget admitting a page into a
+# phase is still sized on those steps taking turns. Batched, the phases run in this
+# order, one after another, which is the order the graph allows.
+_PHASES: list[_Phase] = [
+    _Phase("part 1", "do_part1", PART1_STEPS, None, None),
+    _Phase(
+        "part 2",
+        "do_part2_memory_hungry",
+        PART2_STEPS,
+        1 if _SMALL_RAM_DETECTED else 6,
+        None,
+        PART2_STEPS,
+    ),
+    _Phase("part 3", "do_part3", PART3_STEPS, None, None),
+    _Phase(
+        "part 4",
+        "do_part4_memory_hungry",
+        PART4_STEPS,
+        1 if _SMALL_RAM_DETECTED else 4,
+        None,
+        PART4_STEPS,
+    ),
+    _Phase(
+        "part 5",
+        "do_part5_memory_hungry",
+        PART5_STEPS,
+        1 if _SMALL_RAM_DETECTED else 4,
+        None,
+        PART5_STEPS,
+    ),
 ]
 
 
+def _get_phase_needs(phases: list[_Phase]) -> list[frozenset[int]]:
+    """Return, for each phase, the phases a page has to be done with before starting it.
+
+    Taken from the step graph rather than from the order of the list, so a phase waits
+    only for the phases that write what its steps read.
+    """
+    dependencies = get_step_dependencies(RESTORE_STEPS)
+    phase_of_step = {step: index for index, phase in enumerate(phases) for step in phase.steps}
+
+    return [
+        frozenset(phase_of_step[need] for step in phase.steps for need in dependencies[step])
+        - {index}
+        for index, phase in enumerate(phases)
+    ]
+
+
+_PHASE_NEEDS = _get_phase_needs(_PHASES)
+
+
 class _PhaseOutcome(StrEnum):
     """What became of a page in a phase."""
 
@@ -617,6 +949,9 @@ class _PhaseResult(NamedTuple):
     failed_step: str | None
     step_seconds: dict[str, float]
     outcome: _PhaseOutcome
+    step_peak_rss_mb: dict[str, float]
+    worker_warmup_seconds: float | None = None
+    """How long the worker took to warm up, sent with the first result it returns."""
 
 
 def _run_restore_phase(
@@ -629,8 +964,8 @@ def _run_restore_phase(
     each step took, and whether a stop cut it short - therefore comes back in the return
     value.
 
-    Every page of a batch is submitted to the pool up front, so most of them sit queued
-    behind the handful actually running. Reading the stop here, as each one starts, is
+    Most pages of a batch sit queued behind the handful actually running - in the pool,
+    or waiting on the memory budget. Reading the stop here, as each one starts, is
     what lets those queued pages fall through untouched the moment a stop is asked for,
     rather than the whole batch having to be seen through.
 
@@ -647,6 +982,8 @@ def _run_restore_phase(
         The phase's outcome and timings.
 
     """
+    warmup_seconds = take_worker_warmup_seconds()
+
     stop_mode = read_stop_mode(proc.stop_file)
     if stop_mode.stops_pages_that_have_started or (
         stop_mode is not StopMode.NONE and is_first_phase
@@ -656,18 +993,30 @@ def _run_restore_phase(
             failed_step=None,
             step_seconds={},
             outcome=_PhaseOutcome.SKIPPED,
+            step_peak_rss_mb={},
+            worker_warmup_seconds=warmup_seconds,
         )
 
+    # Put back afterwards, since the worker goes on to run other phases whose gmic should
+    # not inherit this one's cap.
+    prev_omp_threads = os.environ.get("OMP_NUM_THREADS")
     if omp_threads is not None:
         os.environ["OMP_NUM_THREADS"] = str(omp_threads)
-
-    getattr(proc, method_name)()
+    try:
+        getattr(proc, method_name)()
+    finally:
+        if prev_omp_threads is None:
+            os.environ.pop("OMP_NUM_THREADS", None)
+        else:
+            os.environ["OMP_NUM_THREADS"] = prev_omp_threads
 
     return _PhaseResult(
         proc.errors_occurred,
         proc.failed_step,
         dict(proc.step_seconds),
         _PhaseOutcome.STOPPED if proc.stopped_early else _PhaseOutcome.RAN,
+        dict(proc.step_peak_rss_mb),
+        warmup_seconds,
     )
 
 
@@ -702,6 +1051,7 @@ def _record_phase_result(
     """Fold one page's phase result back into the parent's picture of the batch."""
     # The worker mutated its own copy, so its timings only exist in what it sent back.
     process.step_seconds.update(result.step_seconds)
+    process.step_peak_rss_mb.update(result.step_peak_rss_mb)
 
     if result.outcome is _PhaseOutcome.SKIPPED:
         # Whether there is anything to keep depends on how far it had got before the
@@ -724,79 +1074,187 @@ def _record_phase_result(
         )
 
 
-def _run_phase(
-    phase: tuple[str, str, int | None, int | None],
+def _get_megapixels(pipeline: RestorePipeline) -> float:
+    """Return a page's megapixels, or 0 if its header cannot be read for some reason.
+
+    Only ever used to size memory, so an unreadable page is better treated as unmeasured
+    than allowed to take the run down - the pipeline itself will report what is wrong
+    with it, properly, when it gets there.
+    """
+    try:
+        return pipeline.megapixels
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _predict_page_mb(phase: _Phase, pipeline: RestorePipeline, memory: MemoryLimit) -> float:
+    """Return the share of the memory budget a page takes while it runs a phase.
+
+    A page whose steps have never been measured takes the share the phase's default
+    worker count gives it, so until there is something to go on a phase runs exactly as
+    many pages as it always did.
+    """
+    predicted = memory.model.predict_mb(phase.memory_steps, _get_megapixels(pipeline))
+    if predicted is not None:
+        return predicted
+
+    return memory.budget_mb / (phase.workers or os.process_cpu_count() or 1)
+
+
+def _run_phase(  # noqa: C901, PLR0913
+    phase: _Phase,
     restore_processes: list[RestorePipeline],
     run: RunResult,
     deadline: float | None,
+    memory: MemoryLimit | None,
+    pool: WorkerPool,
     *,
     is_first_phase: bool,
 ) -> float | None:
     """Put every page still in play through one phase.
 
+    A memory-hungry phase with a memory limit may use the whole pool, and starts a page
+    only while the predicted peaks of those running fit the budget. Without one, or for a
+    light phase, the phase's worker count is all that throttles it. Either way the pages
+    are held back here rather than by the size of the pool, which serves every phase.
+
     Returns:
         The deadline still to watch for, or None once it has passed and the stop it
         asked for has been made.
 
     """
-    phase_name, method_name, max_workers, omp_threads = phase
+    budget: MemoryBudget | None = None
+    if memory is not None and phase.memory_steps:
+        budget = MemoryBudget(memory.budget_mb)
+    limit = _get_phase_limit(phase, pool.num_workers, budget)
+
+    waiting = deque(i for i in range(len(restore_processes)) if not run.is_settled(i))
+    num_to_run = len(waiting)
+
+    futures: dict[concurrent.futures.Future[_PhaseResult], tuple[int, float]] = {}
+
+    def start_what_fits() -> None:
+        # The first waiting page that fits rather than strictly the next one, so a spread
+        # too big for what is left does not hold up the ordinary pages behind it. It is
+        # not starved by this: with nothing else running it always fits.
+        for i in list(waiting):
+            if len(futures) >= limit:
+                return
+            predicted = 0.0
+            if budget is not None:
+                assert memory is not None
+                predicted = _predict_page_mb(phase, restore_processes[i], memory)
+                if not budget.try_admit(predicted):
+                    continue
+            waiting.remove(i)
+            future = pool.submit(
+                _run_restore_phase,
+                restore_processes[i],
+                phase.method_name,
+                phase.omp_threads,
+                is_first_phase=is_first_phase,
+            )
+            futures[future] = (i, predicted)
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
-        futures: dict[concurrent.futures.Future[_PhaseResult], int] = {}
-        for i, process in enumerate(restore_processes):
-            if run.is_settled(i):
-                continue
-            futures[
-                executor.submit(
-                    _run_restore_phase,
-                    process,
-                    method_name,
-                    omp_threads,
-                    is_first_phase=is_first_phase,
-                )
-            ] = i
+    start_what_fits()
 
-        # Consumed as they finish rather than after the pool drains, so a long phase
-        # reports progress while it is still running instead of going quiet.
-        for num_finished, future in enumerate(concurrent.futures.as_completed(futures), 1):
-            i = futures[future]
+    # Consumed as they finish rather than after the pool drains, so a long phase
+    # reports progress while it is still running instead of going quiet.
+    num_finished = 0
+    while futures:
+        done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            i, predicted = futures.pop(future)
             process = restore_processes[i]
-
-            # noinspection PyBroadException
-            try:
-                result = future.result()
-            except Exception:  # noqa: BLE001
-                result = _PhaseResult(
-                    errors_occurred=True,
-                    failed_step=phase_name,
-                    step_seconds={},
-                    outcome=_PhaseOutcome.RAN,
-                )
-                logger.exception(
-                    f'Unexpected exception in {phase_name} for "{process.srce_upscale_file.name}".',
+            num_finished += 1
+
+            result = _get_phase_result(future, phase.name, process)
+            pool.record_warmup(result.worker_warmup_seconds)
+            _record_phase_result(result, i, process, phase.name, run)
+
+            in_use = ""
+            if budget is not None:
+                assert memory is not None
+                budget.release(predicted)
+                memory.model.observe(_get_megapixels(process), result.step_peak_rss_mb)
+                in_use = (
+                    f" ({budget.num_running} running,"
+                    f" {budget.in_use_mb / 1024:.1f}GB of {budget.budget_mb / 1024:.1f}GB)"
                 )
 
-            _record_phase_result(result, i, process, phase_name, run)
-
             logger.info(
-                f"{phase_name}: {num_finished}/{len(futures)}"
-                f' - "{process.srce_upscale_file.name}".',
+                f"{phase.name}: {num_finished}/{num_to_run}"
+                f' - "{process.srce_upscale_file.name}"{in_use}.',
             )
 
-            if deadline is not None and time.time() > deadline:
-                deadline = None
-                if process.stop_file is not None:
-                    request_stop(process.stop_file.parent)
-                    logger.warning(
-                        "Reached the --stop-after time. Pages already started will"
-                        " finish; nothing new will begin.",
-                    )
+            deadline = _check_deadline(deadline, process)
+
+        start_what_fits()
 
     return deadline
 
 
+def _get_phase_result(
+    future: concurrent.futures.Future[_PhaseResult], phase_name: str, process: RestorePipeline
+) -> _PhaseResult:
+    """Return what a finished worker sent back, or a failure if it raised instead."""
+    # noinspection PyBroadException
+    try:
+        return future.result()
+    except Exception:  # noqa: BLE001
+        logger.exception(
+            f'Unexpected exception in {phase_name} for "{process.srce_upscale_file.name}".',
+        )
+        return _PhaseResult(
+            errors_occurred=True,
+            failed_step=phase_name,
+            step_seconds={},
+            outcome=_PhaseOutcome.RAN,
+            step_peak_rss_mb={},
+        )
+
+
+def _check_deadline(deadline: float | None, process: RestorePipeline) -> float | None:
+    """Ask the run to stop if the deadline has passed.
+
+    Returns:
+        The deadline still to watch for, or None once it has passed and the stop it
+        asked for has been made.
+
+    """
+    if deadline is None or time.time() <= deadline:
+        return deadline
+
+    if process.stop_file is not None:
+        request_stop(process.stop_file.parent)
+        logger.warning(
+            "Reached the --stop-after time. Pages already started will finish;"
+            " nothing new will begin.",
+        )
+
+    return None
+
+
+def _get_pool_width() -> int:
+    """Return how many workers the run's pool has: a page per core, or more if a phase asks."""
+    return max(os.process_cpu_count() or 1, *(phase.workers or 1 for phase in _PHASES))
+
+
+def _use_pool(
+    pool: WorkerPool | None,
+) -> contextlib.AbstractContextManager[WorkerPool]:
+    """Return the caller's pool to use as it is, or a new one to last only this call."""
+    if pool is not None:
+        return contextlib.nullcontext(pool)
+
+    return WorkerPool(_get_pool_width())
+
+
 def run_restore(
-    restore_processes: list[RestorePipeline], deadline: float | None = None
+    restore_processes: list[RestorePipeline],
+    deadline: float | None = None,
+    memory: MemoryLimit | None = None,
+    pool: WorkerPool | None = None,
 ) -> RunResult:
     """Run all restore phases across processes, skipping processes that fail.
 
@@ -805,6 +1263,11 @@ def run_restore(
         deadline: When to ask the run to stop of its own accord, as a `time.time()`
             value. Checked as pages come back, so a bounded run ends on the same path as
             one stopped by hand rather than on a second mechanism of its own.
+        memory: The budget the memory-hungry phases are scheduled within. None runs them
+            at their fixed default worker counts.
+        pool: The workers to run the phases on. None starts a pool for this call alone,
+            which a run of many batches should not do - it pays for warming the workers
+            again every time.
 
     Returns:
         Which pages failed, which were left unfinished, and which were never begun.
@@ -814,26 +1277,212 @@ def run_restore(
 
     run = RunResult()
 
-    for phase_index, phase in enumerate(_PHASES):
-        deadline = _run_phase(
-            phase,
-            restore_processes,
-            run,
-            deadline,
-            is_first_phase=phase_index == 0,
-        )
+    with _use_pool(pool) as run_pool:
+        for phase_index, phase in enumerate(_PHASES):
+            deadline = _run_phase(
+                phase,
+                restore_processes,
+                run,
+                deadline,
+                memory,
+                run_pool,
+                is_first_phase=phase_index == 0,
+            )
+
+    _log_run_result(run, len(restore_processes))
+
+    return run
 
+
+def _log_run_result(run: RunResult, num_processes: int) -> None:
+    """Log how many pages failed, and how many a stop left behind."""
     if run.failed:
-        logger.error(f"{len(run.failed)} of {len(restore_processes)} processes had errors.")
+        logger.error(f"{len(run.failed)} of {num_processes} processes had errors.")
     if run.unfinished or run.untouched:
         logger.warning(
             f"Stopped: {len(run.unfinished)} page(s) left part way through,"
             f" {len(run.untouched)} not begun.",
         )
 
+
+def _get_phase_limit(phase: _Phase, pool_width: int, budget: MemoryBudget | None) -> int:
+    """Return how many pages may run a phase at once: the whole pool, when a budget decides."""
+    if budget is not None and phase.memory_steps:
+        return pool_width
+
+    return phase.workers or pool_width
+
+
+def stream_restore(  # noqa: PLR0913
+    restore_processes: list[RestorePipeline],
+    deadline: float | None = None,
+    memory: MemoryLimit | None = None,
+    max_in_flight: int | None = None,
+    on_page_done: Callable[[int, RunResult, float], None] | None = None,
+    pool: WorkerPool | None = None,
+) -> RunResult:
+    """Run all restore phases across processes, each page moving on as soon as it can.
+
+    The counterpart of `run_restore` without its barriers. There is one pool, a page per
+    core wide, and a queue per phase in front of it. Whenever a page comes back it joins
+    the queue of every phase whose needs it has now met - after part 1, the smooth and
+    the inpaint both - and whatever fits is started: each phase is held to
+    the same limit it has in a batch - its worker count, or its share of the memory
+    budget - so nothing runs wider than it did before, it just never waits for a
+    straggler. The memory-hungry phases now overlap each other, so they share the one
+    budget rather than having one each.
+
+    Later phases are offered the free slots first. That finishes pages rather than
+    starting them, which keeps the work directory small and means the pages a stop has
+    to see through are the ones nearest done.
+
+    A page is only handed back once none of its phases are running, so its work files
+    are never cleaned up from under a branch that is still going. One that fails or is
+    stopped in one branch has nothing more of the other queued.
+
+    Stopping works as it does in a batch. The stop is read by each worker as its phase
+    starts, so a page that had not begun falls through untouched and, for a STEP stop,
+    a page part way through falls through unfinished, and the accounting is the same.
+
+    Args:
+        restore_processes: The pipelines to run.
+        deadline: When to ask the run to stop of its own accord, as a `time.time()`
+            value, as for `run_restore`.
+        memory: The budget the memory-hungry phases are scheduled within. None holds
+            them to their fixed default worker counts.
+        max_in_flight: The most pages that may have started but not yet finished, which
+            is what bounds the work directory. None for no limit.
+        on_page_done: Called with a page's index, the run so far and when its first phase
+            was started, as soon as it is done with - finished, failed, stopped or never
+            begun - so its results can be recorded without waiting for the rest.
+        pool: The workers to run the phases on. None starts a pool for this call alone.
+
+    Returns:
+        Which pages failed, which were left unfinished, and which were never begun.
+
+    """
+    logger.info(f"Starting streamed restore for {len(restore_processes)} processes.")
+
+    run = RunResult()
+    with _use_pool(pool) as run_pool:
+        _stream_phases(
+            restore_processes, run, deadline, memory, max_in_flight, on_page_done, run_pool
+        )
+
+    _log_run_result(run, len(restore_processes))
+
     return run
 
 
+def _stream_phases(  # noqa: C901, PLR0913
+    restore_processes: list[RestorePipeline],
+    run: RunResult,
+    deadline: float | None,
+    memory: MemoryLimit | None,
+    max_in_flight: int | None,
+    on_page_done: Callable[[int, RunResult, float], None] | None,
+    pool: WorkerPool,
+) -> None:
+    """Stream the pages through the phases on a pool, for `stream_restore`."""
+    budget = MemoryBudget(memory.budget_mb) if memory is not None else None
+
+    waiting: list[deque[int]] = [deque() for _ in _PHASES]
+    waiting[0].extend(range(len(restore_processes)))
+    num_running = [0] * len(_PHASES)
+    page_starts: dict[int, float] = {}
+    # The phases each page is done with, and those it has been queued for or started.
+    phases_done: list[set[int]] = [set() for _ in restore_processes]
+    phases_begun: list[set[int]] = [{0} for _ in restore_processes]
+
+    # What each running future is: its page, its phase, and the share of the budget it
+    # was admitted with.
+    futures: dict[concurrent.futures.Future[_PhaseResult], tuple[int, int, float]] = {}
+
+    def start_what_fits() -> None:
+        for phase_index in reversed(range(len(_PHASES))):
+            phase = _PHASES[phase_index]
+            limit = _get_phase_limit(phase, pool.num_workers, budget)
+
+            for i in list(waiting[phase_index]):
+                if len(futures) >= pool.num_workers or num_running[phase_index] >= limit:
+                    break
+                is_full = max_in_flight is not None and len(page_starts) >= max_in_flight
+                if phase_index == 0 and is_full:
+                    break
+
+                predicted = 0.0
+                if budget is not None and phase.memory_steps:
+                    assert memory is not None
+                    predicted = _predict_page_mb(phase, restore_processes[i], memory)
+                    # As in a batch, the first waiting page that fits rather than strictly
+                    # the next one.
+                    if not budget.try_admit(predicted):
+                        continue
+
+                waiting[phase_index].remove(i)
+                if phase_index == 0:
+                    page_starts[i] = time.time()
+                future = pool.submit(
+                    _run_restore_phase,
+                    restore_processes[i],
+                    phase.method_name,
+                    phase.omp_threads,
+                    is_first_phase=phase_index == 0,
+                )
+                futures[future] = (i, phase_index, predicted)
+                num_running[phase_index] += 1
+
+    start_what_fits()
+
+    while futures:
+        done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            i, phase_index, predicted = futures.pop(future)
+            phase = _PHASES[phase_index]
+            process = restore_processes[i]
+            num_running[phase_index] -= 1
+
+            result = _get_phase_result(future, phase.name, process)
+            pool.record_warmup(result.worker_warmup_seconds)
+            _record_phase_result(result, i, process, phase.name, run)
+
+            in_use = ""
+            if budget is not None and phase.memory_steps:
+                assert memory is not None
+                budget.release(predicted)
+                memory.model.observe(_get_megapixels(process), result.step_peak_rss_mb)
+                in_use = f", {budget.in_use_mb / 1024:.1f}GB of {budget.budget_mb / 1024:.1f}GB"
+
+            running = ", ".join(
+                f"{p.name} {n}" for p, n in zip(_PHASES, num_running, strict=True) if n
+            )
+            logger.info(
+                f'{phase.name}: "{process.srce_upscale_file.name}"'
+                f" ({running or 'nothing'} running{in_use}).",
+            )
+
+            deadline = _check_deadline(deadline, process)
+
+            if run.is_settled(i):
+                for queue in waiting:
+                    if i in queue:
+                        queue.remove(i)
+            else:
+                phases_done[i].add(phase_index)
+                for next_index, needs in enumerate(_PHASE_NEEDS):
+                    if next_index not in phases_begun[i] and needs <= phases_done[i]:
+                        phases_begun[i].add(next_index)
+                        waiting[next_index].append(i)
+
+            is_finished = run.is_settled(i) or len(phases_done[i]) == len(_PHASES)
+            if is_finished and all(page != i for page, _, _ in futures.values()):
+                page_start = page_starts.pop(i)
+                if on_page_done is not None:
+                    on_page_done(i, run, page_start)
+
+        start_what_fits()
+
+
 app = typer.Typer()
 
 
@@ -849,7 +1498,10 @@ def main(  # noqa: PLR0913
     ] = None,
     batch_size: Annotated[
         int,
-        typer.Option(help="How many pages go through the pipeline phases together."),
+        typer.Option(
+            help="How many pages go through the pipeline phases together."
+            " Streamed, the most that may be part way through at once.",
+        ),
     ] = DEFAULT_BATCH_SIZE,
     use_existing_work_files: bool = typer.Option(
         default=False,
@@ -874,6 +1526,22 @@ def main(  # noqa: PLR0913
         default=False,
         help="Write debug colour-count text files during colour removal (slow).",
     ),
+    work_file_format: Annotated[
+        WorkFileFormat,
+        typer.Option(help="How to write intermediates. Those gmic reads always stay png."),
+    ] = DEFAULT_WORK_FILE_FORMAT,
+    memory_budget_gb: Annotated[
+        float | None,
+        typer.Option(
+            "--memory-budget-gb",
+            help="Memory the pages in the smooth and inpaint phases may take between them."
+            f" Defaults to {DEFAULT_BUDGET_SHARE:.0%} of what is free at the start.",
+        ),
+    ] = None,
+    scheduling: Annotated[
+        PhaseScheduling,
+        typer.Option(help="Stream pages through the phases, or run them a batch at a time."),
+    ] = DEFAULT_PHASE_SCHEDULING,
 ) -> None:
     init_logging(APP_LOGGING_NAME, "batch-restore.log", log_level_str)
 
@@ -897,6 +1565,9 @@ def main(  # noqa: PLR0913
         debug_color_counts=debug_color_counts,
         keep_work_files=keep_work_files,
         force=force,
+        work_file_format=work_file_format,
+        memory_budget_mb=memory_budget_gb * 1024 if memory_budget_gb else None,
+        scheduling=scheduling,
     )
 
 
@@ -26,7 +26,7 @@ from barks_comic_building.restore.upscale_ledger import (
     OUTCOME_OK,
     UpscaleLedgerWriter,
     get_default_upscale_ledger_file,
-    read_upscale_ledger,
+    read_upscale_ledger_index,
 )
 from barks_comic_building.restore.upscale_recipe import UpscaleRecipe, get_current_recipe
 from barks_comic_building.restore.upscale_state import (
@@ -213,7 +213,7 @@ def _log_run_estimate(
         logger.info("Nothing to upscayl - every page is already up to date with this recipe.")
         return
 
-    stats = read_upscale_ledger(ledger_file).timing_stats(recipe.recipe_id)
+    stats = read_upscale_ledger_index(ledger_file).timing_stats(recipe.recipe_id)
     if stats is None:
         logger.info(f"{len(jobs)} page(s) to upscayl. No timings yet for this recipe.")
         return
@@ -17,27 +17,49 @@ was made from.
 So the structural checks stand alone, and the content check needs the source. Both return a
 description of the first fault rather than raising, because the sweep tool wants to report
 every page it finds and the pipeline wants to stop on the first.
+
+A png is checked without being decoded. Decoding a 100MP page to prove it readable took the
+whole page into memory - as much as 800MB for an RGB one, with the RGB copy its thumbnail
+was reduced from - in every restore worker that checked one. Instead its chunks are walked
+and its image data inflated a window at a time by `check_png_image_data`, which finds the
+damaged stream just as surely, and the thumbnail the blank test needs is averaged from the
+rows as they pass. Nothing larger than a window of the file and two rows of pixels is held.
+
+A run of writes is checked through `ImageChecks`, which reads each image it is asked about
+once however many checks look at it, and takes a page still in memory from the step that
+wrote it in place of reading the file's pixels back at all.
 """
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
+import numpy as np
+from numba import jit
 from PIL import Image, ImageChops, ImageStat
 
+from barks_comic_building.restore.png_chunks import check_png_image_data, read_png_header
+
 if TYPE_CHECKING:
     from pathlib import Path
 
+    import cv2 as cv
+
+    from barks_comic_building.restore.png_chunks import PngHeader
+
 __all__ = [
     "CHECK_THUMBNAIL_SIZE",
     "MAX_THUMBNAIL_DEVIATION",
     "MIN_THUMBNAIL_STDDEV",
     "SIZE_TOLERANCE",
+    "CheckedImage",
+    "ImageChecks",
     "find_content_fault",
     "find_structural_fault",
     "get_check_thumbnail",
     "get_thumbnail_deviation",
     "get_thumbnail_stddev",
+    "predict_check_mb",
 ]
 
 Image.MAX_IMAGE_PIXELS = None
@@ -75,6 +97,13 @@ _PNG_IHDR_BIT_DEPTH_OFFSET = 24
 _PNG_HEADER_BYTES = 33
 _EIGHT_BIT = 8
 
+_BYTES_PER_MB = 1024 * 1024
+
+
+def _is_png(image_file: Path) -> bool:
+    with image_file.open("rb") as opened:
+        return opened.read(len(_PNG_MAGIC)) == _PNG_MAGIC
+
 
 def _find_bit_depth_fault(image_file: Path) -> str | None:
     """Return a fault if a png was written deeper than 8 bits per channel.
@@ -117,18 +146,278 @@ def _reduce_to_check_thumbnail(image: Image.Image) -> Image.Image:
     return image.convert("RGB").resize(CHECK_THUMBNAIL_SIZE, Image.Resampling.BOX)
 
 
+# The modes of the pngs whose thumbnails are averaged as they are read, by colour type: the
+# 8 bit ones with no palette. Everything else this library writes - the traced ink's palette
+# pngs - is at source size, where decoding it costs little, and so is decoded instead.
+_STREAMED_PNG_MODES = {0: "L", 2: "RGB", 4: "LA", 6: "RGBA"}
+
+
+@jit(nopython=True, cache=True)
+def _unfilter_row(  # noqa: PLR0912
+    filter_type: int, row: np.ndarray, prev: np.ndarray, cur: np.ndarray, bpp: int
+) -> None:
+    """Undo a png row filter: `row` as stored, less its filter byte, into `cur`."""
+    stride = cur.shape[0]
+    # One loop per filter rather than a test per byte, which is what keeps this near the
+    # speed of the inflate that feeds it.
+    if filter_type == 0:
+        cur[:] = row
+    elif filter_type == 1:
+        cur[:bpp] = row[:bpp]
+        for i in range(bpp, stride):
+            cur[i] = (row[i] + cur[i - bpp]) & 0xFF
+    elif filter_type == 2:  # noqa: PLR2004
+        for i in range(stride):
+            cur[i] = (row[i] + prev[i]) & 0xFF
+    elif filter_type == 3:  # noqa: PLR2004
+        for i in range(bpp):
+            cur[i] = (row[i] + prev[i] // 2) & 0xFF
+        for i in range(bpp, stride):
+            cur[i] = (row[i] + (np.int32(cur[i - bpp]) + prev[i]) // 2) & 0xFF
+    else:
+        for i in range(bpp):
+            cur[i] = (row[i] + prev[i]) & 0xFF
+        for i in range(bpp, stride):
+            a, b, c = np.int32(cur[i - bpp]), np.int32(prev[i]), np.int32(prev[i - bpp])
+            pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - 2 * c)
+            predictor = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+            cur[i] = (row[i] + predictor) & 0xFF
+
+
+@jit(nopython=True, cache=True)
+def _add_rows_to_thumbnail(  # noqa: PLR0913
+    rows: np.ndarray,
+    prev: np.ndarray,
+    bpp: int,
+    bin_of_row: np.ndarray,
+    bin_of_column: np.ndarray,
+    sums: np.ndarray,
+) -> None:
+    """Unfilter some rows of an 8 bit png and add their pixels to the thumbnail's bins.
+
+    `prev` is the unfiltered row before the first of them, all zero before the first row
+    of the image, and is left holding the last of them. `bin_of_row` gives the thumbnail
+    row each of them falls in. A grey pixel counts as the same value in all three
+    channels, and an alpha channel is left out, as `convert("RGB")` does.
+    """
+    stride = prev.shape[0]
+    width = bin_of_column.shape[0]
+    green, blue = (1, 2) if bpp >= 3 else (0, 0)  # noqa: PLR2004
+    cur = np.empty_like(prev)
+
+    for r in range(bin_of_row.shape[0]):
+        base = r * (stride + 1)
+        _unfilter_row(rows[base], rows[base + 1 : base + 1 + stride], prev, cur, bpp)
+
+        ty = bin_of_row[r]
+        for px in range(width):
+            tx = bin_of_column[px]
+            i = px * bpp
+            sums[ty, tx, 0] += cur[i]
+            sums[ty, tx, 1] += cur[i + green]
+            sums[ty, tx, 2] += cur[i + blue]
+
+        prev[:] = cur
+
+
+def _get_bins(length: int, num_bins: int) -> np.ndarray:
+    """Return the thumbnail bin that each of `length` pixels along an axis falls in."""
+    return np.arange(length) * num_bins // length
+
+
+def _get_thumbnail_of_sums(
+    sums: np.ndarray, bin_of_row: np.ndarray, bin_of_column: np.ndarray
+) -> Image.Image:
+    thumb_width, thumb_height = CHECK_THUMBNAIL_SIZE
+    counts = np.outer(
+        np.bincount(bin_of_row, minlength=thumb_height),
+        np.bincount(bin_of_column, minlength=thumb_width),
+    )
+    means = np.rint(sums / counts[:, :, np.newaxis]).astype(np.uint8)
+
+    return Image.fromarray(means, "RGB")
+
+
+class _ThumbnailAverager:
+    """Averages the rows of an 8 bit png into a check thumbnail as they are inflated.
+
+    Each thumbnail pixel is the mean of the page's pixels that fall in it. PIL's box
+    resize weights the pixels straddling two of them between both, so the two can differ
+    by a fraction of a level; nothing a thumbnail is judged by comes near that.
+    """
+
+    def __init__(self, header: PngHeader) -> None:
+        thumb_width, thumb_height = CHECK_THUMBNAIL_SIZE
+        self._bpp = header.bytes_per_pixel
+        self._prev = np.zeros(header.get_stride(header.width), dtype=np.uint8)
+        self._bin_of_row = _get_bins(header.height, thumb_height)
+        self._bin_of_column = _get_bins(header.width, thumb_width)
+        self._sums = np.zeros((thumb_height, thumb_width, 3), dtype=np.int64)
+        self._num_rows = 0
+
+    def add_rows(self, rows: bytes) -> None:
+        num_rows = len(rows) // (len(self._prev) + 1)
+        _add_rows_to_thumbnail(
+            np.frombuffer(rows, dtype=np.uint8),
+            self._prev,
+            self._bpp,
+            self._bin_of_row[self._num_rows : self._num_rows + num_rows],
+            self._bin_of_column,
+            self._sums,
+        )
+        self._num_rows += num_rows
+
+    def get_thumbnail(self) -> Image.Image:
+        return _get_thumbnail_of_sums(self._sums, self._bin_of_row, self._bin_of_column)
+
+
+@jit(nopython=True, cache=True)
+def _add_image_to_thumbnail(
+    image: np.ndarray, bin_of_row: np.ndarray, bin_of_column: np.ndarray, sums: np.ndarray
+) -> None:
+    """Add the pixels of a page, as OpenCV holds it, to the thumbnail's bins, as RGB.
+
+    `image` has a third axis: BGR, BGRA, or a single grey channel counted in all three.
+    """
+    height, width, num_channels = image.shape
+    red, green = (2, 1) if num_channels >= 3 else (0, 0)  # noqa: PLR2004
+
+    for y in range(height):
+        ty = bin_of_row[y]
+        for x in range(width):
+            tx = bin_of_column[x]
+            sums[ty, tx, 0] += image[y, x, red]
+            sums[ty, tx, 1] += image[y, x, green]
+            sums[ty, tx, 2] += image[y, x, 0]
+
+
+def _average_cv_image(image: cv.typing.MatLike) -> Image.Image:
+    """Return the check thumbnail of a page in memory, as OpenCV holds it.
+
+    Averaged over the same bins as `_ThumbnailAverager`, so it is the thumbnail that
+    streaming the png it was written to gives, to the level.
+    """
+    thumb_width, thumb_height = CHECK_THUMBNAIL_SIZE
+    height, width = image.shape[:2]
+    bin_of_row = _get_bins(height, thumb_height)
+    bin_of_column = _get_bins(width, thumb_width)
+
+    sums = np.zeros((thumb_height, thumb_width, 3), dtype=np.int64)
+    _add_image_to_thumbnail(
+        image if image.ndim == 3 else image[:, :, np.newaxis],  # noqa: PLR2004
+        bin_of_row,
+        bin_of_column,
+        sums,
+    )
+
+    return _get_thumbnail_of_sums(sums, bin_of_row, bin_of_column)
+
+
+class CheckedImage(NamedTuple):
+    """What the checks look at in an image, all of it from one read."""
+
+    size: tuple[int, int]
+    mode: str
+    thumbnail: Image.Image
+    """Always RGB and `CHECK_THUMBNAIL_SIZE`."""
+
+
+def _read_for_check(image_file: Path) -> CheckedImage:
+    """Return an image's size, mode and check thumbnail, reading a png as a stream."""
+    if _is_png(image_file):
+        return _scan_png(image_file)
+
+    return _decode(image_file)
+
+
+def _scan_png(png_file: Path) -> CheckedImage:
+    """Return a png's size, mode and check thumbnail, without decoding it if it is large.
+
+    Raises:
+        ValueError: If the image data is damaged, or the file is not a png.
+
+    """
+    header = read_png_header(png_file)
+    if not _is_streamed(header):
+        check_png_image_data(png_file)
+        return _decode(png_file)
+
+    averager = _ThumbnailAverager(header)
+    check_png_image_data(png_file, averager.add_rows)
+
+    size = (header.width, header.height)
+    return CheckedImage(size, _STREAMED_PNG_MODES[header.colour_type], averager.get_thumbnail())
+
+
+def _is_streamed(header: PngHeader) -> bool:
+    """Whether a png's thumbnail is averaged as it is read, rather than decoded.
+
+    Smaller than the thumbnail it is decoded, since some thumbnail pixels would have no
+    page pixels in them, and a page that small costs nothing to decode.
+    """
+    return (
+        header.colour_type in _STREAMED_PNG_MODES
+        and header.bit_depth == _EIGHT_BIT
+        and not header.interlaced
+        and header.width >= CHECK_THUMBNAIL_SIZE[0]
+        and header.height >= CHECK_THUMBNAIL_SIZE[1]
+    )
+
+
+def _decode(image_file: Path) -> CheckedImage:
+    with Image.open(image_file) as image:
+        image.load()
+        # Asked of a thumbnail rather than of an exact colour count, because the blanks
+        # that turn up are not quite uniform and an exact test reads them as pictures:
+        # gmic handed back volume 4's page 099 as 104,399,984 black pixels and sixteen
+        # stray ones, which `getcolors(maxcolors=1)` waves straight through.
+        return CheckedImage(image.size, image.mode, _reduce_to_check_thumbnail(image))
+
+
+def predict_check_mb(image_file: Path) -> float:
+    """Return how much memory checking an image is expected to take, from its header.
+
+    A png read as a stream holds a window of it whatever its size, which counts as
+    nothing. Anything decoded holds two copies at full size: the image, a byte a band a
+    pixel, and the RGB copy its thumbnail is reduced from, three more.
+
+    Args:
+        image_file: The image.
+
+    Returns:
+        The prediction in megabytes, or 0 if the header cannot be read - the file is then
+        faulty, and the check finds that out without decoding anything.
+
+    """
+    try:
+        if _is_png(image_file) and _is_streamed(read_png_header(image_file)):
+            return 0.0
+        with Image.open(image_file) as image:
+            width, height = image.size
+            num_bands = len(image.getbands())
+    except (OSError, SyntaxError, ValueError):
+        return 0.0
+
+    return width * height * (num_bands + 3) / _BYTES_PER_MB
+
+
 def get_check_thumbnail(image_file: Path) -> Image.Image:
     """Return a small RGB thumbnail of an image, for comparing it against another.
 
+    A png is read as a stream, as `find_structural_fault` reads it, so a page is never
+    decoded whole to be compared either.
+
     Args:
         image_file: The image to reduce.
 
     Returns:
         The thumbnail, always RGB and `CHECK_THUMBNAIL_SIZE`.
 
+    Raises:
+        ValueError: If a png's image data is damaged.
+
     """
-    with Image.open(image_file) as image:
-        return _reduce_to_check_thumbnail(image)
+    return _read_for_check(image_file).thumbnail
 
 
 def get_thumbnail_stddev(thumbnail: Image.Image) -> float:
@@ -157,11 +446,11 @@ def get_thumbnail_deviation(image_file: Path, other_file: Path) -> float:
         The mean absolute difference, 0 for identical pictures and up to 255.
 
     """
-    difference = ImageChops.difference(
-        get_check_thumbnail(image_file),
-        get_check_thumbnail(other_file),
-    )
-    channel_means = ImageStat.Stat(difference).mean
+    return _get_deviation(get_check_thumbnail(image_file), get_check_thumbnail(other_file))
+
+
+def _get_deviation(thumbnail: Image.Image, other: Image.Image) -> float:
+    channel_means = ImageStat.Stat(ImageChops.difference(thumbnail, other)).mean
 
     return sum(channel_means) / len(channel_means)
 
@@ -173,7 +462,7 @@ def get_thumbnail_deviation(image_file: Path, other_file: Path) -> float:
 SIZE_TOLERANCE = 1
 
 
-def find_structural_fault(  # noqa: PLR0911
+def find_structural_fault(
     image_file: Path,
     *,
     expected_size: tuple[int, int] | None = None,
@@ -181,8 +470,9 @@ def find_structural_fault(  # noqa: PLR0911
 ) -> str | None:
     """Return what is wrong with a written image, from the file alone.
 
-    Every pixel is decoded, which is the only way to reach a damaged IDAT chunk - a broken
-    png can carry a perfectly good header, and `Image.open` alone reads no further.
+    Every byte of the image data is read, which is the only way to reach a damaged IDAT
+    chunk - a broken png can carry a perfectly good header, and `Image.open` alone reads no
+    further. A png is read as a stream, without being decoded; anything else is decoded.
 
     Args:
         image_file: The image to check.
@@ -194,46 +484,9 @@ def find_structural_fault(  # noqa: PLR0911
         A description of the first fault found, or None if the image is sound.
 
     """
-    if not image_file.is_file():
-        return "the file was not written"
-
-    too_deep = _find_bit_depth_fault(image_file)
-    if too_deep is not None:
-        return too_deep
-
-    try:
-        with Image.open(image_file) as image:
-            image.load()
-            size, mode = image.size, image.mode
-            # Asked of a thumbnail rather than of an exact colour count, because the blanks
-            # that turn up are not quite uniform and an exact test reads them as pictures:
-            # gmic handed back volume 4's page 099 as 104,399,984 black pixels and sixteen
-            # stray ones, which `getcolors(maxcolors=1)` waves straight through.
-            thumbnail = _reduce_to_check_thumbnail(image)
-    except (OSError, SyntaxError, ValueError) as exc:
-        # OSError covers PIL's "broken data stream" and "image file is truncated"; the
-        # other two cover a file that is not an image at all.
-        return f"the pixel data could not be read ({type(exc).__name__}: {exc})"
-
-    if expected_size is not None and any(
-        abs(got - want) > SIZE_TOLERANCE for got, want in zip(size, expected_size, strict=True)
-    ):
-        return f"it is {size[0]}x{size[1]} but {expected_size[0]}x{expected_size[1]} was expected"
-
-    if expected_mode is not None and mode != expected_mode:
-        return f'it is mode "{mode}" but "{expected_mode}" was expected'
-
-    spread = get_thumbnail_stddev(thumbnail)
-    if spread < MIN_THUMBNAIL_STDDEV:
-        # A blanked page: the shape of a picture with none of the content. Blank pages are
-        # not a restorable page type, so nothing legitimate lands here.
-        colour = tuple(round(mean) for mean in ImageStat.Stat(thumbnail).mean)
-        return (
-            f"every pixel is effectively the same colour {colour}"
-            f" (thumbnail spread {spread:.1f} < {MIN_THUMBNAIL_STDDEV})"
-        )
-
-    return None
+    return ImageChecks().find_fault(
+        image_file, expected_size=expected_size, expected_mode=expected_mode
+    )
 
 
 def find_content_fault(
@@ -254,7 +507,10 @@ def find_content_fault(
         A description of the fault, or None if the image is close enough to its source.
 
     """
-    deviation = get_thumbnail_deviation(srce_file, image_file)
+    return _find_deviation_fault(get_thumbnail_deviation(srce_file, image_file), max_deviation)
+
+
+def _find_deviation_fault(deviation: float, max_deviation: float) -> str | None:
     if deviation > max_deviation:
         return (
             f"it does not resemble the page it was made from"
@@ -262,3 +518,183 @@ def find_content_fault(
         )
 
     return None
+
+
+def _find_checked_image_fault(
+    checked: CheckedImage,
+    expected_size: tuple[int, int] | None,
+    expected_mode: str | None,
+) -> str | None:
+    """Return what is wrong with the shape or the look of an image that could be read."""
+    size = checked.size
+    if expected_size is not None and any(
+        abs(got - want) > SIZE_TOLERANCE for got, want in zip(size, expected_size, strict=True)
+    ):
+        return f"it is {size[0]}x{size[1]} but {expected_size[0]}x{expected_size[1]} was expected"
+
+    if expected_mode is not None and checked.mode != expected_mode:
+        return f'it is mode "{checked.mode}" but "{expected_mode}" was expected'
+
+    spread = get_thumbnail_stddev(checked.thumbnail)
+    if spread < MIN_THUMBNAIL_STDDEV:
+        # A blanked page: the shape of a picture with none of the content. Blank pages are
+        # not a restorable page type, so nothing legitimate lands here.
+        colour = tuple(round(mean) for mean in ImageStat.Stat(checked.thumbnail).mean)
+        return (
+            f"every pixel is effectively the same colour {colour}"
+            f" (thumbnail spread {spread:.1f} < {MIN_THUMBNAIL_STDDEV})"
+        )
+
+    return None
+
+
+def _get_signature(image_file: Path) -> tuple[int, int, int]:
+    stat = image_file.stat()
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ImageChecks:
+    """The checks of a run of writes, reading each image they look at no more than once.
+
+    A restore step's output is checked for its structure, then against what it was made
+    from, and then the next step's output is checked against it in turn - three reads of
+    the same page, each of every byte of it, to find one size, one mode and one thumbnail.
+    Here an image is read once, into a `CheckedImage`, kept against its inode, size and
+    nanosecond mtime, and every later check of it is answered from that. An image written
+    again since is read again.
+
+    A step that still holds the page it has just written hands it over with `add_written`.
+    The file is then only confirmed as a stream - every chunk, CRC and row of it, with
+    nothing unfiltered - and the thumbnail is averaged from the page in memory.
+
+    Only thumbnails are kept, so one of these can last a page's steps for next to nothing.
+    """
+
+    def __init__(self) -> None:
+        self._checked: dict[Path, tuple[tuple[int, int, int], CheckedImage]] = {}
+        self.num_read = 0
+        self.num_reused = 0
+
+    def add_written(self, image_file: Path, image: cv.typing.MatLike) -> None:
+        """Take the page a png was just written from, to check the png by.
+
+        Nothing is kept unless the file streams cleanly, is what it would be read as,
+        and is the page's size: whatever is wrong is then left for `find_fault` to read
+        and report as it would any other file.
+
+        Args:
+            image_file: The png just written.
+            image: The BGR, BGRA or grey page it was written from, as OpenCV holds it.
+
+        """
+        if image.ndim == 3 and image.shape[2] not in (3, 4):  # noqa: PLR2004
+            return
+
+        try:
+            signature = _get_signature(image_file)
+            if not _is_png(image_file):
+                return
+            header = check_png_image_data(image_file)
+        except (OSError, ValueError):
+            return
+
+        size = (header.width, header.height)
+        if not _is_streamed(header) or size != (image.shape[1], image.shape[0]):
+            return
+
+        mode = _STREAMED_PNG_MODES[header.colour_type]
+        self._checked[image_file] = (signature, CheckedImage(size, mode, _average_cv_image(image)))
+
+    def get_size(self, image_file: Path) -> tuple[int, int]:
+        """Return an image's (width, height), from what was read of it or from its header."""
+        checked = self._find_checked(image_file)
+        if checked is not None:
+            return checked.size
+
+        with Image.open(image_file) as image:
+            return image.size
+
+    def get_checked_image(self, image_file: Path) -> CheckedImage:
+        """Return what the checks look at in an image, reading it only if it is new.
+
+        Raises:
+            ValueError: If a png's image data is damaged. Reading anything else can raise
+                whatever PIL raises for it, OSError or SyntaxError, as can a missing file.
+
+        """
+        checked = self._find_checked(image_file)
+        if checked is not None:
+            return checked
+
+        signature = _get_signature(image_file)
+        checked = _read_for_check(image_file)
+        self._checked[image_file] = (signature, checked)
+        self.num_read += 1
+
+        return checked
+
+    def _find_checked(self, image_file: Path) -> CheckedImage | None:
+        entry = self._checked.get(image_file)
+        if entry is None:
+            return None
+        try:
+            if entry[0] != _get_signature(image_file):
+                return None
+        except OSError:
+            return None
+
+        self.num_reused += 1
+        return entry[1]
+
+    def find_fault(
+        self,
+        image_file: Path,
+        *,
+        expected_size: tuple[int, int] | None = None,
+        expected_mode: str | None = None,
+        srce_file: Path | None = None,
+        max_deviation: float = MAX_THUMBNAIL_DEVIATION,
+    ) -> str | None:
+        """Return what is wrong with a written image, reading it and its source once at most.
+
+        The checks of `find_structural_fault`, then of `find_content_fault` if there is a
+        source to compare against.
+
+        Args:
+            image_file: The image to check.
+            expected_size: The (width, height) it should have, to within `SIZE_TOLERANCE`,
+                or None not to check.
+            expected_mode: The PIL mode it should have, or None not to check.
+            srce_file: What it was made from, to compare it against, or None not to.
+            max_deviation: How far from `srce_file` it may be.
+
+        Returns:
+            A description of the first fault found, or None if the image is sound.
+
+        Raises:
+            ValueError: If `srce_file` cannot be read, or whatever reading it raised, as
+                `get_checked_image` describes.
+
+        """
+        if not image_file.is_file():
+            return "the file was not written"
+
+        too_deep = _find_bit_depth_fault(image_file)
+        if too_deep is not None:
+            return too_deep
+
+        try:
+            checked = self.get_checked_image(image_file)
+        except (OSError, SyntaxError, ValueError) as exc:
+            # OSError covers PIL's "broken data stream" and "image file is truncated"; the
+            # other two cover a file that is not an image at all.
+            return f"the pixel data could not be read ({type(exc).__name__}: {exc})"
+
+        fault = _find_checked_image_fault(checked, expected_size, expected_mode)
+        if fault is not None or srce_file is None:
+            return fault
+
+        srce_thumbnail = self.get_checked_image(srce_file).thumbnail
+        return _find_deviation_fault(
+            _get_deviation(srce_thumbnail, checked.thumbnail), max_deviation
+        )
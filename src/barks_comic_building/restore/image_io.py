@@ -1,24 +1,27 @@
 from __future__ import annotations
 
-import os
+from enum import StrEnum
 from typing import TYPE_CHECKING
 
 import cairosvg
 import cv2 as cv
+import numpy as np
 import oxipng
+from cairosvg.parser import Tree
+from cairosvg.surface import PNGSurface
 from comic_utils.comic_consts import JPG_FILE_EXT, PNG_FILE_EXT
 from comic_utils.pil_image_utils import (
     METADATA_PROPERTY_GROUP,
     SAVE_JPG_COMPRESS_LEVEL,
     SAVE_JPG_QUALITY,
     SAVE_PNG_COMPRESSION,
-    add_png_metadata,
     load_pil_image_from_bytes,
 )
 from PIL import Image, ImageOps
 from PIL.PngImagePlugin import PngInfo
 
 from barks_comic_building.restore.gmic_exe import run_gmic
+from barks_comic_building.restore.png_chunks import read_png_text, splice_png_text
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -31,18 +34,127 @@ Image.MAX_IMAGE_PIXELS = None
 # 2.0s. Storing it raw was costing fifty times the disk for a third of a second.
 _FAST_PNG_COMPRESSION = 1
 
-# The zero-length chunk every finished png ends with: length, type, and its fixed crc.
-_PNG_IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB\x60\x82"
+
+class WorkFileFormat(StrEnum):
+    """How an intermediate in the work directory is written.
+
+    None of these loses anything, so the choice never changes a restored page. What they
+    trade is encode time against disk: the optimised png the deliverables are written as
+    spends seconds a page squeezing files that are deleted minutes later.
+    """
+
+    PNG = "png"
+    """Png at the cheapest deflate level. A tenth of the optimised png's encode time."""
+
+    PNG_STORED = "png-stored"
+    """Png with no compression at all. Fastest to write of the gmic-readable forms, and
+    the biggest on disk."""
+
+    NPY = "npy"
+    """The raw array, read back as a copy-on-write memory map. No encode and no decode,
+    but only this package can read it."""
+
+    @property
+    def suffix(self) -> str:
+        """Return the file extension a work file of this format is named with."""
+        match self:
+            case WorkFileFormat.NPY:
+                return ".npy"
+            case _:
+                return PNG_FILE_EXT
+
+    @property
+    def is_gmic_readable(self) -> bool:
+        """Return whether gmic can take a file in this format as input."""
+        return self in (WorkFileFormat.PNG, WorkFileFormat.PNG_STORED)
+
+    def for_gmic(self) -> WorkFileFormat:
+        """Return this format, or the fast png in its place if gmic cannot read it."""
+        return self if self.is_gmic_readable else WorkFileFormat.PNG
+
+
+DEFAULT_WORK_FILE_FORMAT = WorkFileFormat.PNG
+
+
+class ResizeBackend(StrEnum):
+    """What scales the 4x restored page back down to the size of the source."""
+
+    OPENCV = "opencv"
+    """In process, with `cv.INTER_AREA`, writing the pixels and the metadata in one encode.
+
+    gmic's resize below runs with its moving average interpolation, which weights the
+    source pixels as `INTER_AREA` does, and the two agree to within `RESIZE_TOLERANCE`,
+    whether or not the page is a whole number of blocks across. The difference is only
+    that gmic truncates each mean where `INTER_AREA` rounds it, which is why the backend
+    is not part of the recipe: a page redone for it would be indistinguishable from the
+    one it replaced.
+    """
+
+    GMIC = "gmic"
+    """The original: a gmic process to resize, then the metadata spliced in ahead of the
+    image gmic wrote."""
+
+
+DEFAULT_RESIZE_BACKEND = ResizeBackend.OPENCV
+
+# The most any channel of any pixel may differ between the two resize backends.
+RESIZE_TOLERANCE = 1
 
 
 def svg_file_to_png(svg_file: Path, png_file: Path) -> None:
+    pil_image = _svg_file_to_pil_image(svg_file)
+    pil_image.save(str(png_file), optimize=False, compress_level=_FAST_PNG_COMPRESSION)
+
+
+def svg_file_to_rgba_array(svg_file: Path) -> np.ndarray:
+    """Render an svg at its own size, returning the pixels rather than writing them.
+
+    The same render `svg_file_to_png` writes out, but taken straight from the cairo
+    surface cairosvg draws on, so that a step that only wants the pixels does not pay for
+    a 4x png to be encoded and then decoded again. The surface holds premultiplied BGRA;
+    it is unpremultiplied the way cairo does before it writes a png, so the pixels are
+    exactly those the png would have held.
+
+    Args:
+        svg_file: The svg to render.
+
+    Returns:
+        The RGBA pixels.
+
+    """
+    surface = PNGSurface(Tree(url=str(svg_file)), None, dpi=96).cairo
+    surface.flush()
+    width, height = surface.get_width(), surface.get_height()
+
+    # FORMAT_ARGB32 is a native-endian 32-bit word, so B, G, R, A in memory here. Each
+    # row may be padded out to the stride.
+    rows = np.frombuffer(surface.get_data(), np.uint8).reshape(height, surface.get_stride())
+    rgba = rows[:, : width * 4].reshape(height, width, 4)[..., [2, 1, 0, 3]]
+    _unpremultiply(rgba)
+
+    return rgba
+
+
+def _unpremultiply(rgba: np.ndarray) -> None:
+    """Undo cairo's premultiplied alpha in place, rounding as cairo's png writer does.
+
+    Only the partly transparent pixels need it: an opaque pixel is its own colour, and a
+    fully transparent one is already all zero. On line art that is the antialiased edges.
+    """
+    alpha = rgba[..., 3]
+    partial = (alpha > 0) & (alpha < 255)  # noqa: PLR2004
+    colours = rgba[partial, :3].astype(np.uint32)
+    partial_alpha = alpha[partial].astype(np.uint32)[:, np.newaxis]
+    rgba[partial, :3] = (colours * 255 + partial_alpha // 2) // partial_alpha
+
+
+def _svg_file_to_pil_image(svg_file: Path) -> Image.Image:
     png_image = cairosvg.svg2png(url=str(svg_file), scale=1, background_color=None)
 
     # svg2png returns the bytes unless it was handed a 'write_to' target, which it wasn't.
     assert png_image is not None
 
-    pil_image = load_pil_image_from_bytes(png_image, ext=PNG_FILE_EXT)
-    pil_image.save(str(png_file), optimize=False, compress_level=_FAST_PNG_COMPRESSION)
+    return load_pil_image_from_bytes(png_image, ext=PNG_FILE_EXT)
 
 
 def svg_file_to_optimized_png(
@@ -75,6 +187,10 @@ def read_png_metadata(png_file: Path) -> dict[str, str]:
     Everything in this codebase writes its metadata through ``pnginfo=`` at save time,
     which Pillow puts before the image data.
 
+    Nor does it go through Pillow at all: `read_png_text` walks the chunks itself over a
+    memory map, which reads what Pillow's ``info`` would have held for a fraction of the
+    cost, and checks the file is finished in the same open.
+
     A file not ending in an IEND chunk is treated as unreadable. A write killed part way
     leaves the text chunks in place with no pixels behind them, and reporting its metadata
     would let a half written page pass as a finished one - which the full decode used to
@@ -90,40 +206,29 @@ def read_png_metadata(png_file: Path) -> dict[str, str]:
     """
     prefix = f"{METADATA_PROPERTY_GROUP}:"
 
-    if not _is_complete_png(png_file):
-        return {}
-
-    try:
-        with Image.open(str(png_file)) as pil_image:
-            text = dict(pil_image.info)
-    except (OSError, ValueError):
-        return {}
-
-    # `info` holds the other png chunks too, whose keys and values are not all strings.
     return {
         key.removeprefix(prefix): value
-        for key, value in text.items()
-        if isinstance(key, str) and key.startswith(prefix) and isinstance(value, str)
+        for key, value in read_png_text(png_file).items()
+        if key.startswith(prefix)
     }
 
 
-def _is_complete_png(png_file: Path) -> bool:
-    """Return whether a png ends with the IEND chunk that closes a finished file.
+def splice_png_metadata(png_file: Path, metadata: dict[str, str]) -> None:
+    """Stamp a finished png with metadata, under the ``BARKS:`` prefix, in place.
 
-    Args:
-        png_file: The png to check.
+    What ``add_png_metadata`` did after a gmic resize or an upscale, but without decoding
+    and re-encoding the page to do it: the text goes in ahead of the image data, which is
+    copied across byte for byte. On a 4x page that is a copy of the file against seconds of
+    deflate. A key already on the page is replaced rather than written twice.
 
-    Returns:
-        True if the file ends in IEND. False if it does not, or is too short to, or
-        cannot be read.
+    Args:
+        png_file: The png to stamp.
+        metadata: The metadata, keyed without the group prefix.
 
     """
-    try:
-        with png_file.open("rb") as f:
-            f.seek(-len(_PNG_IEND_CHUNK), os.SEEK_END)
-            return f.read(len(_PNG_IEND_CHUNK)) == _PNG_IEND_CHUNK
-    except OSError:
-        return False
+    splice_png_text(
+        png_file, {f"{METADATA_PROPERTY_GROUP}:{key}": value for key, value in metadata.items()}
+    )
 
 
 def write_cv_image_file(
@@ -140,20 +245,118 @@ def write_cv_image_file(
     cv.imwrite(str(file), image)
 
 
-def resize_image_file(
-    in_file: Path, srce_scale: int, resized_file: Path, metadata: dict[str, str]
+def write_work_image_file(
+    file: Path, image: cv.typing.MatLike, work_file_format: WorkFileFormat
 ) -> None:
+    """Write an intermediate that only this pipeline, or gmic, will read.
+
+    The png forms drop any alpha channel, exactly as `write_cv_image_file` always has.
+    gmic has only ever been handed the colour-removed page as RGB, and the smoothing is
+    tuned against that, so a fast writer that kept the alpha would change the pages.
+
+    Args:
+        file: Where to write it. Its extension should be `work_file_format.suffix`.
+        image: The BGR or BGRA image.
+        work_file_format: How to write it.
+
+    """
+    match work_file_format:
+        case WorkFileFormat.NPY:
+            np.save(file, image)
+        case _:
+            level = 0 if work_file_format is WorkFileFormat.PNG_STORED else _FAST_PNG_COMPRESSION
+            colour_image = image[:, :, :3] if image.ndim == 3 else image  # noqa: PLR2004
+            if not cv.imwrite(str(file), colour_image, [cv.IMWRITE_PNG_COMPRESSION, level]):
+                msg = f'Could not write work file: "{file}".'
+                raise OSError(msg)
+
+
+def read_work_image_file(file: Path) -> cv.typing.MatLike:
+    """Read an intermediate back, whichever `WorkFileFormat` it was written in.
+
+    The format is told from the file's extension. An npy file comes back as a
+    copy-on-write memory map, so the caller can change it in place without the pages it
+    changes being read ahead of time, or anything being written back.
+
+    Args:
+        file: The work file.
+
+    Returns:
+        The BGR image.
+
+    Raises:
+        FileNotFoundError: If the file cannot be read.
+
+    """
+    if file.suffix == WorkFileFormat.NPY.suffix:
+        return np.load(file, mmap_mode="c")
+
+    image = cv.imread(str(file))
+    if image is None:
+        msg = f'Could not read work file: "{file}".'
+        raise FileNotFoundError(msg)
+
+    return image
+
+
+def resize_image_file(
+    in_file: Path,
+    srce_scale: int,
+    resized_file: Path,
+    metadata: dict[str, str],
+    backend: ResizeBackend = DEFAULT_RESIZE_BACKEND,
+) -> cv.typing.MatLike | None:
+    """Scale an upscaled page back down by `srce_scale`, writing it with `metadata`.
+
+    Returns:
+        The resized page, when it was made as a png in this process, for the caller to
+        check the file by without reading it back. None when gmic made it, or it was
+        written as a jpeg, which does not hold the page as it was.
+
+    """
     if resized_file.suffix == JPG_FILE_EXT:
         _resize_jpeg_file(in_file, srce_scale, resized_file, metadata)
-        return
+        return None
 
     if resized_file.suffix == PNG_FILE_EXT:
-        _resize_png_file(in_file, srce_scale, resized_file, metadata)
-        return
+        if backend is ResizeBackend.GMIC:
+            _resize_png_file(in_file, srce_scale, resized_file, metadata)
+            return None
+
+        image = cv.imread(str(in_file))
+        assert image is not None
+        resized = resize_image(image, srce_scale)
+        write_cv_image_file(resized_file, resized, metadata)
+        return resized
 
     raise AssertionError
 
 
+def resize_image(image: cv.typing.MatLike, srce_scale: int) -> cv.typing.MatLike:
+    """Return an upscaled page scaled back down by `srce_scale`.
+
+    Sized the way gmic sizes a percentage resize, rounding a half up rather than
+    truncating, so that a page whose width is not a multiple of the scale comes out the
+    same size whichever backend made it - volume 8's page 162 is 8702 across and has
+    always come back 2176.
+
+    Args:
+        image: The upscaled page.
+        srce_scale: What it was upscaled by.
+
+    Returns:
+        The page at the source's size.
+
+    """
+    height, width = image.shape[:2]
+    size = (
+        max(1, (width + srce_scale // 2) // srce_scale),
+        max(1, (height + srce_scale // 2) // srce_scale),
+    )
+
+    return cv.resize(image, size, interpolation=cv.INTER_AREA)
+
+
 def _resize_jpeg_file(
     in_file: Path, srce_scale: int, resized_file: Path, metadata: dict[str, str]
 ) -> None:
@@ -180,7 +383,7 @@ def _resize_png_file(
 
     run_gmic(resize_cmd)
 
-    add_png_metadata(resized_file, metadata)
+    splice_png_metadata(resized_file, metadata)
 
 
 def _write_cv_png_file(
@@ -4,7 +4,12 @@ import cv2 as cv
 import numpy as np
 
 from barks_comic_building.restore.gmic_exe import run_gmic
-from barks_comic_building.restore.image_io import write_cv_image_file
+from barks_comic_building.restore.image_io import (
+    DEFAULT_WORK_FILE_FORMAT,
+    WorkFileFormat,
+    write_cv_image_file,
+    write_work_image_file,
+)
 
 # gmic 'fx_inpaint_matchpatch' parameters (fixed). Named so that the restore recipe can
 # record what the colour layer was filled with.
@@ -24,12 +29,15 @@ GMIC_INPAINT_MATCHPATCH_PARAMS = '"1","5","26","5","1","255","0","0","255","1","
 _GMIC_CLAMP_TO_8_BIT = ("cut", "0,255")
 
 
-def inpaint_image_file(
+def inpaint_image_file(  # noqa: PLR0913
     work_dir: Path,
     work_file_stem: str,
     in_file: Path,
     black_ink_mask_file: Path,
     out_file: Path,
+    *,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+    write_debug_files: bool = False,
 ) -> None:
     """Fill an image's black ink areas with colour taken from around them.
 
@@ -39,6 +47,9 @@ def inpaint_image_file(
         in_file: The colour page to fill.
         black_ink_mask_file: The colour-removed page, dark where the ink is.
         out_file: Where to write the filled page.
+        work_file_format: How to write the page handed to gmic. Always a form gmic can
+            read, whatever is asked for.
+        write_debug_files: Also write the remove mask, which nothing downstream reads.
 
     Raises:
         FileNotFoundError: If either input image is missing.
@@ -64,8 +75,9 @@ def inpaint_image_file(
     _, _, r_remove_mask = cv.split(remove_mask)
 
     remove_mask = np.uint8(r_remove_mask)
-    remove_mask_file = work_dir / f"{work_file_stem}-remove-mask.png"
-    write_cv_image_file(remove_mask_file, remove_mask)  # ty: ignore[invalid-argument-type]
+    if write_debug_files:
+        remove_mask_file = work_dir / f"{work_file_stem}-remove-mask.png"
+        write_cv_image_file(remove_mask_file, remove_mask)  # ty: ignore[invalid-argument-type]
 
     # gmic blend/remove - pipeline??
     b, g, r = cv.split(input_image)
@@ -74,7 +86,7 @@ def inpaint_image_file(
     r = np.where(remove_mask == 255, 255, r)  # noqa: PLR2004
     out_image = cv.merge([b, g, r])
     in_file_black_removed = work_dir / f"{work_file_stem}-input-black-removed.png"
-    write_cv_image_file(in_file_black_removed, out_image)
+    write_work_image_file(in_file_black_removed, out_image, work_file_format.for_gmic())
 
     run_gmic(
         [
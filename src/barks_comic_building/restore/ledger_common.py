@@ -7,15 +7,26 @@ mid-write, generating a run id that cannot collide, noting which commit produced
 
 The record shapes themselves stay with each stage, since they have little in common
 beyond the run and page split.
+
+So does what each stage keeps in its index. A ledger is read back far more often than it
+is written - every status report and every run estimate starts by reading it - and years
+of runs make a full parse a startup cost measured in seconds. `JsonlIndex` keeps what
+the reports ask for in a sidecar file, noting how far into the ledger it has read, and
+brings itself up to date by reading only what has been appended since. The ledger stays
+the one source of truth: the index is thrown away and rebuilt whenever it does not match
+it, and deleting it costs nothing but one full read.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
+import math
 import os
 import socket
 import subprocess
 import uuid
+from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
@@ -41,6 +52,17 @@ OUTCOME_STOPPED = "stopped"
 # passed over so that the ledger accounts for every page a run looked at.
 OUTCOME_PRESENT = "present"
 
+INDEX_SUFFIX = ".index.json"
+
+# How finely an index buckets page times for their median. Each bucket spans 2%, so the
+# median read back from one is within 1% of the true figure, however many pages went in.
+MEDIAN_BUCKET_RATIO = 1.02
+
+# How much of the start of a ledger the index remembers a hash of. A ledger is only ever
+# appended to, so if its start has changed it has been replaced, and the index describes
+# some other file.
+_INDEX_HEAD_BYTES = 4096
+
 
 def now() -> str:
     """Return the current time as an iso timestamp.
@@ -100,6 +122,40 @@ def get_host() -> str:
     return socket.gethostname()
 
 
+def add_to_median_buckets(buckets: dict[int, int], seconds: float, count: int = 1) -> None:
+    """Count a page time, or several in the same bucket, towards a bucketed median."""
+    bucket = math.ceil(math.log(seconds, MEDIAN_BUCKET_RATIO))
+    buckets[bucket] = buckets.get(bucket, 0) + count
+
+
+def get_bucketed_median(buckets: dict[int, int], count: int) -> float:
+    """Return the median of the page times counted into some buckets, to within 1%.
+
+    Read as the middle page's bucket, at the point within 1% of anything in it. An even
+    count has two middle pages, which are averaged as `statistics.median` does. What an
+    index keeps in place of the times themselves, so that it holds the same few numbers
+    however many pages it has seen.
+
+    Args:
+        buckets: How many page times fell into each bucket.
+        count: How many page times there are in all.
+
+    Returns:
+        The median.
+
+    """
+    ranks = sorted({(count - 1) // 2, count // 2})
+    middles: list[float] = []
+    num_seen = 0
+    for bucket, bucket_count in sorted(buckets.items()):
+        num_seen += bucket_count
+        while ranks and ranks[0] < num_seen:
+            ranks.pop(0)
+            middles.append(2 * MEDIAN_BUCKET_RATIO**bucket / (MEDIAN_BUCKET_RATIO + 1))
+
+    return sum(middles) / len(middles)
+
+
 class JsonlWriter:
     """Appends json records, one per line, flushing as it goes.
 
@@ -149,6 +205,21 @@ class JsonlWriter:
         self._file.flush()
 
 
+def _parse_line(line: str | bytes, schema: int) -> dict[str, Any]:
+    """Return the record on a ledger line.
+
+    Raises:
+        ValueError: If the line is not json, or was written by a newer schema.
+
+    """
+    record = json.loads(line)
+    if record.get("schema", 0) > schema:
+        msg = f"schema {record.get('schema')} is newer than {schema}"
+        raise ValueError(msg)
+
+    return record
+
+
 def read_records(path: Path, schema: int) -> Iterator[dict[str, Any]]:
     """Yield the readable records of a ledger.
 
@@ -174,11 +245,8 @@ def read_records(path: Path, schema: int) -> Iterator[dict[str, Any]]:
             if not line.strip():
                 continue
             try:
-                record = json.loads(line)
-                if record.get("schema", 0) > schema:
-                    msg = f"schema {record.get('schema')} is newer than {schema}"
-                    raise ValueError(msg)  # noqa: TRY301
-            except (json.JSONDecodeError, ValueError) as exc:
+                record = _parse_line(line, schema)
+            except ValueError as exc:
                 num_skipped += 1
                 logger.debug(f'Skipping ledger line {line_num} of "{path}": {exc}.')
                 continue
@@ -187,3 +255,141 @@ def read_records(path: Path, schema: int) -> Iterator[dict[str, Any]]:
 
     if num_skipped:
         logger.warning(f'Skipped {num_skipped} unreadable line(s) in "{path}".')
+
+
+class JsonlIndex(ABC):
+    """What the reports need from a ledger, kept beside it and updated as it grows.
+
+    Subclasses say what to keep: `_reset` empties it, `_add` takes in one record, and
+    `_get_state` and `_set_state` turn it to and from json. This class does the rest -
+    finding the sidecar, checking it still belongs to the ledger, and reading only the
+    lines appended since it was saved.
+
+    Only whole lines are read. A last line without its newline is either still being
+    written or was cut off by a hard kill, and either way the next update reads it in
+    whatever state it is in by then, as a full read of the ledger would.
+    """
+
+    INDEX_VERSION = 1
+    """Bumped when what a subclass keeps changes shape, so that old indexes are rebuilt."""
+
+    def __init__(self, ledger_file: Path, schema: int) -> None:
+        """Note the ledger to index. Nothing is read until `update`.
+
+        Args:
+            ledger_file: The ledger. The index lives beside it.
+            schema: The newest ledger schema the caller understands.
+
+        """
+        self.ledger_file = ledger_file
+        self.index_file = ledger_file.with_name(ledger_file.name + INDEX_SUFFIX)
+        self.schema = schema
+        self.offset = 0
+        self.num_new_records = 0
+        self._reset()
+
+    @abstractmethod
+    def _reset(self) -> None:
+        """Empty what is kept, as for a ledger with nothing in it."""
+
+    @abstractmethod
+    def _add(self, record: dict[str, Any]) -> None:
+        """Take in one record, the next in the ledger."""
+
+    @abstractmethod
+    def _get_state(self) -> dict[str, Any]:
+        """Return what is kept, as json."""
+
+    @abstractmethod
+    def _set_state(self, state: dict[str, Any]) -> None:
+        """Take up what is kept from the json `_get_state` returned."""
+
+    def _get_head(self, length: int) -> str:
+        """Return a hash of the ledger's first bytes, up to `length` of them."""
+        with self.ledger_file.open("rb") as f:
+            return hashlib.sha256(f.read(min(length, _INDEX_HEAD_BYTES))).hexdigest()
+
+    def _load(self) -> None:
+        """Take up the saved index, if there is one and it still matches the ledger."""
+        try:
+            saved = json.loads(self.index_file.read_text(encoding="utf-8"))
+            offset = int(saved["offset"])
+            is_current = (
+                saved["version"] == self.INDEX_VERSION
+                and saved["schema"] == self.schema
+                and offset <= self.ledger_file.stat().st_size
+                and saved["head"] == self._get_head(offset)
+            )
+            if is_current:
+                self._set_state(saved["state"])
+                self.offset = offset
+                return
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug(f'Not using ledger index "{self.index_file}": {exc}.')
+        else:
+            logger.info(f'Ledger index "{self.index_file}" is out of date - rebuilding it.')
+
+        self._reset()
+        self.offset = 0
+
+    def _save(self) -> None:
+        """Write the index out. Written to one side and renamed, so it is never half there."""
+        saved = {
+            "version": self.INDEX_VERSION,
+            "schema": self.schema,
+            "offset": self.offset,
+            "head": self._get_head(self.offset),
+            "state": self._get_state(),
+        }
+
+        temp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        try:
+            temp_file.write_text(json.dumps(saved, separators=(",", ":")), encoding="utf-8")
+            temp_file.replace(self.index_file)
+        except OSError as exc:
+            # Only ever a cache. The next read does the work again, and nothing is lost.
+            logger.warning(f'Could not save ledger index "{self.index_file}": {exc}.')
+
+    def update(self) -> Self:
+        """Bring the index up to date with the ledger, reading only what is new.
+
+        Returns:
+            This index, for chaining onto the constructor.
+
+        """
+        self.num_new_records = 0
+        if not self.ledger_file.is_file():
+            self._reset()
+            self.offset = 0
+            return self
+
+        self._load()
+
+        with self.ledger_file.open("rb") as f:
+            f.seek(self.offset)
+            new_bytes = f.read()
+        whole_lines_end = new_bytes.rfind(b"\n") + 1
+        if whole_lines_end == 0:
+            return self
+
+        num_skipped = 0
+        for line in new_bytes[:whole_lines_end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = _parse_line(line, self.schema)
+            except ValueError as exc:
+                num_skipped += 1
+                logger.debug(f'Skipping ledger line in "{self.ledger_file}": {exc}.')
+                continue
+
+            self._add(record)
+            self.num_new_records += 1
+
+        if num_skipped:
+            logger.warning(f'Skipped {num_skipped} unreadable line(s) in "{self.ledger_file}".')
+
+        self.offset += whole_lines_end
+        self._save()
+
+        return self
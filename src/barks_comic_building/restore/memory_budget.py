@@ -0,0 +1,268 @@
+"""How much memory a page will take, and whether there is room to start another one.
+
+The memory-hungry phases used to run a fixed number of pages at once - six smooths and
+four inpaints, or one of each on a machine under `SMALL_RAM`. Those counts were picked for
+one machine and a typical page, so they leave RAM idle on a bigger machine and risk an
+out-of-memory kill when a batch happens to be all double-page spreads, whose 4x upscales
+are twice the megapixels of an ordinary page.
+
+So rather than counting pages, the batch driver now adds up what the pages it has running
+are expected to take and only starts another while that fits a budget. The expectation is
+measured rather than guessed: every step samples the peak resident memory of its worker
+and of any gmic children it spawned, the ledger records that beside the page's
+megapixels, and a page's prediction is its own megapixels times the worst megabytes per
+megapixel the step has been seen to need.
+"""
+
+from __future__ import annotations
+
+import threading
+from statistics import quantiles
+from typing import TYPE_CHECKING
+
+import psutil
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from typing import Self
+
+__all__ = [
+    "DEFAULT_BUDGET_SHARE",
+    "RSS_SAMPLE_SECONDS",
+    "MemoryBudget",
+    "MemoryModel",
+    "PeakRssSampler",
+    "get_default_budget_mb",
+    "get_tree_rss_mb",
+]
+
+# How often a running step's memory is looked at. gmic's peaks last for seconds - it holds
+# the float copies of a 100 megapixel page for the length of a pass - so a quarter second
+# cannot miss one, and a thread waking four times a second costs nothing next to the step.
+RSS_SAMPLE_SECONDS = 0.25
+
+# The share of the memory free at the start of a run that the pages may take between
+# them. The rest is headroom: for the parent, for the page cache the pngs stream through,
+# and for a page that needs more than anything measured before it.
+DEFAULT_BUDGET_SHARE = 0.8
+
+# Below this many measured pages a step's prediction is the worst of them. Above it, the
+# 95th percentile, so that a single freak page cannot throttle every run that follows.
+MIN_SAMPLES_FOR_PERCENTILE = 20
+
+_BYTES_PER_MB = 1024 * 1024
+
+
+def get_tree_rss_mb(process: psutil.Process) -> float:
+    """Return the resident memory of a process and everything it has spawned.
+
+    The children matter as much as the worker itself: the smooth and the inpaint are gmic
+    subprocesses, and counting only the python worker would measure the steps that need
+    the most memory as needing the least.
+
+    Args:
+        process: The process at the top of the tree.
+
+    Returns:
+        The summed resident set, in megabytes. Processes that exit while being looked at
+        are left out rather than raising.
+
+    """
+    total = 0
+    try:
+        tree = [process, *process.children(recursive=True)]
+    except psutil.Error:
+        return 0.0
+
+    for member in tree:
+        try:
+            total += member.memory_info().rss
+        except psutil.Error:
+            continue
+
+    return total / _BYTES_PER_MB
+
+
+class PeakRssSampler:
+    """Samples a process tree's resident memory in the background, keeping the peak.
+
+    Used as a context manager around a single step. The sampling thread is a daemon, so a
+    step that never returns cannot keep the worker alive on its account.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS) -> None:
+        """Get ready to sample the current process. Nothing runs until entered.
+
+        Args:
+            interval: Seconds between samples.
+
+        """
+        self.interval = interval
+        self.peak_mb = 0.0
+
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        self.peak_mb = max(self.peak_mb, get_tree_rss_mb(self._process))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> Self:
+        """Take a first sample and start the background thread."""
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="peak-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        """Stop sampling, taking one last look so a step shorter than the interval counts."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._sample()
+
+
+class MemoryModel:
+    """Predicts a page's peak memory in a step from its megapixels.
+
+    Built from the ledger's history and kept up to date as pages come back during the run,
+    so a first run on a new machine, with nothing in the ledger, is making measured
+    predictions within its first round of pages.
+    """
+
+    def __init__(self) -> None:
+        """Start with nothing measured."""
+        self._mb_per_megapixel: dict[str, list[float]] = {}
+
+    @classmethod
+    def from_measurements(cls, pages: Iterable[tuple[float, dict[str, float]]]) -> Self:
+        """Return a model that has already seen some pages.
+
+        Args:
+            pages: A (megapixels, peak megabytes per step) pair per page.
+
+        Returns:
+            The model.
+
+        """
+        model = cls()
+        for megapixels, step_peak_rss_mb in pages:
+            model.observe(megapixels, step_peak_rss_mb)
+
+        return model
+
+    def observe(self, megapixels: float, step_peak_rss_mb: dict[str, float]) -> None:
+        """Learn from a page that has been through some steps.
+
+        Args:
+            megapixels: The size of the page.
+            step_peak_rss_mb: The peak megabytes measured in each step it ran. Steps with
+                no measurement are simply absent.
+
+        """
+        if megapixels <= 0:
+            return
+
+        for step, peak_mb in step_peak_rss_mb.items():
+            if peak_mb > 0:
+                self._mb_per_megapixel.setdefault(step, []).append(peak_mb / megapixels)
+
+    def mb_per_megapixel(self, step: str) -> float | None:
+        """Return how many megabytes per megapixel to allow for a step.
+
+        Args:
+            step: One of the pipeline's ``STEP_`` names.
+
+        Returns:
+            The allowance, or None if the step has never been measured.
+
+        """
+        ratios = self._mb_per_megapixel.get(step)
+        if not ratios:
+            return None
+        if len(ratios) < MIN_SAMPLES_FOR_PERCENTILE:
+            return max(ratios)
+
+        return quantiles(ratios, n=20, method="inclusive")[-1]
+
+    def predict_mb(self, steps: Iterable[str], megapixels: float) -> float | None:
+        """Return the most a page is expected to need across some steps.
+
+        A phase's steps run one after another in the same worker, so it is the largest of
+        them that has to fit rather than their sum.
+
+        Args:
+            steps: The steps the page will run.
+            megapixels: The size of the page.
+
+        Returns:
+            The predicted peak in megabytes, or None when none of the steps has been
+            measured and there is nothing to predict from.
+
+        """
+        allowances = [a for a in map(self.mb_per_megapixel, steps) if a is not None]
+        if not allowances or megapixels <= 0:
+            return None
+
+        return max(allowances) * megapixels
+
+
+def get_default_budget_mb() -> float:
+    """Return the memory the pages may take between them unless told otherwise.
+
+    Returns:
+        `DEFAULT_BUDGET_SHARE` of the memory available now, in megabytes.
+
+    """
+    return psutil.virtual_memory().available * DEFAULT_BUDGET_SHARE / _BYTES_PER_MB
+
+
+class MemoryBudget:
+    """Keeps the running pages' predicted memory within a budget."""
+
+    def __init__(self, budget_mb: float) -> None:
+        """Start with nothing running.
+
+        Args:
+            budget_mb: What the running pages may take between them.
+
+        """
+        self.budget_mb = budget_mb
+        self.in_use_mb = 0.0
+        self.num_running = 0
+
+    def try_admit(self, predicted_mb: float) -> bool:
+        """Take a page's share of the budget if there is room for it.
+
+        A page is always let in when nothing else is running, however big its prediction.
+        Otherwise a page larger than the whole budget could never run at all, and running
+        it alone is the safest thing the machine can do with it.
+
+        Args:
+            predicted_mb: What the page is expected to need.
+
+        Returns:
+            Whether it was admitted. If it was, `release` must be called when it finishes.
+
+        """
+        if self.num_running and self.in_use_mb + predicted_mb > self.budget_mb:
+            return False
+
+        self.in_use_mb += predicted_mb
+        self.num_running += 1
+        return True
+
+    def release(self, predicted_mb: float) -> None:
+        """Give back a finished page's share.
+
+        Args:
+            predicted_mb: What it was admitted with.
+
+        """
+        self.in_use_mb = max(0.0, self.in_use_mb - predicted_mb)
+        self.num_running -= 1
@@ -9,14 +9,22 @@ mostly in volumes 1 and 7.
 
 Both are the same question asked properly: are all of this page's outputs present, and
 were they made with the recipe in force now.
+
+Asking it of the whole library means opening thousands of pngs for their metadata, and
+the status report and every batch run ask it again from the start. `PageStateCache`
+remembers what was read from each png against the file's size, mtime and inode, so a file
+is only opened again once one of those has changed, and the rest of the answer is the
+stat calls it would have cost anyway.
 """
 
 from __future__ import annotations
 
 from enum import StrEnum
-from typing import TYPE_CHECKING, NamedTuple
+from pathlib import Path
+from typing import NamedTuple
 
 from barks_comic_building.restore.image_io import read_png_metadata
+from barks_comic_building.restore.stat_cache import StatCache, get_file_signature
 from barks_comic_building.restore.upscale_image import (
     UPSCALER_KEY,
     UPSCAYL_MODEL_KEY,
@@ -24,13 +32,13 @@ from barks_comic_building.restore.upscale_image import (
     Upscaler,
 )
 
-if TYPE_CHECKING:
-    from pathlib import Path
-
 __all__ = [
+    "PAGE_STATE_CACHE_FILENAME",
     "UPSCALER_KEY",
     "PageState",
+    "PageStateCache",
     "PageStatus",
+    "get_default_page_state_cache_file",
     "get_page_status",
     "get_upscaler_used",
 ]
@@ -40,6 +48,75 @@ RECIPE_ID_KEY = "Restore recipe id"
 RECIPE_KEY = "Restore recipe"
 RESTORE_DATE_KEY = "Restore date"
 
+PAGE_STATE_CACHE_FILENAME = "restore-page-state-cache.json"
+
+# Bumped when what a cache entry holds changes, so that an old cache is started afresh.
+_PAGE_STATE_CACHE_VERSION = 2
+
+# The keys a page's state is decided from, which are all the cache keeps. Not the
+# expanded recipe: it is a few kilobytes a page, and only the id is compared.
+_CACHED_KEYS = frozenset(
+    {RECIPE_ID_KEY, RESTORE_DATE_KEY, UPSCALER_KEY, UPSCAYL_MODEL_KEY, WAIFU2X_MODEL_KEY}
+)
+
+
+def get_default_page_state_cache_file() -> Path:
+    """Return where the page state cache lives unless told otherwise.
+
+    Beside the ledger, out of the trees the integrity checks walk.
+
+    Returns:
+        The default cache path.
+
+    """
+    from barks_fantagraphics.comics_consts import BARKS_ROOT_DIR  # noqa: PLC0415
+
+    return Path(BARKS_ROOT_DIR) / PAGE_STATE_CACHE_FILENAME
+
+
+class PageStateCache(StatCache):
+    """The provenance read from each png, kept against the stat it was read under.
+
+    A `StatCache`: an entry is trusted only while the file's inode, size and mtime are
+    what they were when it was read.
+    """
+
+    VERSION = _PAGE_STATE_CACHE_VERSION
+    NAME = "page state cache"
+
+    @property
+    def num_read(self) -> int:
+        """How many pngs were opened, rather than answered from the cache."""
+        return self.num_recorded
+
+    def read_png_metadata(self, png_file: Path) -> dict[str, str]:
+        """Return the provenance keys of a png, reading it only if it changed.
+
+        Args:
+            png_file: The png.
+
+        Returns:
+            Those of its metadata keys a page's state depends on.
+
+        """
+        try:
+            signature = get_file_signature(png_file.stat())
+        except OSError:
+            self.forget(png_file)
+            return {}
+
+        try:
+            return self.get_entry(png_file, signature)
+        except KeyError:
+            pass
+
+        metadata = {
+            key: value for key, value in read_png_metadata(png_file).items() if key in _CACHED_KEYS
+        }
+        self.record_entry(png_file, signature, metadata)
+
+        return metadata
+
 
 class PageState(StrEnum):
     """Where a page stands relative to the recipe in force now."""
@@ -114,6 +191,7 @@ def get_page_status(  # noqa: PLR0911, PLR0913
     current_recipe_id: str,
     *,
     is_hand_restored: bool,
+    cache: PageStateCache | None = None,
 ) -> PageStatus:
     """Work out whether a page still needs restoring.
 
@@ -127,6 +205,8 @@ def get_page_status(  # noqa: PLR0911, PLR0913
             `ComicBook.is_hand_restored`. Deliberately required rather than defaulted: a
             caller that forgets it queues the hand work for overwriting, which is exactly
             how volume 4's page 227 came to be one run away from being lost.
+        cache: Where to look for the restored png's provenance before opening it. None
+            opens it.
 
     Returns:
         The page's state, with the recipe id and date read off the restored png when it
@@ -165,7 +245,11 @@ def get_page_status(  # noqa: PLR0911, PLR0913
     if num_present < len(outputs):
         return PageStatus(PageState.INCOMPLETE, "", "")
 
-    metadata = read_png_metadata(dest_restored_file)
+    metadata = (
+        cache.read_png_metadata(dest_restored_file)
+        if cache is not None
+        else read_png_metadata(dest_restored_file)
+    )
     recipe_id = metadata.get(RECIPE_ID_KEY, "")
     restore_date = metadata.get(RESTORE_DATE_KEY, "")
 
@@ -175,7 +259,7 @@ def get_page_status(  # noqa: PLR0911, PLR0913
     return PageStatus(PageState.STALE, recipe_id, restore_date)
 
 
-def get_upscaler_used(srce_upscayl_file: Path) -> str:
+def get_upscaler_used(srce_upscayl_file: Path, cache: PageStateCache | None = None) -> str:
     """Return which upscaler made a page's input, from that file's own metadata.
 
     Upstream provenance rather than part of the restore recipe: it describes the input
@@ -188,12 +272,17 @@ def get_upscaler_used(srce_upscayl_file: Path) -> str:
 
     Args:
         srce_upscayl_file: The upscayled page.
+        cache: Where to look for its provenance before opening it. None opens it.
 
     Returns:
         The upscaler name, or an empty string if the file has no metadata at all.
 
     """
-    metadata = read_png_metadata(srce_upscayl_file)
+    metadata = (
+        cache.read_png_metadata(srce_upscayl_file)
+        if cache is not None
+        else read_png_metadata(srce_upscayl_file)
+    )
 
     upscaler = metadata.get(UPSCALER_KEY, "")
     if upscaler:
@@ -17,7 +17,11 @@ from pathlib import Path
 import cv2 as cv
 import numpy as np
 
-from barks_comic_building.restore.image_io import write_cv_image_file
+from barks_comic_building.restore.image_io import (
+    DEFAULT_WORK_FILE_FORMAT,
+    WorkFileFormat,
+    write_work_image_file,
+)
 
 # What counts as a flat area of the source, and of the bigger image being snapped. The
 # upscaled image needs the looser pair because its fills carry the drift being corrected.
@@ -161,13 +165,20 @@ def snap_to_palette(
     return snapped, num_snapped / (image.shape[0] * image.shape[1])
 
 
-def snap_image_file_to_srce_palette(srce_file: Path, in_file: Path, out_file: Path) -> float:
+def snap_image_file_to_srce_palette(
+    srce_file: Path,
+    in_file: Path,
+    out_file: Path,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+) -> float:
     """Snap an image's flat areas to the palette its source page was drawn with.
 
     Args:
         srce_file: The original source page the palette is taken from.
         in_file: The image to snap.
-        out_file: Where to write the snapped image.
+        out_file: Where to write the snapped image. gmic overlays the ink onto it next,
+            so it is always written in a form gmic can read.
+        work_file_format: How to write it.
 
     Returns:
         The fraction of pixels that were changed.
@@ -175,6 +186,26 @@ def snap_image_file_to_srce_palette(srce_file: Path, in_file: Path, out_file: Pa
     Raises:
         FileNotFoundError: If either input image cannot be read.
 
+    """
+    snapped, fraction = get_palette_snapped_image(srce_file, in_file)
+    write_work_image_file(out_file, snapped, work_file_format.for_gmic())
+
+    return fraction
+
+
+def get_palette_snapped_image(srce_file: Path, in_file: Path) -> tuple[cv.typing.MatLike, float]:
+    """Snap an image's flat areas to its source's palette, returning the snapped pixels.
+
+    Args:
+        srce_file: The original source page the palette is taken from.
+        in_file: The image to snap.
+
+    Returns:
+        The snapped BGR image, and the fraction of its pixels that were changed.
+
+    Raises:
+        FileNotFoundError: If either input image cannot be read.
+
     """
     srce_image = cv.imread(str(srce_file))
     if srce_image is None:
@@ -189,7 +220,4 @@ def snap_image_file_to_srce_palette(srce_file: Path, in_file: Path, out_file: Pa
     palette = get_snap_palette(srce_image)
     del srce_image
 
-    snapped, fraction = snap_to_palette(in_image, palette, in_place=True)
-    write_cv_image_file(out_file, snapped)
-
-    return fraction
+    return snap_to_palette(in_image, palette, in_place=True)
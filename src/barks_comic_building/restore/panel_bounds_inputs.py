@@ -0,0 +1,88 @@
+"""The record of what each page's panel bounds were made from.
+
+`barks-batch-panel-bounds` keeps each page's inputs hash here, by its panel segments
+file, and skips a page whose hash still matches. It lives apart from that command so that
+the integrity check, which has to know the file is not a page, can name it without
+importing a typer app, and so that the record is read and written the way the build's
+own records are - see `inputs_common`.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from barks_comic_building.build.inputs_common import load_versioned_json, save_versioned_json
+
+__all__ = [
+    "PANEL_BOUNDS_INPUTS_FILENAME",
+    "get_default_panel_bounds_inputs_file",
+    "load_panel_bounds_inputs",
+    "save_panel_bounds_inputs",
+]
+
+PANEL_BOUNDS_INPUTS_FILENAME = "panel-bounds-inputs.json"
+
+# Bumped when the shape of the inputs file changes, so that an old one is started afresh.
+_INPUTS_FILE_VERSION = 1
+
+
+def get_default_panel_bounds_inputs_file() -> Path:
+    """Return where the panel bounds inputs are recorded unless told otherwise.
+
+    Beside the ledgers, out of the trees the integrity checks walk.
+
+    Returns:
+        The default inputs file.
+
+    """
+    from barks_fantagraphics.comics_consts import BARKS_ROOT_DIR  # noqa: PLC0415
+
+    return Path(BARKS_ROOT_DIR) / PANEL_BOUNDS_INPUTS_FILENAME
+
+
+def load_panel_bounds_inputs(inputs_file: Path | None) -> dict[str, str]:
+    """Return the recorded inputs hash of each page, by its panel segments file.
+
+    Args:
+        inputs_file: The record. None, or one that cannot be trusted, is no hashes.
+
+    Returns:
+        The hashes.
+
+    """
+    if inputs_file is None:
+        return {}
+
+    return load_versioned_json(
+        inputs_file, _INPUTS_FILE_VERSION, _parse_inputs, {}, "panel bounds inputs"
+    )
+
+
+def save_panel_bounds_inputs(inputs_file: Path | None, inputs: dict[str, str]) -> None:
+    """Write the inputs hashes out, all at once.
+
+    Args:
+        inputs_file: The record. None records nothing.
+        inputs: The hashes, by panel segments file.
+
+    """
+    if inputs_file is None:
+        return
+
+    try:
+        save_versioned_json(inputs_file, _INPUTS_FILE_VERSION, {"inputs": inputs})
+    except OSError as exc:
+        # Losing it costs one more run that cannot skip anything, and nothing else.
+        logger.warning(f'Could not save panel bounds inputs "{inputs_file}": {exc}.')
+
+
+def _parse_inputs(data: dict[str, Any]) -> dict[str, str]:
+    inputs = data["inputs"]
+    if not isinstance(inputs, dict):
+        msg = "The inputs are not a mapping."
+        raise TypeError(msg)
+
+    return {str(dest_file): str(inputs_hash) for dest_file, inputs_hash in inputs.items()}
@@ -0,0 +1,198 @@
+"""Finding a page's panels on a smaller copy of it, then placing their edges at full size.
+
+Kumiko spends its time on the whole page, but what it is looking for is coarse: panel
+borders are lines the width of a pen stroke, separated by gutters a hundred pixels wide.
+A copy at a half or a quarter of the size shows them just as plainly, and Kumiko gets
+through it in a fraction of the time. What the smaller copy cannot give is where each
+edge lies to the pixel, and the bounds are used to crop panels out of the full page.
+
+So each box found on the copy is scaled back up, and each of its four edges is then
+looked for again in the full page, only within a narrow band either side of where the
+copy put it: the outermost line across that band with enough ink along the box's length
+is the border. Reading a band of a few pixels per edge costs nothing next to Kumiko.
+
+A page with a hand-drawn override is always done at full size. The override is drawn
+against the page at its own size, and boxes found on a copy are not to be trusted to line
+up with it.
+
+`scripts/bench_panel_detect.py` compares the boxes from a smaller copy against the panel
+segments already made, and times the two, across a volume. That is what to look at
+before a whole run is switched over.
+"""
+
+from __future__ import annotations
+
+import tempfile
+from enum import StrEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import cv2 as cv
+import numpy as np
+
+if TYPE_CHECKING:
+    from comic_utils.panel_bounding_box_processor import BoundingBoxProcessor
+
+__all__ = [
+    "DEFAULT_PANEL_DETECT_MODE",
+    "PanelDetectMode",
+    "get_panels_segment_info",
+    "refine_panel_box",
+]
+
+
+class PanelDetectMode(StrEnum):
+    """What size of copy Kumiko looks for a page's panels in."""
+
+    FULL = "full"
+    """The page itself, as it always has been."""
+
+    HALF = "half"
+    """A copy at half the width and height, with the edges refined at full size."""
+
+    QUARTER = "quarter"
+    """A copy at a quarter of the width and height, with the edges refined at full size."""
+
+    @property
+    def scale(self) -> int:
+        """Return how many times smaller than the page the copy is."""
+        match self:
+            case PanelDetectMode.HALF:
+                return 2
+            case PanelDetectMode.QUARTER:
+                return 4
+            case _:
+                return 1
+
+
+DEFAULT_PANEL_DETECT_MODE = PanelDetectMode.FULL
+
+# Darker than this, on a 0 to 255 grey, is ink rather than paper. The paper of a
+# restored page is close to white and its line art close to black, so the exact level
+# barely moves an edge.
+_INK_LEVEL = 160
+
+# The share of a box edge's length that must be ink for a line to count as its border.
+# Well under a half, because a panel border is often broken by a balloon or by art that
+# crosses it, and well over nothing, because a stray mark in the gutter must not count.
+_EDGE_INK_FRACTION = 0.3
+
+
+def get_panels_segment_info(
+    bounding_box_processor: BoundingBoxProcessor,
+    srce_panels_bounds_override_dir: Path,
+    srce_file: Path,
+    mode: PanelDetectMode = DEFAULT_PANEL_DETECT_MODE,
+    *,
+    has_override: bool = False,
+) -> dict[str, Any]:
+    """Return a page's panel segments, found the way `mode` says.
+
+    Args:
+        bounding_box_processor: The Kumiko wrapper.
+        srce_panels_bounds_override_dir: Where hand-drawn panel bounds fixes live.
+        srce_file: The page to find panels in.
+        mode: What size of copy to look in.
+        has_override: Whether the page has a hand-drawn override, which is always done
+            at full size.
+
+    Returns:
+        The segment info, as Kumiko gives it, with everything in it measured in pixels
+        given in full page pixels.
+
+    """
+    if mode is PanelDetectMode.FULL or has_override:
+        return bounding_box_processor.get_panels_segment_info_from_kumiko(
+            srce_file, srce_panels_bounds_override_dir
+        )
+
+    grey = cv.imread(str(srce_file), cv.IMREAD_GRAYSCALE)
+    if grey is None:
+        msg = f'Could not read srce file: "{srce_file}".'
+        raise FileNotFoundError(msg)
+
+    height, width = grey.shape
+    small = cv.resize(
+        grey,
+        (max(1, width // mode.scale), max(1, height // mode.scale)),
+        interpolation=cv.INTER_AREA,
+    )
+
+    # Named as the page is, so that anything keyed by the file name finds the same page.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        small_file = Path(temp_dir) / srce_file.name
+        if not cv.imwrite(str(small_file), small):
+            msg = f'Could not write the reduced copy of "{srce_file}".'
+            raise OSError(msg)
+        segment_info = bounding_box_processor.get_panels_segment_info_from_kumiko(
+            small_file, srce_panels_bounds_override_dir
+        )
+
+    # Every field Kumiko measures in pixels is put back at full size: the panels, refined
+    # against the page itself, the page size, and the gutters between the panels. The rest
+    # - the file name, the reading order, the timing - says the same of either copy.
+    segment_info = dict(segment_info)
+    band = 2 * mode.scale
+    segment_info["panels"] = [
+        refine_panel_box(grey, [round(v * mode.scale) for v in box], band)
+        for box in segment_info["panels"]
+    ]
+    if "size" in segment_info:
+        segment_info["size"] = [width, height]
+    if "gutters" in segment_info:
+        segment_info["gutters"] = [round(v * mode.scale) for v in segment_info["gutters"]]
+
+    return segment_info
+
+
+def refine_panel_box(grey: np.ndarray, box: list[int], band: int) -> list[int]:
+    """Move each edge of a box to the panel border nearest it at full size.
+
+    Each edge is looked for within `band` pixels either side of where it is now. An edge
+    with no line dark enough across that band stays where it was - a panel with no drawn
+    border, whose edge is where its art stops, is left as Kumiko found it on the copy.
+
+    Args:
+        grey: The full size page, in grey.
+        box: The box as ``[x, y, width, height]`` in full size pixels.
+        band: How far either side of each edge to look.
+
+    Returns:
+        The refined box, in the same form.
+
+    """
+    height, width = grey.shape
+    x, y, w, h = box
+    left, top = min(max(x, 0), width - 1), min(max(y, 0), height - 1)
+    right, bottom = min(max(x + w - 1, left), width - 1), min(max(y + h - 1, top), height - 1)
+
+    # The edges are measured along the box as the copy found it, so that each is
+    # independent of where the others end up. The columns are transposed, so that either
+    # way round each row is one candidate line.
+    columns = grey[top : bottom + 1, :].T
+    rows = grey[:, left : right + 1]
+
+    new_left = _find_border(columns, left, band, outward=-1)
+    new_right = _find_border(columns, right, band, outward=1)
+    new_top = _find_border(rows, top, band, outward=-1)
+    new_bottom = _find_border(rows, bottom, band, outward=1)
+
+    return [new_left, new_top, new_right - new_left + 1, new_bottom - new_top + 1]
+
+
+def _find_border(lines: np.ndarray, edge: int, band: int, outward: int) -> int:
+    """Return the outermost line within `band` of `edge` with enough ink along it.
+
+    Outermost because the box is the panel's outside: Kumiko's box runs to the far side
+    of the border line, so of the lines that are part of it the one furthest out wins.
+    Only the lines in the band are read.
+    """
+    lo, hi = max(0, edge - band), min(len(lines) - 1, edge + band)
+    ink_fractions = (lines[lo : hi + 1] < _INK_LEVEL).mean(axis=1)
+
+    candidates = range(len(ink_fractions))
+    for i in candidates if outward < 0 else reversed(candidates):
+        if ink_fractions[i] >= _EDGE_INK_FRACTION:
+            return lo + i
+
+    return edge
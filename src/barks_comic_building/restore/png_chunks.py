@@ -0,0 +1,533 @@
+"""Reading a png at the level of its chunks, without a decoder.
+
+Deciding what a run has left to do reads the provenance of every page in the library,
+and each of those is a 100MP png of which only the first few hundred bytes matter: the
+text chunks come before the image data, and the one other thing wanted - that the file
+was finished - is the twelve bytes at its very end. Pillow gets there, but only after
+building an image object, parsing every chunk it meets into its own types, and being
+opened a second time to look at the tail. Walking the chunks by hand over a memory map
+touches two pages of the file in one open, and does nothing else.
+
+The walk is as strict as Pillow's where it matters for agreeing with it: the signature,
+an IHDR first, and the checksum of every chunk it reads. It is not a png validator - the
+image data is never looked at - only a way of reading what precedes it.
+
+Writing goes the same way. Stamping a page with its provenance used to mean Pillow
+decoding the whole 100MP page and deflating it all over again, for the sake of a few
+hundred bytes of text. Those bytes go before the image data, so `splice_png_text`
+rewrites only the chunks ahead of it and copies everything from the first IDAT on across
+as it stands - the pixels are never decoded, and not one byte of the image data changes.
+
+Checking goes the same way too. Proving a png readable used to mean decoding it, which
+for a 100MP page is the whole page in memory at once. `check_png_image_data` reads the
+file front to back instead, checking every chunk's crc, and inflates the image data a
+window at a time, counting its rows and checking the filter byte that starts each. That
+finds everything a decode would - a damaged IDAT fails its crc or will not inflate, a
+truncated one comes up short - while holding no more than a window of it.
+"""
+
+from __future__ import annotations
+
+import mmap
+import shutil
+import struct
+import zlib
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from pathlib import Path
+
+__all__ = [
+    "PNG_IEND_CHUNK",
+    "PNG_SIGNATURE",
+    "PngHeader",
+    "check_png_image_data",
+    "iter_png_chunks",
+    "read_png_header",
+    "read_png_text",
+    "splice_png_text",
+]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# The zero-length chunk every finished png ends with: length, type, and its fixed crc.
+PNG_IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB\x60\x82"
+
+# A chunk's length and type before its data, and its crc after.
+_CHUNK_HEAD = struct.Struct(">I4s")
+_CHUNK_CRC = struct.Struct(">I")
+
+_TEXT_CHUNK_TYPES = (b"tEXt", b"zTXt", b"iTXt")
+
+# Pillow's limit on what one compressed text chunk may inflate to, as a guard against
+# a decompression bomb. Kept the same so that the two refuse the same files.
+_MAX_TEXT_BYTES = 1024 * 1024
+
+# How much of the image data is copied at a time when splicing, and how much of it is read,
+# or inflated, at a time when checking.
+_COPY_BYTES = 1024 * 1024
+
+# The channels of each png colour type: grey, RGB, palette, grey and alpha, RGBA.
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# The IHDR's fields after the width and height.
+_IHDR = struct.Struct(">IIBBBBB")
+
+# Where each of the seven Adam7 passes starts, and how far apart its pixels are: x start,
+# y start, x step, y step.
+_ADAM7_PASSES = (
+    (0, 0, 8, 8),
+    (4, 0, 8, 8),
+    (0, 4, 4, 8),
+    (2, 0, 4, 4),
+    (0, 2, 2, 4),
+    (1, 0, 2, 2),
+    (0, 1, 1, 2),
+)
+
+# The five row filters a png may use, numbered 0 to 4.
+_MAX_FILTER_TYPE = 4
+
+
+class PngHeader(NamedTuple):
+    """What a png's IHDR says about its image data."""
+
+    width: int
+    height: int
+    bit_depth: int
+    colour_type: int
+    interlaced: bool
+
+    @property
+    def num_channels(self) -> int:
+        return _CHANNELS[self.colour_type]
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        """The distance back to the byte a row filter counts as its neighbour."""
+        return max(1, self.num_channels * self.bit_depth // 8)
+
+    def get_stride(self, width: int) -> int:
+        """Return the bytes in a row of `width` pixels, not counting its filter byte."""
+        return (width * self.num_channels * self.bit_depth + 7) // 8
+
+    def get_row_runs(self) -> list[tuple[int, int]]:
+        """Return the rows of the image data as runs of (row length, number of rows).
+
+        The row length counts the filter byte. One run for an image stored a row at a
+        time, and one per non-empty Adam7 pass for an interlaced one.
+        """
+        if not self.interlaced:
+            return [(self.get_stride(self.width) + 1, self.height)]
+
+        runs = []
+        for x_start, y_start, x_step, y_step in _ADAM7_PASSES:
+            pass_width = (self.width - x_start + x_step - 1) // x_step
+            pass_height = (self.height - y_start + y_step - 1) // y_step
+            if pass_width > 0 and pass_height > 0:
+                runs.append((self.get_stride(pass_width) + 1, pass_height))
+
+        return runs
+
+
+def _parse_ihdr(data: bytes) -> PngHeader:
+    if len(data) != _IHDR.size:
+        msg = f"The IHDR chunk is {len(data)} bytes, not {_IHDR.size}."
+        raise ValueError(msg)
+
+    width, height, bit_depth, colour_type, _, _, interlace = _IHDR.unpack(data)
+    if colour_type not in _CHANNELS or bit_depth not in (1, 2, 4, 8, 16):
+        msg = f"The IHDR has an unknown colour type {colour_type} or bit depth {bit_depth}."
+        raise ValueError(msg)
+    if width == 0 or height == 0:
+        msg = f"The IHDR says the image is {width}x{height}."
+        raise ValueError(msg)
+
+    return PngHeader(width, height, bit_depth, colour_type, interlace != 0)
+
+
+def iter_png_chunks(
+    data: bytes | mmap.mmap, stop_at: bytes = b"IDAT"
+) -> Iterator[tuple[bytes, int, int]]:
+    """Yield each chunk's type and where its data lies, up to a chunk of type `stop_at`.
+
+    Each chunk's crc is checked before it is yielded. The chunk of type `stop_at` is
+    yielded unchecked - it is where the caller wanted to get to, and for the image data
+    checking it would mean reading it.
+
+    Args:
+        data: The whole png.
+        stop_at: The chunk type to stop at.
+
+    Yields:
+        The chunk type, and the start and end of its data in `data`.
+
+    Raises:
+        ValueError: If the signature is wrong, the first chunk is not IHDR, a chunk runs
+            off the end, a crc does not match, or the file ends before `stop_at`.
+
+    """
+    if data[: len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+        msg = "Not a png: the signature is wrong."
+        raise ValueError(msg)
+
+    pos = len(PNG_SIGNATURE)
+    while True:
+        if pos + _CHUNK_HEAD.size > len(data):
+            msg = f"The file ends before a {stop_at.decode()} chunk."
+            raise ValueError(msg)
+
+        length, chunk_type = _CHUNK_HEAD.unpack_from(data, pos)
+        start = pos + _CHUNK_HEAD.size
+        end = start + length
+        if pos == len(PNG_SIGNATURE) and chunk_type != b"IHDR":
+            msg = "Not a png: the first chunk is not IHDR."
+            raise ValueError(msg)
+
+        if chunk_type == stop_at:
+            yield chunk_type, start, end
+            return
+
+        if end + _CHUNK_CRC.size > len(data):
+            msg = f"The {chunk_type!r} chunk runs off the end of the file."
+            raise ValueError(msg)
+        (crc,) = _CHUNK_CRC.unpack_from(data, end)
+        if zlib.crc32(data[pos + 4 : end]) != crc:
+            msg = f"The {chunk_type!r} chunk's crc does not match."
+            raise ValueError(msg)
+
+        yield chunk_type, start, end
+        pos = end + _CHUNK_CRC.size
+
+
+def read_png_text(png_file: Path) -> dict[str, str]:
+    """Return the text chunks that precede a png's image data, if the png is finished.
+
+    The three text chunk types are read the way Pillow reads them into ``info``, down to
+    its quirks: a ``tEXt`` as latin-1, and with no separator as a keyword with no text; a
+    ``zTXt`` inflated then latin-1, and as empty if it will not inflate; an ``iTXt``
+    inflated if it says so, then utf-8, and skipped if either fails. A chunk with no
+    keyword is skipped, and where a keyword appears twice the later one wins. Text that
+    would inflate past Pillow's limit makes the whole file unreadable, as it does there.
+
+    A file not ending in an IEND chunk reads as having none: a write killed part way
+    leaves the text chunks in place with no pixels behind them.
+
+    Args:
+        png_file: The png to read.
+
+    Returns:
+        The text, by keyword. Empty if there is none, or the file is incomplete, or it
+        cannot be read as a png.
+
+    """
+    try:
+        with png_file.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[-len(PNG_IEND_CHUNK) :] != PNG_IEND_CHUNK:
+                return {}
+
+            text: dict[str, str] = {}
+            for chunk_type, start, end in iter_png_chunks(data):
+                if chunk_type in _TEXT_CHUNK_TYPES:
+                    item = _decode_text_chunk(chunk_type, data[start:end])
+                    if item is not None:
+                        text[item[0]] = item[1]
+    except (OSError, ValueError):
+        # mmap refuses an empty file with a ValueError, as the walk does a broken one.
+        return {}
+
+    return text
+
+
+def read_png_header(png_file: Path) -> PngHeader:
+    """Return what a png's IHDR says, reading nothing past it.
+
+    Args:
+        png_file: The png.
+
+    Returns:
+        The header.
+
+    Raises:
+        ValueError: If the file does not start with a png signature and a sound IHDR.
+
+    """
+    with png_file.open("rb") as f:
+        data = f.read(len(PNG_SIGNATURE) + _CHUNK_HEAD.size + _IHDR.size + _CHUNK_CRC.size)
+
+    # The walk refuses a file whose first chunk is not IHDR, or whose IHDR crc is wrong.
+    _, start, end = next(iter_png_chunks(data, stop_at=b"IEND"))
+    return _parse_ihdr(data[start:end])
+
+
+def check_png_image_data(
+    png_file: Path, on_rows: Callable[[bytes], None] | None = None
+) -> PngHeader:
+    """Check that a png's image data is all there and sound, without decoding it.
+
+    Every chunk's crc is checked, the image data is inflated a window at a time, and what
+    it inflates to must be exactly the rows the IHDR calls for, each starting with one of
+    the five filter types, with the stream ending where they do and an IEND after it.
+
+    The memory this takes is a window of the file and a window of the inflated data,
+    whatever the size of the image.
+
+    Args:
+        png_file: The png.
+        on_rows: Handed the inflated rows of a non-interlaced image as they come, whole
+            rows at a time and each with its filter byte, for a caller that wants to look
+            at the pixels as they pass. An interlaced image is checked pass by pass in the
+            same way, but its rows are not handed on - nothing here writes one.
+
+    Returns:
+        The header.
+
+    Raises:
+        ValueError: If anything about the file is not as a sound png's would be.
+        OSError: If it cannot be read.
+
+    """
+    with png_file.open("rb") as f:
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            msg = "Not a png: the signature is wrong."
+            raise ValueError(msg)
+
+        header: PngHeader | None = None
+        rows: _RowCounter | None = None
+        while True:
+            head = f.read(_CHUNK_HEAD.size)
+            if len(head) < _CHUNK_HEAD.size:
+                msg = "The file ends before its IEND chunk."
+                raise ValueError(msg)
+            length, chunk_type = _CHUNK_HEAD.unpack(head)
+
+            if header is None and chunk_type != b"IHDR":
+                msg = "Not a png: the first chunk is not IHDR."
+                raise ValueError(msg)
+            if chunk_type == b"IDAT" and rows is None:
+                assert header is not None
+                rows = _RowCounter(header, on_rows if not header.interlaced else None)
+
+            crc = zlib.crc32(chunk_type)
+            kept = bytearray()
+            remaining = length
+            while remaining:
+                window = f.read(min(remaining, _COPY_BYTES))
+                if not window:
+                    msg = f"The {chunk_type!r} chunk runs off the end of the file."
+                    raise ValueError(msg)
+                remaining -= len(window)
+                crc = zlib.crc32(window, crc)
+                if chunk_type == b"IDAT":
+                    assert rows is not None
+                    rows.inflate(window)
+                elif chunk_type == b"IHDR":
+                    kept += window
+
+            saved_crc = f.read(_CHUNK_CRC.size)
+            if len(saved_crc) < _CHUNK_CRC.size or _CHUNK_CRC.unpack(saved_crc)[0] != crc:
+                msg = f"The {chunk_type!r} chunk's crc does not match."
+                raise ValueError(msg)
+
+            if chunk_type == b"IHDR":
+                header = _parse_ihdr(bytes(kept))
+            elif chunk_type == b"IEND":
+                break
+
+    if rows is None:
+        msg = "There is no image data."
+        raise ValueError(msg)
+    rows.finish()
+
+    assert header is not None
+    return header
+
+
+class _RowCounter:
+    """Inflates a png's image data a window at a time, checking the rows as they come."""
+
+    def __init__(self, header: PngHeader, on_rows: Callable[[bytes], None] | None) -> None:
+        self._runs = header.get_row_runs()
+        self._on_rows = on_rows
+        self._inflater = zlib.decompressobj()
+        self._pending = bytearray()
+
+    def inflate(self, data: bytes) -> None:
+        if self._inflater.eof:
+            msg = "There is image data after the end of its compressed stream."
+            raise ValueError(msg)
+
+        try:
+            while True:
+                out = self._inflater.decompress(data, _COPY_BYTES)
+                self._take(out)
+                data = self._inflater.unconsumed_tail
+                if self._inflater.eof or (not data and len(out) < _COPY_BYTES):
+                    return
+        except zlib.error as e:
+            msg = f"The image data will not inflate ({e})."
+            raise ValueError(msg) from e
+
+    def _take(self, out: bytes) -> None:
+        self._pending += out
+        while self._runs:
+            row_len, num_rows = self._runs[0]
+            num_whole = min(num_rows, len(self._pending) // row_len)
+            if num_whole == 0:
+                return
+
+            rows = bytes(self._pending[: num_whole * row_len])
+            del self._pending[: num_whole * row_len]
+            filter_type = max(rows[::row_len])
+            if filter_type > _MAX_FILTER_TYPE:
+                msg = f"A row has filter type {filter_type}, which does not exist."
+                raise ValueError(msg)
+            if self._on_rows is not None:
+                self._on_rows(rows)
+
+            if num_whole == num_rows:
+                self._runs.pop(0)
+            else:
+                self._runs[0] = (row_len, num_rows - num_whole)
+
+        if self._pending:
+            msg = "The image data inflates to more than its rows hold."
+            raise ValueError(msg)
+
+    def finish(self) -> None:
+        if not self._inflater.eof:
+            msg = "The image data's compressed stream is cut short."
+            raise ValueError(msg)
+        if self._runs:
+            num_missing = sum(num_rows for _, num_rows in self._runs)
+            msg = f"The image data stops {num_missing} row(s) short."
+            raise ValueError(msg)
+
+
+def splice_png_text(png_file: Path, text: dict[str, str]) -> None:
+    """Add text chunks to a png, or replace those already there, without touching its pixels.
+
+    The new chunks go in just ahead of the image data, where Pillow's ``pnginfo=`` puts
+    them and where `read_png_text` looks. A text chunk of any of the three types with a
+    keyword being written is dropped; every other chunk is kept as it was, in its place.
+    Text that latin-1 cannot hold is written as an uncompressed ``iTXt``, as Pillow's
+    ``add_text`` does.
+
+    The new file is written alongside and renamed over the old, so a kill part way
+    leaves the page as it was and never half spliced. It is given the old file's mode
+    before the rename.
+
+    Args:
+        png_file: The png to add the text to.
+        text: The text, by keyword.
+
+    Raises:
+        ValueError: If the png is not a finished one, or a keyword cannot be written.
+
+    """
+    new_chunks = b"".join(_make_text_chunk(keyword, value) for keyword, value in text.items())
+    keywords = {keyword.encode("latin-1") for keyword in text}
+
+    temp_file = png_file.with_name(png_file.name + ".tmp")
+    try:
+        with png_file.open("rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[-len(PNG_IEND_CHUNK) :] != PNG_IEND_CHUNK:
+                    msg = f'Not a finished png: "{png_file}".'
+                    raise ValueError(msg)
+
+                head = bytearray(PNG_SIGNATURE)
+                for chunk_type, start, end in iter_png_chunks(data):
+                    chunk_pos = start - _CHUNK_HEAD.size
+                    if chunk_type == b"IDAT":
+                        image_data_pos = chunk_pos
+                    elif not (
+                        chunk_type in _TEXT_CHUNK_TYPES
+                        and data[start:end].partition(b"\0")[0] in keywords
+                    ):
+                        head += data[chunk_pos : end + _CHUNK_CRC.size]
+
+            with temp_file.open("wb") as out:
+                out.write(head)
+                out.write(new_chunks)
+                f.seek(image_data_pos)
+                shutil.copyfileobj(f, out, _COPY_BYTES)
+
+        # A new file takes the umask's mode, not the page's.
+        shutil.copymode(png_file, temp_file)
+        temp_file.replace(png_file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+
+def _make_text_chunk(keyword: str, value: str) -> bytes:
+    try:
+        keyword_bytes = keyword.encode("latin-1")
+    except UnicodeEncodeError as e:
+        msg = f'A png keyword must be latin-1: "{keyword}".'
+        raise ValueError(msg) from e
+    if not 1 <= len(keyword_bytes) <= 79:  # noqa: PLR2004
+        msg = f'A png keyword must be 1 to 79 bytes: "{keyword}".'
+        raise ValueError(msg)
+
+    try:
+        chunk_type, chunk = b"tEXt", keyword_bytes + b"\0" + value.encode("latin-1")
+    except UnicodeEncodeError:
+        chunk_type, chunk = b"iTXt", keyword_bytes + b"\0\0\0\0\0" + value.encode("utf-8")
+
+    crc = zlib.crc32(chunk_type + chunk)
+    return _CHUNK_HEAD.pack(len(chunk), chunk_type) + chunk + _CHUNK_CRC.pack(crc)
+
+
+def _decode_text_chunk(chunk_type: bytes, chunk: bytes) -> tuple[str, str] | None:
+    keyword, sep, rest = chunk.partition(b"\0")
+
+    match chunk_type:
+        case b"tEXt":
+            value = rest.decode("latin-1", "replace")
+        case b"zTXt":
+            if rest[:1] not in (b"", b"\0"):
+                msg = "Unknown compression method in a zTXt chunk."
+                raise ValueError(msg)
+            value = (_inflate(rest[1:]) or b"").decode("latin-1", "replace")
+        case _:
+            if not sep or len(rest) < 2:  # noqa: PLR2004
+                return None
+            compressed, method = rest[0], rest[1]
+            fields = rest[2:].split(b"\0", 2)
+            if len(fields) < 3:  # noqa: PLR2004
+                return None
+            language, translated, value_bytes = fields
+            if compressed:
+                value_bytes = _inflate(value_bytes) if method == 0 else None
+                if value_bytes is None:
+                    return None
+            try:
+                language.decode("utf-8")
+                translated.decode("utf-8")
+                value = value_bytes.decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+
+    return (keyword.decode("latin-1"), value) if keyword else None
+
+
+def _inflate(data: bytes) -> bytes | None:
+    """Return the text inflated, or None if it is not zlib data.
+
+    Raises:
+        ValueError: If it inflates to more than Pillow allows.
+
+    """
+    inflater = zlib.decompressobj()
+    try:
+        text = inflater.decompress(data, _MAX_TEXT_BYTES)
+    except zlib.error:
+        return None
+    if inflater.unconsumed_tail:
+        msg = "A compressed text chunk inflates to more than is allowed."
+        raise ValueError(msg)
+
+    return text
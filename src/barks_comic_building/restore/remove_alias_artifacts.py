@@ -1,10 +1,12 @@
 # ruff: noqa: ERA001, PTH118, S108, ANN001, ANN202
 
 import os
+from enum import StrEnum
 
 import cv2 as cv
+import numba
 import numpy as np
-from numba import jit
+from numba import jit, prange
 
 DEBUG = False
 DEBUG_OUTPUT_DIR = "/tmp"
@@ -13,9 +15,41 @@ MEDIAN_BLUR_APERTURE_SIZE = 7
 ADAPTIVE_THRESHOLD_BLOCK_SIZE = 21
 ADAPTIVE_THRESHOLD_CONST_SUBTRACT = 12  # Careful here with including alias artifacts
 
+# What a pixel with no unmasked neighbours at all is set to. A marker colour rather than a
+# guess, and kept identical across the engines below.
+_NO_NEIGHBOURS_COLOR = (0, 100, 0)
+
+
+class MedianEngine(StrEnum):
+    """Which implementation of the masked median filter to run.
+
+    All three give the same image, pixel for pixel - which is why the choice is not part
+    of the restore recipe, and why switching between them never makes a page stale. They
+    differ only in how long a 100 megapixel page takes.
+    """
+
+    SERIAL = "serial"
+    """The original single-threaded loop, calling `np.median` per pixel. Kept as the
+    reference the other two are tested against."""
+
+    PARALLEL = "parallel"
+    """The same per-pixel median, with the rows shared out across numba threads."""
+
+    HISTOGRAM = "histogram"
+    """A sliding 256-bin histogram per row (Huang's method), with the rows shared out as
+    above. Moving the window one pixel right removes one column and adds one, instead of
+    gathering and sorting all forty nine neighbours again."""
+
+
+DEFAULT_MEDIAN_ENGINE = MedianEngine.HISTOGRAM
+
 
 def _median_filter(
-    original_image: cv.typing.MatLike, mask: cv.typing.MatLike, kernel_size: int
+    original_image: cv.typing.MatLike,
+    mask: cv.typing.MatLike,
+    kernel_size: int,
+    engine: MedianEngine = DEFAULT_MEDIAN_ENGINE,
+    num_threads: int | None = None,
 ) -> cv.typing.MatLike:
     filtered_image = np.zeros_like(original_image)
     w = kernel_size // 2
@@ -37,14 +71,36 @@ def _median_filter(
             wrapped_mask,
         )
 
-    _median_filter_core(wrapped_image, wrapped_mask, kernel_size, filtered_image)
+    if engine is MedianEngine.SERIAL:
+        _median_filter_core(wrapped_image, wrapped_mask, kernel_size, filtered_image)
+        return filtered_image
+
+    core = (
+        _median_filter_core_histogram
+        if engine is MedianEngine.HISTOGRAM
+        else _median_filter_core_parallel
+    )
+
+    # Set for this call only and put back afterwards, because the thread count is process
+    # wide: a batch runs many of these in separate worker processes already, and each of
+    # them taking every core would ask for cores squared threads.
+    prev_num_threads = numba.get_num_threads()
+    if num_threads is not None:
+        numba.set_num_threads(max(1, min(num_threads, numba.config.NUMBA_NUM_THREADS)))
+    try:
+        core(wrapped_image, wrapped_mask, kernel_size, filtered_image)
+    finally:
+        numba.set_num_threads(prev_num_threads)
 
     #    median_filter_core.parallel_diagnostics(level=4)
 
     return filtered_image
 
 
-@jit(nopython=True, parallel=False)
+# This kernel and every one below it are cached on disk, so a page only pays for compiling
+# them the first time this version of them runs on a machine - after that a new process
+# loads them in well under a second instead of spending several seconds in the compiler.
+@jit(nopython=True, parallel=False, cache=True)
 def _median_filter_core(
     wrapped_image: cv.typing.MatLike,
     wrapped_mask: cv.typing.MatLike,
@@ -76,10 +132,10 @@ def _median_filter_core(
             filtered_image[i - w, j - w] = _get_median(num_nbrs, nbrs0, nbrs1, nbrs2)
 
 
-@jit(nopython=True, parallel=False)
+@jit(nopython=True, parallel=False, cache=True)
 def _get_median(num_nbrs: int, nbrs0, nbrs1, nbrs2):
     if num_nbrs == 0:
-        return 0, 100, 0
+        return _NO_NEIGHBOURS_COLOR
 
     if num_nbrs == nbrs0.size:
         return np.median(nbrs0), np.median(nbrs1), np.median(nbrs2)
@@ -91,7 +147,149 @@ def _get_median(num_nbrs: int, nbrs0, nbrs1, nbrs2):
     )
 
 
-def get_median_filter(input_image: cv.typing.MatLike) -> cv.typing.MatLike:
+@jit(nopython=True, parallel=True, cache=True)
+def _median_filter_core_parallel(
+    wrapped_image: cv.typing.MatLike,
+    wrapped_mask: cv.typing.MatLike,
+    kernel_size: int,
+    filtered_image: cv.typing.MatLike,
+) -> None:
+    image_h, image_w = filtered_image.shape[0], filtered_image.shape[1]
+    w: int = kernel_size // 2
+
+    for i in prange(w, image_h + w):
+        # Per row, so that no two threads share a buffer.
+        nbrs = np.empty((3, kernel_size * kernel_size), dtype=np.int32)
+        for j in range(w, image_w + w):
+            if wrapped_mask[i, j] > 0:
+                filtered_image[i - w, j - w] = wrapped_image[i, j]
+                continue
+            num_nbrs = 0
+            for x in range(i - w, i + w + 1):
+                for y in range(j - w, j + w + 1):
+                    if wrapped_mask[x, y] > 0:
+                        continue
+                    for c in range(3):
+                        nbrs[c, num_nbrs] = wrapped_image[x, y, c]
+                    num_nbrs += 1
+            _set_sorted_median(num_nbrs, nbrs, filtered_image, i - w, j - w)
+
+
+@jit(nopython=True, cache=True)
+def _set_sorted_median(num_nbrs: int, nbrs, filtered_image, row: int, col: int) -> None:
+    if num_nbrs == 0:
+        for c in range(3):
+            filtered_image[row, col, c] = _NO_NEIGHBOURS_COLOR[c]
+        return
+
+    # The mean of the two middle values, truncated. That is what the reference engine's
+    # float `np.median` becomes when it is stored back into an 8 bit image, done here in
+    # integers so that the two cannot drift apart on a half.
+    lo = (num_nbrs - 1) // 2
+    hi = num_nbrs // 2
+    for c in range(3):
+        _insertion_sort(nbrs[c], num_nbrs)
+        filtered_image[row, col, c] = (nbrs[c, lo] + nbrs[c, hi]) // 2
+
+
+@jit(nopython=True, cache=True)
+def _insertion_sort(values, n: int) -> None:
+    # At most forty nine values, where this beats `np.sort` and allocates nothing.
+    for k in range(1, n):
+        value = values[k]
+        m = k - 1
+        while m >= 0 and values[m] > value:
+            values[m + 1] = values[m]
+            m -= 1
+        values[m + 1] = value
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def _median_filter_core_histogram(  # noqa: C901, PLR0912
+    wrapped_image: cv.typing.MatLike,
+    wrapped_mask: cv.typing.MatLike,
+    kernel_size: int,
+    filtered_image: cv.typing.MatLike,
+) -> None:
+    image_h, image_w = filtered_image.shape[0], filtered_image.shape[1]
+    w: int = kernel_size // 2
+
+    for i in prange(w, image_h + w):
+        # One histogram per channel, over the unmasked pixels of the window, and per row
+        # so that no two threads share one.
+        hist = np.zeros((3, 256), dtype=np.int32)
+        num_nbrs = 0
+
+        # Prime it with the window to the left of the first pixel, minus its last column,
+        # so that every step below is the same remove-one-column, add-one-column slide.
+        for x in range(i - w, i + w + 1):
+            for y in range(0, kernel_size - 1):
+                if wrapped_mask[x, y] == 0:
+                    for c in range(3):
+                        hist[c, wrapped_image[x, y, c]] += 1
+                    num_nbrs += 1
+
+        for j in range(w, image_w + w):
+            if j > w:
+                y = j - w - 1
+                for x in range(i - w, i + w + 1):
+                    if wrapped_mask[x, y] == 0:
+                        for c in range(3):
+                            hist[c, wrapped_image[x, y, c]] -= 1
+                        num_nbrs -= 1
+            y = j + w
+            for x in range(i - w, i + w + 1):
+                if wrapped_mask[x, y] == 0:
+                    for c in range(3):
+                        hist[c, wrapped_image[x, y, c]] += 1
+                    num_nbrs += 1
+
+            if wrapped_mask[i, j] > 0:
+                filtered_image[i - w, j - w] = wrapped_image[i, j]
+                continue
+
+            if num_nbrs == 0:
+                for c in range(3):
+                    filtered_image[i - w, j - w, c] = _NO_NEIGHBOURS_COLOR[c]
+                continue
+
+            lo = (num_nbrs - 1) // 2
+            hi = num_nbrs // 2
+            for c in range(3):
+                filtered_image[i - w, j - w, c] = (
+                    _nth_in_histogram(hist[c], lo) + _nth_in_histogram(hist[c], hi)
+                ) // 2
+
+
+@jit(nopython=True, cache=True)
+def _nth_in_histogram(hist, n: int) -> int:
+    """Return the value at zero-based position `n` of the sorted values a histogram counts."""
+    total = 0
+    for value in range(256):
+        total += hist[value]
+        if total > n:
+            return value
+    return 255
+
+
+def get_median_filter(
+    input_image: cv.typing.MatLike,
+    engine: MedianEngine = DEFAULT_MEDIAN_ENGINE,
+    num_threads: int | None = None,
+) -> cv.typing.MatLike:
+    """Return the image with its jpeg artifacts median filtered away, leaving the ink alone.
+
+    Args:
+        input_image: The BGR page to filter.
+        engine: Which implementation to run. They all give the same image.
+        num_threads: How many threads the parallel engines may use. None leaves it to
+            numba, which takes every core - right for a single page, and wrong for a
+            batch whose phases already run a page per core.
+
+    Returns:
+        The filtered page.
+
+    """
     black_ink_mask = _get_black_ink_mask(input_image)
     if DEBUG:
         cv.imwrite(
@@ -110,7 +308,9 @@ def get_median_filter(input_image: cv.typing.MatLike) -> cv.typing.MatLike:
             enlarged_black_ink_mask,
         )
 
-    filtered_image = _median_filter(input_image, enlarged_black_ink_mask, MEDIAN_BLUR_APERTURE_SIZE)
+    filtered_image = _median_filter(
+        input_image, enlarged_black_ink_mask, MEDIAN_BLUR_APERTURE_SIZE, engine, num_threads
+    )
     if DEBUG:
         cv.imwrite(
             os.path.join(DEBUG_OUTPUT_DIR, "median-filtered-image.jpg"),
@@ -120,6 +320,19 @@ def get_median_filter(input_image: cv.typing.MatLike) -> cv.typing.MatLike:
     return filtered_image
 
 
+def warm_up_median_filter(engine: MedianEngine = DEFAULT_MEDIAN_ENGINE) -> None:
+    """Compile, or load from the cache, the kernels an engine runs.
+
+    Done on a few pixels, so that the process pays for it up front rather than inside
+    the first page's timed step, where it would be charged to the filter.
+
+    Args:
+        engine: The engine the pages will be filtered with.
+
+    """
+    get_median_filter(np.full((16, 16, 3), 255, dtype=np.uint8), engine, num_threads=1)
+
+
 def _get_black_ink_mask(image: cv.typing.MatLike) -> cv.typing.MatLike:
     gray_image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
 
@@ -4,7 +4,13 @@ from pathlib import Path
 import cv2 as cv
 import numpy as np
 
-from barks_comic_building.restore.image_io import write_cv_image_file
+from barks_comic_building.restore.image_io import (
+    DEFAULT_WORK_FILE_FORMAT,
+    WorkFileFormat,
+    read_work_image_file,
+    write_cv_image_file,
+    write_work_image_file,
+)
 
 DEBUG_WRITE_COLOR_COUNTS = False
 
@@ -65,19 +71,58 @@ def write_color_counts(filename: Path, image: cv.typing.MatLike) -> None:
         )
 
 
-def remove_colors_from_image(
+def remove_colors_from_image(  # noqa: PLR0913
     work_dir: Path,
     work_file_stem: str,
     in_file: Path,
     out_file: Path,
     debug_color_counts: bool = DEBUG_WRITE_COLOR_COUNTS,
+    *,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+    write_debug_files: bool = False,
 ) -> None:
-    out_image = cv.imread(str(in_file))
-    assert out_image is not None
+    out_image = read_work_image_file(in_file)
+
+    remove_colors_from_array(
+        work_dir,
+        work_file_stem,
+        out_image,
+        out_file,
+        debug_color_counts=debug_color_counts,
+        work_file_format=work_file_format,
+        write_debug_files=write_debug_files,
+    )
+
 
+def remove_colors_from_array(  # noqa: PLR0913
+    work_dir: Path,
+    work_file_stem: str,
+    out_image: cv.typing.MatLike,
+    out_file: Path,
+    debug_color_counts: bool = DEBUG_WRITE_COLOR_COUNTS,
+    *,
+    work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+    write_debug_files: bool = False,
+) -> None:
+    """Remove the colours from an image already in memory, writing what is left of it.
+
+    The image is posterized in place, so the caller's array is spent afterwards.
+
+    Args:
+        work_dir: Where the debug intermediates are written.
+        work_file_stem: What to name them after.
+        out_image: The median filtered BGR page.
+        out_file: Where to write the colour-removed page. gmic smooths it next, so it is
+            always written in a form gmic can read.
+        debug_color_counts: Write the slow colour-count text files.
+        work_file_format: How to write `out_file`.
+        write_debug_files: Also write the posterized page, which nothing downstream reads.
+
+    """
     posterize_image(out_image)
-    posterized_image_file = work_dir / (work_file_stem + "-posterized-pre-remove-colors.png")
-    write_cv_image_file(posterized_image_file, out_image)
+    if write_debug_files:
+        posterized_image_file = work_dir / (work_file_stem + "-posterized-pre-remove-colors.png")
+        write_cv_image_file(posterized_image_file, out_image)
 
     if debug_color_counts:
         posterized_counts_file = work_dir / (
@@ -94,4 +139,4 @@ def remove_colors_from_image(
         )
         write_color_counts(remaining_color_counts_file, out_image)
 
-    write_cv_image_file(out_file, out_image)
+    write_work_image_file(out_file, out_image, work_file_format.for_gmic())
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import contextlib
+import functools
 import time
 from datetime import datetime
 from pathlib import Path
@@ -14,41 +15,67 @@ from comic_utils.pil_image_utils import get_image_size
 from loguru import logger
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Collection, Generator
+    from collections.abc import Collection, Generator
 
-from barks_comic_building.restore.image_checks import (
-    MAX_THUMBNAIL_DEVIATION,
-    find_content_fault,
-    find_structural_fault,
-)
+from barks_comic_building.restore.image_checks import MAX_THUMBNAIL_DEVIATION, ImageChecks
 from barks_comic_building.restore.image_io import (
+    DEFAULT_RESIZE_BACKEND,
+    DEFAULT_WORK_FILE_FORMAT,
+    ResizeBackend,
+    WorkFileFormat,
     resize_image_file,
     svg_file_to_optimized_png,
     svg_file_to_png,
-    write_cv_image_file,
+    svg_file_to_rgba_array,
+    write_work_image_file,
 )
 from barks_comic_building.restore.inpaint import inpaint_image_file
-from barks_comic_building.restore.overlay import overlay_inpainted_file_with_black_ink
+from barks_comic_building.restore.memory_budget import PeakRssSampler
+from barks_comic_building.restore.overlay import (
+    DEFAULT_OVERLAY_BACKEND,
+    OverlayBackend,
+    overlay_inpainted_file_with_black_ink,
+    overlay_with_black_ink,
+    write_overlaid_file,
+)
 from barks_comic_building.restore.page_state import (
     RECIPE_ID_KEY,
     RECIPE_KEY,
     RESTORE_DATE_KEY,
 )
-from barks_comic_building.restore.palette_snap import snap_image_file_to_srce_palette
-from barks_comic_building.restore.remove_alias_artifacts import get_median_filter
+from barks_comic_building.restore.palette_snap import (
+    get_palette_snapped_image,
+    snap_image_file_to_srce_palette,
+)
+from barks_comic_building.restore.remove_alias_artifacts import (
+    DEFAULT_MEDIAN_ENGINE,
+    MedianEngine,
+    get_median_filter,
+)
 from barks_comic_building.restore.remove_colors import (
     DEBUG_WRITE_COLOR_COUNTS,
+    remove_colors_from_array,
     remove_colors_from_image,
 )
 from barks_comic_building.restore.restore_recipe import get_current_recipe
 from barks_comic_building.restore.run_stop import read_stop_mode
 from barks_comic_building.restore.smooth_image import smooth_image_file
+from barks_comic_building.restore.step_graph import StepNode, get_step_order, run_step_graph
 from barks_comic_building.restore.vtracer_to_svg import image_file_to_svg
 
 # Default for whether existing intermediate work files are reused (resume) rather than
 # regenerated. Can be overridden per pipeline via the constructor. Use with care.
 USE_EXISTING_WORK_FILES = False
 
+# Default for whether part 1 hands the median filtered image straight to the colour
+# removal in memory rather than through a png in the work directory. The round trip is
+# several seconds of deflate and inflate on a 4x page, for a file nothing else reads.
+FUSE_PART1 = True
+
+# Default for how many of a page's steps `do_all_steps` runs at once. Two is every branch
+# the graph has: the inpaint and the palette snap beside the smooth and the trace.
+CONCURRENT_STEPS = 2
+
 
 # The declared hand-restored pages, resolved from (volume, page) to the (volume directory
 # name, page stem) pair a destination path can be tested against. Resolved once, at import,
@@ -97,6 +124,79 @@ STEP_SNAP_PALETTE = "snap palette"
 STEP_OVERLAY = "overlay"
 STEP_RESIZE = "resize restored file"
 
+# The steps, by the files they read and write - see `step_graph`. The order is the one
+# they run in one at a time, and the graph only lets the inpaint branch start early: it
+# reads the colour removed page and the upscale, and nothing the smooth or the trace
+# writes. The overlay is where the two branches meet.
+RESTORE_STEPS: tuple[StepNode, ...] = (
+    StepNode(
+        STEP_REMOVE_ARTIFACTS,
+        "_do_remove_jpg_artifacts",
+        ("srce_upscale_file",),
+        (),
+        ("removed_artifacts_file",),
+    ),
+    StepNode(
+        STEP_REMOVE_COLORS,
+        "_do_remove_colors",
+        ("removed_artifacts_file",),
+        (),
+        ("removed_colors_file", "posterized_file"),
+    ),
+    StepNode(
+        STEP_SMOOTH,
+        "_do_smooth_removed_colors",
+        ("removed_colors_file",),
+        (),
+        ("smoothed_removed_colors_file",),
+    ),
+    StepNode(
+        STEP_GENERATE_SVG,
+        "_do_generate_svg",
+        ("smoothed_removed_colors_file",),
+        ("dest_svg_restored_file",),
+        ("svg_png_4x_file",),
+    ),
+    StepNode(
+        STEP_INPAINT,
+        "_do_inpaint",
+        ("srce_upscale_file", "removed_colors_file"),
+        (),
+        ("inpainted_file", "remove_mask_file", "input_black_removed_file"),
+    ),
+    StepNode(
+        STEP_SNAP_PALETTE,
+        "_do_snap_palette",
+        ("srce_file", "inpainted_file"),
+        (),
+        ("palette_snapped_file",),
+    ),
+    StepNode(
+        STEP_OVERLAY,
+        "_do_overlay_inpaint_with_black_ink",
+        ("inpainted_file", "palette_snapped_file", "dest_svg_restored_file", "svg_png_4x_file"),
+        ("dest_upscayled_restored_file",),
+    ),
+    StepNode(
+        STEP_RESIZE,
+        "_do_resize_restored_file",
+        ("srce_file", "dest_upscayled_restored_file", "dest_svg_restored_file"),
+        ("dest_restored_file", "png_of_svg_file"),
+    ),
+)
+_STEPS_BY_NAME = {step.name: step for step in RESTORE_STEPS}
+
+# The steps each of the batch driver's phases runs. A phase is run in a worker of its own,
+# so it has to be a set of steps whose inputs the phases it waits for have all written -
+# which the batch driver works out from the graph. Nothing held in memory may cross from
+# one phase to the next, which is why the snap shares a phase with the overlay that takes
+# its colour layer straight from it, and the inpaint, which writes its file, has its own.
+PART1_STEPS = (STEP_REMOVE_ARTIFACTS, STEP_REMOVE_COLORS)
+PART2_STEPS = (STEP_SMOOTH,)
+PART3_STEPS = (STEP_GENERATE_SVG,)
+PART4_STEPS = (STEP_INPAINT,)
+PART5_STEPS = (STEP_SNAP_PALETTE, STEP_OVERLAY, STEP_RESIZE)
+
 # There was a retry here, and then a ladder of reduced scales beneath it, on the strength of
 # volume 4's 098 and 099 coming back as blank pages. They were never blank: the inpaint had
 # written values a shade over 255, gmic had answered by writing 16 bit pngs, and the check
@@ -115,6 +215,9 @@ def _timed_step(pipeline: RestorePipeline, step_name: str, target: str) -> Gener
     line buried in an append-only log. A step that fails is timed too - how long a page
     took to fail is worth as much as how long it took to succeed.
 
+    The step's peak memory is kept the same way, for the batch driver to size its
+    memory-hungry phases by - see `memory_budget`.
+
     Args:
         pipeline: The pipeline being run, which collects the timings.
         step_name: The canonical step name, used as the ledger key. One of the
@@ -123,9 +226,13 @@ def _timed_step(pipeline: RestorePipeline, step_name: str, target: str) -> Gener
 
     """
     start = time.time()
+    # Bound before the try, so that a sampler that cannot start is reported as the step's
+    # failure rather than hidden behind the finally's read of it.
+    sampler: PeakRssSampler | None = None
     # noinspection PyBroadException
     try:
-        yield
+        with PeakRssSampler() as sampler:
+            yield
     except Exception:  # noqa: BLE001
         pipeline.errors_occurred = True
         pipeline.failed_step = step_name
@@ -134,6 +241,8 @@ def _timed_step(pipeline: RestorePipeline, step_name: str, target: str) -> Gener
     else:
         pipeline.step_seconds[step_name] = time.time() - start
         logger.info(f'Time taken for {step_name} "{target}": {int(time.time() - start)}s.')
+    finally:
+        pipeline.step_peak_rss_mb[step_name] = 0.0 if sampler is None else sampler.peak_mb
 
 
 # noinspection PyBroadException
@@ -151,6 +260,13 @@ class RestorePipeline:
         debug_color_counts: bool = DEBUG_WRITE_COLOR_COUNTS,
         do_palette_snap: bool = True,
         stop_file: Path | None = None,
+        fuse_part1: bool = FUSE_PART1,
+        keep_work_files: bool = False,
+        work_file_format: WorkFileFormat = DEFAULT_WORK_FILE_FORMAT,
+        median_engine: MedianEngine = DEFAULT_MEDIAN_ENGINE,
+        median_threads: int | None = None,
+        resize_backend: ResizeBackend = DEFAULT_RESIZE_BACKEND,
+        overlay_backend: OverlayBackend = DEFAULT_OVERLAY_BACKEND,
     ) -> None:
         self.work_dir = work_dir
         self.out_dir = dest_restored_file.parent
@@ -163,6 +279,19 @@ class RestorePipeline:
         self.use_existing_work_files = use_existing_work_files
         self.debug_color_counts = debug_color_counts
         self.do_palette_snap = do_palette_snap
+        self.fuse_part1 = fuse_part1
+        self.keep_work_files = keep_work_files
+
+        # How the intermediates are written. Lossless whichever it is, so again not part
+        # of the recipe. The ones gmic reads next stay png whatever is asked for.
+        self.work_file_format = work_file_format
+        self.resize_backend = resize_backend
+        self.overlay_backend = overlay_backend
+
+        # Not part of the recipe: every engine gives the same pixels. The thread count is
+        # left to numba (every core) unless the caller is already running a page per core.
+        self.median_engine = median_engine
+        self.median_threads = median_threads
 
         # Recorded into the restored page so that a later run can tell what it was made
         # with, and redo it when the tuning has moved on. Derived from the live step
@@ -175,9 +304,25 @@ class RestorePipeline:
         # directly by the single-page CLI.
         self.stop_file = stop_file
 
+        # The median filtered page, held between the two part 1 steps when they are fused.
+        # Only ever set while `_run_steps` is running, which clears it again, so a pipeline
+        # is never pickled off to a worker carrying a hundred megapixels it does not need.
+        self._removed_artifacts_image: cv.typing.MatLike | None = None
+
+        # Likewise the palette snapped colour layer, held between the snap and the overlay
+        # when the overlay is done in process, and cleared the same way.
+        self._palette_snapped_image: cv.typing.MatLike | None = None
+
+        # What the output checks have read of the page's files, so that an output checked
+        # and then compared against by the next step's check is read the once. Only the
+        # thumbnails, but kept to `_run_steps` all the same: the files can change between
+        # one phase and the next.
+        self._image_checks: ImageChecks | None = None
+
         self.errors_occurred = False
         self.failed_step: str | None = None
         self.step_seconds: dict[str, float] = {}
+        self.step_peak_rss_mb: dict[str, float] = {}
 
         # Set when the pipeline gave up part way through a phase because a stop was
         # asked for. Not a failure: the page is unfinished but everything it wrote is
@@ -223,7 +368,11 @@ class RestorePipeline:
 
         self.srce_upscale_stem = f"{self.srce_upscale_file.stem}-upscayled"
 
-        self.removed_artifacts_file = work_dir / f"{self.srce_upscale_stem}-median-filtered.png"
+        # The one intermediate that only this package reads, so the only one whose name
+        # follows the work file format.
+        self.removed_artifacts_file = (
+            work_dir / f"{self.srce_upscale_stem}-median-filtered{work_file_format.suffix}"
+        )
         self.removed_colors_file = work_dir / f"{self.srce_upscale_stem}-color-removed.png"
         self.smoothed_removed_colors_file = (
             work_dir / f"{self.srce_upscale_stem}-color-removed-smoothed.png"
@@ -231,6 +380,18 @@ class RestorePipeline:
         self.inpainted_file = work_dir / f"{self.srce_upscale_stem}-inpainted.png"
         self.palette_snapped_file = work_dir / f"{self.srce_upscale_stem}-palette-snapped.png"
 
+        # Written by the step modules rather than by the pipeline, under names they make
+        # up for themselves. Named here too so that the step graph can say whose they are.
+        # The first two are only written when the work files are being kept, but an
+        # earlier run may have left them either way.
+        self.posterized_file = (
+            work_dir / f"{self.srce_upscale_stem}-posterized-pre-remove-colors.png"
+        )
+        self.remove_mask_file = work_dir / f"{self.srce_upscale_stem}-remove-mask.png"
+        self.input_black_removed_file = (
+            work_dir / f"{self.srce_upscale_stem}-input-black-removed.png"
+        )
+
         # The traced line art is rendered twice, at two sizes and in two forms, and the
         # two must not share a path. The 4x render is an rgba work file that the overlay
         # composites onto the colour layer; the 1x render is the inverted alpha mask that
@@ -240,27 +401,82 @@ class RestorePipeline:
         self.svg_png_4x_file = work_dir / f"{self.srce_upscale_stem}-svg-4x.png"
         self.png_of_svg_file = Path(str(self.dest_svg_restored_file) + ".png")
 
+    @functools.cached_property
+    def megapixels(self) -> float:
+        """Return the size of the page the steps work on, read from the upscale's header.
+
+        Cached since it is asked for every time the batch driver considers starting the
+        page, and the file does not change under a run.
+        """
+        width, height = get_image_size(self.srce_upscale_file)
+        return width * height / 1e6
+
     @property
-    def expected_output_files(self) -> list[Path]:
-        """Return all intermediate and final output files produced by the pipeline."""
-        files = [
-            self.removed_artifacts_file,
-            self.removed_colors_file,
-            self.smoothed_removed_colors_file,
-            self.dest_svg_restored_file,
-            self.svg_png_4x_file,
-            self.png_of_svg_file,
-            self.inpainted_file,
-        ]
+    def persists_removed_artifacts(self) -> bool:
+        """Return whether the median filtered page is written to the work directory.
+
+        Always when part 1 is not fused, since the colour removal reads it from there.
+        When it is fused, only if something will look at the file later: a resumed run,
+        which can skip the filter when the file survives, or someone keeping the work
+        files to see what each step did.
+        """
+        return not self.fuse_part1 or self.use_existing_work_files or self.keep_work_files
+
+    @property
+    def persists_palette_snapped(self) -> bool:
+        """Return whether the palette snapped colour layer is written to the work directory.
+
+        Always for the gmic overlay, which reads it from there. The in-process overlay
+        takes it straight from the snap, so it is only written for a resumed run or for
+        someone keeping the work files.
+        """
+        return (
+            self.overlay_backend is OverlayBackend.GMIC
+            or self.use_existing_work_files
+            or self.keep_work_files
+        )
+
+    @property
+    def renders_svg_png_4x(self) -> bool:
+        """Return whether the traced ink is rendered out to a 4x png for the overlay.
+
+        Only the gmic overlay needs one. The in-process overlay renders the svg itself,
+        straight into memory.
+        """
+        return self.overlay_backend is OverlayBackend.GMIC
+
+    @property
+    def _unchecked_files(self) -> set[Path]:
+        """Return the files in the step graph that a finished page need not have.
+
+        The ones this configuration does not write, and the by-products of the step
+        modules, which are theirs to write or not.
+        """
+        unchecked = {self.posterized_file, self.remove_mask_file, self.input_black_removed_file}
+        if not self.persists_removed_artifacts:
+            unchecked.add(self.removed_artifacts_file)
+        if not self.renders_svg_png_4x:
+            unchecked.add(self.svg_png_4x_file)
 
         # Only expected when the snap actually runs. It is skipped when turned off, and
         # when there is no source page to take a palette from.
-        if self.do_palette_snap and self.srce_file.is_file():
-            files.append(self.palette_snapped_file)
+        if not (
+            self.do_palette_snap and self.srce_file.is_file() and self.persists_palette_snapped
+        ):
+            unchecked.add(self.palette_snapped_file)
+
+        return unchecked
+
+    @property
+    def expected_output_files(self) -> list[Path]:
+        """Return all intermediate and final output files produced by the pipeline.
 
-        files += [self.dest_upscayled_restored_file, self.dest_restored_file]
+        Read off the step graph, so a step's files are looked for as soon as it is in it.
+        """
+        unchecked = self._unchecked_files
+        files = (getattr(self, name) for step in RESTORE_STEPS for name in step.all_outputs)
 
-        return files
+        return [file for file in files if file not in unchecked]
 
     @property
     def work_files(self) -> list[Path]:
@@ -268,24 +484,11 @@ class RestorePipeline:
 
         Named explicitly rather than by globbing the work directory, because the work
         directory is shared by a whole title and cleaning up is a deletion - it should
-        only ever remove files this page is known to have put there.
-
-        Includes the three written by the step modules rather than by the pipeline
-        itself, which would otherwise be left behind.
+        only ever remove files this page is known to have put there. The names come from
+        the step graph, which is also what `expected_output_files` reads, so the files
+        checked for and the files cleaned up cannot drift apart.
         """
-        stem = self.srce_upscale_stem
-
-        return [
-            self.removed_artifacts_file,
-            self.removed_colors_file,
-            self.smoothed_removed_colors_file,
-            self.inpainted_file,
-            self.palette_snapped_file,
-            self.svg_png_4x_file,
-            self.work_dir / f"{stem}-posterized-pre-remove-colors.png",
-            self.work_dir / f"{stem}-remove-mask.png",
-            self.work_dir / f"{stem}-input-black-removed.png",
-        ]
+        return [getattr(self, name) for step in RESTORE_STEPS for name in step.work_outputs]
 
     @property
     def file_to_overlay(self) -> Path:
@@ -295,48 +498,79 @@ class RestorePipeline:
         have been made from - the snap is skipped when it is turned off or when there is
         no source file to take a palette from.
         """
-        if self.do_palette_snap and self.palette_snapped_file.is_file():
+        if self.do_palette_snap and (
+            self._palette_snapped_image is not None or self.palette_snapped_file.is_file()
+        ):
             return self.palette_snapped_file
         return self.inpainted_file
 
-    def _run_steps(self, *steps: Callable[[], None]) -> None:
-        """Run steps in order, giving up early on an error or a stop request.
+    def _should_go_on(self) -> bool:
+        """Return whether to start another step, after one has finished.
 
         The stop is looked for between steps and never during one, so whatever a worker
         is in the middle of always finishes. That is what keeps a stopped run resumable:
         every intermediate left on disk is a whole file, not a truncated one.
         """
-        for step in steps:
-            step()
+        if self.errors_occurred:
+            return False
 
-            if self.errors_occurred:
-                return
+        if read_stop_mode(self.stop_file).stops_pages_that_have_started:
+            self.stopped_early = True
+            # The step that just ran is the last one the timer recorded.
+            last_step = next(reversed(self.step_seconds), "the current step")
+            logger.warning(
+                f'Stop requested - "{self.srce_upscale_file.name}" stopping after {last_step}.',
+            )
+            return False
 
-            if read_stop_mode(self.stop_file).stops_pages_that_have_started:
-                self.stopped_early = True
-                # The step that just ran is the last one the timer recorded.
-                last_step = next(reversed(self.step_seconds), "the current step")
-                logger.warning(
-                    f'Stop requested - "{self.srce_upscale_file.name}" stopping after {last_step}.',
-                )
-                return
+        return True
+
+    def _run_steps(self, step_names: Collection[str], max_concurrent: int = 1) -> None:
+        """Run some of the steps as the graph allows, giving up early on an error or a stop.
+
+        Whatever is held in memory between two steps is let go of afterwards, so that a
+        pipeline is never pickled off to a worker carrying a page it does not need.
+        """
+        self._image_checks = ImageChecks()
+        try:
+            run_step_graph(
+                [_STEPS_BY_NAME[name] for name in step_names],
+                lambda step: getattr(self, step.method_name)(),
+                self._should_go_on,
+                max_concurrent,
+            )
+        finally:
+            self._removed_artifacts_image = None
+            self._palette_snapped_image = None
+            self._image_checks = None
+
+    @property
+    def image_checks(self) -> ImageChecks:
+        """Return the output checks of the steps running, or fresh ones outside a run."""
+        return ImageChecks() if self._image_checks is None else self._image_checks
 
     def do_part1(self) -> None:
-        self._run_steps(self._do_remove_jpg_artifacts, self._do_remove_colors)
+        self._run_steps(PART1_STEPS)
 
     def do_part2_memory_hungry(self) -> None:
-        self._run_steps(self._do_smooth_removed_colors)
+        self._run_steps(PART2_STEPS)
 
     def do_part3(self) -> None:
-        self._run_steps(self._do_generate_svg)
+        self._run_steps(PART3_STEPS)
 
     def do_part4_memory_hungry(self) -> None:
-        self._run_steps(
-            self._do_inpaint,
-            self._do_snap_palette,
-            self._do_overlay_inpaint_with_black_ink,
-            self._do_resize_restored_file,
-        )
+        self._run_steps(PART4_STEPS)
+
+    def do_part5_memory_hungry(self) -> None:
+        self._run_steps(PART5_STEPS)
+
+    def do_all_steps(self, max_concurrent: int = CONCURRENT_STEPS) -> None:
+        """Run every step of the page in this process, the independent branches at once.
+
+        For a page restored on its own. The batch driver runs the phases instead, in
+        separate workers, where the cores are already kept busy by other pages.
+        """
+        self._run_steps([step.name for step in get_step_order(RESTORE_STEPS)], max_concurrent)
 
     def _do_remove_jpg_artifacts(self) -> None:
         if self.use_existing_work_files and self.removed_artifacts_file.is_file():
@@ -351,8 +585,15 @@ class RestorePipeline:
         )
         with _timed_step(self, STEP_REMOVE_ARTIFACTS, self.removed_artifacts_file.name):
             upscale_image = cv.imread(str(self.srce_upscale_file))
-            out_image = get_median_filter(upscale_image)  # ty:ignore[invalid-argument-type]
-            write_cv_image_file(self.removed_artifacts_file, out_image)
+            out_image = get_median_filter(
+                upscale_image,  # ty:ignore[invalid-argument-type]
+                self.median_engine,
+                self.median_threads,
+            )
+            if self.fuse_part1:
+                self._removed_artifacts_image = out_image
+            if self.persists_removed_artifacts:
+                write_work_image_file(self.removed_artifacts_file, out_image, self.work_file_format)
 
     def _do_remove_colors(self) -> None:
         if self.use_existing_work_files and self.removed_colors_file.is_file():
@@ -363,12 +604,30 @@ class RestorePipeline:
 
         logger.info(f'\nGenerating color removed file "{self.removed_colors_file}"...')
         with _timed_step(self, STEP_REMOVE_COLORS, self.removed_colors_file.name):
+            # Fused, the filtered page is still in memory from the step before - unless
+            # that step found its file already there and skipped, which leaves the file
+            # to be read like any other.
+            if self._removed_artifacts_image is not None:
+                remove_colors_from_array(
+                    self.work_dir,
+                    self.srce_upscale_stem,
+                    self._removed_artifacts_image,
+                    self.removed_colors_file,
+                    debug_color_counts=self.debug_color_counts,
+                    work_file_format=self.work_file_format,
+                    write_debug_files=self.keep_work_files,
+                )
+                self._removed_artifacts_image = None
+                return
+
             remove_colors_from_image(
                 self.work_dir,
                 self.srce_upscale_stem,
                 self.removed_artifacts_file,
                 self.removed_colors_file,
                 debug_color_counts=self.debug_color_counts,
+                work_file_format=self.work_file_format,
+                write_debug_files=self.keep_work_files,
             )
 
     def _do_smooth_removed_colors(self) -> None:
@@ -387,7 +646,7 @@ class RestorePipeline:
         if (
             self.use_existing_work_files
             and self.dest_svg_restored_file.is_file()
-            and self.svg_png_4x_file.is_file()
+            and (self.svg_png_4x_file.is_file() or not self.renders_svg_png_4x)
         ):
             logger.warning(
                 f'Svg file and its 4x render already exist - skipping: "{self.svg_png_4x_file}".'
@@ -398,8 +657,9 @@ class RestorePipeline:
         with _timed_step(self, STEP_GENERATE_SVG, self.dest_svg_restored_file.name):
             image_file_to_svg(self.smoothed_removed_colors_file, self.dest_svg_restored_file)
 
-            logger.info(f'\nSaving svg file to same-sized png file "{self.svg_png_4x_file}"...')
-            svg_file_to_png(self.dest_svg_restored_file, self.svg_png_4x_file)
+            if self.renders_svg_png_4x:
+                logger.info(f'\nSaving svg file to same-sized png file "{self.svg_png_4x_file}"...')
+                svg_file_to_png(self.dest_svg_restored_file, self.svg_png_4x_file)
 
     def _do_inpaint(self) -> None:
         if self.use_existing_work_files and self.inpainted_file.is_file():
@@ -414,6 +674,8 @@ class RestorePipeline:
                 self.srce_upscale_file,
                 self.removed_colors_file,
                 self.inpainted_file,
+                work_file_format=self.work_file_format,
+                write_debug_files=self.keep_work_files,
             )
             self._verify_inpaint()
 
@@ -437,7 +699,7 @@ class RestorePipeline:
         """
         self._verify_output(
             self.inpainted_file,
-            expected_size=get_image_size(self.srce_upscale_file),
+            expected_size=self.image_checks.get_size(self.srce_upscale_file),
             expected_mode="RGB",
         )
 
@@ -457,9 +719,20 @@ class RestorePipeline:
 
         logger.info(f'\nSnapping inpainted file to "{self.palette_snapped_file}"...')
         with _timed_step(self, STEP_SNAP_PALETTE, self.palette_snapped_file.name):
-            fraction = snap_image_file_to_srce_palette(
-                self.srce_file, self.inpainted_file, self.palette_snapped_file
-            )
+            if self.overlay_backend is OverlayBackend.GMIC:
+                fraction = snap_image_file_to_srce_palette(
+                    self.srce_file,
+                    self.inpainted_file,
+                    self.palette_snapped_file,
+                    self.work_file_format,
+                )
+            else:
+                snapped, fraction = get_palette_snapped_image(self.srce_file, self.inpainted_file)
+                if self.persists_palette_snapped:
+                    write_work_image_file(
+                        self.palette_snapped_file, snapped, self.work_file_format.for_gmic()
+                    )
+                self._palette_snapped_image = snapped
             logger.info(f"Snapped {fraction:.1%} of pixels to the srce palette.")
 
     def _verify_output(
@@ -490,11 +763,13 @@ class RestorePipeline:
                 or does not resemble what it was made from.
 
         """
-        fault = find_structural_fault(
-            out_file, expected_size=expected_size, expected_mode=expected_mode
+        fault = self.image_checks.find_fault(
+            out_file,
+            expected_size=expected_size,
+            expected_mode=expected_mode,
+            srce_file=srce_file,
+            max_deviation=max_deviation,
         )
-        if fault is None and srce_file is not None:
-            fault = find_content_fault(out_file, srce_file, max_deviation)
 
         if fault is None:
             return
@@ -504,25 +779,48 @@ class RestorePipeline:
         raise RuntimeError(msg)
 
     def _do_overlay_inpaint_with_black_ink(self) -> None:
+        black_ink_file = (
+            self.svg_png_4x_file if self.renders_svg_png_4x else self.dest_svg_restored_file
+        )
         logger.info(
             f'\nOverlaying colour file "{self.file_to_overlay}"'
-            f' with black ink file "{self.svg_png_4x_file}"...'
+            f' with black ink file "{black_ink_file}"...'
         )
         with _timed_step(self, STEP_OVERLAY, self.file_to_overlay.name):
-            overlay_inpainted_file_with_black_ink(
-                self.file_to_overlay, self.svg_png_4x_file, self.dest_upscayled_restored_file
-            )
+            if self.overlay_backend is OverlayBackend.GMIC:
+                overlay_inpainted_file_with_black_ink(
+                    self.file_to_overlay, self.svg_png_4x_file, self.dest_upscayled_restored_file
+                )
+            else:
+                self._overlay_in_process()
 
             # Checked before the resize rather than at the end of the run, because the
             # resize reads this file: a blacked-out overlay would otherwise be quietly
             # copied down into the restored page as well.
             self._verify_output(
                 self.dest_upscayled_restored_file,
-                expected_size=get_image_size(self.srce_upscale_file),
+                expected_size=self.image_checks.get_size(self.srce_upscale_file),
                 expected_mode="RGB",
                 srce_file=self.srce_upscale_file,
             )
 
+    def _overlay_in_process(self) -> None:
+        colour_image = self._palette_snapped_image
+        self._palette_snapped_image = None
+        if colour_image is None:
+            colour_image = cv.imread(str(self.file_to_overlay))
+            if colour_image is None:
+                msg = f'Could not read colour file: "{self.file_to_overlay}".'
+                raise FileNotFoundError(msg)
+
+        black_ink_image = svg_file_to_rgba_array(self.dest_svg_restored_file)
+        overlaid = overlay_with_black_ink(colour_image, black_ink_image)
+        del black_ink_image
+
+        write_overlaid_file(self.dest_upscayled_restored_file, overlaid)
+        # Checked from the page in hand, with the file only streamed to confirm it.
+        self.image_checks.add_written(self.dest_upscayled_restored_file, overlaid)
+
     def _do_resize_restored_file(self) -> None:
         logger.info(f'\nResizing restored file to "{self.dest_restored_file}"...')
         with _timed_step(self, STEP_RESIZE, self.dest_restored_file.name):
@@ -540,16 +838,22 @@ class RestorePipeline:
                 RESTORE_DATE_KEY: datetime.now().astimezone().isoformat(timespec="seconds"),
             }
 
-            resize_image_file(
+            resized = resize_image_file(
                 self.dest_upscayled_restored_file,
                 self.scale,
                 self.dest_restored_file,
                 restored_file_metadata,
+                self.resize_backend,
             )
+            if resized is not None:
+                self.image_checks.add_written(self.dest_restored_file, resized)
+                del resized
 
             # This is the page the build reads, and the only one carrying a recipe, so a
-            # bad one here is the one that would go unnoticed longest.
-            upscayled_width, upscayled_height = get_image_size(self.dest_upscayled_restored_file)
+            # bad one here is the one that would go unnoticed longest. Compared against
+            # the overlay's output, whose check read, or was handed, it already.
+            checks = self.image_checks
+            upscayled_width, upscayled_height = checks.get_size(self.dest_upscayled_restored_file)
             self._verify_output(
                 self.dest_restored_file,
                 expected_size=(upscayled_width // self.scale, upscayled_height // self.scale),
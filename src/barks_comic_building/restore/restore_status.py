@@ -25,12 +25,18 @@ from rich.table import Table
 
 from barks_comic_building.cli_setup import get_comic_titles, init_logging
 from barks_comic_building.restore.batch_restore_pipeline import SCALE
-from barks_comic_building.restore.page_state import PageState, get_page_status
+from barks_comic_building.restore.page_state import (
+    PageState,
+    PageStateCache,
+    get_default_page_state_cache_file,
+    get_page_status,
+)
 from barks_comic_building.restore.report_format import format_duration, shorten_volume_title
 from barks_comic_building.restore.restore_ledger import (
     Ledger,
+    LedgerIndex,
     get_default_ledger_file,
-    read_ledger,
+    read_ledger_index,
 )
 from barks_comic_building.restore.restore_recipe import get_current_recipe
 
@@ -67,7 +73,10 @@ class VolumeStatus(NamedTuple):
 
 
 def get_title_status(
-    comics_database: ComicsDatabase, title: str, current_recipe_id: str
+    comics_database: ComicsDatabase,
+    title: str,
+    current_recipe_id: str,
+    cache: PageStateCache | None = None,
 ) -> Counter[PageState]:
     """Return the state of every restorable page of a title.
 
@@ -75,6 +84,7 @@ def get_title_status(
         comics_database: The comics database.
         title: The title to look at.
         current_recipe_id: The id of the recipe the pipeline would use now.
+        cache: What has already been read from the restored pngs, or None to open them.
 
     Returns:
         How many pages are in each state.
@@ -104,6 +114,7 @@ def get_title_status(
             Path(svg_file),
             current_recipe_id,
             is_hand_restored=comic.is_hand_restored(Path(restored_file).stem),
+            cache=cache,
         )
         counts[status.state] += 1
 
@@ -111,7 +122,10 @@ def get_title_status(
 
 
 def get_status_by_volume(
-    comics_database: ComicsDatabase, titles: list[str], current_recipe_id: str
+    comics_database: ComicsDatabase,
+    titles: list[str],
+    current_recipe_id: str,
+    cache: PageStateCache | None = None,
 ) -> list[VolumeStatus]:
     """Return the state of every restorable page, gathered by volume.
 
@@ -119,6 +133,7 @@ def get_status_by_volume(
         comics_database: The comics database.
         titles: The titles to look at.
         current_recipe_id: The id of the recipe the pipeline would use now.
+        cache: What has already been read from the restored pngs, or None to open them.
 
     Returns:
         One entry per volume, in volume order.
@@ -133,7 +148,7 @@ def get_status_by_volume(
 
         volume = comics_database.get_fanta_volume_int(title)
         by_volume.setdefault(volume, Counter()).update(
-            get_title_status(comics_database, title, current_recipe_id)
+            get_title_status(comics_database, title, current_recipe_id, cache)
         )
 
     return [
@@ -146,7 +161,7 @@ def get_status_by_volume(
     ]
 
 
-def _get_seconds_per_page(ledger: Ledger, current_recipe_id: str) -> float:
+def _get_seconds_per_page(ledger: Ledger | LedgerIndex, current_recipe_id: str) -> float:
     """Return the measured cost of a page, preferring pages made with this recipe."""
     stats = ledger.timing_stats(current_recipe_id) or ledger.timing_stats()
 
@@ -227,7 +242,7 @@ def print_status_table(
         )
 
 
-def print_step_breakdown(ledger: Ledger, current_recipe_id: str) -> None:
+def print_step_breakdown(ledger: Ledger | LedgerIndex, current_recipe_id: str) -> None:
     """Print where the time goes, per pipeline step.
 
     Args:
@@ -262,7 +277,7 @@ def print_step_breakdown(ledger: Ledger, current_recipe_id: str) -> None:
     )
 
 
-def print_failures(ledger: Ledger) -> None:
+def print_failures(ledger: Ledger | LedgerIndex) -> None:
     """Print the pages whose most recent attempt failed, and where they failed.
 
     Args:
@@ -351,7 +366,7 @@ def main(  # noqa: PLR0913
 ) -> None:
     init_logging(APP_LOGGING_NAME, "restore-status.log", log_level_str)
 
-    ledger = read_ledger(ledger_file or get_default_ledger_file())
+    ledger = read_ledger_index(ledger_file or get_default_ledger_file())
 
     if failed:
         print_failures(ledger)
@@ -366,7 +381,8 @@ def main(  # noqa: PLR0913
 
     comics_database, titles = get_comic_titles(volumes_str, title_str)
 
-    statuses = get_status_by_volume(comics_database, titles, recipe.recipe_id)
+    with PageStateCache(get_default_page_state_cache_file()) as cache:
+        statuses = get_status_by_volume(comics_database, titles, recipe.recipe_id, cache)
     seconds_per_page = _get_seconds_per_page(ledger, recipe.recipe_id)
 
     if as_json:
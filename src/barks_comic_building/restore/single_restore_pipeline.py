@@ -3,13 +3,19 @@
 import sys
 import time
 from pathlib import Path
+from typing import Annotated
 
 import typer
 from comic_utils.common_typer_options import LogLevelArg
 from loguru import logger
 
 from barks_comic_building.cli_setup import init_logging
-from barks_comic_building.restore.restore_pipeline import RestorePipeline, check_for_errors
+from barks_comic_building.restore.remove_alias_artifacts import DEFAULT_MEDIAN_ENGINE, MedianEngine
+from barks_comic_building.restore.restore_pipeline import (
+    CONCURRENT_STEPS,
+    RestorePipeline,
+    check_for_errors,
+)
 
 APP_LOGGING_NAME = "srst"
 
@@ -26,6 +32,14 @@ def main(  # noqa: PLR0913
     dest_upscayled_restored_file: Path,
     dest_svg_restored_file: Path,
     log_level_str: LogLevelArg = "DEBUG",
+    median_engine: MedianEngine = DEFAULT_MEDIAN_ENGINE,
+    concurrent_steps: Annotated[
+        int,
+        typer.Option(
+            help="How many of the page's steps to run at once. 1 runs them in turn,"
+            " as the batch phases do; 2 runs the inpaint beside the smooth and the trace."
+        ),
+    ] = CONCURRENT_STEPS,
 ) -> None:
     init_logging(APP_LOGGING_NAME, "single-restore-pipeline.log", log_level_str)
 
@@ -50,11 +64,9 @@ def main(  # noqa: PLR0913
         dest_restored_file,
         dest_upscayled_restored_file,
         dest_svg_restored_file,
+        median_engine=median_engine,
     )
-    restore_process.do_part1()
-    restore_process.do_part2_memory_hungry()
-    restore_process.do_part3()
-    restore_process.do_part4_memory_hungry()
+    restore_process.do_all_steps(concurrent_steps)
 
     logger.info(f'\nTime taken to restore all files": {int(time.time() - start_restore)}s.')
 
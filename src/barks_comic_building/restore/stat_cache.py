@@ -0,0 +1,175 @@
+"""What was worked out from a file, kept against the stat it was worked out under.
+
+Several sweeps spend their time on files that have not changed since the last sweep
+looked at them: reading each restored png's provenance, decoding every pixel of every
+image, hashing every file of a build. Each keeps what it found in a json cache against
+the file's inode, size and nanosecond mtime, and works a file out again only once one of
+those has changed. `StatCache` is that cache; a subclass says what it keeps, and how it
+is named in the log.
+
+Only ever a cache: an entry is trusted only while the file's signature is what it was, a
+cache that cannot be read is started afresh, and deleting it costs nothing but one full
+sweep. Entries for files that are no longer there are dropped when it is saved, so a
+cache holds the trees as they are rather than everything they have ever held - but only
+in the directories the run swept. A cache is library-wide and a run is often one volume,
+and asking the disk after every entry in the library, to save a sweep of one volume,
+cost more than the sweep saved.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from typing import Self
+
+__all__ = [
+    "StatCache",
+    "get_file_signature",
+]
+
+
+def get_file_signature(stat: os.stat_result) -> list[int]:
+    """Return what a cache entry is kept against: its file's inode, size and mtime."""
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+class StatCache:
+    """Each file's entry, kept against the signature of the file it was worked out from.
+
+    Used as a context manager: loaded on entry and, if anything was added, saved on the
+    way out - an interrupted sweep included, so the work it did get through is not lost.
+    """
+
+    VERSION: ClassVar[int] = 1
+    """Bumped when what an entry holds changes, so that an old cache is started afresh."""
+
+    NAME: ClassVar[str] = "stat cache"
+    """What the cache is called in the log."""
+
+    def __init__(self, cache_file: Path | None = None) -> None:
+        """Note where the cache is kept. Nothing is read until the context is entered.
+
+        Args:
+            cache_file: The cache. None keeps it in memory only, for the one run.
+
+        """
+        self.cache_file = cache_file
+        self.num_cached = 0
+        self.num_recorded = 0
+        self._entries: dict[str, list[Any]] = {}
+        self._is_changed = False
+        # The files this run asked after, and the trees it said it swept whole.
+        self._seen: set[str] = set()
+        self._swept_trees: set[str] = set()
+
+    def __enter__(self) -> Self:
+        """Load the cache, if there is one."""
+        if self.cache_file is None or not self.cache_file.is_file():
+            return self
+
+        try:
+            saved = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            if saved["version"] == self.VERSION:
+                self._entries = dict(saved["entries"])
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning(f'Ignoring unreadable {self.NAME} "{self.cache_file}": {exc}.')
+
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        """Save the cache if anything was added to it, less the files no longer there."""
+        logger.debug(
+            f"{self.NAME.capitalize()}: {self.num_cached} file(s) answered from it,"
+            f" {self.num_recorded} worked out afresh.",
+        )
+        if self.cache_file is None or not self._is_changed:
+            return
+
+        saved = {"version": self.VERSION, "entries": self._get_entries_still_there()}
+        temp_file = self.cache_file.with_name(self.cache_file.name + ".tmp")
+        try:
+            temp_file.write_text(json.dumps(saved, separators=(",", ":")), encoding="utf-8")
+            temp_file.replace(self.cache_file)
+        except OSError as exc:
+            logger.warning(f'Could not save {self.NAME} "{self.cache_file}": {exc}.')
+
+    def mark_swept(self, trees: Iterable[Path]) -> None:
+        """Note that this run swept whole trees, so their entries are pruned on saving.
+
+        The directory of every file asked after is swept anyway; this is for a tree
+        whose subdirectories may have gone altogether.
+
+        Args:
+            trees: The trees' roots.
+
+        """
+        self._swept_trees.update(str(tree) for tree in trees)
+
+    def _get_entries_still_there(self) -> dict[str, list[Any]]:
+        """Return the entries, less those of files in a swept directory that are gone.
+
+        An entry this run asked after was of a file that was there, so only the others
+        in the same directories - or the swept trees - are asked of the disk. The rest
+        of the library's are kept as they are.
+        """
+        swept_dirs = {os.path.dirname(name) for name in self._seen}  # noqa: PTH120
+        swept_prefixes = tuple(tree + os.sep for tree in self._swept_trees)
+
+        def is_still_there(name: str) -> bool:
+            if name in self._seen:
+                return True
+            dir_name = os.path.dirname(name)  # noqa: PTH120
+            is_swept = dir_name in swept_dirs or name.startswith(swept_prefixes)
+            return not is_swept or Path(name).exists()
+
+        return {name: entry for name, entry in self._entries.items() if is_still_there(name)}
+
+    def get_entry(self, file: Path, signature: list[int]) -> Any:  # noqa: ANN401
+        """Return what was kept for a file, if it was worked out from the file as it is now.
+
+        Args:
+            file: The file.
+            signature: Its signature now, from `get_file_signature`.
+
+        Returns:
+            What was kept, which may itself be None.
+
+        Raises:
+            KeyError: If the file has to be worked out again.
+
+        """
+        self._seen.add(str(file))
+        entry = self._entries.get(str(file))
+        if entry is None or entry[0] != signature:
+            raise KeyError(str(file))
+
+        self.num_cached += 1
+        return entry[1]
+
+    def record_entry(self, file: Path, signature: list[int], value: Any) -> None:  # noqa: ANN401
+        """Keep what was worked out from a file against the signature it was worked out under.
+
+        Args:
+            file: The file.
+            signature: Its signature as it was before it was read, so that a file
+                written while it was being read is worked out again next time.
+            value: What to keep, which json must be able to write.
+
+        """
+        self._entries[str(file)] = [signature, value]
+        self._seen.add(str(file))
+        self._is_changed = True
+        self.num_recorded += 1
+
+    def forget(self, file: Path) -> None:
+        """Drop whatever was kept for a file, as for one that is no longer there."""
+        self._seen.add(str(file))
+        if self._entries.pop(str(file), None) is not None:
+            self._is_changed = True
@@ -0,0 +1,162 @@
+"""The restore steps as a graph of the files they read and write, and a runner for it.
+
+The steps used to be a fixed sequence, and so the inpaint waited behind the smooth and the
+trace although it reads nothing either of them writes - only the colour removed page and
+the upscale. Declared by their files instead, the order falls out of what each step
+needs, and the branches that share nothing can run side by side: the inpaint and the
+palette snap alongside the smooth and the trace, meeting again at the overlay.
+
+A step is a node naming pipeline attributes rather than paths, so the one declaration
+serves every page. The same declaration says which files a step leaves behind, which is
+what the error check and the work file cleanup are driven from, so a step added here is
+checked for and cleaned up after without either list having to be remembered.
+
+The steps themselves run gmic and vtracer for most of their time, outside the GIL, so
+threads are enough to run two at once.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+from graphlib import CycleError, TopologicalSorter
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Sequence
+
+__all__ = [
+    "StepNode",
+    "get_step_dependencies",
+    "get_step_order",
+    "run_step_graph",
+]
+
+
+class StepNode(NamedTuple):
+    """One step, and the files it reads and writes, named by pipeline attribute."""
+
+    name: str
+    """The canonical step name, one of the ``STEP_`` constants in `restore_pipeline`."""
+    method_name: str
+    """The pipeline method that runs it."""
+    inputs: tuple[str, ...]
+    """The files it reads. Those no step writes are the page's sources."""
+    outputs: tuple[str, ...]
+    """The files it writes that are kept once the page is done."""
+    work_outputs: tuple[str, ...] = ()
+    """The intermediates it writes into the work directory, which cleanup deletes."""
+
+    @property
+    def all_outputs(self) -> tuple[str, ...]:
+        """Return every file it writes, kept or not."""
+        return self.outputs + self.work_outputs
+
+
+def get_step_dependencies(nodes: Iterable[StepNode]) -> dict[str, set[str]]:
+    """Return, for each step, the steps that write a file it reads.
+
+    A file that none of the given steps writes is taken to be there already - either a
+    source, or the output of a step run earlier, as when a phase runs only some of them.
+
+    Raises:
+        ValueError: If two steps write the same file, or the steps need each other.
+
+    """
+    nodes = list(nodes)
+
+    writers: dict[str, str] = {}
+    for node in nodes:
+        for output in node.all_outputs:
+            if output in writers:
+                msg = f'"{output}" is written by both {writers[output]} and {node.name}.'
+                raise ValueError(msg)
+            writers[output] = node.name
+
+    dependencies = {
+        node.name: {writers[i] for i in node.inputs if i in writers and writers[i] != node.name}
+        for node in nodes
+    }
+
+    try:
+        tuple(TopologicalSorter(dependencies).static_order())
+    except CycleError as e:
+        msg = f"The steps depend on each other: {' -> '.join(e.args[1])}."
+        raise ValueError(msg) from e
+
+    return dependencies
+
+
+def get_step_order(nodes: Sequence[StepNode]) -> list[StepNode]:
+    """Return the steps in an order that runs each after everything it reads from.
+
+    Stable: where the graph leaves a choice, steps keep the order they were given in, so
+    running one at a time does what the old fixed sequence did.
+    """
+    dependencies = get_step_dependencies(nodes)
+
+    ordered: list[StepNode] = []
+    done: set[str] = set()
+    pending = list(nodes)
+    while pending:
+        node = next(n for n in pending if dependencies[n.name] <= done)
+        pending.remove(node)
+        ordered.append(node)
+        done.add(node.name)
+
+    return ordered
+
+
+def run_step_graph(
+    nodes: Sequence[StepNode],
+    run_step: Callable[[StepNode], None],
+    should_go_on: Callable[[], bool],
+    max_concurrent: int = 1,
+) -> None:
+    """Run steps as soon as what they read has been written, up to some at once.
+
+    After each step finishes, `should_go_on` decides whether any more are started. Saying
+    no does not cut short a step already running on the other branch - a step is never
+    interrupted, for the same reason a stop waits for one - so its outputs are whole
+    files whatever happens.
+
+    Args:
+        nodes: The steps to run.
+        run_step: Runs one of them.
+        should_go_on: Asked after each step, whether to start any more.
+        max_concurrent: The most steps to run at once. At 1 they run in turn, in this
+            thread, in the order `get_step_order` gives.
+
+    """
+    if max_concurrent <= 1:
+        for node in get_step_order(nodes):
+            run_step(node)
+            if not should_go_on():
+                return
+        return
+
+    dependencies = get_step_dependencies(nodes)
+    pending = list(nodes)
+    done: set[str] = set()
+    running: dict[concurrent.futures.Future[None], StepNode] = {}
+    going_on = True
+
+    with concurrent.futures.ThreadPoolExecutor(max_concurrent) as executor:
+        while True:
+            if going_on:
+                for node in [n for n in pending if dependencies[n.name] <= done]:
+                    if len(running) >= max_concurrent:
+                        break
+                    pending.remove(node)
+                    running[executor.submit(run_step, node)] = node
+
+            if not running:
+                return
+
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                node = running.pop(future)
+                future.result()
+                done.add(node.name)
+                going_on = going_on and should_go_on()
@@ -8,7 +8,6 @@ from typing import Annotated
 import typer
 from barks_fantagraphics.comics_utils import get_clean_path
 from barks_fantagraphics.fanta_comics_info import FANTAGRAPHICS_UPSCAYLED_FIXES_DIRNAME
-from comic_utils.pil_image_utils import add_png_metadata
 from loguru import logger
 from PIL import Image
 
@@ -16,6 +15,7 @@ from barks_comic_building.restore.image_checks import (
     MAX_THUMBNAIL_DEVIATION,
     get_thumbnail_deviation,
 )
+from barks_comic_building.restore.image_io import splice_png_metadata
 
 Image.MAX_IMAGE_PIXELS = None
 
@@ -346,4 +346,4 @@ def upscale_image_file(
         out_file.unlink(missing_ok=True)
         raise
 
-    add_png_metadata(out_file, _get_metadata(upscaler, in_file, scale))
+    splice_png_metadata(out_file, _get_metadata(upscaler, in_file, scale))
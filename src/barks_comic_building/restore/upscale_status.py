@@ -34,8 +34,9 @@ from barks_comic_building.restore.report_format import format_duration, shorten_
 from barks_comic_building.restore.upscale_image import DEFAULT_UPSCALER, Upscaler, UpscalerArg
 from barks_comic_building.restore.upscale_ledger import (
     UpscaleLedger,
+    UpscaleLedgerIndex,
     get_default_upscale_ledger_file,
-    read_upscale_ledger,
+    read_upscale_ledger_index,
 )
 from barks_comic_building.restore.upscale_recipe import get_current_recipe
 from barks_comic_building.restore.upscale_state import UpscalePageState, get_upscale_page_status
@@ -143,7 +144,9 @@ def get_status_by_volume(
     ]
 
 
-def _get_seconds_per_page(ledger: UpscaleLedger, current_recipe_id: str) -> float:
+def _get_seconds_per_page(
+    ledger: UpscaleLedger | UpscaleLedgerIndex, current_recipe_id: str
+) -> float:
     """Return the measured cost of a page, preferring pages made with this recipe."""
     stats = ledger.timing_stats(current_recipe_id) or ledger.timing_stats()
 
@@ -229,7 +232,7 @@ def print_status_table(
         )
 
 
-def print_failures(ledger: UpscaleLedger) -> None:
+def print_failures(ledger: UpscaleLedger | UpscaleLedgerIndex) -> None:
     """Print the pages whose most recent attempt failed, and why.
 
     The reason is worth the width: a page Upscayl blacked out and a page it never got to
@@ -320,7 +323,7 @@ def main(  # noqa: PLR0913
 ) -> None:
     init_logging(APP_LOGGING_NAME, "upscale-status.log", log_level_str)
 
-    ledger = read_upscale_ledger(ledger_file or get_default_upscale_ledger_file())
+    ledger = read_upscale_ledger_index(ledger_file or get_default_upscale_ledger_file())
 
     if failed:
         print_failures(ledger)
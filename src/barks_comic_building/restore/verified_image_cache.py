@@ -0,0 +1,114 @@
+"""Remembering which image files have already been verified, and what was found.
+
+`barks-verify-volume-images` decodes every pixel of every image in a volume's trees,
+which over the whole library is hours, and nearly all of it is files that have not
+changed since the last sweep decoded them. `VerifiedImageCache` keeps each file's
+verdict - sound, or the fault found in it - against the inode, size and nanosecond mtime
+it had when it was decoded, so a later sweep decodes only what was written or replaced
+since and reports the rest from the cache.
+
+A fault is remembered as well as a pass, so a broken file goes on being reported every
+sweep until it is replaced, rather than being reported once and then decoded again and
+again to find the same thing.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import NamedTuple
+
+from barks_comic_building.restore.stat_cache import StatCache, get_file_signature
+
+__all__ = [
+    "VERIFIED_IMAGE_CACHE_FILENAME",
+    "VerifiedImageCache",
+    "Verdict",
+    "get_default_verified_image_cache_file",
+    "get_file_signature",
+]
+
+VERIFIED_IMAGE_CACHE_FILENAME = "verified-images-cache.json"
+
+# Bumped when the checks a file is put through change, so that everything they passed
+# before is looked at again.
+_VERIFIED_IMAGE_CACHE_VERSION = 2
+
+
+def get_default_verified_image_cache_file() -> Path:
+    """Return where the verified image cache lives unless told otherwise.
+
+    Beside the page state cache, out of the trees being verified.
+
+    Returns:
+        The default cache path.
+
+    """
+    from barks_fantagraphics.comics_consts import BARKS_ROOT_DIR  # noqa: PLC0415
+
+    return Path(BARKS_ROOT_DIR) / VERIFIED_IMAGE_CACHE_FILENAME
+
+
+class Verdict(NamedTuple):
+    """What verifying a file found."""
+
+    fault: str | None
+    """The fault, or None if the file is sound."""
+
+
+class VerifiedImageCache(StatCache):
+    """Each verified file's verdict, kept against the signature it was verified under.
+
+    A `StatCache`, so saved on the way out of an interrupted sweep too, and the hours it
+    did get through are not lost.
+    """
+
+    VERSION = _VERIFIED_IMAGE_CACHE_VERSION
+    NAME = "verified image cache"
+
+    def __init__(self, cache_file: Path | None = None, *, recheck: bool = False) -> None:
+        """Note where the cache is kept. Nothing is read until the context is entered.
+
+        Args:
+            cache_file: The cache. None keeps it in memory only, for the one run.
+            recheck: Trust none of the cached verdicts, so every file is verified again.
+                What is found is still saved, for the next sweep.
+
+        """
+        super().__init__(cache_file)
+        self.recheck = recheck
+
+    @property
+    def num_verified(self) -> int:
+        """How many files were verified, rather than answered from the cache."""
+        return self.num_recorded
+
+    def get_verdict(self, image_file: Path, signature: list[int]) -> Verdict | None:
+        """Return a file's verdict, if it was verified as it is now.
+
+        Args:
+            image_file: The file.
+            signature: Its signature now, from `get_file_signature`.
+
+        Returns:
+            The verdict, or None if the file has to be verified.
+
+        """
+        if self.recheck:
+            return None
+
+        try:
+            return Verdict(self.get_entry(image_file, signature))
+        except KeyError:
+            return None
+
+    def record(self, image_file: Path, signature: list[int], verdict: Verdict) -> None:
+        """Keep a file's verdict against the signature it was verified under.
+
+        Args:
+            image_file: The file.
+            signature: Its signature as it was before it was verified, so that a file
+                written while it was being read is verified again next time.
+            verdict: What verifying it found.
+
+        """
+        self.record_entry(image_file, signature, verdict.fault)
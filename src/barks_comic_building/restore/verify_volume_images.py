@@ -1,5 +1,11 @@
+from __future__ import annotations
+
+import concurrent.futures
+import os
 import time
-from pathlib import Path
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Annotated, NamedTuple
 
 import typer
 from barks_fantagraphics.comics_database import ComicsDatabase
@@ -9,25 +15,47 @@ from loguru import logger
 from PIL import Image
 
 from barks_comic_building.cli_setup import init_logging
-from barks_comic_building.restore.image_checks import find_structural_fault
+from barks_comic_building.restore.image_checks import find_structural_fault, predict_check_mb
+from barks_comic_building.restore.memory_budget import (
+    DEFAULT_BUDGET_SHARE,
+    MemoryBudget,
+    get_default_budget_mb,
+)
+from barks_comic_building.restore.verified_image_cache import (
+    Verdict,
+    VerifiedImageCache,
+    get_default_verified_image_cache_file,
+    get_file_signature,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Self
 
 APP_LOGGING_NAME = "vimg"
 Image.MAX_IMAGE_PIXELS = None  # disables the DOS warning
 
+_BYTES_PER_MB = 1024 * 1024
+
 
 def verify_image_files(
-    comics_database: ComicsDatabase, volumes: list[int], do_restored: bool
+    comics_database: ComicsDatabase,
+    volumes: list[int],
+    do_restored: bool,
+    cache: VerifiedImageCache,
+    budget_mb: float,
 ) -> None:
     start = time.time()
 
     num_images_checked = 0
     num_errors = 0
-    for volume in volumes:
-        logger.info(f'Verifying all images files in all dirs for Fanta volume "{volume}"...')
+    with VolumeImageVerifier(cache, budget_mb) as verifier:
+        for volume in volumes:
+            logger.info(f'Verifying all images files in all dirs for Fanta volume "{volume}"...')
 
-        n, e = verify_volume_dirs(comics_database, volume, do_restored)
-        num_images_checked += n
-        num_errors += e
+            n, e = verify_volume_dirs(comics_database, volume, do_restored, verifier)
+            num_images_checked += n
+            num_errors += e
 
     if num_errors == 0:
         logger.info("\nThere were no errors.")
@@ -35,19 +63,20 @@ def verify_image_files(
         logger.error(f"\nThere were {num_errors} errors.")
 
     logger.info(
-        f"\nTime taken to verify all {num_images_checked} files: {int(time.time() - start)}s."
+        f"\nTime taken to verify all {num_images_checked} files: {int(time.time() - start)}s"
+        f" ({cache.num_cached} unchanged since they were last verified)."
     )
 
 
 def verify_volume_dirs(
-    comic_database: ComicsDatabase, volume: int, do_restored: bool
+    comic_database: ComicsDatabase, volume: int, do_restored: bool, verifier: VolumeImageVerifier
 ) -> tuple[int, int]:
     num_images_checked = 0
     num_errors = 0
 
     def _accumulate(d: Path) -> None:
         nonlocal num_images_checked, num_errors
-        n, e = verify_volume_dir(d)
+        n, e = verifier.verify_volume_dir(d)
         num_images_checked += n
         num_errors += e
 
@@ -64,41 +93,183 @@ def verify_volume_dirs(
     return num_images_checked, num_errors
 
 
-def verify_volume_dir(volume_dir: Path) -> tuple[int, int]:
-    logger.info(f'Verifying volume dir: "{volume_dir}".')
+class _Throughput(NamedTuple):
+    num_files: int
+    num_bytes: int
+    seconds: float
 
-    num_image_files = 0
-    num_errors = 0
+    def describe(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.num_files} verified in {self.seconds:.1f}s"
+            f" ({self.num_files / seconds:.1f} files/s,"
+            f" {self.num_bytes / _BYTES_PER_MB / seconds:.1f} MB/s)"
+        )
 
-    for image_file in volume_dir.iterdir():
-        if image_file.is_dir():
-            logger.debug(f'Skipping directory: "{image_file}".')
-            continue
-        if image_file.suffix == ".txt":
-            logger.debug(f'Skipping txt file: "{image_file}".')
-            continue
-        if image_file.suffix == ".svg":
-            logger.debug(f'Skipping svg file: "{image_file}".')
-            continue
 
-        fault = find_file_fault(image_file)
-        if fault is not None:
-            logger.error(f'File "{image_file}": {fault}.')
-            num_errors += 1
+class _VerifiedFiles(NamedTuple):
+    rate: _Throughput
+    num_errors: int
 
-        num_image_files += 1
 
-    return num_image_files, num_errors
+class VolumeImageVerifier:
+    """Verifies the files of one directory after another across a pool of processes.
+
+    Reading the image data is what a sweep spends its time on and it is all cpu, so the
+    files are spread over a worker a core. The pages read as a stream take next to no
+    memory, but a file that is decoded whole - a scan, say - takes two copies of itself,
+    and a worker a core on those at once need not fit. So each file is admitted only while
+    the predicted memory of those being checked fits a `MemoryBudget`.
+
+    Used as a context manager, so the one pool serves every directory of the sweep.
+    """
+
+    def __init__(
+        self, cache: VerifiedImageCache, budget_mb: float, num_workers: int | None = None
+    ) -> None:
+        """Get ready to verify. The workers start as the first files need them.
+
+        Args:
+            cache: Where verdicts are looked up before a file is decoded, and kept after.
+            budget_mb: What the files being decoded may take between them.
+            num_workers: How many worker processes. None for one a core.
+
+        """
+        self.cache = cache
+        self.budget = MemoryBudget(budget_mb)
+        self.num_workers = num_workers or os.process_cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.num_workers)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def verify_volume_dir(self, volume_dir: Path) -> tuple[int, int]:
+        """Verify every image in a directory, logging each fault and the throughput.
+
+        Args:
+            volume_dir: The directory.
+
+        Returns:
+            How many image files it has, and how many of them are faulty.
+
+        """
+        logger.info(f'Verifying volume dir: "{volume_dir}".')
+
+        num_image_files = 0
+        num_errors = 0
+        to_verify: list[tuple[Path, list[int]]] = []
+
+        for image_file in volume_dir.iterdir():
+            if image_file.is_dir():
+                logger.debug(f'Skipping directory: "{image_file}".')
+                continue
+            if image_file.suffix == ".txt":
+                logger.debug(f'Skipping txt file: "{image_file}".')
+                continue
+            if image_file.suffix == ".svg":
+                logger.debug(f'Skipping svg file: "{image_file}".')
+                continue
+
+            num_image_files += 1
+            signature = get_file_signature(image_file.stat())
+            verdict = self.cache.get_verdict(image_file, signature)
+            if verdict is None:
+                to_verify.append((image_file, signature))
+            elif verdict.fault is not None:
+                logger.error(f'File "{image_file}": {verdict.fault} (unchanged since found).')
+                num_errors += 1
+
+        verified = self._verify_files(to_verify)
+        num_errors += verified.num_errors
+
+        logger.info(
+            f'Volume dir "{volume_dir}": {num_image_files} image file(s),'
+            f" {verified.rate.describe()},"
+            f" {num_image_files - len(to_verify)} unchanged since they were last verified."
+        )
+
+        return num_image_files, num_errors
+
+    def _verify_files(self, to_verify: list[tuple[Path, list[int]]]) -> _VerifiedFiles:
+        start = time.perf_counter()
+        num_errors = 0
+        num_bytes = 0
+
+        waiting = deque(to_verify)
+        futures: dict[concurrent.futures.Future[str | None], tuple[Path, list[int], float]] = {}
+        pools: dict[concurrent.futures.Future[str | None], concurrent.futures.Executor] = {}
+
+        def start_what_fits() -> None:
+            # In order, and only the next one: the files of one directory are all much the
+            # same size, so there is nothing to be had from looking past one that waits.
+            while waiting and len(futures) < self.num_workers:
+                image_file, signature = waiting[0]
+                predicted = predict_check_mb(image_file)
+                if not self.budget.try_admit(predicted):
+                    return
+                waiting.popleft()
+                future = self._submit(image_file)
+                futures[future] = (image_file, signature, predicted)
+                pools[future] = self._executor
+
+        start_what_fits()
+        while futures:
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                image_file, signature, predicted = futures.pop(future)
+                pool = pools.pop(future)
+                self.budget.release(predicted)
+                num_bytes += signature[1]
+
+                try:
+                    fault = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    # A worker that crashed fails its file, not the sweep. Nothing is
+                    # kept for the file, so the next sweep verifies it again.
+                    logger.error(f'File "{image_file}": could not be verified: {exc!r}.')
+                    num_errors += 1
+                    if isinstance(exc, BrokenProcessPool) and pool is self._executor:
+                        self._restart_pool()
+                    continue
+
+                self.cache.record(image_file, signature, Verdict(fault))
+                if fault is not None:
+                    logger.error(f'File "{image_file}": {fault}.')
+                    num_errors += 1
+            start_what_fits()
+
+        rate = _Throughput(len(to_verify), num_bytes, time.perf_counter() - start)
+        return _VerifiedFiles(rate, num_errors)
+
+    def _submit(self, image_file: Path) -> concurrent.futures.Future[str | None]:
+        try:
+            return self._executor.submit(find_file_fault, image_file)
+        except BrokenProcessPool:
+            # Broken since the last of its files came back: the files it still had fail
+            # as they come back, and this one goes to a pool that works.
+            self._restart_pool()
+            return self._executor.submit(find_file_fault, image_file)
+
+    def _restart_pool(self) -> None:
+        """Replace a pool a worker took down with it, so the sweep carries on."""
+        logger.warning("A verifying worker died: starting the pool again.")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.num_workers)
 
 
 def find_file_fault(image_file: Path) -> str | None:
     """Return what is wrong with an image file on disk, or None if it is sound.
 
-    Every pixel is decoded rather than just the header, because the damage worth finding
-    here hides behind a well-formed one - a correct signature, a proper trailing IEND, and
-    a pixel stream zlib will not touch. Reading a whole volume is minutes rather than
-    seconds because of it, which is why this is a command you run and not a step in a
-    build.
+    All of the image data is read rather than just the header, because the damage worth
+    finding here hides behind a well-formed one - a correct signature, a proper trailing
+    IEND, and a pixel stream zlib will not touch. Reading a whole volume is minutes rather
+    than seconds because of it, which is why this is a command you run and not a step in
+    a build.
 
     The source comparison is deliberately not run - pairing every tree with what it was
     made from is a different job, and it is the writing stages that have the source to
@@ -128,14 +299,28 @@ app = typer.Typer()
 def main(
     volumes_str: VolumesArg = "",
     do_restored: bool = False,
+    recheck: Annotated[
+        bool,
+        typer.Option(help="Verify every file again, not just those changed since the last run."),
+    ] = False,
+    memory_budget_gb: Annotated[
+        float | None,
+        typer.Option(
+            "--memory-budget-gb",
+            help="Memory the files being decoded may take between them."
+            f" Defaults to {DEFAULT_BUDGET_SHARE:.0%} of what is free at the start.",
+        ),
+    ] = None,
     log_level_str: LogLevelArg = "DEBUG",
 ) -> None:
     init_logging(APP_LOGGING_NAME, "verify-volume-image-files.log", log_level_str)
 
     volumes = list(intspan(volumes_str))
     comics_database = ComicsDatabase()
+    budget_mb = memory_budget_gb * 1024 if memory_budget_gb else get_default_budget_mb()
 
-    verify_image_files(comics_database, volumes, do_restored)
+    with VerifiedImageCache(get_default_verified_image_cache_file(), recheck=recheck) as cache:
+        verify_image_files(comics_database, volumes, do_restored, cache, budget_mb)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""A pool of worker processes that lasts a whole restore run, warmed once as it starts.
+
+The batch driver used to build a fresh process pool for every phase of every batch. Every
+one of those workers then paid again for what a new process costs before it can do any
+work: importing cv2, numba and the pipeline's own modules, and compiling the median
+filter's kernels the first time a page reached part 1. Over a run of a few hundred batches that is
+thousands of process starts, and the compile lands inside the first page's timed step,
+where the ledger charges it to the filter.
+
+So the run keeps one pool, a worker per core, for its whole length. Each worker is warmed
+by the pool's initializer before it takes any work, and how long that took comes back
+with the first result it sends, so the run summary can say what starting the workers
+actually cost. How many pages each phase runs at once is no longer the pool's size - the
+scheduler counts those itself - so the same workers serve every phase.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import importlib
+import time
+from statistics import mean
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+from barks_comic_building.restore.remove_alias_artifacts import (
+    DEFAULT_MEDIAN_ENGINE,
+    MedianEngine,
+    warm_up_median_filter,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Self
+
+__all__ = [
+    "WorkerPool",
+    "take_worker_warmup_seconds",
+]
+
+# Imported by the initializer so that every worker has them before its first page. Named
+# rather than imported here since under fork they are already in the parent, and it is
+# only under spawn and forkserver that a worker has to find them for itself.
+_WARM_MODULES = (
+    "cv2",
+    "numba",
+    "barks_comic_building.restore.restore_pipeline",
+)
+
+# How long this worker took to warm up, until the first result it sends has carried it
+# back to the parent. None in the parent, and in a worker once it has been reported.
+_worker_warmup_seconds: float | None = None
+
+
+def _warm_up_worker(median_engine: MedianEngine) -> None:
+    """Get a new worker ready for pages: the slow imports, and the median filter compiled."""
+    global _worker_warmup_seconds  # noqa: PLW0603
+
+    start = time.time()
+    for module in _WARM_MODULES:
+        importlib.import_module(module)
+    warm_up_median_filter(median_engine)
+
+    _worker_warmup_seconds = time.time() - start
+
+
+def take_worker_warmup_seconds() -> float | None:
+    """Return how long this worker took to warm up, the first time it is asked only.
+
+    Called at the start of every task, so that each worker's warm-up is reported exactly
+    once, by whichever task it happens to run first.
+
+    Returns:
+        The seconds its initializer took, or None if that has already been reported or
+        this is not a pool worker.
+
+    """
+    global _worker_warmup_seconds  # noqa: PLW0603
+
+    seconds = _worker_warmup_seconds
+    _worker_warmup_seconds = None
+    return seconds
+
+
+class WorkerPool:
+    """A process pool that outlives the phases and batches it serves.
+
+    Used as a context manager around a whole run. A worker killed under it - most likely
+    for its memory - breaks a process pool for good, so the pool is replaced then rather
+    than the rest of the run failing with it.
+    """
+
+    def __init__(
+        self, num_workers: int, median_engine: MedianEngine = DEFAULT_MEDIAN_ENGINE
+    ) -> None:
+        """Get ready to start the workers. They start as the first tasks need them.
+
+        Args:
+            num_workers: How many worker processes. The most pages that can run at once,
+                across every phase together.
+            median_engine: The median filter engine to compile in each worker.
+
+        """
+        self.num_workers = num_workers
+        self.median_engine = median_engine
+        self.warmup_seconds: list[float] = []
+        self.num_replaced = 0
+        self._executor = self._make_executor()
+
+    def _make_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(
+            self.num_workers, initializer=_warm_up_worker, initargs=(self.median_engine,)
+        )
+
+    def submit(
+        self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any
+    ) -> concurrent.futures.Future[Any]:
+        """Start a task on the next free worker, replacing the pool first if it broke.
+
+        The tasks a broken pool was running fail through their own futures, and are the
+        caller's to account for. Only the tasks submitted afterwards go to the new one.
+
+        Returns:
+            The task's future.
+
+        """
+        try:
+            return self._executor.submit(fn, *args, **kwargs)
+        except concurrent.futures.BrokenExecutor:
+            logger.error("The worker pool broke - starting a new one.")
+            self._executor.shutdown(wait=False)
+            self._executor = self._make_executor()
+            self.num_replaced += 1
+            return self._executor.submit(fn, *args, **kwargs)
+
+    def record_warmup(self, seconds: float | None) -> None:
+        """Note a worker's warm-up, as carried back by the first result it sent."""
+        if seconds is not None:
+            self.warmup_seconds.append(seconds)
+
+    def describe_warmup(self) -> str:
+        """Return what starting the workers cost the run, for its summary."""
+        if not self.warmup_seconds:
+            return "No workers reported warming up."
+
+        total = sum(self.warmup_seconds)
+        summary = (
+            f"Warmed {len(self.warmup_seconds)} worker(s) once for the whole run:"
+            f" {mean(self.warmup_seconds):.1f}s each on average, {total:.0f}s in all."
+        )
+        if self.num_replaced:
+            summary += f" The pool broke and was replaced {self.num_replaced} time(s)."
+
+        return summary
+
+    def shutdown(self) -> None:
+        """Wait for the running tasks, then let the workers go."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> Self:
+        """Return the pool, ready for tasks."""
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        """Shut the workers down."""
+        self.shutdown()
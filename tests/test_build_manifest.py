@@ -0,0 +1,94 @@
+"""Tests for the manifest an incremental build decides what to redraw from.
+
+The one failure that matters is a page left as it is when it should have been drawn
+again: nothing downstream would notice, and the cbz would quietly carry the old page.
+So most of what is pinned here is that every doubt - a missing or unreadable manifest, a
+manifest from another version, a jpg touched since it was built - comes out as "draw it".
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from barks_comic_building.build.build_manifest import (
+    BUILD_MANIFEST_VERSION,
+    BuildManifest,
+    ManifestPage,
+    get_build_manifest_file,
+    get_file_identity,
+    load_build_manifest,
+    save_build_manifest,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.fixture
+def dest_page(tmp_path: Path) -> Path:
+    path = tmp_path / "images" / "01.jpg"
+    path.parent.mkdir()
+    path.write_bytes(b"a drawn page")
+
+    return path
+
+
+def _manifest_for(dest_page: Path, inputs_hash: str = "inputs") -> BuildManifest:
+    identity = get_file_identity(dest_page)
+    assert identity is not None
+
+    return BuildManifest("title", {dest_page.name: ManifestPage(inputs_hash, identity)})
+
+
+class TestIsPageCurrent:
+    def test_the_same_inputs_and_the_same_jpg(self, dest_page: Path) -> None:
+        assert _manifest_for(dest_page).is_page_current(dest_page, "inputs")
+
+    def test_different_inputs(self, dest_page: Path) -> None:
+        assert not _manifest_for(dest_page).is_page_current(dest_page, "other inputs")
+
+    def test_a_page_never_built(self, dest_page: Path) -> None:
+        assert not BuildManifest().is_page_current(dest_page, "inputs")
+
+    def test_a_jpg_written_since(self, dest_page: Path) -> None:
+        manifest = _manifest_for(dest_page)
+        stat = dest_page.stat()
+        os.utime(dest_page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert not manifest.is_page_current(dest_page, "inputs")
+
+    def test_a_jpg_gone(self, dest_page: Path) -> None:
+        manifest = _manifest_for(dest_page)
+        dest_page.unlink()
+
+        assert not manifest.is_page_current(dest_page, "inputs")
+
+
+class TestLoadAndSave:
+    def test_it_comes_back_the_same(self, tmp_path: Path, dest_page: Path) -> None:
+        manifest_file = tmp_path / "manifests" / "title.json"
+        manifest = _manifest_for(dest_page)
+
+        save_build_manifest(manifest_file, manifest)
+
+        assert load_build_manifest(manifest_file) == manifest
+        assert load_build_manifest(manifest_file).is_page_current(dest_page, "inputs")
+        assert [f.name for f in manifest_file.parent.iterdir()] == ["title.json"]
+
+    def test_a_manifest_of_another_shape_is_an_empty_one(self, tmp_path: Path) -> None:
+        manifest_file = tmp_path / "bad.json"
+        data = {"version": BUILD_MANIFEST_VERSION, "title_hash": None}
+        manifest_file.write_text(json.dumps(data))
+
+        assert load_build_manifest(manifest_file) == BuildManifest()
+
+    def test_named_for_the_dest_directory(self, tmp_path: Path) -> None:
+        dest_dir = tmp_path / "The Comics" / "123 Lost in the Andes"
+
+        file = get_build_manifest_file(tmp_path / "manifests", dest_dir)
+
+        assert file == tmp_path / "manifests" / "123 Lost in the Andes.json"
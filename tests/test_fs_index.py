@@ -0,0 +1,252 @@
+"""Tests for the one-scan index the integrity check asks instead of the disk.
+
+An index that answered wrongly would turn the integrity check into a report on a tree
+that is not there, so what is pinned here is that every answer it gives is the one
+`Path` would have given at the time of the scan, and that whatever it did not scan - a
+path outside its roots, under a symlinked directory, or with no index in use at all - is
+asked of the disk.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from barks_comic_building.build import fs_index
+from barks_comic_building.build.fs_index import FsIndex, describe_profile, use_fs_index
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / "root"
+    (root / "vol" / "images").mkdir(parents=True)
+    (root / "vol" / "images" / "001.png").write_bytes(b"page")
+    (root / "vol" / "notes.txt").write_text("notes")
+    (root / "vol" / "link.png").symlink_to(root / "vol" / "images" / "001.png")
+    (root / "vol" / "dangling.png").symlink_to(root / "vol" / "gone.png")
+    (tmp_path / "elsewhere").mkdir()
+    (tmp_path / "elsewhere" / "002.png").write_bytes(b"page")
+    (root / "linked-dir").symlink_to(tmp_path / "elsewhere")
+
+    return root
+
+
+@pytest.fixture
+def index(tree: Path) -> FsIndex:
+    index = FsIndex([tree])
+    index.scan()
+
+    return index
+
+
+def _answers(path: Path) -> tuple[bool, bool, bool, bool]:
+    return (
+        fs_index.is_file(path),
+        fs_index.is_dir(path),
+        fs_index.exists(path),
+        fs_index.is_symlink(path),
+    )
+
+
+def _path_answers(path: Path) -> tuple[bool, bool, bool, bool]:
+    return path.is_file(), path.is_dir(), path.exists(), path.is_symlink()
+
+
+class TestAnswers:
+    @pytest.mark.parametrize(
+        "name",
+        [
+            "",
+            "vol",
+            "vol/images",
+            "vol/images/001.png",
+            "vol/notes.txt",
+            "vol/link.png",
+            "vol/dangling.png",
+            "vol/missing.png",
+            "linked-dir",
+        ],
+    )
+    def test_the_same_as_the_disk(self, tree: Path, index: FsIndex, name: str) -> None:
+        path = tree / name
+
+        with use_fs_index(index):
+            assert _answers(path) == _path_answers(path)
+
+        assert index.counts["(other)"].passed_on == 0
+
+    def test_the_same_listing_as_the_disk(self, tree: Path, index: FsIndex) -> None:
+        with use_fs_index(index):
+            assert sorted(fs_index.iterdir(tree / "vol")) == sorted((tree / "vol").iterdir())
+
+    def test_the_same_stat_as_the_disk(self, tree: Path, index: FsIndex) -> None:
+        page = tree / "vol" / "link.png"
+
+        with use_fs_index(index):
+            assert fs_index.stat(page).st_mtime_ns == page.stat().st_mtime_ns
+
+    def test_a_link_has_its_own_lstat(self, tree: Path, index: FsIndex) -> None:
+        link = tree / "vol" / "link.png"
+        os.utime(link, ns=(0, 1_000_000_000), follow_symlinks=False)
+        index.scan()
+
+        with use_fs_index(index):
+            assert fs_index.lstat(link).st_mtime_ns == 1_000_000_000
+            assert fs_index.stat(link).st_mtime_ns == link.stat().st_mtime_ns
+
+    def test_a_dangling_link_has_no_stat(self, tree: Path, index: FsIndex) -> None:
+        dangling = tree / "vol" / "dangling.png"
+
+        with use_fs_index(index):
+            assert fs_index.lstat(dangling).st_mtime_ns == dangling.lstat().st_mtime_ns
+            with pytest.raises(FileNotFoundError):
+                fs_index.stat(dangling)
+
+
+class TestTimestamps:
+    def test_a_link_is_dated_by_its_own_mtime(self, tree: Path) -> None:
+        # As `comics_utils.get_timestamp` dates it: the zip symlinks are graded by when
+        # they were made, not by when the zip was.
+        link = tree / "vol" / "link.png"
+        os.utime(link, ns=(0, 1_000_000_000), follow_symlinks=False)
+        index = FsIndex([tree])
+        index.scan()
+
+        with use_fs_index(index):
+            assert fs_index.get_timestamp(link) == 1.0
+            assert fs_index.get_timestamp(tree / "vol" / "notes.txt") == (
+                (tree / "vol" / "notes.txt").stat().st_mtime
+            )
+
+        assert index.counts["(other)"].passed_on == 0
+
+    def test_a_dangling_link_is_still_dated(self, tree: Path, index: FsIndex) -> None:
+        dangling = tree / "vol" / "dangling.png"
+
+        with use_fs_index(index):
+            assert fs_index.get_timestamp(dangling) == dangling.lstat().st_mtime
+
+    def test_a_missing_file_is_refused(self, tree: Path, index: FsIndex) -> None:
+        with use_fs_index(index), pytest.raises(FileNotFoundError):
+            fs_index.get_timestamp(tree / "vol" / "missing.png")
+
+    def test_the_same_with_no_index_in_use(self, tree: Path) -> None:
+        link = tree / "vol" / "link.png"
+        os.utime(link, ns=(0, 1_000_000_000), follow_symlinks=False)
+
+        assert fs_index.get_timestamp(link) == 1.0
+
+
+class TestSameFile:
+    @pytest.mark.parametrize(
+        ("name", "other"),
+        [
+            ("vol/link.png", "vol/images/001.png"),
+            ("vol/link.png", "vol/notes.txt"),
+            ("vol/dangling.png", "vol/gone.png"),
+            ("vol/dangling.png", "vol/notes.txt"),
+            ("vol/notes.txt", "vol/missing.png"),
+        ],
+    )
+    def test_the_same_as_comparing_resolved_paths(
+        self, tree: Path, index: FsIndex, name: str, other: str
+    ) -> None:
+        path, other_path = tree / name, tree / other
+
+        with use_fs_index(index):
+            assert fs_index.same_file(path, other_path) == (
+                path.resolve() == other_path.resolve()
+            )
+
+
+class TestWhatIsLeftToTheDisk:
+    def test_a_path_outside_the_roots(self, tree: Path, index: FsIndex) -> None:
+        outside = tree.parent / "elsewhere" / "002.png"
+
+        with use_fs_index(index):
+            assert fs_index.is_file(outside)
+
+        assert index.counts["(other)"].passed_on == 1
+
+    def test_the_paths_under_a_symlinked_directory(self, tree: Path, index: FsIndex) -> None:
+        with use_fs_index(index):
+            assert fs_index.is_file(tree / "linked-dir" / "002.png")
+            assert [p.name for p in fs_index.iterdir(tree / "linked-dir")] == ["002.png"]
+
+        assert index.counts["(other)"].passed_on == 2
+
+    def test_everything_with_no_index_in_use(self, tree: Path, index: FsIndex) -> None:
+        (tree / "vol" / "images" / "003.png").touch()
+
+        assert fs_index.is_file(tree / "vol" / "images" / "003.png")
+        assert index.counts == {}
+
+
+class TestSnapshot:
+    def test_what_changed_since_is_seen_only_after_another_scan(
+        self, tree: Path, index: FsIndex
+    ) -> None:
+        new_page = tree / "vol" / "images" / "003.png"
+        new_page.touch()
+
+        with use_fs_index(index):
+            assert not fs_index.is_file(new_page)
+            index.scan()
+            assert fs_index.is_file(new_page)
+
+
+class TestProfile:
+    def test_queries_are_counted_against_their_section(self, tree: Path, index: FsIndex) -> None:
+        with use_fs_index(index):
+            with index.section("sweep"):
+                fs_index.iterdir(tree / "vol")
+                fs_index.is_file(tree / "vol" / "notes.txt")
+                fs_index.is_file(tree / "vol" / "missing.png")
+            fs_index.is_dir(tree / "vol")
+
+        assert index.counts["sweep"].answered == 3
+        assert index.counts["(other)"].answered == 1
+
+    def test_a_section_inside_another_is_indented_under_it(
+        self, tree: Path, index: FsIndex
+    ) -> None:
+        with use_fs_index(index), index.section("titles"):
+            fs_index.is_dir(tree / "vol")
+            with index.section("pages"):
+                fs_index.is_file(tree / "vol" / "notes.txt")
+                fs_index.is_file(tree / "vol" / "images" / "001.png")
+
+        lines = describe_profile(index)
+
+        assert index.counts["titles"].answered == 1
+        assert index.counts["pages"].answered == 2
+        assert lines[1].startswith("  titles ")
+        assert lines[2].startswith("    pages ")
+        assert index.counts["titles"].seconds >= index.counts["pages"].seconds
+
+    def test_the_report_sets_the_savings_against_the_scan(
+        self, tree: Path, index: FsIndex
+    ) -> None:
+        with use_fs_index(index), index.section("sweep"):
+            for _ in range(100):
+                fs_index.is_file(tree / "vol" / "notes.txt")
+
+        lines = describe_profile(index)
+
+        assert lines[0].startswith(f"Scanned {index.num_entries} entries")
+        assert "sweep" in lines[1]
+        assert "100 answered" in lines[1]
+        assert lines[-1].endswith(f"{100 - index.scan_calls:+d} net.")
+
+    def test_a_scan_is_counted_as_a_call_an_entry_and_a_directory(self, tree: Path) -> None:
+        index = FsIndex([tree / "vol" / "images"])
+        index.scan()
+
+        # The root's own stat and lstat, its listing, and the one page's stat.
+        assert index.scan_calls == 4
+        assert index.num_entries == len(os.listdir(tree / "vol" / "images")) + 1
@@ -0,0 +1,261 @@
+"""Tests for comparing images in ImageMagick's figures without running ImageMagick.
+
+`image_compare` can stand in for a ``compare`` process a pair only if its figures are
+``compare``'s own, so that the cutoffs measured with ``compare`` still hold. The edges of
+that are pinned here by hand, as ImageMagick's source reads: where a fuzz stops counting
+a difference, how the RMSE is normalised, and where ``-crop`` puts its tile edges. All
+three are also held to what ``compare`` itself measured on noisy pairs, grey and colour,
+png and jpg, checked in under ``fixtures/image_compare`` by
+``scripts/record_image_compare_fixtures.py``. Until those are recorded, the checks skip
+and the scripts run ``compare`` alone.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from barks_comic_building.build.image_compare import (
+    PairRequest,
+    TileFractions,
+    compare_image_pair,
+    compare_image_pairs,
+    get_tile_grid,
+    measure_difference,
+    parse_fuzz,
+)
+
+IMAGEMAGICK_FIXTURES_DIR = Path(__file__).parent / "fixtures" / "image_compare"
+
+
+def write_image(image_file: Path, image: np.ndarray) -> Path:
+    assert cv.imwrite(str(image_file), image)
+    return image_file
+
+
+def grey(value: int, size: tuple[int, int] = (8, 6)) -> np.ndarray:
+    width, height = size
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def one_channel(value: int) -> np.ndarray:
+    image = grey(100)
+    image[..., 2] = value
+    return image
+
+
+class TestFuzz:
+    def test_it_is_read_as_a_percentage(self) -> None:
+        assert parse_fuzz("20%") == pytest.approx(0.2)
+
+    def test_it_must_be_one(self) -> None:
+        with pytest.raises(ValueError, match="%"):
+            parse_fuzz("20")
+
+    def test_at_twenty_percent_a_difference_of_51_is_not_counted(self) -> None:
+        """20% of 65536 is 13107.2, and 51 is 13107 of 65535."""
+        assert measure_difference(grey(100), one_channel(151), 0.2).num_differing == 0
+
+    def test_at_twenty_percent_a_difference_of_52_is(self) -> None:
+        assert measure_difference(grey(100), one_channel(152), 0.2).num_differing == 48
+
+    def test_the_channels_are_one_distance(self) -> None:
+        """Two channels 37 apart are 52.3 apart together, and two 36 apart only 50.9."""
+        image = grey(100)
+        near, far = image.copy(), image.copy()
+        near[0, 0, :2] = 136
+        far[0, 0, :2] = 137
+
+        assert measure_difference(image, near, 0.2).num_differing == 0
+        assert measure_difference(image, far, 0.2).num_differing == 1
+
+    def test_a_grey_difference_counts_in_all_three_channels(self) -> None:
+        """Three channels 30 apart are 52.0 apart together, and three 29 apart only 50.2."""
+        image = np.full((6, 8), 100, dtype=np.uint8)
+
+        assert measure_difference(image, image + 29, 0.2).num_differing == 0
+        assert measure_difference(image, image + 30, 0.2).num_differing == 48
+
+    def test_at_zero_percent_any_difference_is(self) -> None:
+        image = grey(100)
+        other = image.copy()
+        other[0, 0, 2] = 101
+
+        assert measure_difference(image, other, 0.0).num_differing == 1
+
+    def test_a_pixel_differs_once_however_many_channels_do(self) -> None:
+        image = grey(0)
+        other = image.copy()
+        other[2, 3] = 255
+
+        assert measure_difference(image, other, 0.1).num_differing == 1
+
+    def test_a_transparent_pixel_differs_in_nothing_but_its_alpha(self) -> None:
+        image = np.zeros((2, 2, 4), dtype=np.uint8)
+        other = image.copy()
+        other[..., :3] = 255
+
+        assert measure_difference(image, other, 0.0).num_differing == 0
+
+
+class TestRmse:
+    def test_it_is_a_fraction_of_full_scale_over_every_channel(self) -> None:
+        image = grey(0)
+        other = image.copy()
+        other[..., 0] = 255
+
+        assert measure_difference(image, other, 0.0).rmse == pytest.approx(math.sqrt(1 / 3))
+
+    def test_it_is_zero_for_the_same_image(self) -> None:
+        assert measure_difference(grey(7), grey(7), 0.0).rmse == 0.0
+
+    def test_grey_against_colour_is_compared_as_colour(self) -> None:
+        image = np.full((6, 8), 10, dtype=np.uint8)
+
+        difference = measure_difference(image, grey(10), 0.0)
+
+        assert (difference.num_differing, difference.rmse) == (0, 0.0)
+
+
+class TestTiles:
+    def test_the_grid_is_the_nearest_count_of_tiles(self) -> None:
+        assert get_tile_grid((2100, 3000), 512) == (4, 6)
+        assert get_tile_grid((100, 100), 512) == (1, 1)
+
+    def test_each_tile_is_its_own_fraction(self) -> None:
+        image = grey(0, (4, 4))
+        other = image.copy()
+        other[0, 0] = 255
+        other[3, 2:] = 255
+
+        tiles = measure_difference(image, other, 0.0, tile_grid=(2, 2)).tiles
+
+        assert tiles == TileFractions([0.25, 0.0, 0.0, 0.5], 2, 2)
+        assert tiles.get_worst() == (0.5, 1, 1)
+
+    def test_the_edges_are_the_ones_crop_cuts(self) -> None:
+        """10 over 3 is 3.33: the edges round to 3, 7 and 10, not 3, 6 and 10."""
+        image = grey(0, (10, 1))
+        other = image.copy()
+        other[0, 6] = 255
+
+        tiles = measure_difference(image, other, 0.0, tile_grid=(3, 1)).tiles
+
+        assert tiles.fractions == pytest.approx([0.0, 0.25, 0.0])
+
+
+class TestPairs:
+    def test_an_identical_pair_is_all_zero(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "1.png", grey(40))
+        file2 = write_image(tmp_path / "2.png", grey(40))
+
+        result = compare_image_pair(PairRequest(file1, file2, 0.2, tile_size=4))
+
+        assert result.is_identical
+        assert result.difference.num_differing == 0
+        assert result.difference.tiles.get_worst()[0] == 0.0
+
+    def test_an_exact_comparison_measures_nothing(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "1.png", grey(40))
+        file2 = write_image(tmp_path / "2.png", grey(41))
+
+        result = compare_image_pair(PairRequest(file1, file2, exact=True))
+
+        assert (result.is_identical, result.difference, result.error) == (False, None, None)
+
+    def test_a_pair_of_different_sizes_is_an_error(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "1.png", grey(40, (8, 6)))
+        file2 = write_image(tmp_path / "2.png", grey(40, (6, 8)))
+
+        result = compare_image_pair(PairRequest(file1, file2))
+
+        assert result.difference is None
+        assert "different sizes" in result.error
+
+    def test_a_missing_image_is_an_error(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "1.png", grey(40))
+
+        result = compare_image_pair(PairRequest(file1, tmp_path / "gone.png"))
+
+        assert result.error is not None
+
+    def test_the_mask_is_written_only_if_something_differs(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "1.png", grey(40))
+        file2 = write_image(tmp_path / "2.png", grey(40))
+        other = grey(40)
+        other[1, 2] = 255
+        file3 = write_image(tmp_path / "3.png", other)
+
+        compare_image_pair(PairRequest(file1, file2, 0.1, mask_file=tmp_path / "same.png"))
+        compare_image_pair(PairRequest(file1, file3, 0.1, mask_file=tmp_path / "diff.png"))
+
+        assert not (tmp_path / "same.png").exists()
+        mask = cv.imread(str(tmp_path / "diff.png"), cv.IMREAD_UNCHANGED)
+        assert list(zip(*np.nonzero(mask), strict=True)) == [(1, 2)]
+        assert mask[1, 2] == 255
+
+    def test_the_pool_keeps_the_order(self, tmp_path: Path) -> None:
+        file1 = write_image(tmp_path / "base.png", grey(0))
+        requests = []
+        for value in range(6):
+            image = grey(0)
+            image[0, :value] = 255
+            requests.append(PairRequest(file1, write_image(tmp_path / f"{value}.png", image)))
+
+        results = list(compare_image_pairs(requests, num_workers=2))
+
+        assert [r.request for r in results] == requests
+        assert [r.difference.num_differing for r in results] == list(range(6))
+
+
+def _load_imagemagick_figures() -> dict:
+    expected_file = IMAGEMAGICK_FIXTURES_DIR / "expected.json"
+    if not expected_file.is_file():
+        pytest.skip(
+            "ImageMagick's figures are not recorded yet:"
+            " run scripts/record_image_compare_fixtures.py where it is installed."
+        )
+
+    return json.loads(expected_file.read_text())
+
+
+@pytest.mark.parametrize("name", ["grey-png", "colour-png", "colour-jpg"])
+class TestAgainstImageMagick:
+    @pytest.fixture
+    def recorded(self, name: str) -> tuple[Path, Path, dict]:
+        figures = _load_imagemagick_figures()["pairs"][name]
+        file1, file2 = (IMAGEMAGICK_FIXTURES_DIR / file for file in figures["files"])
+
+        return file1, file2, figures
+
+    def test_the_ae_count(self, recorded: tuple[Path, Path, dict]) -> None:
+        file1, file2, figures = recorded
+
+        for fuzz, expected in figures["ae"].items():
+            request = PairRequest(file1, file2, parse_fuzz(fuzz))
+
+            assert compare_image_pair(request).difference.num_differing == expected, fuzz
+
+    def test_the_rmse(self, recorded: tuple[Path, Path, dict]) -> None:
+        file1, file2, figures = recorded
+
+        rmse = compare_image_pair(PairRequest(file1, file2)).difference.rmse
+
+        assert rmse == pytest.approx(figures["rmse"], rel=1e-3)
+
+    def test_the_tiles(self, recorded: tuple[Path, Path, dict]) -> None:
+        file1, file2, figures = recorded
+        expected = figures["tiles"]
+        request = PairRequest(
+            file1, file2, parse_fuzz(expected["fuzz"]), tile_size=expected["tile_size"]
+        )
+
+        tiles = compare_image_pair(request).difference.tiles
+
+        assert [tiles.cols, tiles.rows] == expected["grid"]
+        assert tiles.fractions == pytest.approx(expected["fractions"], abs=1e-6)
@@ -0,0 +1,122 @@
+"""Tests for what the build manifests and the integrity snapshot share.
+
+Both skip work on the strength of what they recorded last time, so what is pinned here
+is what would make a skip wrong: a file identity that misses a change, a hash that
+survives a change of record version, and a record that is trusted when it should not be.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from barks_comic_building.build.inputs_common import (
+    get_file_identity,
+    hash_versioned_inputs,
+    load_versioned_json,
+    save_versioned_json,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def parse(data: dict[str, Any]) -> list[str]:
+    return list(data["names"])
+
+
+class TestFileIdentity:
+    def test_re_pointing_a_link_changes_it(self, tmp_path: Path) -> None:
+        old, new = tmp_path / "old.jpg", tmp_path / "new.jpg"
+        old.write_bytes(b"page")
+        new.write_bytes(b"page")
+        os.utime(new, ns=(0, old.stat().st_mtime_ns))
+        link = tmp_path / "link.jpg"
+        link.symlink_to(old)
+        before = get_file_identity(link)
+
+        link.unlink()
+        link.symlink_to(new)
+        os.utime(link, ns=(0, 1), follow_symlinks=False)
+
+        assert get_file_identity(link) != before
+
+    def test_touching_a_file_changes_it(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.jpg"
+        file.write_bytes(b"page")
+        before = get_file_identity(file)
+
+        stat = file.stat()
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert get_file_identity(file) != before
+
+    def test_touching_a_link_changes_it(self, tmp_path: Path) -> None:
+        """As the zip symlinks are graded by the link's own mtime."""
+        target = tmp_path / "comic.cbz"
+        target.write_bytes(b"zip")
+        link = tmp_path / "link.cbz"
+        link.symlink_to(target)
+        before = get_file_identity(link)
+
+        os.utime(link, ns=(0, 1_000_000_000), follow_symlinks=False)
+
+        assert get_file_identity(link) != before
+
+    def test_it_is_read_with_the_stat_given(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.jpg"
+        seen: list[Path] = []
+
+        def stat(path: Path) -> os.stat_result:
+            seen.append(path)
+            return os.stat(path)
+
+        file.write_bytes(b"page")
+
+        assert get_file_identity(file, stat, stat) == get_file_identity(file)
+        assert seen == [file, file]
+
+    def test_a_missing_file_has_none(self, tmp_path: Path) -> None:
+        assert get_file_identity(tmp_path / "not-there.jpg") is None
+
+
+class TestHash:
+    def test_the_version_is_part_of_it(self) -> None:
+        assert hash_versioned_inputs(1, {"page": 1}) != hash_versioned_inputs(2, {"page": 1})
+
+    def test_dict_key_order_is_not(self) -> None:
+        assert hash_versioned_inputs(1, {"a": 1, "b": 2}) == hash_versioned_inputs(
+            1, {"b": 2, "a": 1}
+        )
+
+    def test_any_value_is(self) -> None:
+        assert hash_versioned_inputs(1, {"a": 1, "b": [2, 3]}) != hash_versioned_inputs(
+            1, {"a": 1, "b": [3, 2]}
+        )
+
+
+class TestRecordFile:
+    def test_it_comes_back_the_same(self, tmp_path: Path) -> None:
+        record_file = tmp_path / "records" / "record.json"
+        save_versioned_json(record_file, 1, {"names": ["a", "b"]})
+
+        assert load_versioned_json(record_file, 1, parse, [], "record") == ["a", "b"]
+        assert not record_file.with_name("record.json.tmp").exists()
+
+    def test_another_version_is_empty(self, tmp_path: Path) -> None:
+        record_file = tmp_path / "record.json"
+        save_versioned_json(record_file, 1, {"names": ["a"]})
+
+        assert load_versioned_json(record_file, 2, parse, [], "record") == []
+
+    @pytest.mark.parametrize("text", ["not json", "[]", '{"version": 1}'])
+    def test_an_unreadable_one_is_empty(self, tmp_path: Path, text: str) -> None:
+        record_file = tmp_path / "record.json"
+        record_file.write_text(text)
+
+        assert load_versioned_json(record_file, 1, parse, [], "record") == []
+
+    def test_a_missing_one_is_empty(self, tmp_path: Path) -> None:
+        assert load_versioned_json(tmp_path / "not-there.json", 1, parse, [], "record") == []
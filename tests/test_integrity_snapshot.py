@@ -0,0 +1,142 @@
+"""Tests for the snapshot that lets a check skip the titles unchanged since they passed.
+
+The failure that matters is a title skipped when it should have been checked: a finding
+would go unreported, and the run would say the library is clean. So what is pinned here
+is that only a pass is ever remembered, that a change to anything identified comes out as
+"check it", and that every doubt about the snapshot itself is an empty one.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from barks_comic_building.build.fs_index import FsIndex, use_fs_index
+from barks_comic_building.build.integrity_snapshot import (
+    INTEGRITY_SNAPSHOT_VERSION,
+    IntegritySnapshot,
+    get_code_version,
+    get_page_file_identities,
+    load_integrity_snapshot,
+    save_integrity_snapshot,
+)
+
+
+class TestVerdicts:
+    def test_a_title_that_passed_against_the_same_inputs(self) -> None:
+        snapshot = IntegritySnapshot()
+        snapshot.record("title", "inputs")
+
+        assert snapshot.is_unchanged("title", "inputs")
+        assert snapshot.num_skipped == 1
+
+    def test_a_title_whose_inputs_changed(self) -> None:
+        snapshot = IntegritySnapshot()
+        snapshot.record("title", "inputs")
+
+        assert not snapshot.is_unchanged("title", "other inputs")
+        assert snapshot.num_skipped == 0
+
+    def test_a_title_that_failed_since_is_forgotten(self) -> None:
+        snapshot = IntegritySnapshot()
+        snapshot.record("title", "inputs")
+
+        snapshot.record("title", None)
+
+        assert not snapshot.is_unchanged("title", "inputs")
+
+
+
+@pytest.fixture
+def volume(tmp_path: Path) -> Path:
+    """A volume's artifacts across two trees, as the chain of pages 017 and 018 has them."""
+    volume = tmp_path / "library"
+    for name in [
+        "restored/images/017.png",
+        "restored/images/018.png",
+        "svg/images/017.svg",
+        "svg/images/017.svg.png",
+        "fixes/images/018.jpg",
+        "fixes/bounded/017.json",
+        "restored/images/readme.txt",
+    ]:
+        file = volume / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(name)
+
+    return volume
+
+
+def _dirs(volume: Path) -> list[Path]:
+    return [volume / "restored", volume / "svg", volume / "fixes", volume / "not-there"]
+
+
+class TestPageFiles:
+    def test_every_file_named_for_a_page_is_found_under_it(self, volume: Path) -> None:
+        by_page = get_page_file_identities(_dirs(volume))
+
+        names = {
+            page: [Path(file).relative_to(volume).as_posix() for file, _ in files]
+            for page, files in by_page.items()
+        }
+        assert names == {
+            "017": [
+                "fixes/bounded/017.json",
+                "restored/images/017.png",
+                "svg/images/017.svg",
+                "svg/images/017.svg.png",
+            ],
+            "018": ["fixes/images/018.jpg", "restored/images/018.png"],
+        }
+
+    def test_touching_an_artifact_changes_only_its_page(self, volume: Path) -> None:
+        before = get_page_file_identities(_dirs(volume))
+
+        os.utime(volume / "svg" / "images" / "017.svg", ns=(0, 1_000_000_000))
+        after = get_page_file_identities(_dirs(volume))
+
+        assert after["017"] != before["017"]
+        assert after["018"] == before["018"]
+
+    def test_with_the_trees_scanned_nothing_is_asked_of_the_disk(self, volume: Path) -> None:
+        index = FsIndex([volume])
+        index.scan()
+
+        with use_fs_index(index):
+            from_index = get_page_file_identities(_dirs(volume))
+
+        assert from_index == get_page_file_identities(_dirs(volume))
+        assert index.counts["(other)"].passed_on == 0
+
+
+class TestCodeVersion:
+    def test_the_same_code_is_the_same_version(self) -> None:
+        modules = ["barks_comic_building.build.integrity_snapshot"]
+
+        assert get_code_version(modules) == get_code_version(modules)
+
+    def test_other_code_is_another(self) -> None:
+        assert get_code_version(["barks_comic_building.build.fs_index"]) != get_code_version(
+            ["barks_comic_building.build.integrity_snapshot"]
+        )
+
+
+class TestLoadAndSave:
+    def test_it_comes_back_the_same(self, tmp_path: Path) -> None:
+        snapshot_file = tmp_path / "integrity-snapshot.json"
+        snapshot = IntegritySnapshot({"b title": "b", "a title": "a"})
+
+        save_integrity_snapshot(snapshot_file, snapshot)
+
+        assert load_integrity_snapshot(snapshot_file) == snapshot
+        assert [f.name for f in tmp_path.iterdir()] == ["integrity-snapshot.json"]
+
+    def test_a_hash_that_is_not_a_string_is_an_empty_snapshot(self, tmp_path: Path) -> None:
+        snapshot_file = tmp_path / "bad.json"
+        data = {"version": INTEGRITY_SNAPSHOT_VERSION, "passed": {"title": 1}}
+        snapshot_file.write_text(json.dumps(data))
+
+        assert load_integrity_snapshot(snapshot_file) == IntegritySnapshot()
@@ -0,0 +1,148 @@
+"""Tests for sizing the memory-hungry phases by what their pages are expected to take.
+
+The sampler is tested against real allocations, including one made by a child process,
+since the steps that matter most are gmic subprocesses and a sampler that only saw the
+worker would measure them as needing the least. The model and the budget are plain
+arithmetic and are tested as such.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import time
+
+import numpy as np
+import psutil
+import pytest
+
+from barks_comic_building.restore.memory_budget import (
+    MIN_SAMPLES_FOR_PERCENTILE,
+    MemoryBudget,
+    MemoryModel,
+    PeakRssSampler,
+    get_tree_rss_mb,
+)
+
+ALLOCATION_MB = 200
+
+# The child allocates and then says so, so the test never samples it half way there.
+_CHILD_SCRIPT = (
+    f"import sys, time; block = bytearray({ALLOCATION_MB} * 1024 * 1024); "
+    "print('ready', flush=True); time.sleep(30)"
+)
+
+
+class TestPeakRssSampler:
+    def test_a_peak_that_has_been_freed_is_still_seen(self) -> None:
+        with PeakRssSampler(interval=0.01) as sampler:
+            before = get_tree_rss_mb(psutil.Process())
+            block = np.ones(ALLOCATION_MB * 1024 * 1024, dtype=np.uint8)
+            time.sleep(0.1)
+            del block
+
+        assert sampler.peak_mb >= before + ALLOCATION_MB * 0.9
+
+    def test_a_child_process_is_counted(self) -> None:
+        """What gmic looks like from the worker: the memory is all in the child."""
+        alone = get_tree_rss_mb(psutil.Process())
+
+        with subprocess.Popen(  # noqa: S603
+            [sys.executable, "-c", _CHILD_SCRIPT], stdout=subprocess.PIPE, text=True
+        ) as child:
+            try:
+                assert child.stdout is not None
+                assert child.stdout.readline().strip() == "ready"
+
+                with_child = get_tree_rss_mb(psutil.Process())
+            finally:
+                child.kill()
+
+        assert with_child >= alone + ALLOCATION_MB * 0.9
+
+    def test_a_step_shorter_than_the_interval_is_still_measured(self) -> None:
+        with PeakRssSampler(interval=60) as sampler:
+            pass
+
+        assert sampler.peak_mb > 0
+
+
+class TestMemoryModel:
+    def test_nothing_measured_predicts_nothing(self) -> None:
+        assert MemoryModel().predict_mb(["smooth"], 100.0) is None
+
+    def test_the_prediction_scales_with_the_page(self) -> None:
+        """A double-page spread is twice the megapixels, and needs twice the memory."""
+        model = MemoryModel.from_measurements([(100.0, {"smooth": 4000.0})])
+
+        assert model.predict_mb(["smooth"], 100.0) == pytest.approx(4000.0)
+        assert model.predict_mb(["smooth"], 200.0) == pytest.approx(8000.0)
+
+    def test_a_phase_needs_its_largest_step_not_the_sum(self) -> None:
+        """The steps of a phase run one after another in the one worker."""
+        model = MemoryModel.from_measurements(
+            [(100.0, {"inpaint": 6000.0, "overlay": 1500.0, "resize restored file": 900.0})]
+        )
+
+        predicted = model.predict_mb(["inpaint", "overlay", "resize restored file"], 100.0)
+
+        assert predicted == pytest.approx(6000.0)
+
+    def test_a_step_with_no_measurement_does_not_block_one_with(self) -> None:
+        model = MemoryModel.from_measurements([(100.0, {"overlay": 1500.0})])
+
+        assert model.predict_mb(["inpaint", "overlay"], 100.0) == pytest.approx(1500.0)
+
+    def test_few_pages_predict_the_worst_of_them(self) -> None:
+        model = MemoryModel.from_measurements(
+            [(100.0, {"smooth": 3000.0}), (100.0, {"smooth": 5000.0})]
+        )
+
+        assert model.mb_per_megapixel("smooth") == pytest.approx(50.0)
+
+    def test_one_freak_page_among_many_does_not_set_the_prediction(self) -> None:
+        pages = [(100.0, {"smooth": 4000.0})] * (MIN_SAMPLES_FOR_PERCENTILE * 2)
+        model = MemoryModel.from_measurements([*pages, (100.0, {"smooth": 40000.0})])
+
+        allowance = model.mb_per_megapixel("smooth")
+
+        assert allowance is not None
+        assert allowance < 100.0
+
+    def test_a_page_with_no_size_teaches_nothing(self) -> None:
+        model = MemoryModel()
+        model.observe(0.0, {"smooth": 4000.0})
+
+        assert model.mb_per_megapixel("smooth") is None
+
+    def test_pages_coming_back_during_a_run_are_learnt_from(self) -> None:
+        model = MemoryModel()
+        model.observe(100.0, {"smooth": 4000.0})
+
+        assert model.predict_mb(["smooth"], 100.0) == pytest.approx(4000.0)
+
+
+class TestMemoryBudget:
+    def test_pages_are_admitted_while_they_fit(self) -> None:
+        budget = MemoryBudget(10000.0)
+
+        assert budget.try_admit(4000.0)
+        assert budget.try_admit(4000.0)
+        assert not budget.try_admit(4000.0)
+        assert budget.num_running == 2  # noqa: PLR2004
+
+    def test_a_finished_page_makes_room(self) -> None:
+        budget = MemoryBudget(10000.0)
+        budget.try_admit(6000.0)
+        assert not budget.try_admit(6000.0)
+
+        budget.release(6000.0)
+
+        assert budget.try_admit(6000.0)
+
+    def test_a_page_bigger_than_the_budget_still_runs_alone(self) -> None:
+        """Otherwise it could never run at all."""
+        budget = MemoryBudget(1000.0)
+
+        assert budget.try_admit(5000.0)
+        assert not budget.try_admit(1.0)
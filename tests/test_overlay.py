@@ -0,0 +1,103 @@
+"""Tests for the in-process overlay agreeing with the gmic command it stands in for.
+
+The overlay backend is not part of the recipe, so a page composited in process sits in the
+library beside pages gmic composited and nothing ever redoes either. That is only honest
+if the two make the same page to within `OVERLAY_TOLERANCE`, which is what the comparison
+against gmic pins - when gmic is there to compare against. The rest pins the blend itself,
+which needs nothing installed.
+"""
+
+from __future__ import annotations
+
+import shutil
+from typing import TYPE_CHECKING
+
+import cv2 as cv
+import numpy as np
+import pytest
+from PIL import Image
+
+from barks_comic_building.restore import overlay as overlay_module
+from barks_comic_building.restore.overlay import (
+    OVERLAY_TOLERANCE,
+    overlay_inpainted_file_with_black_ink,
+    overlay_with_black_ink,
+    write_overlaid_file,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+HEIGHT, WIDTH = 300, 200
+
+
+def make_colour_layer() -> np.ndarray:
+    return np.random.default_rng(1).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def make_ink(alpha: int | None = None) -> np.ndarray:
+    """Return an RGBA ink render: near-black strokes with a ramp of alphas, or one alpha."""
+    rng = np.random.default_rng(2)
+    ink = rng.integers(0, 40, (HEIGHT, WIDTH, 4), dtype=np.uint8)
+    ink[:, :, 3] = rng.integers(0, 256, (HEIGHT, WIDTH)) if alpha is None else alpha
+
+    return ink
+
+
+class TestTheBlend:
+    def test_transparent_ink_leaves_the_colour_alone(self) -> None:
+        colour = make_colour_layer()
+
+        out = overlay_with_black_ink(colour.copy(), make_ink(alpha=0))
+
+        np.testing.assert_array_equal(out, colour)
+
+    def test_opaque_ink_replaces_the_colour(self) -> None:
+        ink = make_ink(alpha=255)
+
+        out = overlay_with_black_ink(make_colour_layer(), ink)
+
+        # The ink is RGB and the colour layer BGR.
+        np.testing.assert_array_equal(out, ink[:, :, 2::-1])
+
+    def test_a_partial_alpha_blends_and_truncates(self) -> None:
+        colour = np.full((2, 2, 3), 200, dtype=np.uint8)
+        ink = np.zeros((2, 2, 4), dtype=np.uint8)
+        ink[:, :, 3] = 100
+
+        out = overlay_with_black_ink(colour, ink)
+
+        # 200 * 155 / 255 = 121.57, truncated as gmic's png writer does.
+        assert (out == 121).all()  # noqa: PLR2004
+
+    def test_the_bands_cover_the_whole_page(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """A band size that does not divide the height still reaches the last row."""
+        monkeypatch.setattr(overlay_module, "BLOCK_ROWS", 7)
+        ink = make_ink(alpha=255)
+
+        out = overlay_with_black_ink(make_colour_layer(), ink)
+
+        np.testing.assert_array_equal(out[-1], ink[-1, :, 2::-1])
+
+    def test_a_size_mismatch_is_refused(self) -> None:
+        with pytest.raises(ValueError, match="Ink render is"):
+            overlay_with_black_ink(make_colour_layer(), make_ink()[:-1])
+
+
+@pytest.mark.skipif(shutil.which("gmic") is None, reason="needs gmic to compare against")
+def test_agrees_with_the_gmic_backend(tmp_path: Path) -> None:
+    colour = make_colour_layer()
+    ink = make_ink()
+    colour_file = tmp_path / "colour.png"
+    ink_file = tmp_path / "ink.png"
+    cv.imwrite(str(colour_file), colour)
+    Image.fromarray(ink, "RGBA").save(str(ink_file))
+
+    gmic_file = tmp_path / "gmic.png"
+    overlay_inpainted_file_with_black_ink(colour_file, ink_file, gmic_file)
+    numpy_file = tmp_path / "numpy.png"
+    write_overlaid_file(numpy_file, overlay_with_black_ink(colour.copy(), ink))
+
+    gmic_pixels = cv.imread(str(gmic_file)).astype(np.int16)
+    numpy_pixels = cv.imread(str(numpy_file)).astype(np.int16)
+    assert np.abs(gmic_pixels - numpy_pixels).max() <= OVERLAY_TOLERANCE
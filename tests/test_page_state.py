@@ -18,8 +18,10 @@ from PIL.PngImagePlugin import PngInfo
 
 from barks_comic_building.restore.page_state import (
     RECIPE_ID_KEY,
+    RESTORE_DATE_KEY,
     UPSCALER_KEY,
     PageState,
+    PageStateCache,
     get_page_status,
     get_upscaler_used,
 )
@@ -53,7 +55,9 @@ class Page:
         self.restored_4x = tmp_path / "restored-4x.png"
         self.svg = tmp_path / "restored.svg"
 
-    def status(self, *, is_hand_restored: bool = False) -> PageState:
+    def status(
+        self, *, is_hand_restored: bool = False, cache: PageStateCache | None = None
+    ) -> PageState:
         return get_page_status(
             self.upscayl,
             self.restored,
@@ -61,6 +65,7 @@ class Page:
             self.svg,
             CURRENT_RECIPE_ID,
             is_hand_restored=is_hand_restored,
+            cache=cache,
         ).state
 
     def write_all(self, recipe_id: str | None) -> None:
@@ -379,3 +384,56 @@ class TestUpscalerUsed:
 
     def test_a_missing_file_gives_nothing(self, tmp_path: Path) -> None:
         assert get_upscaler_used(tmp_path / "gone.png") == ""
+
+
+class TestPageStateCache:
+    """A png is opened again only when it has changed, and never trusted once it has."""
+
+    def test_an_unchanged_page_is_answered_from_the_saved_cache(
+        self, page: Page, tmp_path: Path
+    ) -> None:
+        cache_file = tmp_path / "cache.json"
+        page.write_all(CURRENT_RECIPE_ID)
+        with PageStateCache(cache_file) as cache:
+            assert page.status(cache=cache) is PageState.CURRENT
+
+        with PageStateCache(cache_file) as cache:
+            assert page.status(cache=cache) is PageState.CURRENT
+
+        assert (cache.num_read, cache.num_cached) == (0, 1)
+
+    def test_a_rewritten_page_is_read_again(self, page: Page, tmp_path: Path) -> None:
+        """As when a run restores a stale page - it must not stay stale in the report."""
+        cache_file = tmp_path / "cache.json"
+        page.write_all(OLD_RECIPE_ID)
+        with PageStateCache(cache_file) as cache:
+            assert page.status(cache=cache) is PageState.STALE
+
+        # Dated as well, so that the new file differs in size too, and the test does not
+        # hang on the filesystem's timestamp resolution.
+        page.restored.unlink()
+        write_png(page.restored, {RECIPE_ID_KEY: CURRENT_RECIPE_ID, RESTORE_DATE_KEY: "today"})
+
+        with PageStateCache(cache_file) as cache:
+            assert page.status(cache=cache) is PageState.CURRENT
+
+        assert cache.num_read == 1
+
+    def test_an_unreadable_cache_is_started_afresh(self, page: Page, tmp_path: Path) -> None:
+        cache_file = tmp_path / "cache.json"
+        cache_file.write_text("{not json")
+        page.write_all(CURRENT_RECIPE_ID)
+
+        with PageStateCache(cache_file) as cache:
+            assert page.status(cache=cache) is PageState.CURRENT
+
+        assert cache.num_read == 1
+
+    def test_the_upscaler_is_cached_too(self, tmp_path: Path) -> None:
+        upscayl = write_png(tmp_path / "upscayl.png", {UPSCALER_KEY: "waifu2x"})
+
+        with PageStateCache() as cache:
+            assert get_upscaler_used(upscayl, cache) == "waifu2x"
+            assert get_upscaler_used(upscayl, cache) == "waifu2x"
+
+        assert (cache.num_read, cache.num_cached) == (1, 1)
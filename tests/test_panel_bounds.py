@@ -9,16 +9,36 @@ The failure worth guarding is the quiet one in each direction. A `--force` that
 actually reach the per-page decision would silently do nothing and leave the bad bounds in
 place; a default run that stopped skipping would recompute the whole library. So both are
 asserted against a processor that records whether it was asked to do any work.
+
+Since the run started recording what each page's bounds were made from, a default run
+also remakes a page whose source or override changed underneath its bounds, and nothing
+else - so that is asserted the same way, in both directions. A whole run is then checked
+on a real process pool, for what it counts and records of the pages that come back and
+of one that does not.
 """
 
 from __future__ import annotations
 
 import json
+import os
+from collections import Counter
 from typing import TYPE_CHECKING, Any, cast
 
 import pytest
 
-from barks_comic_building.restore.batch_panel_bounds import get_page_panel_bounds
+from barks_comic_building.restore.batch_panel_bounds import (
+    PageResult,
+    PanelBoundsJob,
+    PanelBoundsOutcome,
+    get_inputs_hash,
+    get_override_files,
+    get_page_panel_bounds,
+    run_panel_bounds_jobs,
+)
+from barks_comic_building.restore.panel_bounds_inputs import (
+    load_panel_bounds_inputs,
+    save_panel_bounds_inputs,
+)
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -93,14 +113,21 @@ def page(tmp_path: Path) -> Page:
     return Page(tmp_path)
 
 
-def run(page: Page, processor: FakeBoundingBoxProcessor, *, force: bool) -> None:
+def run(
+    page: Page,
+    processor: FakeBoundingBoxProcessor,
+    *,
+    force: bool,
+    recorded_hash: str | None = None,
+) -> PageResult:
     """Run the per-page bounds step for one page."""
-    get_page_panel_bounds(
+    return get_page_panel_bounds(
         as_processor(processor),
         page.override_dir,
         page.srce_file,
         page.dest_file,
         force=force,
+        recorded_hash=recorded_hash,
     )
 
 
@@ -263,3 +290,232 @@ class TestAPageWithNoSourceScan:
         page.srce_file.unlink()
 
         run(page, FakeBoundingBoxProcessor(), force=True)
+
+
+class TestAPageWhoseInputsWereRecorded:
+    """A page made by a run that recorded what its bounds were made from."""
+
+    @pytest.fixture
+    def recorded_hash(self, page: Page) -> str:
+        page.srce_file.write_text("the restored page")
+        result = run(page, FakeBoundingBoxProcessor(), force=False)
+        assert result.outcome is PanelBoundsOutcome.MADE
+
+        assert result.inputs_hash is not None
+        return result.inputs_hash
+
+    def test_an_unchanged_page_is_skipped(self, page: Page, recorded_hash: str) -> None:
+        processor = FakeBoundingBoxProcessor()
+
+        result = run(page, processor, force=False, recorded_hash=recorded_hash)
+
+        assert result == PageResult(PanelBoundsOutcome.UNCHANGED, recorded_hash)
+        assert processor.kumiko_calls == []
+
+    def test_a_re_restored_page_is_remade(self, page: Page, recorded_hash: str) -> None:
+        page.srce_file.write_text("the page restored again, differently")
+        processor = FakeBoundingBoxProcessor()
+
+        result = run(page, processor, force=False, recorded_hash=recorded_hash)
+
+        assert result.outcome is PanelBoundsOutcome.MADE
+        assert result.inputs_hash != recorded_hash
+        assert processor.kumiko_calls == [page.srce_file]
+
+    def test_a_page_given_an_override_is_remade(self, page: Page, recorded_hash: str) -> None:
+        page.override_dir.mkdir(parents=True)
+        (page.override_dir / "042.png").write_text("hand-drawn bounds")
+        processor = FakeBoundingBoxProcessor()
+
+        run(page, processor, force=False, recorded_hash=recorded_hash)
+
+        assert processor.kumiko_calls == [page.srce_file]
+
+    def test_another_pages_override_makes_no_difference(self, page: Page) -> None:
+        before = get_inputs_hash(page.srce_file, page.override_dir)
+        page.override_dir.mkdir(parents=True)
+        (page.override_dir / "043.png").write_text("another page's bounds")
+
+        assert get_inputs_hash(page.srce_file, page.override_dir) == before
+
+    def test_a_page_rewritten_the_same_is_skipped_and_brought_up_to_date(
+        self, page: Page, recorded_hash: str
+    ) -> None:
+        """Or the integrity check, which goes by timestamps, would call its bounds stale."""
+        srce_mtime = page.srce_file.stat().st_mtime_ns
+        os.utime(page.dest_file, ns=(srce_mtime - 10**9, srce_mtime - 10**9))
+        processor = FakeBoundingBoxProcessor()
+
+        run(page, processor, force=False, recorded_hash=recorded_hash)
+
+        assert processor.kumiko_calls == []
+        assert page.dest_file.stat().st_mtime_ns >= page.srce_file.stat().st_mtime_ns
+
+
+class TestAPageMadeBeforeInputsWereRecorded:
+    def test_it_is_kept_and_its_inputs_recorded(self, page: Page) -> None:
+        page.already_bounded()
+
+        result = run(page, FakeBoundingBoxProcessor(), force=False)
+
+        assert result.outcome is PanelBoundsOutcome.UNCHANGED
+        assert result.inputs_hash == get_inputs_hash(page.srce_file, page.override_dir)
+
+    def test_it_is_remade_if_older_than_its_page(self, page: Page) -> None:
+        page.already_bounded()
+        srce_mtime = page.srce_file.stat().st_mtime_ns
+        os.utime(page.dest_file, ns=(srce_mtime - 10**9, srce_mtime - 10**9))
+        processor = FakeBoundingBoxProcessor()
+
+        run(page, processor, force=False)
+
+        assert processor.kumiko_calls == [page.srce_file]
+
+
+class TestOutcomes:
+    """What the run counts each page as, which is what its summary reports."""
+
+    def test_a_linked_page(self, page: Page) -> None:
+        page.staged_from_home_volume()
+
+        assert run(page, FakeBoundingBoxProcessor(), force=False) == PageResult(
+            PanelBoundsOutcome.LINKED
+        )
+
+    def test_a_failed_page(self, page: Page) -> None:
+        page.srce_file.unlink()
+
+        assert run(page, FakeBoundingBoxProcessor(), force=False) == PageResult(
+            PanelBoundsOutcome.FAILED
+        )
+
+
+class TestOverrideFiles:
+    def test_found_by_page_number_whatever_the_extension(self, page: Page) -> None:
+        page.override_dir.mkdir(parents=True)
+        for name in ["042.png", "042.jpg", "043.png"]:
+            (page.override_dir / name).touch()
+
+        assert get_override_files(page.srce_file, page.override_dir) == [
+            page.override_dir / "042.jpg",
+            page.override_dir / "042.png",
+        ]
+
+    def test_no_override_dir_is_no_overrides(self, page: Page) -> None:
+        assert get_override_files(page.srce_file, page.override_dir) == []
+        assert not page.override_dir.exists()
+
+
+class UnpicklableProcessor(FakeBoundingBoxProcessor):
+    """A processor that cannot be sent to a worker, so its page never comes back."""
+
+    def __reduce__(self) -> Any:  # noqa: ANN401
+        msg = "Cannot be sent to a worker."
+        raise TypeError(msg)
+
+
+def make_jobs(tmp_path: Path, page_nums: list[str]) -> list[PanelBoundsJob]:
+    """Return a job for each page, its source scan in place and no bounds made yet."""
+    processor = as_processor(FakeBoundingBoxProcessor())
+    srce_dir = tmp_path / "restored"
+    srce_dir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for page_num in page_nums:
+        srce_file = srce_dir / f"{page_num}.png"
+        srce_file.write_text(f"page {page_num}")
+        dest_file = tmp_path / "segments" / f"{page_num}.json"
+        jobs.append(PanelBoundsJob(processor, tmp_path / "bounded", srce_file, dest_file))
+
+    return jobs
+
+
+class TestARun:
+    """The pool the pages run on, and what the run makes of what comes back."""
+
+    def test_every_page_is_made_and_its_inputs_recorded(self, tmp_path: Path) -> None:
+        jobs = make_jobs(tmp_path, ["001", "002", "003"])
+        inputs_file = tmp_path / "inputs.json"
+
+        outcomes, failed = run_panel_bounds_jobs(jobs, force=False, inputs_file=inputs_file)
+
+        assert outcomes == Counter({PanelBoundsOutcome.MADE: 3})
+        assert not failed
+        assert all(job.dest_file.is_file() for job in jobs)
+        assert load_panel_bounds_inputs(inputs_file) == {
+            str(job.dest_file): get_inputs_hash(job.srce_file, job.srce_panels_bounds_override_dir)
+            for job in jobs
+        }
+
+    def test_a_second_run_skips_every_page(self, tmp_path: Path) -> None:
+        jobs = make_jobs(tmp_path, ["001", "002"])
+        inputs_file = tmp_path / "inputs.json"
+        run_panel_bounds_jobs(jobs, force=False, inputs_file=inputs_file)
+
+        outcomes, _ = run_panel_bounds_jobs(jobs, force=False, inputs_file=inputs_file)
+
+        assert outcomes == Counter({PanelBoundsOutcome.UNCHANGED: 2})
+
+    def test_each_outcome_is_counted_and_the_failures_named(self, tmp_path: Path) -> None:
+        made, linked, missing = make_jobs(tmp_path, ["001", "002", "003"])
+        home_file = linked.srce_file.with_name("176.png")
+        home_file.write_text("the home volume's page")
+        linked.srce_file.unlink()
+        linked.srce_file.symlink_to(home_file)
+        missing.srce_file.unlink()
+
+        outcomes, failed = run_panel_bounds_jobs([made, linked, missing], force=False)
+
+        assert outcomes == Counter(
+            {
+                PanelBoundsOutcome.MADE: 1,
+                PanelBoundsOutcome.LINKED: 1,
+                PanelBoundsOutcome.FAILED: 1,
+            }
+        )
+        assert failed == [missing.srce_file]
+
+    def test_a_page_that_never_comes_back_is_a_failure(self, tmp_path: Path) -> None:
+        """Not the end of the run: the other pages are still made and recorded."""
+        sent, lost = make_jobs(tmp_path, ["001", "002"])
+        lost = lost._replace(bounding_box_processor=as_processor(UnpicklableProcessor()))
+        inputs_file = tmp_path / "inputs.json"
+
+        outcomes, failed = run_panel_bounds_jobs([sent, lost], force=False, inputs_file=inputs_file)
+
+        assert outcomes == Counter({PanelBoundsOutcome.MADE: 1, PanelBoundsOutcome.FAILED: 1})
+        assert failed == [lost.srce_file]
+        assert list(load_panel_bounds_inputs(inputs_file)) == [str(sent.dest_file)]
+
+
+class TestInputsFile:
+    def test_it_reads_back_what_was_saved(self, tmp_path: Path) -> None:
+        inputs_file = tmp_path / "inputs.json"
+
+        save_panel_bounds_inputs(inputs_file, {"segments/001.json": "abc"})
+
+        assert load_panel_bounds_inputs(inputs_file) == {"segments/001.json": "abc"}
+        assert list(tmp_path.iterdir()) == [inputs_file]
+
+    def test_none_records_nothing(self, tmp_path: Path) -> None:
+        save_panel_bounds_inputs(None, {"segments/001.json": "abc"})
+
+        assert load_panel_bounds_inputs(None) == {}
+        assert not list(tmp_path.iterdir())
+
+    def test_a_missing_file_is_no_hashes(self, tmp_path: Path) -> None:
+        assert load_panel_bounds_inputs(tmp_path / "inputs.json") == {}
+
+    @pytest.mark.parametrize(
+        "text", ["not json", '{"version": 1}', '{"version": 1, "inputs": ["a", "b"]}']
+    )
+    def test_an_unreadable_file_is_no_hashes(self, tmp_path: Path, text: str) -> None:
+        inputs_file = tmp_path / "inputs.json"
+        inputs_file.write_text(text)
+
+        assert load_panel_bounds_inputs(inputs_file) == {}
+
+    def test_another_version_is_started_afresh(self, tmp_path: Path) -> None:
+        inputs_file = tmp_path / "inputs.json"
+        inputs_file.write_text(json.dumps({"version": 0, "inputs": {"a": "b"}}))
+
+        assert load_panel_bounds_inputs(inputs_file) == {}
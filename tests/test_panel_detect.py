@@ -0,0 +1,128 @@
+"""Tests for finding panels on a reduced copy of a page and refining them at full size.
+
+The reduced copy is only worth using if the boxes that come back are where a full size
+run would have put them, so that is what is checked here: on a drawn page whose borders
+are known to the pixel, with a stand-in for Kumiko that finds them on whatever it is
+given. Kumiko itself is not what is being tested.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from barks_comic_building.restore.panel_detect import (
+    PanelDetectMode,
+    get_panels_segment_info,
+    refine_panel_box,
+)
+
+# Two panels, as [x, y, w, h], with borders 3 pixels wide drawn inside each box.
+_PANELS = [[37, 41, 301, 219], [37, 290, 301, 183]]
+_PAGE_SIZE = (400, 520)
+_BORDER = 3
+# The gap between the two panels, as Kumiko reports it.
+_GUTTERS = [0, 28]
+
+
+def _draw_page(path: Path) -> np.ndarray:
+    page = np.full((_PAGE_SIZE[1], _PAGE_SIZE[0]), 255, np.uint8)
+    for x, y, w, h in _PANELS:
+        cv.rectangle(page, (x, y), (x + w - 1, y + h - 1), 0, cv.FILLED)
+        inner = (x + _BORDER, y + _BORDER), (x + w - 1 - _BORDER, y + h - 1 - _BORDER)
+        cv.rectangle(page, *inner, 255, cv.FILLED)
+        # Some art inside, which must not be taken for a border.
+        cv.circle(page, (x + w // 2, y + h // 2), min(w, h) // 4, 40, -1)
+    cv.imwrite(str(path), page)
+
+    return page
+
+
+class _FakeProcessor:
+    """Find the drawn borders on whatever image it is given, as Kumiko would, roughly."""
+
+    def __init__(self) -> None:
+        self.seen: list[tuple[int, int]] = []
+
+    def get_panels_segment_info_from_kumiko(self, srce_file: Path, _override: Path) -> Any:
+        grey = cv.imread(str(srce_file), cv.IMREAD_GRAYSCALE)
+        height, width = grey.shape
+        self.seen.append((width, height))
+        scale = _PAGE_SIZE[0] / width
+        # A box a pixel or so off, as found on a reduced copy it would be.
+        panels = [[int(v / scale) + 1 for v in box] for box in _PANELS]
+
+        gutters = [round(v / scale) for v in _GUTTERS]
+
+        return {"panels": panels, "size": [width, height], "gutters": gutters}
+
+
+@pytest.fixture
+def page(tmp_path: Path) -> Path:
+    path = tmp_path / "page-01.png"
+    _draw_page(path)
+
+    return path
+
+
+class TestModes:
+    def test_scales(self) -> None:
+        assert [m.scale for m in PanelDetectMode] == [1, 2, 4]
+
+    def test_full_size_runs_kumiko_on_the_page_itself(self, page: Path, tmp_path: Path) -> None:
+        processor = _FakeProcessor()
+
+        get_panels_segment_info(processor, tmp_path, page, PanelDetectMode.FULL)
+
+        assert processor.seen == [_PAGE_SIZE]
+
+    def test_a_page_with_an_override_is_done_at_full_size(self, page: Path, tmp_path: Path) -> None:
+        processor = _FakeProcessor()
+
+        get_panels_segment_info(
+            processor, tmp_path, page, PanelDetectMode.QUARTER, has_override=True
+        )
+
+        assert processor.seen == [_PAGE_SIZE]
+
+    @pytest.mark.parametrize("mode", [PanelDetectMode.HALF, PanelDetectMode.QUARTER])
+    def test_a_reduced_copy_comes_back_at_full_size(
+        self, page: Path, tmp_path: Path, mode: PanelDetectMode
+    ) -> None:
+        processor = _FakeProcessor()
+
+        info = get_panels_segment_info(processor, tmp_path, page, mode)
+
+        assert processor.seen == [(_PAGE_SIZE[0] // mode.scale, _PAGE_SIZE[1] // mode.scale)]
+        assert info["size"] == list(_PAGE_SIZE)
+        assert info["panels"] == _PANELS
+        assert info["gutters"] == _GUTTERS
+
+
+class TestRefine:
+    def test_each_edge_moves_onto_the_border(self, page: Path) -> None:
+        grey = cv.imread(str(page), cv.IMREAD_GRAYSCALE)
+        x, y, w, h = _PANELS[0]
+
+        assert refine_panel_box(grey, [x + 3, y - 2, w - 5, h + 1], band=4) == _PANELS[0]
+
+    def test_an_edge_with_no_border_in_reach_stays_put(self, page: Path) -> None:
+        grey = cv.imread(str(page), cv.IMREAD_GRAYSCALE)
+        x, y, w, h = _PANELS[0]
+        box = [x + 20, y, w - 20, h]
+
+        assert refine_panel_box(grey, box, band=4) == box
+
+    def test_a_box_off_the_page_is_kept_on_it(self, page: Path) -> None:
+        grey = cv.imread(str(page), cv.IMREAD_GRAYSCALE)
+
+        x, y, w, h = refine_panel_box(grey, [-10, -10, 1000, 1000], band=2)
+
+        assert x >= 0
+        assert y >= 0
+        assert x + w <= _PAGE_SIZE[0]
+        assert y + h <= _PAGE_SIZE[1]
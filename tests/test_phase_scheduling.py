@@ -0,0 +1,199 @@
+"""Tests for streaming pages through the restore phases.
+
+The pages here do no work: they note which phases they ran and, where a test needs it,
+fail or ask for a stop part way through. What is under test is the scheduling - that every
+page still runs every phase after the ones it needs, that a page is handed back the moment it is done
+with, and that a stop leaves the same accounting a batch would. The phases are not a
+chain: a page's inpaint may start beside its smooth, and only what a phase needs has to
+come before it.
+
+They run in a real process pool, since that is where the copies of a page diverge from
+the parent's and where the accounting has to be brought back together.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from barks_comic_building.restore.batch_restore_pipeline import (
+    _PHASE_NEEDS,
+    _PHASES,
+    RunResult,
+    stream_restore,
+)
+from barks_comic_building.restore.run_stop import StopMode, request_stop
+
+if TYPE_CHECKING:
+    from barks_comic_building.restore.restore_pipeline import RestorePipeline
+
+PHASE_NAMES = [phase.name for phase in _PHASES]
+SLOW_SECONDS = 1.0
+
+
+class _FakePage:
+    """Has what the scheduler looks at. Records each phase it runs as a step."""
+
+    def __init__(
+        self,
+        index: int,
+        stop_file: Path | None = None,
+        fail_in: str | None = None,
+        stop_in: str | None = None,
+        slow_in: str | None = None,
+    ) -> None:
+        self.srce_upscale_file = Path(f"page-{index}.png")
+        self.stop_file = stop_file
+        self.errors_occurred = False
+        self.failed_step: str | None = None
+        self.stopped_early = False
+        self.step_seconds: dict[str, float] = {}
+        self.step_peak_rss_mb: dict[str, float] = {}
+        self.fail_in = fail_in
+        self.stop_in = stop_in
+        self.slow_in = slow_in
+
+    def _run(self, phase_name: str) -> None:
+        self.step_seconds[phase_name] = time.time()
+        if phase_name == self.slow_in:
+            time.sleep(SLOW_SECONDS)
+        if phase_name == self.fail_in:
+            self.errors_occurred = True
+            self.failed_step = phase_name
+        if phase_name == self.stop_in and self.stop_file is not None:
+            request_stop(self.stop_file.parent, StopMode.STEP)
+
+    def do_part1(self) -> None:
+        self._run(PHASE_NAMES[0])
+
+    def do_part2_memory_hungry(self) -> None:
+        self._run(PHASE_NAMES[1])
+
+    def do_part3(self) -> None:
+        self._run(PHASE_NAMES[2])
+
+    def do_part4_memory_hungry(self) -> None:
+        self._run(PHASE_NAMES[3])
+
+    def do_part5_memory_hungry(self) -> None:
+        self._run(PHASE_NAMES[4])
+
+
+def as_pipelines(pages: list[_FakePage]) -> list[RestorePipeline]:
+    return cast("list[RestorePipeline]", pages)
+
+
+class TestPhaseNeeds:
+    def test_the_list_is_an_order_the_needs_allow(self) -> None:
+        """Which is what lets a batch run the phases one after another as they are listed."""
+        for index, needs in enumerate(_PHASE_NEEDS):
+            assert all(need < index for need in needs)
+
+    def test_the_inpaint_needs_only_part_1(self) -> None:
+        assert _PHASE_NEEDS[3] == {0}
+
+    def test_the_last_phase_needs_both_branches(self) -> None:
+        assert _PHASE_NEEDS[4] == {2, 3}
+
+
+class TestStreaming:
+    def test_every_page_runs_every_phase_after_what_it_needs(self) -> None:
+        pages = [_FakePage(i) for i in range(5)]
+
+        run = stream_restore(as_pipelines(pages))
+
+        assert run == RunResult(started=set(range(5)))
+        for page in pages:
+            assert sorted(page.step_seconds) == sorted(PHASE_NAMES)
+            for index, needs in enumerate(_PHASE_NEEDS):
+                for need in needs:
+                    started = page.step_seconds[PHASE_NAMES[index]]
+                    assert page.step_seconds[PHASE_NAMES[need]] <= started
+
+    def test_the_inpaint_runs_beside_the_smooth(self) -> None:
+        page = _FakePage(0, slow_in=PHASE_NAMES[1])
+
+        stream_restore(as_pipelines([page]))
+
+        assert page.step_seconds[PHASE_NAMES[3]] < page.step_seconds[PHASE_NAMES[1]] + SLOW_SECONDS
+
+    def test_a_failed_branch_holds_the_page_until_the_other_is_back(self) -> None:
+        """The page is handed back once, and only after its slow inpaint has returned."""
+        page = _FakePage(0, fail_in=PHASE_NAMES[1], slow_in=PHASE_NAMES[3])
+        done_times: list[float] = []
+
+        run = stream_restore(
+            as_pipelines([page]),
+            on_page_done=lambda _i, _run, _start: done_times.append(time.time()),
+        )
+
+        assert run.failed == {0}
+        assert PHASE_NAMES[4] not in page.step_seconds
+        assert len(done_times) == 1
+        assert done_times[0] >= page.step_seconds[PHASE_NAMES[3]] + SLOW_SECONDS
+
+    def test_each_page_is_handed_back_once(self) -> None:
+        done: list[int] = []
+
+        stream_restore(
+            as_pipelines([_FakePage(i) for i in range(5)]),
+            on_page_done=lambda i, _run, _start: done.append(i),
+        )
+
+        assert sorted(done) == list(range(5))
+
+    def test_a_failed_page_goes_no_further(self) -> None:
+        pages = [_FakePage(0, fail_in=PHASE_NAMES[0]), _FakePage(1)]
+
+        run = stream_restore(as_pipelines(pages))
+
+        assert run.failed == {0}
+        assert list(pages[0].step_seconds) == PHASE_NAMES[:1]
+        assert pages[0].failed_step == PHASE_NAMES[0]
+        assert sorted(pages[1].step_seconds) == sorted(PHASE_NAMES)
+
+    def test_the_in_flight_cap_holds_new_pages_back(self) -> None:
+        """With a cap of one, each page only starts once the one before is done."""
+        done_times: dict[int, float] = {}
+        start_times: dict[int, float] = {}
+
+        def on_done(i: int, _run: RunResult, start: float) -> None:
+            done_times[i] = time.time()
+            start_times[i] = start
+
+        stream_restore(
+            as_pipelines([_FakePage(i) for i in range(3)]), max_in_flight=1, on_page_done=on_done
+        )
+
+        assert start_times[1] >= done_times[0]
+        assert start_times[2] >= done_times[1]
+
+
+class TestStopping:
+    def test_a_stop_before_the_run_leaves_every_page_untouched(self, tmp_path: Path) -> None:
+        stop_file = tmp_path / "STOP"
+        request_stop(tmp_path)
+        pages = [_FakePage(i, stop_file) for i in range(3)]
+        done: list[int] = []
+
+        run = stream_restore(
+            as_pipelines(pages), on_page_done=lambda i, _run, _start: done.append(i)
+        )
+
+        assert run.untouched == {0, 1, 2}
+        assert not run.started
+        assert sorted(done) == [0, 1, 2]
+        assert all(not page.step_seconds for page in pages)
+
+    def test_a_step_stop_leaves_the_page_under_way_unfinished(self, tmp_path: Path) -> None:
+        """The same accounting as a batch: begun is unfinished, never begun is untouched."""
+        stop_file = tmp_path / "STOP"
+        pages = [_FakePage(0, stop_file, stop_in=PHASE_NAMES[0])]
+        pages += [_FakePage(i, stop_file) for i in (1, 2)]
+
+        run = stream_restore(as_pipelines(pages), max_in_flight=1)
+
+        assert run.unfinished == {0}
+        assert run.untouched == {1, 2}
+        assert list(pages[0].step_seconds) == PHASE_NAMES[:1]
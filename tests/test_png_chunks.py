@@ -0,0 +1,391 @@
+"""Tests for reading and writing a png's text chunks without Pillow.
+
+`read_png_text` replaced Pillow as the way every status scan reads a page's provenance,
+on the promise that it reads exactly what Pillow's ``info`` held, so that is most of what
+is pinned here: for each of the three text chunk types, and for the files Pillow refuses.
+The rest is what the old IEND check did, which now happens in the same open.
+
+`splice_png_text` replaced a full decode and re-encode as the way a page is stamped, on
+the promise that the image data comes through it byte for byte. That is checked on the
+bytes themselves, not on the decoded pixels, which would pass a re-encode too.
+
+`check_png_image_data` replaced a full decode as the way a written page is proved
+readable, on the promise that it refuses whatever a decode would. So each way the image
+data can be wrong is built here by hand, with every crc correct but the one being tested,
+and the decode is asked to agree.
+"""
+
+from __future__ import annotations
+
+import stat
+import zlib
+from typing import TYPE_CHECKING
+
+import pytest
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from barks_comic_building.restore.png_chunks import (
+    PNG_SIGNATURE,
+    PngHeader,
+    check_png_image_data,
+    iter_png_chunks,
+    read_png_header,
+    read_png_text,
+    splice_png_text,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _read_with_pillow(png_file: Path) -> dict[str, str]:
+    with Image.open(str(png_file)) as image:
+        return {k: v for k, v in image.info.items() if isinstance(v, str)}
+
+
+@pytest.fixture
+def png(tmp_path: Path) -> Path:
+    """Return a png carrying one of each kind of text chunk, and a non-ascii one."""
+    path = tmp_path / "page.png"
+    info = PngInfo()
+    info.add_text("BARKS:Plain", "tEXt value")
+    info.add_text("BARKS:Squeezed", "zTXt value " * 20, zip=True)
+    info.add_itxt("BARKS:International", "iTXt value é中", lang="en", tkey="Intl")
+    info.add_itxt("BARKS:Compressed", "compressed iTXt " * 20, zip=True)
+    info.add_text("Software", "some other tool")
+    Image.new("RGB", (32, 32)).save(str(path), pnginfo=info)
+
+    return path
+
+
+def _insert_chunk(png: Path, chunk_type: bytes, data: bytes, crc: int | None = None) -> None:
+    """Put a chunk in straight after IHDR, the way no writer here would."""
+    whole = png.read_bytes()
+    ihdr_end = len(PNG_SIGNATURE) + 8 + 13 + 4
+    crc = zlib.crc32(chunk_type + data) if crc is None else crc
+    chunk = len(data).to_bytes(4, "big") + chunk_type + data + crc.to_bytes(4, "big")
+    png.write_bytes(whole[:ihdr_end] + chunk + whole[ihdr_end:])
+
+
+class TestAgreesWithPillow:
+    def test_every_kind_of_text_chunk(self, png: Path) -> None:
+        text = read_png_text(png)
+
+        assert text == _read_with_pillow(png)
+        assert text["BARKS:International"] == "iTXt value é中"
+
+    def test_a_png_with_no_text(self, tmp_path: Path) -> None:
+        path = tmp_path / "bare.png"
+        Image.new("L", (8, 8)).save(str(path))
+
+        assert read_png_text(path) == _read_with_pillow(path) == {}
+
+    def test_a_repeated_keyword_keeps_the_later_value(self, png: Path) -> None:
+        _insert_chunk(png, b"tEXt", b"BARKS:Plain\0earlier")
+
+        assert read_png_text(png)["BARKS:Plain"] == "tEXt value"
+        assert read_png_text(png) == _read_with_pillow(png)
+
+    def test_a_text_chunk_with_no_separator_is_a_keyword_with_no_text(self, png: Path) -> None:
+        _insert_chunk(png, b"tEXt", b"BARKS:Lonely")
+
+        assert read_png_text(png)["BARKS:Lonely"] == ""
+        assert read_png_text(png) == _read_with_pillow(png)
+
+    def test_text_after_the_image_data_is_not_read(self, png: Path) -> None:
+        """Neither reads past the image data, which is the point of both."""
+        whole = png.read_bytes()
+        iend = len(whole) - 12
+        data = b"BARKS:Late\0too late"
+        chunk = len(data).to_bytes(4, "big") + b"tEXt" + data
+        chunk += zlib.crc32(b"tEXt" + data).to_bytes(4, "big")
+        png.write_bytes(whole[:iend] + chunk + whole[iend:])
+
+        assert "BARKS:Late" not in read_png_text(png)
+        assert read_png_text(png) == _read_with_pillow(png)
+
+    def test_compressed_chunks_that_will_not_inflate(self, png: Path) -> None:
+        _insert_chunk(png, b"zTXt", b"BARKS:Bad\0\0not zlib")
+        _insert_chunk(png, b"iTXt", b"BARKS:AlsoBad\0\1\0en\0\0not zlib")
+
+        assert read_png_text(png)["BARKS:Bad"] == ""
+        assert "BARKS:AlsoBad" not in read_png_text(png)
+        assert read_png_text(png) == _read_with_pillow(png)
+
+
+class TestRefused:
+    """Files Pillow will not open - raising either error the old read caught - have none."""
+
+    def test_a_bad_crc(self, png: Path) -> None:
+        _insert_chunk(png, b"tEXt", b"BARKS:Bad\0crc", crc=0)
+
+        with pytest.raises((OSError, ValueError)):
+            _read_with_pillow(png)
+        assert read_png_text(png) == {}
+
+    def test_a_compressed_chunk_that_inflates_too_far(self, png: Path) -> None:
+        _insert_chunk(png, b"zTXt", b"BARKS:Bomb\0\0" + zlib.compress(b"x" * 2 * 1024 * 1024))
+
+        with pytest.raises((OSError, ValueError)):
+            _read_with_pillow(png)
+        assert read_png_text(png) == {}
+
+    def test_not_a_png(self, tmp_path: Path) -> None:
+        path = tmp_path / "not.png"
+        path.write_bytes(b"not a png at all, though long enough to have a tail")
+
+        assert read_png_text(path) == {}
+
+
+class TestIncomplete:
+    def test_a_truncated_png_has_no_text(self, png: Path) -> None:
+        whole = png.read_bytes()
+        png.write_bytes(whole[: len(whole) - 1])
+
+        assert read_png_text(png) == {}
+
+    def test_an_empty_file_has_no_text(self, tmp_path: Path) -> None:
+        path = tmp_path / "empty.png"
+        path.touch()
+
+        assert read_png_text(path) == {}
+
+    def test_a_missing_file_has_no_text(self, tmp_path: Path) -> None:
+        assert read_png_text(tmp_path / "gone.png") == {}
+
+
+class TestWalk:
+    def test_it_stops_at_the_image_data(self, png: Path) -> None:
+        chunk_types = [t for t, _, _ in iter_png_chunks(png.read_bytes())]
+
+        assert chunk_types[0] == b"IHDR"
+        assert chunk_types[-1] == b"IDAT"
+        assert b"IEND" not in chunk_types
+
+    def test_it_refuses_a_file_that_ends_before_the_image_data(self, png: Path) -> None:
+        with pytest.raises(ValueError, match="ends before"):
+            list(iter_png_chunks(png.read_bytes()[:40]))
+
+
+def _image_data_onwards(png: Path) -> bytes:
+    """Return the file from its first IDAT chunk to the end, chunk headers and all."""
+    whole = png.read_bytes()
+    *_, (_, idat_start, _) = iter_png_chunks(whole)
+
+    return whole[idat_start - 8 :]
+
+
+class TestSplice:
+    def test_the_image_data_comes_through_byte_for_byte(self, png: Path) -> None:
+        before = _image_data_onwards(png)
+
+        splice_png_text(png, {"BARKS:Restore recipe id": "abc123"})
+
+        assert _image_data_onwards(png) == before
+        assert png.read_bytes().endswith(before)
+
+    def test_the_text_reads_back_through_both_readers(self, png: Path) -> None:
+        splice_png_text(png, {"BARKS:Restore recipe id": "abc123", "BARKS:Wide": "é中"})
+
+        assert read_png_text(png) == _read_with_pillow(png)
+        assert read_png_text(png)["BARKS:Restore recipe id"] == "abc123"
+        assert read_png_text(png)["BARKS:Wide"] == "é中"
+
+    def test_every_crc_is_right(self, png: Path) -> None:
+        """The walk checks each crc ahead of the image data, and Pillow's verify the rest."""
+        splice_png_text(png, {"BARKS:Restore recipe id": "abc123"})
+
+        list(iter_png_chunks(png.read_bytes()))
+        with Image.open(str(png)) as image:
+            image.verify()
+
+    def test_a_keyword_already_there_is_replaced_in_whatever_chunk_it_was(
+        self, png: Path
+    ) -> None:
+        splice_png_text(
+            png, {"BARKS:Plain": "new", "BARKS:Squeezed": "new", "BARKS:International": "new"}
+        )
+
+        text = read_png_text(png)
+        assert text["BARKS:Plain"] == text["BARKS:Squeezed"] == "new"
+        assert text["BARKS:International"] == "new"
+        keywords = [
+            png.read_bytes()[start:end].partition(b"\0")[0]
+            for chunk_type, start, end in iter_png_chunks(png.read_bytes())
+            if chunk_type in (b"tEXt", b"zTXt", b"iTXt")
+        ]
+        assert len(keywords) == len(set(keywords))
+
+    def test_the_other_chunks_are_kept(self, png: Path) -> None:
+        before = read_png_text(png)
+
+        splice_png_text(png, {"BARKS:New": "value"})
+
+        assert read_png_text(png) == before | {"BARKS:New": "value"}
+
+    def test_the_file_keeps_its_mode(self, png: Path) -> None:
+        png.chmod(0o640)
+
+        splice_png_text(png, {"BARKS:New": "value"})
+
+        assert stat.S_IMODE(png.stat().st_mode) == 0o640
+
+    def test_an_unfinished_png_is_refused_and_left_as_it_was(self, png: Path) -> None:
+        truncated = png.read_bytes()[:-1]
+        png.write_bytes(truncated)
+
+        with pytest.raises(ValueError, match="finished"):
+            splice_png_text(png, {"BARKS:New": "value"})
+
+        assert png.read_bytes() == truncated
+        assert list(png.parent.iterdir()) == [png]
+
+    def test_a_keyword_a_png_cannot_hold_is_refused(self, png: Path) -> None:
+        with pytest.raises(ValueError, match="1 to 79"):
+            splice_png_text(png, {"": "value"})
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + data)
+    return len(data).to_bytes(4, "big") + chunk_type + data + crc.to_bytes(4, "big")
+
+
+def _write_png(
+    path: Path, image_data: bytes, size: tuple[int, int] = (8, 4), *, interlaced: bool = False
+) -> Path:
+    """Write an RGB png whose compressed image data is exactly `image_data`, inflated."""
+    ihdr = size[0].to_bytes(4, "big") + size[1].to_bytes(4, "big") + bytes([8, 2, 0, 0])
+    ihdr += bytes([1 if interlaced else 0])
+    path.write_bytes(
+        PNG_SIGNATURE
+        + _chunk(b"IHDR", ihdr)
+        + _chunk(b"IDAT", zlib.compress(image_data))
+        + _chunk(b"IEND", b"")
+    )
+
+    return path
+
+
+def _rows(num_rows: int, width: int = 8, filter_type: int = 0) -> bytes:
+    return (bytes([filter_type]) + bytes(range(width * 3))) * num_rows
+
+
+def _pillow_refuses(path: Path) -> bool:
+    try:
+        with Image.open(str(path)) as image:
+            image.load()
+    except (OSError, SyntaxError, ValueError):
+        return True
+
+    return False
+
+
+class TestCheckImageData:
+    def test_a_sound_png_and_its_rows(self, tmp_path: Path) -> None:
+        png = _write_png(tmp_path / "page.png", _rows(4))
+        handed_on: list[bytes] = []
+
+        header = check_png_image_data(png, handed_on.append)
+
+        assert header == PngHeader(8, 4, 8, 2, interlaced=False)
+        assert header == read_png_header(png)
+        assert b"".join(handed_on) == _rows(4)
+        assert not _pillow_refuses(png)
+
+    def test_pillows_own_pngs(self, png: Path) -> None:
+        assert check_png_image_data(png).width == 32
+
+    def test_rows_are_handed_on_whole_across_many_windows(self, tmp_path: Path) -> None:
+        """Four megabytes inflated, so the rows straddle the inflate's windows."""
+        png = tmp_path / "big.png"
+        Image.effect_noise((1000, 1400), 64).convert("RGB").save(str(png))
+        row_lengths: set[int] = set()
+
+        check_png_image_data(png, lambda rows: row_lengths.add(len(rows) % 3001))
+
+        assert row_lengths == {0}
+
+    def test_a_damaged_idat(self, tmp_path: Path) -> None:
+        """Volume 1's page 144. Refused as it is inflated, before its crc is reached."""
+        png = _write_png(tmp_path / "page.png", _rows(4))
+        data = bytearray(png.read_bytes())
+        data[data.index(b"IDAT") + 10] ^= 0xFF
+        png.write_bytes(bytes(data))
+
+        with pytest.raises(ValueError, match="inflate"):
+            check_png_image_data(png)
+        assert _pillow_refuses(png)
+
+    def test_a_damaged_chunk_fails_its_crc(self, tmp_path: Path) -> None:
+        png = _write_png(tmp_path / "page.png", _rows(4))
+        data = bytearray(png.read_bytes())
+        data[data.index(b"IDAT") - 5] ^= 0xFF
+        png.write_bytes(bytes(data))
+
+        with pytest.raises(ValueError, match="IHDR.*crc"):
+            check_png_image_data(png)
+
+    def test_a_stream_that_will_not_inflate(self, tmp_path: Path) -> None:
+        png = tmp_path / "page.png"
+        ihdr = bytes([0, 0, 0, 8, 0, 0, 0, 4, 8, 2, 0, 0, 0])
+        damaged = bytearray(zlib.compress(_rows(4)))
+        damaged[3] ^= 0xFF
+        png.write_bytes(
+            PNG_SIGNATURE
+            + _chunk(b"IHDR", ihdr)
+            + _chunk(b"IDAT", bytes(damaged))
+            + _chunk(b"IEND", b"")
+        )
+
+        with pytest.raises(ValueError, match="inflate"):
+            check_png_image_data(png)
+        assert _pillow_refuses(png)
+
+    def test_too_few_rows(self, tmp_path: Path) -> None:
+        """Stricter than Pillow, which leaves the rows that never came as black."""
+        png = _write_png(tmp_path / "page.png", _rows(3))
+
+        with pytest.raises(ValueError, match="1 row"):
+            check_png_image_data(png)
+        assert not _pillow_refuses(png)
+
+    def test_too_many_rows(self, tmp_path: Path) -> None:
+        png = _write_png(tmp_path / "page.png", _rows(5))
+
+        with pytest.raises(ValueError, match="more than"):
+            check_png_image_data(png)
+
+    def test_a_filter_that_does_not_exist(self, tmp_path: Path) -> None:
+        png = _write_png(tmp_path / "page.png", _rows(4, filter_type=5))
+
+        with pytest.raises(ValueError, match="filter type 5"):
+            check_png_image_data(png)
+        assert _pillow_refuses(png)
+
+    def test_a_file_cut_short(self, tmp_path: Path) -> None:
+        png = _write_png(tmp_path / "page.png", _rows(4))
+        png.write_bytes(png.read_bytes()[:-12])
+
+        with pytest.raises(ValueError, match="IEND"):
+            check_png_image_data(png)
+
+    def test_a_sound_interlaced_png(self, tmp_path: Path) -> None:
+        # The passes of an 8x4 image: 1x1, 1x1, 2x1, 4x1, 4x2 and 8x2 pixels. It is too
+        # short for the third, which starts on the fifth row.
+        passes = [(1, 1), (1, 1), (2, 1), (4, 1), (4, 2), (8, 2)]
+        image_data = b"".join(_rows(rows, width) for width, rows in passes)
+        png = _write_png(tmp_path / "page.png", image_data, interlaced=True)
+        handed_on: list[bytes] = []
+
+        assert check_png_image_data(png, handed_on.append).interlaced
+        assert handed_on == []
+        assert not _pillow_refuses(png)
+
+    def test_an_interlaced_png_a_pass_short(self, tmp_path: Path) -> None:
+        passes = [(1, 1), (1, 1), (2, 1), (4, 1), (4, 2)]
+        image_data = b"".join(_rows(rows, width) for width, rows in passes)
+        png = _write_png(tmp_path / "page.png", image_data, interlaced=True)
+
+        with pytest.raises(ValueError, match="2 row"):
+            check_png_image_data(png)
@@ -23,7 +23,7 @@ from comic_utils.pil_image_utils import METADATA_PROPERTY_GROUP, add_png_metadat
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 
-from barks_comic_building.restore.image_io import read_png_metadata
+from barks_comic_building.restore.image_io import read_png_metadata, splice_png_metadata
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -74,6 +74,16 @@ class TestRoundTrip:
     def test_a_missing_file_reads_as_empty(self, tmp_path: Path) -> None:
         assert read_png_metadata(tmp_path / "gone.png") == {}
 
+    def test_spliced_metadata_comes_back_the_same_way(self, png: Path) -> None:
+        """The splice writes under the prefix, as `add_png_metadata` does."""
+        splice_png_metadata(png, {"Upscale recipe id": "bbbbbbbbbbbb", "Upscaler": "waifu2x"})
+
+        assert read_png_metadata(png) == {
+            "Upscale recipe id": "bbbbbbbbbbbb",
+            "Upscale recipe": RECIPE_JSON,
+            "Upscaler": "waifu2x",
+        }
+
 
 class TestIncompleteFiles:
     """A page whose write was killed must not pass as finished."""
@@ -0,0 +1,90 @@
+"""Tests for scaling the restored page back down in process, in place of gmic.
+
+The in-process resize is not part of the recipe, so pages it makes sit beside pages gmic
+made and are never redone. That is only honest if the two are the same page to within
+`RESIZE_TOLERANCE`, and the same size exactly - the size is checked on every page and a
+page one pixel narrower than gmic made it would look like a different page to the build.
+
+gmic itself is not run here. What it made of a few pages, one a whole number of blocks
+across and two not, is checked in under ``fixtures/resize``, made with gmic 3.6.3 by the
+command `_resize_png_file` runs, and the in-process result is held to that. Its moving
+average resize truncates the mean of each block where `INTER_AREA` rounds it, so about
+half the values differ, each by one.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from barks_comic_building.restore.image_io import (
+    RESIZE_TOLERANCE,
+    ResizeBackend,
+    read_png_metadata,
+    resize_image,
+    resize_image_file,
+    write_cv_image_file,
+)
+
+SCALE = 4
+GMIC_FIXTURES_DIR = Path(__file__).parent / "fixtures" / "resize"
+
+
+def box_mean(image: np.ndarray, scale: int) -> np.ndarray:
+    height, width, channels = image.shape
+    blocks = image.reshape(height // scale, scale, width // scale, scale, channels)
+
+    return blocks.mean(axis=(1, 3))
+
+
+def make_page(height: int = 96, width: int = 128) -> np.ndarray:
+    return np.random.default_rng(3).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+class TestResizeImage:
+    def test_agrees_with_a_box_mean_within_the_tolerance(self) -> None:
+        page = make_page()
+
+        resized = resize_image(page, SCALE)
+
+        difference = np.abs(resized.astype(np.float64) - box_mean(page, SCALE))
+        assert difference.max() <= RESIZE_TOLERANCE
+
+    @pytest.mark.parametrize("size", ["64x48", "66x49", "67x50"])
+    def test_agrees_with_gmic_within_the_tolerance(self, size: str) -> None:
+        page = cv.imread(str(GMIC_FIXTURES_DIR / f"page-{size}.png"))
+        made_by_gmic = cv.imread(str(GMIC_FIXTURES_DIR / f"page-{size}-gmic.png"))
+
+        resized = resize_image(page, SCALE)
+
+        assert resized.shape == made_by_gmic.shape
+        difference = np.abs(resized.astype(np.int16) - made_by_gmic)
+        assert difference.max() <= RESIZE_TOLERANCE
+
+    @pytest.mark.parametrize(("width", "expected"), [(8702, 2176), (8704, 2176), (8701, 2175)])
+    def test_rounds_the_size_the_way_gmic_does(self, width: int, expected: int) -> None:
+        """Volume 8's page 162 is 8702 across, and gmic has always made it 2176."""
+        page = np.zeros((8, width, 3), dtype=np.uint8)
+
+        assert resize_image(page, SCALE).shape[1] == expected
+
+    def test_a_flat_page_stays_exactly_flat(self) -> None:
+        page = np.full((64, 64, 3), 173, dtype=np.uint8)
+
+        assert (resize_image(page, SCALE) == 173).all()  # noqa: PLR2004
+
+
+class TestResizeImageFile:
+    def test_writes_the_pixels_and_the_metadata_in_one_go(self, tmp_path: Path) -> None:
+        upscaled = tmp_path / "page-4x.png"
+        write_cv_image_file(upscaled, make_page())
+        resized = tmp_path / "page.png"
+
+        resize_image_file(
+            upscaled, SCALE, resized, {"Restore recipe id": "abc"}, ResizeBackend.OPENCV
+        )
+
+        assert read_png_metadata(resized) == {"Restore recipe id": "abc"}
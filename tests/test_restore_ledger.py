@@ -9,6 +9,9 @@ by pages that failed part way through.
 
 from __future__ import annotations
 
+import json
+from dataclasses import replace
+from statistics import median
 from typing import TYPE_CHECKING
 
 import pytest
@@ -20,7 +23,9 @@ from barks_comic_building.restore.restore_ledger import (
     OUTCOME_OK,
     OUTCOME_PRESENT,
     LedgerWriter,
+    TimingStats,
     read_ledger,
+    read_ledger_index,
 )
 from barks_comic_building.restore.restore_recipe import get_current_recipe
 
@@ -32,6 +37,19 @@ WORKERS = {"part 2": 6, "part 4": 4}
 # Named so the assertions read as "both of them" rather than as a bare literal.
 TWO = 2
 
+MEDIAN_CASES = [[300.0], [300.0, 200.0], [90.5, 300.0, 4000.0, 271.3]]
+
+
+def assert_same_stats(index_stats: TimingStats | None, ledger_stats: TimingStats | None) -> None:
+    """The very same figures, but for the index's median, which is only within 1%."""
+    if ledger_stats is None:
+        assert index_stats is None
+        return
+
+    assert index_stats is not None
+    assert replace(index_stats, median_seconds=ledger_stats.median_seconds) == ledger_stats
+    assert index_stats.median_seconds == pytest.approx(ledger_stats.median_seconds, rel=0.01)
+
 
 @pytest.fixture
 def ledger_file(tmp_path: Path) -> Path:
@@ -169,6 +187,29 @@ class TestTimings:
 
         assert read_ledger(ledger_file).timing_stats() is None
 
+    @pytest.mark.parametrize("seconds", MEDIAN_CASES)
+    def test_the_full_read_gives_the_exact_median(
+        self, ledger_file: Path, seconds: list[float]
+    ) -> None:
+        write_pages(ledger_file, [(str(110 + i), OUTCOME_OK, t) for i, t in enumerate(seconds)])
+
+        stats = read_ledger(ledger_file).timing_stats()
+
+        assert stats is not None
+        assert stats.median_seconds == median(seconds)
+
+    @pytest.mark.parametrize("seconds", MEDIAN_CASES)
+    def test_the_index_median_is_within_a_percent(
+        self, ledger_file: Path, seconds: list[float]
+    ) -> None:
+        """It is read from bucketed times, not the times themselves, so it is only close."""
+        write_pages(ledger_file, [(str(110 + i), OUTCOME_OK, t) for i, t in enumerate(seconds)])
+
+        stats = read_ledger_index(ledger_file).timing_stats()
+
+        assert stats is not None
+        assert stats.median_seconds == pytest.approx(median(seconds), rel=0.01)
+
 
 class TestLatestByPage:
     def test_a_later_attempt_replaces_an_earlier_one(self, ledger_file: Path) -> None:
@@ -298,3 +339,119 @@ class TestCopiedPages:
         assert stats is not None
         assert stats.count == 1
         assert stats.mean_seconds == pytest.approx(300.0)
+
+
+class TestMemoryMeasurements:
+    """What the batch driver sizes its memory-hungry phases from."""
+
+    def write_measured(
+        self, ledger_file: Path, page: str, megapixels: float, outcome: str = OUTCOME_OK
+    ) -> None:
+        recipe = get_current_recipe(4, do_palette_snap=True)
+        with LedgerWriter(ledger_file, recipe, WORKERS) as writer:
+            writer.write_page(
+                title="Camp Counselor",
+                volume=9,
+                page=page,
+                outcome=outcome,
+                started="2026-07-29T12:00:00+10:00",
+                total_seconds=300.0,
+                step_seconds={"smooth": 150.0},
+                megapixels=megapixels,
+                step_peak_rss_mb={"smooth": 4200.4},
+            )
+
+    def test_the_peaks_and_the_page_size_come_back(self, ledger_file: Path) -> None:
+        self.write_measured(ledger_file, "110", 104.4)
+
+        record = read_ledger(ledger_file).pages[0]
+
+        assert record.megapixels == pytest.approx(104.4)
+        assert record.step_peak_rss_mb == {"smooth": 4200.0}
+
+    def test_a_failed_page_still_counts(self, ledger_file: Path) -> None:
+        """Unlike for the timings: what it took before it failed is still what it took."""
+        self.write_measured(ledger_file, "110", 104.4, OUTCOME_FAILED)
+
+        assert read_ledger(ledger_file).memory_measurements() == [(104.4, {"smooth": 4200.0})]
+
+    def test_records_from_before_the_measurement_are_left_out(self, ledger_file: Path) -> None:
+        """Older records carry neither field, and read back as unmeasured."""
+        write_pages(ledger_file, [("110", OUTCOME_OK, 270.0)])
+
+        ledger = read_ledger(ledger_file)
+
+        assert ledger.pages[0].megapixels == 0.0
+        assert ledger.memory_measurements() == []
+
+
+class TestIndex:
+    """The index has to give the answers a full read would, however the ledger grew."""
+
+    def assert_agrees(self, ledger_file: Path) -> None:
+        ledger = read_ledger(ledger_file)
+        index = read_ledger_index(ledger_file)
+
+        assert index.latest_by_page() == ledger.latest_by_page()
+        assert_same_stats(index.timing_stats(), ledger.timing_stats())
+        for recipe_id in {page.recipe_id for page in ledger.pages}:
+            assert_same_stats(index.timing_stats(recipe_id), ledger.timing_stats(recipe_id))
+        assert index.memory_measurements() == ledger.memory_measurements()
+        for recipe_id in {page.recipe_id for page in ledger.pages}:
+            assert index.recipe_for(recipe_id) == ledger.recipe_for(recipe_id)
+
+    def test_it_agrees_with_a_full_read(self, ledger_file: Path) -> None:
+        write_pages(ledger_file, [("110", OUTCOME_FAILED, 90.0), ("111", OUTCOME_OK, 270.0)])
+        write_pages(ledger_file, [("110", OUTCOME_OK, 300.0), ("112", OUTCOME_COPIED, 0.1)])
+
+        self.assert_agrees(ledger_file)
+
+    def test_only_what_was_appended_is_read(self, ledger_file: Path) -> None:
+        write_pages(ledger_file, [("110", OUTCOME_OK, 270.0)])
+        read_ledger_index(ledger_file)
+
+        write_pages(ledger_file, [("111", OUTCOME_OK, 300.0)])
+
+        # The new run's record and its page.
+        assert read_ledger_index(ledger_file).num_new_records == TWO
+        assert read_ledger_index(ledger_file).num_new_records == 0
+        self.assert_agrees(ledger_file)
+
+    def test_a_line_still_being_written_waits_for_its_newline(self, ledger_file: Path) -> None:
+        write_pages(ledger_file, [("110", OUTCOME_OK, 270.0)])
+        with ledger_file.open("a", encoding="utf-8") as f:
+            f.write('{"type": "page", "ti')
+
+        index = read_ledger_index(ledger_file)
+
+        assert index.offset < ledger_file.stat().st_size
+        assert list(index.latest_by_page()) == [("Camp Counselor", "110")]
+
+    def test_a_replaced_ledger_is_indexed_afresh(self, ledger_file: Path) -> None:
+        write_pages(ledger_file, [("110", OUTCOME_OK, 270.0), ("111", OUTCOME_OK, 300.0)])
+        read_ledger_index(ledger_file)
+
+        ledger_file.unlink()
+        write_pages(ledger_file, [("112", OUTCOME_OK, 280.0)])
+
+        assert list(read_ledger_index(ledger_file).latest_by_page()) == [("Camp Counselor", "112")]
+        self.assert_agrees(ledger_file)
+
+    def test_it_does_not_grow_as_pages_are_redone(self, ledger_file: Path) -> None:
+        """What it keeps is per page and per recipe, not per run, so years of runs stay cheap."""
+        for _ in range(10):
+            write_pages(ledger_file, [("110", OUTCOME_OK, 270.0), ("111", OUTCOME_FAILED, 30.0)])
+
+        index = read_ledger_index(ledger_file)
+        state = json.loads(index.index_file.read_text())["state"]
+
+        assert len(state["latest"]) == TWO
+        assert len(state["recipes"]) == 1
+        assert [timings["buckets"] for timings in state["timings"].values()] == [[[283, 10]]]
+        self.assert_agrees(ledger_file)
+
+    def test_a_missing_ledger_indexes_as_empty(self, tmp_path: Path) -> None:
+        index = read_ledger_index(tmp_path / "not-there.jsonl")
+
+        assert index.latest_by_page() == {}
+        assert index.timing_stats() is None
@@ -0,0 +1,144 @@
+"""Tests for the cache the sweeps keep what they worked out from each file in.
+
+An entry that outlives a change to its file would have a sweep report a file as it used
+to be, so what is pinned here is that an entry is only ever answered for the file as it
+was, and that the cache holds the trees as they are now, not every file they once held.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from barks_comic_building.restore.stat_cache import StatCache, get_file_signature
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class NameCache(StatCache):
+    VERSION = 3
+    NAME = "name cache"
+
+
+def signature(path: Path) -> list[int]:
+    return get_file_signature(path.stat())
+
+
+class TestEntries:
+    def test_an_entry_is_answered_while_the_file_is_unchanged(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.png"
+        file.write_bytes(b"page")
+        cache = NameCache()
+        cache.record_entry(file, signature(file), None)
+
+        assert cache.get_entry(file, signature(file)) is None
+        assert (cache.num_recorded, cache.num_cached) == (1, 1)
+
+    def test_not_once_it_has_changed(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.png"
+        file.write_bytes(b"page")
+        cache = NameCache()
+        cache.record_entry(file, signature(file), "page")
+
+        file.write_bytes(b"a longer page")
+
+        with pytest.raises(KeyError):
+            cache.get_entry(file, signature(file))
+
+    def test_a_forgotten_file_is_worked_out_again(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.png"
+        file.write_bytes(b"page")
+        cache = NameCache()
+        cache.record_entry(file, signature(file), "page")
+
+        cache.forget(file)
+
+        with pytest.raises(KeyError):
+            cache.get_entry(file, signature(file))
+
+
+class TestSaving:
+    def test_it_comes_back_the_same(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.png"
+        file.write_bytes(b"page")
+        cache_file = tmp_path / "cache.json"
+        with NameCache(cache_file) as cache:
+            cache.record_entry(file, signature(file), {"recipe": "1"})
+
+        with NameCache(cache_file) as cache:
+            assert cache.get_entry(file, signature(file)) == {"recipe": "1"}
+
+    def test_another_version_is_started_afresh(self, tmp_path: Path) -> None:
+        file = tmp_path / "page.png"
+        file.write_bytes(b"page")
+        cache_file = tmp_path / "cache.json"
+        entries = {str(file): [signature(file), "page"]}
+        cache_file.write_text(json.dumps({"version": NameCache.VERSION - 1, "entries": entries}))
+
+        with NameCache(cache_file) as cache, pytest.raises(KeyError):
+            cache.get_entry(file, signature(file))
+
+    def test_files_no_longer_there_are_dropped(self, tmp_path: Path) -> None:
+        kept, deleted = tmp_path / "kept.png", tmp_path / "deleted.png"
+        cache_file = tmp_path / "cache.json"
+        with NameCache(cache_file) as cache:
+            for file in (kept, deleted):
+                file.write_bytes(b"page")
+                cache.record_entry(file, signature(file), file.name)
+
+        deleted.unlink()
+        new = tmp_path / "new.png"
+        new.write_bytes(b"page")
+        with NameCache(cache_file) as cache:
+            cache.record_entry(new, signature(new), new.name)
+
+        assert list(json.loads(cache_file.read_text())["entries"]) == [str(kept), str(new)]
+
+    def test_nothing_is_written_when_nothing_was_added(self, tmp_path: Path) -> None:
+        cache_file = tmp_path / "cache.json"
+
+        with NameCache(cache_file):
+            pass
+
+        assert not cache_file.exists()
+
+    def test_files_in_directories_not_swept_are_kept_unasked(self, tmp_path: Path) -> None:
+        volume_1, volume_2 = tmp_path / "volume-1", tmp_path / "volume-2"
+        cache_file = tmp_path / "cache.json"
+        with NameCache(cache_file) as cache:
+            for volume in (volume_1, volume_2):
+                volume.mkdir()
+                file = volume / "page.png"
+                file.write_bytes(b"page")
+                cache.record_entry(file, signature(file), file.name)
+
+        (volume_2 / "page.png").unlink()
+        new = volume_1 / "new.png"
+        new.write_bytes(b"page")
+        with NameCache(cache_file) as cache:
+            cache.record_entry(new, signature(new), new.name)
+
+        entries = json.loads(cache_file.read_text())["entries"]
+        assert str(volume_2 / "page.png") in entries
+
+    def test_a_swept_tree_drops_files_in_directories_gone_altogether(self, tmp_path: Path) -> None:
+        tree = tmp_path / "tree"
+        gone = tree / "gone" / "page.png"
+        gone.parent.mkdir(parents=True)
+        gone.write_bytes(b"page")
+        cache_file = tmp_path / "cache.json"
+        with NameCache(cache_file) as cache:
+            cache.record_entry(gone, signature(gone), gone.name)
+
+        gone.unlink()
+        gone.parent.rmdir()
+        kept = tree / "page.png"
+        kept.write_bytes(b"page")
+        with NameCache(cache_file) as cache:
+            cache.mark_swept([tree])
+            cache.record_entry(kept, signature(kept), kept.name)
+
+        assert list(json.loads(cache_file.read_text())["entries"]) == [str(kept)]
@@ -0,0 +1,151 @@
+"""Tests for the restore steps as a graph, and for running it.
+
+Two things are under test. That the graph the pipeline declares says what the steps
+actually need - the inpaint branch free of the smooth and the trace, and the two meeting
+at the overlay - and that the phases the batch driver runs are cut along it. And that the
+runner starts a step only once everything it reads has been written, runs the branches at
+once when asked, and starts nothing more once told to stop.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from barks_comic_building.restore.restore_pipeline import (
+    PART1_STEPS,
+    PART2_STEPS,
+    PART3_STEPS,
+    PART4_STEPS,
+    PART5_STEPS,
+    RESTORE_STEPS,
+    STEP_GENERATE_SVG,
+    STEP_INPAINT,
+    STEP_OVERLAY,
+    STEP_REMOVE_COLORS,
+    STEP_SMOOTH,
+    STEP_SNAP_PALETTE,
+)
+from barks_comic_building.restore.step_graph import (
+    StepNode,
+    get_step_dependencies,
+    get_step_order,
+    run_step_graph,
+)
+
+
+def _get_ancestors(step: str, dependencies: dict[str, set[str]]) -> set[str]:
+    ancestors: set[str] = set()
+    pending = [step]
+    while pending:
+        for parent in dependencies[pending.pop()]:
+            if parent not in ancestors:
+                ancestors.add(parent)
+                pending.append(parent)
+
+    return ancestors
+
+
+class TestRestoreSteps:
+    def test_the_inpaint_branch_needs_neither_the_smooth_nor_the_trace(self) -> None:
+        dependencies = get_step_dependencies(RESTORE_STEPS)
+
+        for step in (STEP_INPAINT, STEP_SNAP_PALETTE):
+            ancestors = _get_ancestors(step, dependencies)
+            assert STEP_REMOVE_COLORS in ancestors
+            assert not ancestors & {STEP_SMOOTH, STEP_GENERATE_SVG}
+
+    def test_the_branches_meet_at_the_overlay(self) -> None:
+        dependencies = get_step_dependencies(RESTORE_STEPS)
+
+        assert {STEP_GENERATE_SVG, STEP_SNAP_PALETTE} <= dependencies[STEP_OVERLAY]
+
+    def test_one_at_a_time_keeps_the_declared_order(self) -> None:
+        assert get_step_order(RESTORE_STEPS) == list(RESTORE_STEPS)
+
+    def test_the_phases_cover_every_step_once(self) -> None:
+        phases = [PART1_STEPS, PART2_STEPS, PART3_STEPS, PART4_STEPS, PART5_STEPS]
+
+        assert sorted(s for phase in phases for s in phase) == sorted(s.name for s in RESTORE_STEPS)
+
+    def test_each_phase_only_needs_the_phases_before_it(self) -> None:
+        dependencies = get_step_dependencies(RESTORE_STEPS)
+        done: set[str] = set()
+
+        for phase in (PART1_STEPS, PART2_STEPS, PART3_STEPS, PART4_STEPS, PART5_STEPS):
+            for step in phase:
+                assert dependencies[step] <= done | set(phase)
+            done |= set(phase)
+
+
+def _node(name: str, inputs: tuple[str, ...], outputs: tuple[str, ...]) -> StepNode:
+    return StepNode(name, "", inputs, outputs)
+
+
+# a -> b -> c, and a -> d, meeting at e.
+DIAMOND = [
+    _node("a", ("source",), ("a_out",)),
+    _node("b", ("a_out",), ("b_out",)),
+    _node("c", ("b_out",), ("c_out",)),
+    _node("d", ("a_out",), ("d_out",)),
+    _node("e", ("c_out", "d_out"), ("e_out",)),
+]
+
+
+class TestGraph:
+    def test_two_steps_writing_one_file_are_refused(self) -> None:
+        with pytest.raises(ValueError, match="written by both"):
+            get_step_dependencies([_node("a", (), ("out",)), _node("b", (), ("out",))])
+
+    def test_steps_that_need_each_other_are_refused(self) -> None:
+        with pytest.raises(ValueError, match="depend on each other"):
+            get_step_dependencies(
+                [_node("a", ("b_out",), ("a_out",)), _node("b", ("a_out",), ("b_out",))]
+            )
+
+    def test_a_file_no_given_step_writes_is_taken_as_there(self) -> None:
+        """As when a phase runs only the later steps."""
+        assert get_step_dependencies(DIAMOND[3:]) == {"d": set(), "e": {"d"}}
+
+
+class TestRunning:
+    def test_one_at_a_time_runs_in_order(self) -> None:
+        ran: list[str] = []
+
+        run_step_graph(DIAMOND, lambda node: ran.append(node.name), lambda: True)
+
+        assert ran == ["a", "b", "c", "d", "e"]
+
+    def test_each_step_starts_after_what_it_reads(self) -> None:
+        finished: dict[str, float] = {}
+        started: dict[str, float] = {}
+
+        def run(node: StepNode) -> None:
+            started[node.name] = time.monotonic()
+            time.sleep(0.01)
+            finished[node.name] = time.monotonic()
+
+        run_step_graph(DIAMOND, run, lambda: True, max_concurrent=2)
+
+        dependencies = get_step_dependencies(DIAMOND)
+        for step, parents in dependencies.items():
+            assert all(started[step] >= finished[parent] for parent in parents)
+
+    def test_the_branches_run_at_once(self) -> None:
+        """b and d each wait for the other, so they only finish if they run together."""
+        both_started = threading.Barrier(2, timeout=5)
+
+        def run(node: StepNode) -> None:
+            if node.name in {"b", "d"}:
+                both_started.wait()
+
+        run_step_graph(DIAMOND, run, lambda: True, max_concurrent=2)
+
+    def test_nothing_more_starts_once_told_to_stop(self) -> None:
+        ran: list[str] = []
+
+        run_step_graph(DIAMOND, lambda node: ran.append(node.name), lambda: False, max_concurrent=2)
+
+        assert ran == ["a"]
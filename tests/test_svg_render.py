@@ -0,0 +1,41 @@
+"""Tests for rendering the traced line art straight to an array.
+
+`svg_file_to_rgba_array` takes its pixels from cairo's surface instead of from the png
+`svg_file_to_png` writes, on the promise that they are the same pixels. The part that
+could break that is the antialiased edge, where cairo's premultiplied alpha has to be
+undone exactly as its png writer undoes it, so that is what the svg here is made of.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+from barks_comic_building.restore.image_io import svg_file_to_png, svg_file_to_rgba_array
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="37" height="23">
+  <circle cx="12" cy="11" r="8.3" fill="#204080"/>
+  <path d="M2 20 L35 3" stroke="#000" stroke-width="1.7" stroke-opacity="0.6"/>
+  <rect x="20.5" y="10.25" width="9.5" height="7" fill="#c03010" fill-opacity="0.35"/>
+</svg>
+"""
+
+
+def test_the_array_is_the_png(tmp_path: Path) -> None:
+    svg_file = tmp_path / "page.svg"
+    svg_file.write_text(SVG)
+    png_file = tmp_path / "page.png"
+    svg_file_to_png(svg_file, png_file)
+
+    rgba = svg_file_to_rgba_array(svg_file)
+
+    with Image.open(png_file) as png:
+        expected = np.asarray(png.convert("RGBA"))
+    assert rgba.shape == (23, 37, 4)
+    assert 0 < np.count_nonzero((rgba[..., 3] > 0) & (rgba[..., 3] < 255))
+    np.testing.assert_array_equal(rgba, expected)
@@ -0,0 +1,122 @@
+"""Tests for building several titles at once under one page budget.
+
+Two promises are checked here, as neither shows in a build that happens to go well. The
+first is that titles are finished - linked and summarised - in the order asked for,
+whichever worker gets there first, so a parallel build leaves the same trees a serial one
+would. The second is that the page budget holds across titles, not just within each:
+it is what stands between a wide build and running out of memory.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from typing import TYPE_CHECKING
+
+import pytest
+
+from barks_comic_building.build.title_scheduler import (
+    TitleBuildResult,
+    build_titles,
+    describe_throughput,
+    page_slot,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _build_after(seconds: float) -> TitleBuildResult:
+    time.sleep(seconds)
+    return TitleBuildResult(f"after {seconds}", ret_code=0, num_pages=2)
+
+
+def _build_or_raise(ret_code: int) -> TitleBuildResult:
+    if ret_code < 0:
+        msg = "worker blew up"
+        raise RuntimeError(msg)
+    return TitleBuildResult("title", ret_code=ret_code)
+
+
+def _build_holding_a_slot(pages_dir: Path) -> TitleBuildResult:
+    """Draw three pages, noting how many pages were being drawn at once, by anyone."""
+    most = 0
+    for _ in range(3):
+        with page_slot():
+            page = pages_dir / uuid.uuid4().hex
+            page.touch()
+            time.sleep(0.05)
+            most = max(most, len(list(pages_dir.iterdir())))
+            page.unlink()
+
+    return TitleBuildResult(str(pages_dir), ret_code=0, finish_args=most)
+
+
+class TestOrder:
+    def test_titles_are_finished_in_the_order_asked_for(self) -> None:
+        finished = []
+
+        def finish(seconds: float, _result: TitleBuildResult) -> int:
+            finished.append(seconds)
+            return 0
+
+        items = [("slow", 0.3), ("middling", 0.15), ("quick", 0.0)]
+        results = build_titles(items, _build_after, finish, max_titles=3)
+
+        assert finished == [0.3, 0.15, 0.0]
+        assert [r.title for r in results] == ["after 0.3", "after 0.15", "after 0.0"]
+
+    def test_a_failed_finish_fails_the_title(self) -> None:
+        results = build_titles([("one", 0.0)], _build_after, lambda _i, _r: 1, max_titles=1)
+
+        assert results[0].ret_code == 1
+
+
+class TestFailures:
+    def test_a_title_that_fails_is_not_finished_and_the_rest_are(self) -> None:
+        finished = []
+
+        def finish(item: int, _result: TitleBuildResult) -> int:
+            finished.append(item)
+            return 0
+
+        items = [("raises", -1), ("fails", 1), ("builds", 0)]
+        results = build_titles(items, _build_or_raise, finish, max_titles=2)
+
+        assert [r.ret_code for r in results] == [1, 1, 0]
+        assert results[0].title == "raises"
+        assert finished == [0]
+
+
+class TestPageBudget:
+    @pytest.mark.parametrize("page_budget", [1, 2])
+    def test_the_budget_holds_across_titles(self, tmp_path: Path, page_budget: int) -> None:
+        results = build_titles(
+            [(str(i), tmp_path) for i in range(4)],
+            _build_holding_a_slot,
+            lambda _i, _r: 0,
+            max_titles=4,
+            page_budget=page_budget,
+        )
+
+        assert max(r.finish_args for r in results) <= page_budget
+
+    def test_outside_a_worker_a_page_takes_no_slot(self) -> None:
+        with page_slot(), page_slot():
+            pass
+
+
+class TestThroughput:
+    def test_rates_are_over_the_wall_clock(self) -> None:
+        results = [
+            TitleBuildResult("a", 0, num_pages=30, bytes_written=30 * 1024 * 1024, seconds=6.0),
+            TitleBuildResult("b", 0, num_pages=10, bytes_written=10 * 1024 * 1024, seconds=4.0),
+            TitleBuildResult("c", 1, num_pages=99, bytes_written=99, seconds=1.0),
+        ]
+
+        lines = describe_throughput(results, wall_seconds=5.0)
+
+        assert lines[0] == "Built 2 of 3 title(s), 40 page(s), 40.0MB written, in 5.0s."
+        assert lines[1] == "Throughput: 8.00 pages/s, 8.00MB/s."
+        assert "2.0x the wall clock" in lines[2]
+        assert lines[3] == "Failed: c."
@@ -0,0 +1,221 @@
+"""Tests for the manifests two builds are compared by, file digest against file digest.
+
+The failure that matters is two files taken for the same when they are not: the
+comparison never opens a file whose digest matches, so a changed page would pass
+unlooked at. So what is pinned here is that a digest is trusted from the cache only
+while the file is exactly as it was, that every difference between two trees comes out,
+and that an archive's CRCs are the ones its build dir's files have.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import zipfile
+import zlib
+from typing import TYPE_CHECKING
+
+import pytest
+
+from barks_comic_building.build import tree_manifest
+from barks_comic_building.build.tree_manifest import (
+    FileDigest,
+    FileDigestCache,
+    ManifestDiff,
+    diff_manifests,
+    get_file_digest,
+    get_file_digests,
+    get_tree_manifest,
+    get_tree_manifests,
+    read_archive_crcs,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def unreadable_if_bad(file: Path) -> FileDigest:
+    if file.stem == "bad":
+        raise PermissionError(13, "Permission denied", str(file))
+    return get_file_digest(file)
+
+
+def write_tree(root: Path, files: dict[str, bytes]) -> Path:
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    return root
+
+
+class TestFileDigest:
+    def test_the_crc_is_the_one_a_zip_records(self, tmp_path: Path) -> None:
+        data = os.urandom(3_000_000)
+        file = write_tree(tmp_path, {"page.jpg": data}) / "page.jpg"
+
+        digest = get_file_digest(file)
+
+        assert digest.crc == zlib.crc32(data)
+        assert digest.size == len(data)
+
+    def test_one_byte_changes_it(self, tmp_path: Path) -> None:
+        write_tree(tmp_path, {"1.jpg": b"page", "2.jpg": b"pagf"})
+
+        assert get_file_digest(tmp_path / "1.jpg") != get_file_digest(tmp_path / "2.jpg")
+
+
+class TestCache:
+    def test_an_unchanged_file_is_not_read_again(self, tmp_path: Path) -> None:
+        file = write_tree(tmp_path, {"page.jpg": b"page"}) / "page.jpg"
+        cache = FileDigestCache()
+        get_file_digests([file], cache, num_workers=1)
+
+        digests = get_file_digests([file], cache, num_workers=1)
+
+        assert digests == {file: get_file_digest(file)}
+        assert (cache.num_hashed, cache.num_cached) == (1, 1)
+
+    def test_a_touched_file_is(self, tmp_path: Path) -> None:
+        file = write_tree(tmp_path, {"page.jpg": b"page"}) / "page.jpg"
+        cache = FileDigestCache()
+        get_file_digests([file], cache, num_workers=1)
+
+        file.write_bytes(b"gape")
+        stat = file.stat()
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert get_file_digests([file], cache, num_workers=1) == {file: get_file_digest(file)}
+        assert cache.num_cached == 0
+
+    def test_it_comes_back_the_same(self, tmp_path: Path) -> None:
+        file = write_tree(tmp_path, {"page.jpg": b"page"}) / "page.jpg"
+        cache_file = tmp_path / "cache.json"
+        with FileDigestCache(cache_file) as cache:
+            get_file_digests([file], cache, num_workers=1)
+
+        with FileDigestCache(cache_file) as cache:
+            digests = get_file_digests([file], cache, num_workers=1)
+
+        assert digests == {file: get_file_digest(file)}
+        assert cache.num_hashed == 0
+
+    def test_what_is_gone_from_a_swept_root_is_forgotten(self, tmp_path: Path) -> None:
+        """Otherwise every build dir a root ever held would stay in it."""
+        root = write_tree(tmp_path / "root", {"old/page.jpg": b"old page", "page.jpg": b"page"})
+        cache_file = tmp_path / "cache.json"
+        with FileDigestCache(cache_file) as cache:
+            get_tree_manifest(root, cache, num_workers=1)
+
+        (root / "old" / "page.jpg").unlink()
+        (root / "old").rmdir()
+        (root / "page.jpg").write_bytes(b"newer page")
+        with FileDigestCache(cache_file) as cache:
+            get_tree_manifest(root, cache, num_workers=1)
+
+        assert list(json.loads(cache_file.read_text())["entries"]) == [str(root / "page.jpg")]
+
+    def test_another_root_is_kept_without_asking_the_disk(self, tmp_path: Path) -> None:
+        """The cache is kept across every root, and a run compares only some of them."""
+        old_root = write_tree(tmp_path / "old", {"page.jpg": b"old page"})
+        new_root = write_tree(tmp_path / "new", {"page.jpg": b"new page"})
+        cache_file = tmp_path / "cache.json"
+        with FileDigestCache(cache_file) as cache:
+            get_tree_manifests([old_root, new_root], cache, num_workers=1)
+
+        (old_root / "page.jpg").unlink()
+        (new_root / "page.jpg").write_bytes(b"newer page")
+        with FileDigestCache(cache_file) as cache:
+            get_tree_manifest(new_root, cache, num_workers=1)
+
+        entries = json.loads(cache_file.read_text())["entries"]
+        assert sorted(entries) == sorted([str(old_root / "page.jpg"), str(new_root / "page.jpg")])
+
+    @pytest.mark.parametrize("text", ["not json", "[]", '{"version": 1}'])
+    def test_an_unreadable_cache_is_an_empty_one(self, tmp_path: Path, text: str) -> None:
+        file = write_tree(tmp_path, {"page.jpg": b"page"}) / "page.jpg"
+        cache_file = tmp_path / "cache.json"
+        cache_file.write_text(text)
+
+        with FileDigestCache(cache_file) as cache:
+            get_file_digests([file], cache, num_workers=1)
+
+        assert cache.num_hashed == 1
+
+
+class TestManifests:
+    def test_every_file_under_the_root(self, tmp_path: Path) -> None:
+        root = write_tree(tmp_path / "comic", {"info.txt": b"x", "images/01.jpg": b"page"})
+
+        manifest = get_tree_manifest(root, num_workers=2)
+
+        assert manifest.root == root
+        assert list(manifest.files) == ["images/01.jpg", "info.txt"]
+        assert manifest.files["info.txt"] == get_file_digest(root / "info.txt")
+
+    def test_several_roots_each_relative_to_its_own(self, tmp_path: Path) -> None:
+        root1 = write_tree(tmp_path / "1", {"images/01.jpg": b"page"})
+        root2 = write_tree(tmp_path / "2", {"images/01.jpg": b"page"})
+
+        manifest1, manifest2 = get_tree_manifests([root1, root2], num_workers=2)
+
+        assert manifest1.files == manifest2.files
+        assert (manifest1.root, manifest2.root) == (root1, root2)
+
+    def test_every_difference_comes_out(self, tmp_path: Path) -> None:
+        root1 = write_tree(
+            tmp_path / "1", {"same.txt": b"a", "changed.txt": b"b", "only1.txt": b"c"}
+        )
+        root2 = write_tree(
+            tmp_path / "2", {"same.txt": b"a", "changed.txt": b"B", "images/only2.jpg": b"d"}
+        )
+
+        manifest_diff = diff_manifests(
+            *get_tree_manifests([root1, root2], num_workers=1),
+        )
+
+        assert manifest_diff == ManifestDiff(["only1.txt"], ["images/only2.jpg"], ["changed.txt"])
+
+    def test_an_unreadable_file_fails_only_its_own_root(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        bad_root = write_tree(tmp_path / "1", {"bad.jpg": b"bad", "good.jpg": b"good"})
+        good_root = write_tree(tmp_path / "2", {"good.jpg": b"good"})
+        monkeypatch.setattr(tree_manifest, "get_file_digest", unreadable_if_bad)
+
+        bad, good = get_tree_manifests([bad_root, good_root], num_workers=1)
+
+        assert list(bad.files) == ["good.jpg"]
+        assert list(bad.unreadable) == ["bad.jpg"]
+        assert (list(good.files), good.unreadable) == (["good.jpg"], {})
+
+    def test_the_digests_alone_raise_on_it(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        root = write_tree(tmp_path, {"bad.jpg": b"bad"})
+        monkeypatch.setattr(tree_manifest, "get_file_digest", unreadable_if_bad)
+
+        with pytest.raises(PermissionError):
+            get_file_digests([root / "bad.jpg"], num_workers=1)
+
+
+class TestArchiveCrcs:
+    def test_they_are_the_build_dirs_crcs(self, tmp_path: Path) -> None:
+        root = write_tree(tmp_path / "comic", {"info.txt": b"x", "images/01.jpg": b"page"})
+        zip_path = tmp_path / "comic.cbz"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(root / "info.txt", "info.txt")
+            archive.write(root / "images/01.jpg", "images/01.jpg")
+            archive.mkdir("empty")
+
+        manifest = get_tree_manifest(root, num_workers=1)
+
+        assert read_archive_crcs(zip_path) == {
+            name: digest.crc for name, digest in manifest.files.items()
+        }
+
+    def test_a_file_that_is_not_a_zip(self, tmp_path: Path) -> None:
+        zip_path = write_tree(tmp_path, {"comic.cbz": b"not a zip"}) / "comic.cbz"
+
+        with pytest.raises(zipfile.BadZipFile):
+            read_archive_crcs(zip_path)
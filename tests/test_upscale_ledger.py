@@ -12,6 +12,9 @@ reason, not just the outcome.
 
 from __future__ import annotations
 
+import json
+from dataclasses import replace
+from statistics import median
 from typing import TYPE_CHECKING
 
 import pytest
@@ -22,7 +25,9 @@ from barks_comic_building.restore.upscale_ledger import (
     OUTCOME_FAILED,
     OUTCOME_OK,
     UpscaleLedgerWriter,
+    UpscaleTimingStats,
     read_upscale_ledger,
+    read_upscale_ledger_index,
 )
 from barks_comic_building.restore.upscale_recipe import get_current_recipe
 
@@ -34,6 +39,21 @@ SCALE = 4
 # Named so the assertions read as "both of them" rather than as a bare literal.
 TWO = 2
 
+MEDIAN_CASES = [[40.0], [40.0, 44.0], [12.5, 40.0, 400.0, 37.1]]
+
+
+def assert_same_stats(
+    index_stats: UpscaleTimingStats | None, ledger_stats: UpscaleTimingStats | None
+) -> None:
+    """The very same figures, but for the index's median, which is only within 1%."""
+    if ledger_stats is None:
+        assert index_stats is None
+        return
+
+    assert index_stats is not None
+    assert replace(index_stats, median_seconds=ledger_stats.median_seconds) == ledger_stats
+    assert index_stats.median_seconds == pytest.approx(ledger_stats.median_seconds, rel=0.01)
+
 
 @pytest.fixture
 def ledger_file(tmp_path: Path) -> Path:
@@ -178,3 +198,59 @@ class TestTimingStats:
         write_pages(ledger_file, [("067", OUTCOME_FAILED, 3.0)])
 
         assert read_upscale_ledger(ledger_file).timing_stats() is None
+
+    @pytest.mark.parametrize("seconds", MEDIAN_CASES)
+    def test_the_full_read_gives_the_exact_median(
+        self, ledger_file: Path, seconds: list[float]
+    ) -> None:
+        write_pages(ledger_file, [(f"{67 + i:03d}", OUTCOME_OK, t) for i, t in enumerate(seconds)])
+
+        stats = read_upscale_ledger(ledger_file).timing_stats()
+
+        assert stats is not None
+        assert stats.median_seconds == median(seconds)
+
+    @pytest.mark.parametrize("seconds", MEDIAN_CASES)
+    def test_the_index_median_is_within_a_percent(
+        self, ledger_file: Path, seconds: list[float]
+    ) -> None:
+        """It is read from bucketed times, not the times themselves, so it is only close."""
+        write_pages(ledger_file, [(f"{67 + i:03d}", OUTCOME_OK, t) for i, t in enumerate(seconds)])
+
+        stats = read_upscale_ledger_index(ledger_file).timing_stats()
+
+        assert stats is not None
+        assert stats.median_seconds == pytest.approx(median(seconds), rel=0.01)
+
+
+class TestIndex:
+    def test_it_keeps_running_figures_rather_than_every_time(self, ledger_file: Path) -> None:
+        """Twenty pages at one speed are one bucket, and three runs are one recipe."""
+        for _ in range(2):
+            write_pages(ledger_file, [(f"{i:03d}", OUTCOME_OK, 40.0) for i in range(10)])
+        write_pages(ledger_file, [("067", OUTCOME_OK, 40.0)])
+        read_upscale_ledger_index(ledger_file)
+
+        index_file = ledger_file.with_name(ledger_file.name + ".index.json")
+        state = json.loads(index_file.read_text(encoding="utf-8"))["state"]
+
+        assert len(state["recipes"]) == 1
+        (totals,) = state["totals"].values()
+        assert totals["count"] == 21
+        assert len(totals["buckets"]) == 1
+
+    def test_it_agrees_with_a_full_read_as_the_ledger_grows(self, ledger_file: Path) -> None:
+        write_pages(ledger_file, [("067", OUTCOME_FAILED, 0.0), ("068", OUTCOME_OK, 20.0)])
+        read_upscale_ledger_index(ledger_file)
+        write_pages(ledger_file, [("067", OUTCOME_OK, 30.0)])
+
+        ledger = read_upscale_ledger(ledger_file)
+        index = read_upscale_ledger_index(ledger_file)
+
+        # Only the second run: its run record and its page.
+        assert index.num_new_records == TWO
+        assert index.latest_by_page() == ledger.latest_by_page()
+        assert_same_stats(index.timing_stats(), ledger.timing_stats())
+        recipe_id = ledger.pages[0].recipe_id
+        assert_same_stats(index.timing_stats(recipe_id), ledger.timing_stats(recipe_id))
+        assert index.recipe_for(recipe_id) == ledger.recipe_for(recipe_id)
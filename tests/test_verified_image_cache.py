@@ -0,0 +1,164 @@
+"""Tests for the sweep that decodes only the images changed since it last verified them.
+
+The failure that matters is a file reported sound when it is not: a damaged page would
+sit in the library with a clean sweep vouching for it. So what is pinned here is that a
+verdict is trusted only while the file is exactly as it was, that a fault is remembered
+and reported as readily as a pass, and that `--recheck` trusts nothing.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+from PIL import Image
+
+from barks_comic_building.restore.verified_image_cache import (
+    Verdict,
+    VerifiedImageCache,
+    get_file_signature,
+)
+from barks_comic_building.restore.verify_volume_images import VolumeImageVerifier
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SIZE = (64, 48)
+
+
+def write_picture(path: Path) -> Path:
+    image = Image.new("RGB", SIZE)
+    image.putdata(
+        [(x * 4 % 256, y * 5 % 256, (x + y) % 256) for y in range(SIZE[1]) for x in range(SIZE[0])]
+    )
+    image.save(str(path))
+
+    return path
+
+
+@pytest.fixture
+def image_file(tmp_path: Path) -> Path:
+    return write_picture(tmp_path / "001.png")
+
+
+def _signature(path: Path) -> list[int]:
+    return get_file_signature(path.stat())
+
+
+class TestVerdicts:
+    def test_a_file_verified_as_it_is_now(self, image_file: Path) -> None:
+        cache = VerifiedImageCache()
+        cache.record(image_file, _signature(image_file), Verdict(None))
+
+        assert cache.get_verdict(image_file, _signature(image_file)) == Verdict(None)
+        assert cache.num_cached == 1
+
+    def test_a_fault_is_remembered_too(self, image_file: Path) -> None:
+        cache = VerifiedImageCache()
+        cache.record(image_file, _signature(image_file), Verdict("it is broken"))
+
+        assert cache.get_verdict(image_file, _signature(image_file)) == Verdict("it is broken")
+
+    def test_a_file_written_since(self, image_file: Path) -> None:
+        cache = VerifiedImageCache()
+        cache.record(image_file, _signature(image_file), Verdict(None))
+        stat = image_file.stat()
+        os.utime(image_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert cache.get_verdict(image_file, _signature(image_file)) is None
+
+    def test_a_file_never_verified(self, image_file: Path) -> None:
+        assert VerifiedImageCache().get_verdict(image_file, _signature(image_file)) is None
+
+    def test_a_recheck_trusts_nothing(self, image_file: Path) -> None:
+        cache = VerifiedImageCache(recheck=True)
+        cache.record(image_file, _signature(image_file), Verdict(None))
+
+        assert cache.get_verdict(image_file, _signature(image_file)) is None
+
+
+class TestLoadAndSave:
+    def test_it_comes_back_the_same(self, tmp_path: Path, image_file: Path) -> None:
+        cache_file = tmp_path / "cache.json"
+        with VerifiedImageCache(cache_file) as cache:
+            cache.record(image_file, _signature(image_file), Verdict("it is broken"))
+
+        with VerifiedImageCache(cache_file) as cache:
+            assert cache.get_verdict(image_file, _signature(image_file)) == Verdict("it is broken")
+
+    @pytest.mark.parametrize("text", ["not json", "[]", '{"version": 1}'])
+    def test_an_unreadable_cache_is_an_empty_one(
+        self, tmp_path: Path, image_file: Path, text: str
+    ) -> None:
+        cache_file = tmp_path / "cache.json"
+        cache_file.write_text(text)
+
+        with VerifiedImageCache(cache_file) as cache:
+            assert cache.get_verdict(image_file, _signature(image_file)) is None
+
+    def test_a_cache_from_another_version_is_an_empty_one(
+        self, tmp_path: Path, image_file: Path
+    ) -> None:
+        cache_file = tmp_path / "cache.json"
+        with VerifiedImageCache(cache_file) as cache:
+            cache.record(image_file, _signature(image_file), Verdict(None))
+        data = json.loads(cache_file.read_text())
+        data["version"] += 1
+        cache_file.write_text(json.dumps(data))
+
+        with VerifiedImageCache(cache_file) as cache:
+            assert cache.get_verdict(image_file, _signature(image_file)) is None
+
+
+class TestSweep:
+    @pytest.fixture
+    def volume_dir(self, tmp_path: Path) -> Path:
+        volume_dir = tmp_path / "volume"
+        volume_dir.mkdir()
+        for page in ("001", "002", "003"):
+            write_picture(volume_dir / f"{page}.png")
+        (volume_dir / "broken.png").write_bytes(b"not a png")
+        (volume_dir / "notes.txt").write_text("notes")
+
+        return volume_dir
+
+    def _sweep(self, volume_dir: Path, cache: VerifiedImageCache) -> tuple[int, int]:
+        with VolumeImageVerifier(cache, budget_mb=1024, num_workers=2) as verifier:
+            return verifier.verify_volume_dir(volume_dir)
+
+    def test_every_image_is_verified_and_the_fault_found(self, volume_dir: Path) -> None:
+        cache = VerifiedImageCache()
+
+        assert self._sweep(volume_dir, cache) == (4, 1)
+        assert cache.num_verified == 4
+
+    def test_a_second_sweep_decodes_only_what_changed(self, volume_dir: Path) -> None:
+        cache = VerifiedImageCache()
+        self._sweep(volume_dir, cache)
+        write_picture(volume_dir / "004.png")
+
+        assert self._sweep(volume_dir, cache) == (5, 1)
+        assert cache.num_verified == 5
+        assert cache.num_cached == 4
+
+    def test_a_budget_smaller_than_any_image_still_verifies_them(self, volume_dir: Path) -> None:
+        cache = VerifiedImageCache()
+        with VolumeImageVerifier(cache, budget_mb=0, num_workers=2) as verifier:
+            assert verifier.verify_volume_dir(volume_dir) == (4, 1)
+
+    def test_a_worker_that_dies_fails_its_file_not_the_sweep(self, volume_dir: Path) -> None:
+        cache = VerifiedImageCache()
+        with VolumeImageVerifier(cache, budget_mb=1024, num_workers=2) as verifier:
+            broken_pool = verifier._executor  # noqa: SLF001
+            broken_pool.submit(os._exit, 1)
+            num_checked, num_errors = verifier.verify_volume_dir(volume_dir)
+
+            assert num_checked == 4
+            assert num_errors >= 1
+            assert verifier._executor is not broken_pool  # noqa: SLF001
+
+        # Nothing is kept for a file that was not verified, so the next sweep tries again.
+        assert self._sweep(volume_dir, cache) == (4, 1)
+
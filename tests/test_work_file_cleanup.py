@@ -18,6 +18,7 @@ from typing import TYPE_CHECKING
 import pytest
 
 from barks_comic_building.restore.batch_restore_pipeline import _clean_up_work_files
+from barks_comic_building.restore.overlay import OverlayBackend
 from barks_comic_building.restore.restore_pipeline import RestorePipeline
 
 if TYPE_CHECKING:
@@ -142,3 +143,51 @@ class TestCleanUpWorkFiles:
         assert pipeline.svg_png_4x_file in pipeline.work_files
         assert pipeline.png_of_svg_file not in pipeline.work_files
         assert pipeline.svg_png_4x_file != pipeline.png_of_svg_file
+
+
+class TestFusedPart1:
+    """Part 1 fused hands the filtered page over in memory, and only writes it if asked.
+
+    `check_for_errors` treats a missing expected output as a failure, so the file not
+    being written has to go hand in hand with it not being expected.
+    """
+
+    def test_the_filtered_page_is_not_expected_when_nothing_reads_it(
+        self, pipeline: RestorePipeline
+    ) -> None:
+        assert pipeline.fuse_part1
+        assert not pipeline.persists_removed_artifacts
+        assert pipeline.removed_artifacts_file not in pipeline.expected_output_files
+
+    @pytest.mark.parametrize("retention", ["use_existing_work_files", "keep_work_files"])
+    def test_it_is_written_when_something_will_read_it(
+        self, pipeline: RestorePipeline, retention: str
+    ) -> None:
+        setattr(pipeline, retention, True)
+
+        assert pipeline.persists_removed_artifacts
+        assert pipeline.removed_artifacts_file in pipeline.expected_output_files
+
+    def test_it_is_written_when_part_1_is_not_fused(self, pipeline: RestorePipeline) -> None:
+        pipeline.fuse_part1 = False
+
+        assert pipeline.removed_artifacts_file in pipeline.expected_output_files
+
+    def test_it_is_still_cleaned_up(self, pipeline: RestorePipeline) -> None:
+        """An earlier, unfused run may have left one behind."""
+        assert pipeline.removed_artifacts_file in pipeline.work_files
+
+
+class TestInProcessOverlay:
+    """The in-process overlay needs neither the 4x ink render nor the snapped file."""
+
+    def test_neither_is_expected(self, pipeline: RestorePipeline) -> None:
+        assert pipeline.overlay_backend is OverlayBackend.NUMPY
+
+        assert pipeline.svg_png_4x_file not in pipeline.expected_output_files
+        assert pipeline.palette_snapped_file not in pipeline.expected_output_files
+
+    def test_the_gmic_overlay_still_expects_the_4x_render(self, pipeline: RestorePipeline) -> None:
+        pipeline.overlay_backend = OverlayBackend.GMIC
+
+        assert pipeline.svg_png_4x_file in pipeline.expected_output_files
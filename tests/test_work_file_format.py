@@ -0,0 +1,100 @@
+"""Tests for the formats the restore writes its intermediates in.
+
+Every one of them has to give back exactly what went in, because none of them is part of
+the recipe: switching format never makes a page stale, so a lossy one would change pages
+with nothing ever redoing the ones it had already touched.
+
+The png forms have one deliberate loss, which is tested as such. They drop the alpha
+channel, because the optimised writer they replace always did, and gmic's smoothing has
+only ever seen the colour-removed page as RGB.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from barks_comic_building.restore.image_io import (
+    WorkFileFormat,
+    read_work_image_file,
+    write_cv_image_file,
+    write_work_image_file,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+FORMATS = [
+    WorkFileFormat.PNG,
+    WorkFileFormat.PNG_STORED,
+    WorkFileFormat.NPY,
+]
+
+
+def make_page(channels: int = 3) -> np.ndarray:
+    return np.random.default_rng(5).integers(0, 256, (48, 64, channels), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("work_file_format", FORMATS)
+def test_a_bgr_page_round_trips_exactly(tmp_path: Path, work_file_format: WorkFileFormat) -> None:
+    page = make_page()
+    file = tmp_path / f"page{work_file_format.suffix}"
+
+    write_work_image_file(file, page, work_file_format)
+
+    np.testing.assert_array_equal(read_work_image_file(file), page)
+
+
+@pytest.mark.parametrize("work_file_format", [WorkFileFormat.PNG, WorkFileFormat.PNG_STORED])
+def test_png_writes_the_same_pixels_as_the_optimised_writer(
+    tmp_path: Path, work_file_format: WorkFileFormat
+) -> None:
+    """Including for a BGRA page, which both write as RGB."""
+    page = make_page(channels=4)
+    fast = tmp_path / "fast.png"
+    optimised = tmp_path / "optimised.png"
+
+    write_work_image_file(fast, page, work_file_format)
+    write_cv_image_file(optimised, page)
+
+    fast_pixels = cv.imread(str(fast), cv.IMREAD_UNCHANGED)
+    np.testing.assert_array_equal(fast_pixels, cv.imread(str(optimised), cv.IMREAD_UNCHANGED))
+    assert fast_pixels.shape[2] == 3  # noqa: PLR2004
+
+
+def test_the_stored_png_is_bigger_and_the_fast_one_is_not(tmp_path: Path) -> None:
+    """The fast png should still be compressing a flat page, unlike the stored one."""
+    flat = np.full((200, 300, 3), 200, dtype=np.uint8)
+    stored = tmp_path / "stored.png"
+    fast = tmp_path / "fast.png"
+
+    write_work_image_file(stored, flat, WorkFileFormat.PNG_STORED)
+    write_work_image_file(fast, flat, WorkFileFormat.PNG)
+
+    assert stored.stat().st_size > flat.nbytes
+    assert fast.stat().st_size < flat.nbytes // 50
+
+
+def test_an_npy_page_can_be_changed_in_place_without_touching_the_file(tmp_path: Path) -> None:
+    """The colour removal posterizes what it is given in place."""
+    page = make_page()
+    file = tmp_path / "page.npy"
+    write_work_image_file(file, page, WorkFileFormat.NPY)
+
+    image = read_work_image_file(file)
+    image[:] = 0
+
+    np.testing.assert_array_equal(read_work_image_file(file), page)
+
+
+class TestGmicInputsStayPng:
+    def test_a_format_gmic_cannot_read_falls_back_to_png(self) -> None:
+        assert not WorkFileFormat.NPY.is_gmic_readable
+        assert WorkFileFormat.NPY.for_gmic() is WorkFileFormat.PNG
+
+    @pytest.mark.parametrize("work_file_format", [WorkFileFormat.PNG, WorkFileFormat.PNG_STORED])
+    def test_a_png_format_is_kept(self, work_file_format: WorkFileFormat) -> None:
+        assert work_file_format.for_gmic() is work_file_format
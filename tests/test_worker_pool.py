@@ -0,0 +1,55 @@
+"""Tests for the process pool a restore run keeps for its whole length.
+
+What matters is that each worker's warm-up is reported exactly once however many tasks
+it goes on to run - the run summary adds them up - and that a worker dying under the pool
+costs the tasks it had and not the rest of the run.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import os
+
+import pytest
+
+from barks_comic_building.restore.worker_pool import WorkerPool, take_worker_warmup_seconds
+
+NUM_WORKERS = 2
+
+
+def _exit_worker() -> None:
+    os._exit(1)
+
+
+class TestWarmup:
+    def test_nothing_to_report_outside_a_worker(self) -> None:
+        assert take_worker_warmup_seconds() is None
+
+    def test_each_worker_reports_once_however_many_tasks_it_runs(self) -> None:
+        with WorkerPool(NUM_WORKERS) as pool:
+            futures = [pool.submit(take_worker_warmup_seconds) for _ in range(20)]
+            for future in futures:
+                pool.record_warmup(future.result())
+
+        assert 1 <= len(pool.warmup_seconds) <= NUM_WORKERS
+        assert all(seconds > 0 for seconds in pool.warmup_seconds)
+        assert "once for the whole run" in pool.describe_warmup()
+
+    def test_a_pool_nobody_used_says_so(self) -> None:
+        with WorkerPool(NUM_WORKERS) as pool:
+            pass
+
+        assert pool.describe_warmup() == "No workers reported warming up."
+
+
+class TestBrokenPool:
+    def test_a_dead_worker_fails_its_task_and_the_pool_carries_on(self) -> None:
+        with WorkerPool(NUM_WORKERS) as pool:
+            with pytest.raises(concurrent.futures.BrokenExecutor):
+                pool.submit(_exit_worker).result()
+
+            # A new worker, in a new pool, so a new warm-up to report.
+            pool.record_warmup(pool.submit(take_worker_warmup_seconds).result())
+
+        assert pool.num_replaced == 1
+        assert "replaced 1 time(s)" in pool.describe_warmup()
@@ -20,9 +20,12 @@ from typing import TYPE_CHECKING, cast
 import pytest
 
 from barks_comic_building.build.zipping import (
+    CbzWriter,
     create_symlink_zip,
     create_symlinks_to_comic_zip,
+    get_cbz_members,
     relative_symlink,
+    start_cbz,
     zip_comic_book,
 )
 
@@ -140,6 +143,117 @@ class TestZippingTheComic:
             assert "004.jpg" in archive.namelist()
 
 
+class TestTheCbzWriter:
+    """The pages go in stored, in order, and the cbz is only ever replaced whole."""
+
+    def test_images_are_stored_and_the_rest_deflated(self, tmp_path: Path) -> None:
+        info = touch(tmp_path / "comic-metadata.json")
+        info.write_text("{}" * 100)
+        cbz = tmp_path / "comic.cbz"
+
+        with CbzWriter(cbz, ["images/01.jpg", "images/02.png"]) as writer:
+            writer.add_page("images/01.jpg", b"jpg bytes", mtime=1_700_000_000)
+            writer.add_page("images/02.png", b"png bytes", mtime=1_700_000_000)
+            writer.finish([("comic-metadata.json", info)])
+
+        with zipfile.ZipFile(cbz) as archive:
+            types = {i.filename: i.compress_type for i in archive.infolist()}
+            assert archive.read("images/01.jpg") == b"jpg bytes"
+        assert types == {
+            "images/01.jpg": zipfile.ZIP_STORED,
+            "images/02.png": zipfile.ZIP_STORED,
+            "comic-metadata.json": zipfile.ZIP_DEFLATED,
+        }
+
+    def test_pages_go_in_the_order_named_whatever_order_they_arrive(
+        self, tmp_path: Path
+    ) -> None:
+        names = [f"images/{n:02d}.jpg" for n in range(1, 6)]
+        on_disk = touch(tmp_path / "03.jpg")
+        cbz = tmp_path / "comic.cbz"
+
+        with CbzWriter(cbz, names) as writer:
+            for name in reversed(names):
+                if name == "images/03.jpg":
+                    writer.add_page_file(name, on_disk)
+                else:
+                    writer.add_page(name, name.encode(), mtime=1_700_000_000)
+            writer.finish([])
+
+        with zipfile.ZipFile(cbz) as archive:
+            assert archive.namelist() == names
+
+    def test_a_page_never_added_is_refused(self, tmp_path: Path) -> None:
+        with (
+            pytest.raises(RuntimeError, match="images/02.jpg"),
+            CbzWriter(tmp_path / "comic.cbz", ["images/01.jpg", "images/02.jpg"]) as writer,
+        ):
+            writer.add_page("images/01.jpg", b"page", mtime=1_700_000_000)
+            writer.finish([])
+
+    def test_a_failed_build_leaves_the_old_cbz_and_no_temporary_one(self, tmp_path: Path) -> None:
+        cbz = tmp_path / "comic.cbz"
+        cbz.write_bytes(b"the old cbz")
+
+        with pytest.raises(ValueError, match="page failed"), CbzWriter(cbz, ["01.jpg"]):
+            msg = "page failed"
+            raise ValueError(msg)
+
+        assert cbz.read_bytes() == b"the old cbz"
+        assert [f.name for f in tmp_path.iterdir()] == ["comic.cbz"]
+
+    def test_the_same_pages_make_the_same_archive(self, comic: FakeComic) -> None:
+        zip_comic_book(as_comic(comic))
+        first = comic.zip_file.read_bytes()
+
+        zip_comic_book(as_comic(comic))
+
+        assert comic.zip_file.read_bytes() == first
+
+
+
+class TestStreamingTheCbz:
+    """A cbz written as the pages are drawn holds what one zipped from disk would."""
+
+    def make_dest_dir(self, comic: FakeComic) -> list[str]:
+        for name in ["images/01.jpg", "images/02.jpg", "images/03.jpg", "comic-metadata.json"]:
+            touch(comic.dest_dir / name).write_text(name)
+        # Not a page, but in a subdirectory, so `zip_comic_book` takes it in with them.
+        touch(comic.dest_dir / "images" / "notes.txt").write_text("notes")
+        touch(comic.dest_dir / "extras" / "cover.jpg").write_text("cover")
+
+        return ["images/02.jpg"]
+
+    def stream(self, comic: FakeComic, to_draw: list[str]) -> None:
+        with start_cbz(comic.dest_dir, comic.zip_file, to_draw) as writer:
+            for arcname in to_draw:
+                writer.add_page(arcname, arcname.encode(), mtime=1_700_000_000)
+            writer.finish(get_cbz_members(comic.dest_dir)[1])
+
+    def test_the_members_match_zipping_from_disk(self, comic: FakeComic) -> None:
+        to_draw = self.make_dest_dir(comic)
+        zip_comic_book(as_comic(comic))
+        with zipfile.ZipFile(comic.zip_file) as archive:
+            from_disk = archive.namelist()
+
+        self.stream(comic, to_draw)
+
+        with zipfile.ZipFile(comic.zip_file) as archive:
+            assert archive.namelist() == from_disk
+        assert "extras/cover.jpg" in from_disk
+        assert "images/notes.txt" in from_disk
+
+    def test_a_page_still_to_draw_need_not_be_on_disk(self, comic: FakeComic) -> None:
+        to_draw = self.make_dest_dir(comic)
+        (comic.dest_dir / to_draw[0]).unlink()
+
+        self.stream(comic, to_draw)
+
+        with zipfile.ZipFile(comic.zip_file) as archive:
+            assert archive.read(to_draw[0]) == to_draw[0].encode()
+            assert archive.read("images/01.jpg") == b"images/01.jpg"
+
+
 class TestTheSymlinksAreRelative:
     """The property that lets a built tree be renamed without re-linking every zip."""
 